@@ -0,0 +1,32 @@
+"""change
+
+Revision ID: 2b8e6f0c4d17
+Revises: 7d2f9b4e1a68
+Create Date: 2026-10-18 19:48:12.204815
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2b8e6f0c4d17"
+down_revision = "7d2f9b4e1a68"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "fraud_feature_histograms",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("model_version", sa.String(length=64), nullable=False),
+        sa.Column("counts", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("rows", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("day", "model_version"),
+    )
+
+
+def downgrade():
+    op.drop_table("fraud_feature_histograms")
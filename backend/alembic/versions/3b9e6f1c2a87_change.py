@@ -0,0 +1,24 @@
+"""change
+
+Revision ID: 3b9e6f1c2a87
+Revises: 8d41f0c6b2e7
+Create Date: 2026-10-18 14:02:37.418265
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3b9e6f1c2a87"
+down_revision = "8d41f0c6b2e7"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # existing scores have no fingerprint, they are rescored once the next time they are synced
+    op.add_column("transactions", sa.Column("fraud_fingerprint", sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("transactions", "fraud_fingerprint")
@@ -0,0 +1,38 @@
+"""change
+
+Revision ID: 5c1e8a3f7b92
+Revises: 2b8e6f0c4d17
+Create Date: 2026-10-18 21:12:40.518376
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c1e8a3f7b92"
+down_revision = "2b8e6f0c4d17"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "fraud_online_detectors",
+        sa.Column("name", sa.String(length=128), nullable=False),
+        sa.Column("params", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("mass_ref", sa.LargeBinary(), nullable=False),
+        sa.Column("mass_latest", sa.LargeBinary(), nullable=False),
+        sa.Column("latest_rows", sa.BigInteger(), nullable=False),
+        sa.Column("windows", sa.Integer(), nullable=False),
+        sa.Column("calibration", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column(
+            "previous_calibration", postgresql.JSONB(astext_type=sa.Text()), nullable=True
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade():
+    op.drop_table("fraud_online_detectors")
@@ -0,0 +1,67 @@
+"""change
+
+Revision ID: 5e2b7c91d4a3
+Revises: c0d7aa9fe19e
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e2b7c91d4a3"
+down_revision = "c0d7aa9fe19e"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    job_status = postgresql.ENUM(
+        "pending", "processing", "done", "dead",
+        name="fraud_scoring_job_status",
+        create_type=True,
+    )
+    job_status.create(op.get_bind(), checkfirst=True)
+
+    op.create_table(
+        "fraud_scoring_jobs",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("transaction_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM(
+                "pending", "processing", "done", "dead",
+                name="fraud_scoring_job_status",
+                create_type=False,
+            ),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(length=512), nullable=True),
+        sa.Column("available_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("locked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["transaction_id"], ["transactions.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_fraud_scoring_jobs_transaction_id"),
+        "fraud_scoring_jobs",
+        ["transaction_id"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_fraud_jobs_status_available_id", "fraud_scoring_jobs", ["status", "available_at", "id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_fraud_jobs_status_available_id", table_name="fraud_scoring_jobs")
+    op.drop_index(op.f("ix_fraud_scoring_jobs_transaction_id"), table_name="fraud_scoring_jobs")
+    op.drop_table("fraud_scoring_jobs")
+
+    job_status = postgresql.ENUM(name="fraud_scoring_job_status")
+    job_status.drop(op.get_bind(), checkfirst=True)
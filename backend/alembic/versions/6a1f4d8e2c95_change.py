@@ -0,0 +1,89 @@
+"""change
+
+Revision ID: 6a1f4d8e2c95
+Revises: 3b9e6f1c2a87
+Create Date: 2026-10-18 16:21:44.730512
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6a1f4d8e2c95"
+down_revision = "3b9e6f1c2a87"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "user_spend_profile",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("txn_count", sa.BigInteger(), nullable=False),
+        sa.Column("amount_mean", sa.Float(), nullable=False),
+        sa.Column("amount_m2", sa.Float(), nullable=False),
+        sa.Column("merchant_counts", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("hour_counts", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+    # seed from the transactions already stored, hour buckets cover the 7 days up to
+    # each user's latest transaction; afterwards the table is only updated incrementally
+    op.execute(
+        """
+        WITH tx AS (
+            SELECT user_id, merchant_name, amount,
+                   floor(extract(epoch FROM date::timestamp) / 3600)::bigint AS hour
+            FROM transactions
+            WHERE removed IS NOT TRUE
+        ),
+        moments AS (
+            SELECT user_id,
+                   count(amount) AS txn_count,
+                   coalesce(avg(amount), 0)::double precision AS amount_mean,
+                   coalesce(var_samp(amount) * (count(amount) - 1), 0)::double precision
+                       AS amount_m2,
+                   max(hour) AS latest_hour
+            FROM tx
+            GROUP BY user_id
+        ),
+        merchants AS (
+            SELECT user_id, jsonb_object_agg(merchant_name, n) AS merchant_counts
+            FROM (
+                SELECT user_id, merchant_name, count(*) AS n
+                FROM tx
+                WHERE merchant_name IS NOT NULL
+                GROUP BY user_id, merchant_name
+            ) m
+            GROUP BY user_id
+        ),
+        hours AS (
+            SELECT tx.user_id, jsonb_object_agg(tx.hour::text, tx.n) AS hour_counts
+            FROM (
+                SELECT user_id, hour, count(*) AS n
+                FROM tx
+                WHERE hour IS NOT NULL
+                GROUP BY user_id, hour
+            ) tx
+            JOIN moments ON moments.user_id = tx.user_id
+            WHERE tx.hour > moments.latest_hour - 168
+            GROUP BY tx.user_id
+        )
+        INSERT INTO user_spend_profile
+            (user_id, txn_count, amount_mean, amount_m2, merchant_counts, hour_counts, updated_at)
+        SELECT moments.user_id, moments.txn_count, moments.amount_mean, moments.amount_m2,
+               coalesce(merchants.merchant_counts, '{}'::jsonb),
+               coalesce(hours.hour_counts, '{}'::jsonb),
+               now()
+        FROM moments
+        LEFT JOIN merchants ON merchants.user_id = moments.user_id
+        LEFT JOIN hours ON hours.user_id = moments.user_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("user_spend_profile")
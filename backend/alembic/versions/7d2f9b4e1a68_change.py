@@ -0,0 +1,32 @@
+"""change
+
+Revision ID: 7d2f9b4e1a68
+Revises: e4b7a2c9d315
+Create Date: 2026-10-18 23:05:51.830274
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7d2f9b4e1a68"
+down_revision = "e4b7a2c9d315"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "fraud_score_sketches",
+        sa.Column("model_version", sa.String(length=64), nullable=False),
+        sa.Column("sketch", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("risk_thresholds", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("model_version"),
+    )
+
+
+def downgrade():
+    op.drop_table("fraud_score_sketches")
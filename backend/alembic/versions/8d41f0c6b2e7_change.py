@@ -0,0 +1,46 @@
+"""change
+
+Revision ID: 8d41f0c6b2e7
+Revises: 5e2b7c91d4a3
+Create Date: 2026-10-18 11:47:05.913377
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d41f0c6b2e7"
+down_revision = "5e2b7c91d4a3"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "merchant_amount_stats",
+        sa.Column("merchant_name", sa.String(length=256), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("mean", sa.Float(), nullable=False),
+        sa.Column("m2", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("merchant_name"),
+    )
+
+    # seed from the transactions already stored, afterwards the table is only updated incrementally
+    op.execute(
+        """
+        INSERT INTO merchant_amount_stats (merchant_name, count, mean, m2, updated_at)
+        SELECT merchant_name,
+               count(*),
+               avg(amount)::double precision,
+               coalesce(var_samp(amount) * (count(*) - 1), 0)::double precision,
+               now()
+        FROM transactions
+        WHERE merchant_name IS NOT NULL AND amount IS NOT NULL AND NOT removed
+        GROUP BY merchant_name
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("merchant_amount_stats")
@@ -0,0 +1,26 @@
+"""change
+
+Revision ID: 9c3e5a7d1f40
+Revises: 6a1f4d8e2c95
+Create Date: 2026-10-18 19:08:12.562114
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9c3e5a7d1f40"
+down_revision = "6a1f4d8e2c95"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # existing scores don't know their model, they get one the next time they are scored
+    op.add_column(
+        "transactions", sa.Column("fraud_model_version", sa.String(length=64), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("transactions", "fraud_model_version")
@@ -0,0 +1,28 @@
+"""change
+
+Revision ID: a4d8c2e6f913
+Revises: 5c1e8a3f7b92
+Create Date: 2026-10-19 10:04:17.332901
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a4d8c2e6f913"
+down_revision = "5c1e8a3f7b92"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # rows inserted before this keep reading the user's current profile
+    op.add_column(
+        "transactions",
+        sa.Column("profile_features", postgresql.ARRAY(sa.Float()), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("transactions", "profile_features")
@@ -0,0 +1,33 @@
+"""change
+
+Revision ID: e4b7a2c9d315
+Revises: 9c3e5a7d1f40
+Create Date: 2026-10-18 21:42:37.104528
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e4b7a2c9d315"
+down_revision = "9c3e5a7d1f40"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "fraud_shadow_scores",
+        sa.Column("model_version", sa.String(length=64), nullable=False),
+        sa.Column("transaction_id", sa.Integer(), nullable=False),
+        sa.Column("primary_score", sa.REAL(), nullable=False),
+        sa.Column("primary_tier", sa.SmallInteger(), nullable=False),
+        sa.Column("shadow_score", sa.REAL(), nullable=False),
+        sa.Column("shadow_tier", sa.SmallInteger(), nullable=False),
+        sa.Column("scored_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("model_version", "transaction_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("fraud_shadow_scores")
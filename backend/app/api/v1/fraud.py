@@ -0,0 +1,250 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app.domain.entities import FraudScoreEntity
+from app.security.admin import require_admin_token
+from app.security.auth import get_current_user
+from app.services.fraud_detection_service import FraudDetectionService
+from app.services_container import (
+    get_feature_histogram_repo,
+    get_fraud_detection_service,
+    get_score_sketch_repo,
+)
+from fraud_detection.drift import (
+    DEFAULT_REPORT_DAYS,
+    FeatureHistograms,
+    get_drift_monitor,
+    reference_of,
+    window_report,
+)
+from fraud_detection.inference_executor import get_inference_executor
+from fraud_detection.model_registry import model_registry
+from fraud_detection.model_versions import list_versions, promote, read_active
+from fraud_detection.quantile_sketch import (
+    DEFAULT_HIGH_QUANTILE,
+    DEFAULT_LOW_QUANTILE,
+    DEFAULT_MIN_RECALIBRATION_COUNT,
+    DEFAULT_QUANTILES,
+    KLLSketch,
+    apply_thresholds,
+    get_score_sketches,
+    recalibrated_thresholds,
+    tier_shares,
+)
+from fraud_detection.shadow import get_shadow_scorer
+from infrastructure.db.repos.feature_histogram_repo import SqlFeatureHistogramRepo
+from infrastructure.db.repos.score_sketch_repo import SqlScoreSketchRepo
+
+
+class ScoreTransactionBody(BaseModel):
+    amount: float
+    merchant_name: Optional[str] = None
+    payment_channel: Optional[str] = None
+    date: Optional[Union[datetime, date]] = None
+    pending: bool = False
+
+
+class RecalibrateBody(BaseModel):
+    low_quantile: float = DEFAULT_LOW_QUANTILE
+    high_quantile: float = DEFAULT_HIGH_QUANTILE
+    min_count: int = DEFAULT_MIN_RECALIBRATION_COUNT
+
+
+router = APIRouter(
+    prefix="/fraud",
+    tags=["fraud"],
+)
+
+
+def _registry_dir() -> str:
+    registry_dir = get_settings().FRAUD_MODEL_REGISTRY_DIR
+    if not registry_dir:
+        raise HTTPException(404, "model registry directory is not configured")
+    return registry_dir
+
+
+# scores one transaction or a list of them with the loaded model, nothing is stored
+# a single item comes back as one object, a list as a list in the same order
+@router.post(
+    "/score",
+    response_model=Union[FraudScoreEntity, list[FraudScoreEntity]],
+    dependencies=[Depends(get_current_user)],
+)
+async def score_transactions(
+    body: Union[ScoreTransactionBody, list[ScoreTransactionBody]],
+    svc: FraudDetectionService = Depends(get_fraud_detection_service),
+):
+    items = body if isinstance(body, list) else [body]
+    max_items = get_settings().FRAUD_SCORE_MAX_ITEMS
+    if len(items) > max_items:
+        raise HTTPException(422, f"at most {max_items} transactions per request")
+
+    try:
+        results = await svc.score_payloads([item.model_dump() for item in items])
+    except (FileNotFoundError, RuntimeError):
+        raise HTTPException(503, "fraud model is not available")
+
+    scores = [
+        FraudScoreEntity(fraud_score=score, is_fraud_suspected=is_suspected, risk_level=risk_tier)
+        for score, is_suspected, risk_tier in results
+    ]
+    return scores if isinstance(body, list) else scores[0]
+
+
+# versions in the registry directory, the promoted one and what this process is serving
+@router.get("/models", dependencies=[Depends(require_admin_token)])
+async def list_models():
+    registry_dir = _registry_dir()
+    return {
+        "versions": list_versions(registry_dir),
+        "active": read_active(registry_dir),
+        "loaded": model_registry.stats(),
+    }
+
+
+def _loaded_version() -> str:
+    if not model_registry.loaded:
+        raise HTTPException(503, "fraud model is not available")
+    return model_registry.model_version
+
+
+async def _live_sketch(repo: SqlScoreSketchRepo, version: str) -> tuple[KLLSketch, dict | None]:
+    stored, stored_thresholds = await repo.load(version)
+    sketches = get_score_sketches()
+    if sketches is None:
+        return stored or KLLSketch(), stored_thresholds
+    return sketches.live_sketch(version, stored), stored_thresholds
+
+
+# quantiles of every score a version produced across all processes, plus this
+# process's unflushed scores, and the share of scores in each tier
+@router.get("/models/quantiles", dependencies=[Depends(require_admin_token)])
+async def score_quantiles(
+    version: Optional[str] = None,
+    q: list[float] = Query(default=list(DEFAULT_QUANTILES)),
+    repo: SqlScoreSketchRepo = Depends(get_score_sketch_repo),
+):
+    if any(not 0.0 <= value <= 1.0 for value in q):
+        raise HTTPException(422, "quantiles must be between 0 and 1")
+    version = version or _loaded_version()
+    sketch, stored_thresholds = await _live_sketch(repo, version)
+
+    thresholds = stored_thresholds
+    if model_registry.loaded and version == model_registry.model_version:
+        thresholds = model_registry.get()[0].get("risk_thresholds")
+    return {
+        "version": version,
+        "count": sketch.count,
+        "sketch_items": sketch.size,
+        "min": sketch.min if sketch.count else None,
+        "max": sketch.max if sketch.count else None,
+        "quantiles": {str(value): score for value, score in zip(q, sketch.quantiles(q))},
+        "risk_thresholds": thresholds,
+        "recalibrated_thresholds": stored_thresholds,
+        "tier_shares": tier_shares(sketch, thresholds),
+    }
+
+
+# moves the loaded version's tier thresholds to quantiles of its live scores; this
+# process applies them now, the others on their next FRAUD_SCORE_SKETCH_FLUSH_SECONDS flush
+@router.post("/models/quantiles/recalibrate", dependencies=[Depends(require_admin_token)])
+async def recalibrate_thresholds(
+    body: RecalibrateBody,
+    repo: SqlScoreSketchRepo = Depends(get_score_sketch_repo),
+):
+    version = _loaded_version()
+    sketches = get_score_sketches()
+    if sketches is not None:
+        # this process's scores count too
+        await sketches.flush()
+    sketch, _ = await _live_sketch(repo, version)
+    if sketch.count < body.min_count:
+        raise HTTPException(
+            422, f"{sketch.count} scores recorded for {version}, at least {body.min_count} needed"
+        )
+    try:
+        thresholds = recalibrated_thresholds(
+            sketch, low_quantile=body.low_quantile, high_quantile=body.high_quantile
+        )
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+
+    await repo.set_risk_thresholds(version, thresholds)
+    apply_thresholds(model_registry, thresholds)
+    return {
+        "version": version,
+        "count": sketch.count,
+        "risk_thresholds": thresholds,
+        "tier_shares": tier_shares(sketch, thresholds),
+    }
+
+
+# undoes a recalibration, the loaded version goes back to its bundle's thresholds; this
+# process now, the others on their next flush
+@router.post("/models/quantiles/reset", dependencies=[Depends(require_admin_token)])
+async def reset_thresholds(repo: SqlScoreSketchRepo = Depends(get_score_sketch_repo)):
+    version = _loaded_version()
+    await repo.set_risk_thresholds(version, None)
+    apply_thresholds(model_registry, None)
+    return {"version": version, "risk_thresholds": model_registry.get()[0].get("risk_thresholds")}
+
+
+# the training histograms of a bundle this process has loaded, live or shadow
+def _feature_reference(version: str) -> dict:
+    shadow = get_shadow_scorer()
+    for registry in (model_registry, shadow.registry if shadow is not None else None):
+        if registry is not None and registry.loaded and registry.model_version == version:
+            reference = reference_of(registry.get()[0])
+            if reference is None:
+                raise HTTPException(
+                    409, f"bundle {version} has no training feature histograms, retrain it"
+                )
+            return reference
+    raise HTTPException(404, f"model version {version} is not loaded")
+
+
+# PSI and KS distance of each base feature's live histogram against the training one,
+# over the last `days` UTC days (stored counts plus this process's unflushed ones)
+@router.get("/drift", dependencies=[Depends(require_admin_token)])
+async def feature_drift(
+    version: Optional[str] = None,
+    days: int = Query(default=DEFAULT_REPORT_DAYS, ge=1, le=366),
+    repo: SqlFeatureHistogramRepo = Depends(get_feature_histogram_repo),
+):
+    version = version or _loaded_version()
+    reference = _feature_reference(version)
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+    daily = {}
+    for day, counts, rows in await repo.load(version, since):
+        daily[day] = FeatureHistograms(reference["edges"]).add_counts(counts, rows)
+    monitor = get_drift_monitor()
+    if monitor is not None:
+        for day, histograms in monitor.pending_for(version).items():
+            if day >= since:
+                daily[day] = (daily.get(day) or FeatureHistograms(reference["edges"])).merge(
+                    histograms
+                )
+
+    report = window_report(reference, daily, psi_alert=get_settings().FRAUD_DRIFT_PSI_ALERT)
+    return {"version": version, "since": since.isoformat(), **report}
+
+
+# loads and warms the version next to the live model, then swaps it in; other app
+# processes pick it up from the ACTIVE pointer within FRAUD_MODEL_POLL_SECONDS
+@router.post("/models/{version}/promote", dependencies=[Depends(require_admin_token)])
+async def promote_model(version: str):
+    registry_dir = _registry_dir()
+    try:
+        stats = await promote(
+            version, registry_dir, registry=model_registry, executor=get_inference_executor()
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    return {"active": version, "loaded": stats}
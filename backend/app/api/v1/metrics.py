@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.config import get_settings
+from app.services.fraud_detection_service import FraudDetectionService
+from app.services_container import get_fraud_detection_service
+from fraud_detection.metrics import CONTENT_TYPE, metrics
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+# Prometheus scrape target, counters and histograms are per process; the outbox depth
+# is counted at most once per FRAUD_METRICS_JOB_COUNTS_SECONDS
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics(
+    svc: FraudDetectionService = Depends(get_fraud_detection_service),
+):
+    await svc.refresh_metrics(
+        job_counts_seconds=get_settings().FRAUD_METRICS_JOB_COUNTS_SECONDS
+    )
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -19,6 +19,55 @@ class Settings(BaseSettings):
     PLAID_ENCRYPT_KEY: str
     AUTH_SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MIN: int
+    FRAUD_MODEL_PATH: str = "fraud_detection/fraud_model.joblib"
+    FRAUD_COMPACT_MODEL: bool = True
+    # versioned bundles + ACTIVE pointer, overrides FRAUD_MODEL_PATH once a version is promoted
+    FRAUD_MODEL_REGISTRY_DIR: str = ""
+    FRAUD_MODEL_POLL_SECONDS: float = 30.0
+    # X-Admin-Token for the model promotion endpoints, empty disables them
+    FRAUD_ADMIN_TOKEN: str = ""
+    # candidate bundle scored next to the live one into fraud_shadow_scores, empty turns it off
+    FRAUD_SHADOW_MODEL_PATH: str = ""
+    FRAUD_SHADOW_MAX_PENDING: int = 16
+    # live score quantiles per model version in fraud_score_sketches
+    FRAUD_SCORE_SKETCHES: bool = True
+    FRAUD_SCORE_SKETCH_K: int = 400
+    FRAUD_SCORE_SKETCH_FLUSH_SECONDS: float = 60.0
+    # per day feature histograms in fraud_feature_histograms, PSI above the alert flags a feature
+    FRAUD_DRIFT_MONITOR: bool = True
+    FRAUD_DRIFT_FLUSH_SECONDS: float = 60.0
+    FRAUD_DRIFT_MAX_PENDING: int = 16
+    FRAUD_DRIFT_PSI_ALERT: float = 0.2
+    # Half-Space Trees learning from live traffic, checkpointed in fraud_online_detectors;
+    # FRAUD_ONLINE_SCORES stores its scores instead of the bundle's once it is calibrated
+    FRAUD_ONLINE_DETECTOR: bool = False
+    FRAUD_ONLINE_SCORES: bool = False
+    FRAUD_ONLINE_TREES: int = 25
+    FRAUD_ONLINE_DEPTH: int = 10
+    FRAUD_ONLINE_WINDOW: int = 1000
+    FRAUD_ONLINE_CHECKPOINT_SECONDS: float = 30.0
+    FRAUD_MAX_BATCH_SIZE: int = 1000
+    FRAUD_INFERENCE_MODE: str = "thread"  # inline | thread | process
+    FRAUD_INFERENCE_WORKERS: int = 2
+    FRAUD_INFERENCE_MAX_PENDING: int = 8
+    FRAUD_BATCH_MAX_ROWS: int = 1000  # 0 turns micro-batching off
+    FRAUD_BATCH_MAX_WAIT_MS: float = 2.0
+    FRAUD_SCORE_MAX_ITEMS: int = 1000
+    FRAUD_SCORING_WORKERS: int = 1
+    FRAUD_WORKER_POLL_SECONDS: float = 5.0
+    FRAUD_JOB_MAX_ATTEMPTS: int = 5
+    FRAUD_JOB_LEASE_SECONDS: float = 300.0
+    FRAUD_JOB_RETRY_SECONDS: float = 10.0
+    FRAUD_METRICS_JOB_COUNTS_SECONDS: float = 15.0
+    FRAUD_LIVE_MERCHANT_STATS: bool = True
+    FRAUD_MERCHANT_STATS_REFRESH_SECONDS: float = 300.0
+    FRAUD_MERCHANT_STATS_MIN_COUNT: int = 5
+    FRAUD_SKIP_UNCHANGED: bool = True
+    # on by default so synced transactions come back scored; a page that takes longer than
+    # the timeout (cold model, saturated executor) goes to the outbox instead of holding the sync
+    FRAUD_INLINE_SCORING: bool = True
+    FRAUD_INLINE_SCORING_TIMEOUT_SECONDS: float = 2.0
+    SYNC_PIPELINE_DEPTH: int = 2
     # need to add each env variable expected if want to include and have access to it
 
     model_config = SettingsConfigDict(
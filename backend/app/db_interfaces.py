@@ -65,6 +65,12 @@ class ConnectionItemRepo(Protocol):
 
 class TransactionRepo(Protocol):
     async def upsert_from_plaid(self, item: ConnectionItemEntity, plaid_tx: dict) -> int: ...
+    async def upsert_many_from_plaid(
+        self,
+        item: ConnectionItemEntity,
+        plaid_txns: Sequence[dict],
+    ) -> list[tuple[int, int | None, list | None]]: ...
+    async def load_user_profiles(self, user_ids: Iterable[int]) -> dict: ...
     async def mark_removed(self, plaid_ids: list[str]) -> None: ...
     async def list_by_user_paginated(
             self, 
@@ -97,10 +103,20 @@ class TransactionRepo(Protocol):
             user_id: int, 
             transaction_id: int
         ) -> TransactionEntity | None: ...
+    async def fetch_rescore_chunk(
+        self,
+        after_id: int,
+        limit: int,
+        *,
+        max_id: int | None = None,
+    ) -> list[tuple]: ...
+    async def rescore_id_bounds(self) -> tuple[int, int] | None: ...
+    async def fetch_training_chunk(self, after_id: int, limit: int) -> list[tuple]: ...
+    # (id, score, is_suspected, risk_level[, fraud_fingerprint[, fraud_model_version]])
     async def set_fraud_results(
         self,
-        updates: Sequence[tuple[int, float, bool, str | None]],
-    ) -> bool: ...
+        updates: Sequence[tuple],
+    ) -> int: ...
     async def set_fraud_review(
         self,
         *,
@@ -118,4 +134,24 @@ class BudgetCategoryRepo(Protocol):
     async def update(self, user_id: int, category_id: int, patch: dict) -> BudgetCategoryEntity: ...
     async def delete(self, user_id: int, category_id: int) -> None: ...
     async def get_owned(self, user_id: int, category_id: int) -> BudgetCategoryEntity | None: ...
-    
\ No newline at end of file
+    
+
+class FraudScoringJobRepo(Protocol):
+    async def enqueue(self, transaction_ids: Iterable[int]) -> int: ...
+    async def claim_batch(
+            self,
+            limit: int,
+            *,
+            lease_seconds: float,
+            max_attempts: int,
+        ) -> list[tuple[int, int, int]]: ...
+    async def mark_done(self, jobs: Sequence[tuple[int, int, int]]) -> int: ...
+    async def mark_failed(
+            self,
+            jobs: Sequence[tuple[int, int, int]],
+            error: str,
+            *,
+            max_attempts: int,
+            retry_base_seconds: float,
+        ) -> int: ...
+    async def count_by_status(self) -> dict[str, int]: ...
@@ -106,6 +106,7 @@ class TransactionEntity(BaseModel):
     fraud_score: float | None = None
     is_fraud_suspected: bool = False
     risk_level: str | None = None
+    fraud_model_version: str | None = None
     fraud_review_status: Literal["pending", "fraud", "not_fraud", "ignored"] | None = None
 
     removed: bool = False
@@ -115,6 +116,12 @@ class TransactionEntity(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class FraudScoreEntity(BaseModel):
+    fraud_score: float
+    is_fraud_suspected: bool
+    risk_level: str
+
+
 class TransactionsPageEntity(BaseModel):
     items: list[TransactionEntity]
     next_cursor: str | None = None
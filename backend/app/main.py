@@ -7,10 +7,12 @@ from app.api.v1.accounts import router as accounts_router
 from app.api.v1.auth import router as auth_router
 from app.api.v1.budget import router as budget_router
 from app.api.v1.dashboard import router as dashboard_router
+from app.api.v1.fraud import router as fraud_router
+from app.api.v1.metrics import router as metrics_router
 from app.api.v1.plaid import router as plaid_router
 from app.api.v1.transactions import router as transaction_router
 from app.api.v1.users import router as users_router
-from infrastructure.db.session import lifespan
+from app.startup import lifespan
 
 app = FastAPI(lifespan=lifespan)
 
@@ -22,6 +24,8 @@ app.include_router(transaction_router)
 app.include_router(plaid_router)
 app.include_router(budget_router)
 app.include_router(dashboard_router)
+app.include_router(metrics_router)
+app.include_router(fraud_router)
 
 
 # @app.get("/debug/env")
@@ -0,0 +1,18 @@
+import hmac
+
+from fastapi import Depends, Header, HTTPException, status
+
+from app.config import Settings, get_settings
+
+
+# operator endpoints (model promotion) take a shared X-Admin-Token instead of a user
+# login, users have no admin role; an empty FRAUD_ADMIN_TOKEN turns them off
+async def require_admin_token(
+    x_admin_token: str | None = Header(None),
+    settings: Settings = Depends(get_settings),
+):
+    expected = settings.FRAUD_ADMIN_TOKEN
+    if not expected:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "invalid admin token")
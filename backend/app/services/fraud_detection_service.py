@@ -1,10 +1,51 @@
 import asyncio
+import logging
+import time
 from datetime import date as DateType
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from fraud_detection.prediction import load_pipeline, predict_single
+from app.db_interfaces import FraudScoringJobRepo
+from fraud_detection import metrics
+from fraud_detection.drift import DriftMonitor
+from fraud_detection.fast_scorer import MAX_ROW_LOOP
+from fraud_detection.features import (
+    NUMBER_FEATURES,
+    PROFILE_COLUMNS,
+    build_feature_matrix,
+    uses_profiles,
+)
+from fraud_detection.fingerprint import feature_fingerprint
+from fraud_detection.inference_executor import InferenceExecutor, get_inference_executor
+from fraud_detection.merchant_stats import MerchantStatsCache
+from fraud_detection.model_registry import ModelRegistry, model_registry
+from fraud_detection.online_detector import OnlineDetector
+from fraud_detection.quantile_sketch import ScoreSketches
+from fraud_detection.shadow import ShadowScorer
+from fraud_detection.user_profile import annotate as annotate_profiles
+from fraud_detection.user_profile import has_snapshot as has_profile_snapshot
+from infrastructure.db.repos.feature_histogram_repo import SqlFeatureHistogramRepo
+from infrastructure.db.repos.fraud_scoring_job_repo import SqlFraudScoringJobRepo
+from infrastructure.db.repos.merchant_stats_repo import SqlMerchantStatsRepo
+from infrastructure.db.repos.online_detector_repo import SqlOnlineDetectorRepo
+from infrastructure.db.repos.score_sketch_repo import SqlScoreSketchRepo
+from infrastructure.db.repos.shadow_score_repo import SqlShadowScoreRepo
 from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
+from infrastructure.db.repos.user_spend_profile_repo import SqlUserSpendProfileRepo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 1000
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_RETRY_BASE_SECONDS = 10.0
+# outbox depth on /metrics is a count query, scrapes closer together than this reuse it
+DEFAULT_JOB_COUNTS_SECONDS = 15.0
+# longest a sync page may spend scoring inline before it is handed to the outbox
+DEFAULT_INLINE_TIMEOUT_SECONDS = 2.0
+
+# monotonic time of the last outbox count, shared by the per request service instances
+_job_counts_at: float | None = None
 
 
 class FraudDetectionService:
@@ -13,62 +54,517 @@ class FraudDetectionService:
             session_factory: async_sessionmaker[AsyncSession], 
             model_path: str, 
             *, 
-            enabled: bool = True
+            enabled: bool = True,
+            max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+            registry: ModelRegistry | None = None,
+            executor: InferenceExecutor | None = None,
+            job_repo: FraudScoringJobRepo | None = None,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            lease_seconds: float = DEFAULT_LEASE_SECONDS,
+            retry_base_seconds: float = DEFAULT_RETRY_BASE_SECONDS,
+            merchant_stats: MerchantStatsCache | None = None,
+            transaction_repo_factory=None,
+            skip_unchanged: bool = True,
+            score_inline: bool = False,
+            inline_timeout_seconds: float = DEFAULT_INLINE_TIMEOUT_SECONDS,
+            user_profiles=None,
+            shadow: ShadowScorer | None = None,
+            score_sketches: ScoreSketches | None = None,
+            drift: DriftMonitor | None = None,
+            online: OnlineDetector | None = None,
         ):
         
         self.session_factory = session_factory
         self.model_path = model_path
         self.enabled = enabled
+        self.max_batch_size = max(1, int(max_batch_size))
+        # shared per process, the bundle is only unpickled once for all instances
+        self.registry = registry or model_registry
+        # inline, thread or process pool, set up once in the app lifespan
+        self.executor = executor or get_inference_executor()
+        # request scoped job repo, jobs are written in the caller's transaction
+        self.job_repo = job_repo
+        self.max_attempts = max(1, int(max_attempts))
+        self.lease_seconds = float(lease_seconds)
+        self.retry_base_seconds = float(retry_base_seconds)
+        # live per merchant amount stats for the z-score features, None uses the bundle's
+        self.merchant_stats = merchant_stats
+        # session -> transaction repo, None means SqlTransactionRepo (benchmarks use in memory)
+        self.transaction_repo_factory = transaction_repo_factory
+        # rows whose model inputs and model version match the stored fingerprint aren't rescored
+        self.skip_unchanged = skip_unchanged
+        # Plaid syncs score each page as it lands instead of going through the job outbox
+        self.score_inline = score_inline
+        self.inline_timeout_seconds = float(inline_timeout_seconds)
+        # async user_ids -> {user_id: UserSpendProfile}, only read for behavioral bundles
+        self.user_profiles = user_profiles or user_profile_loader(session_factory)
+        # candidate bundle that gets every scored batch after the live scores are in
+        self.shadow = shadow
+        # per version quantile sketches of every stored score, see quantile_sketch.py
+        self.score_sketches = score_sketches
+        # per day feature histograms compared against the bundle's training ones, see drift.py
+        self.drift = drift
+        # Half-Space Trees learning from every stored batch, its scores replace the
+        # forest's stored ones only when it opts in (replace_scores), see online_detector.py
+        self.online = online
 
-        self._loaded = False
+        self._generation = None
         self._feature_state = None
         self._models = None
+        self._model_version = None
         
 
+    def _transaction_repo(self, db):
+        return (self.transaction_repo_factory or SqlTransactionRepo)(db)
+
+
+    # model_path is only read when nothing is loaded yet; after that the service follows
+    # the registry, so a promoted bundle is picked up by the next batch (see model_versions.py)
     def _load_pipeline_model(self):
-        if not self._loaded:
-            self._feature_state, self._models = load_pipeline(self.model_path)
-            self._loaded = True
+        if not self.registry.loaded:
+            self.registry.ensure_loaded(self.model_path)
+        if self._generation != self.registry.generation:
+            self._feature_state, self._models, self._model_version, self._generation = (
+                self.registry.active()
+            )
+            metrics.MODEL_INFO.clear()
+            metrics.MODEL_INFO.labels(self._model_version or "unknown").set(1)
 
 
-    def enqueue_ids(self, ids) -> None:
+    # writes a scoring job per id to the fraud_scoring_jobs outbox, the workers pick
+    # them up once the caller commits (call notify_workers after the commit)
+    async def enqueue_ids(self, ids) -> int:
         if not self.enabled:
-            return
-        ids = list({int(i) for i in ids or []})
+            return 0
+        ids = sorted({int(i) for i in ids or []})
         if not ids:
-            return
-        asyncio.create_task(self._run_prediction(ids))
+            return 0
 
+        if self.job_repo is not None:
+            return await self.job_repo.enqueue(ids)
 
+        # no request session to join, the jobs get their own transaction
+        async with self.session_factory() as db:
+            enqueued = await SqlFraudScoringJobRepo(db).enqueue(ids)
+            await db.commit()
+        self.notify_workers()
+        return enqueued
 
-    async def _run_prediction(self, ids: list[int]) -> None:
-        self._load_pipeline_model()
+
+    # point in time gauges for /metrics: outbox depth by status, executor load, model version
+    async def refresh_metrics(
+            self,
+            *,
+            job_counts_seconds: float = DEFAULT_JOB_COUNTS_SECONDS,
+        ) -> None:
+
+        global _job_counts_at
+        now = time.monotonic()
+        if self.job_repo is not None and (
+            _job_counts_at is None or now - _job_counts_at >= job_counts_seconds
+        ):
+            # claimed before the query so concurrent scrapes don't all run it
+            _job_counts_at = now
+            for status, count in (await self.job_repo.count_by_status()).items():
+                metrics.JOBS.labels(status).set(count)
+        metrics.IN_FLIGHT.set(self.executor.in_flight)
+        if self.registry.loaded:
+            metrics.MODEL_INFO.clear()
+            metrics.MODEL_INFO.labels(self.registry.model_version or "unknown").set(1)
+
+
+    def notify_workers(self) -> None:
+        workers = get_scoring_workers()
+        if workers is not None:
+            workers.wake()
+
+
+    # claims one batch of due jobs, scores it and marks it done in the same commit as
+    # the results, a failure puts the batch back with backoff (or dead after max_attempts)
+    async def process_next_batch(self) -> int:
         async with self.session_factory() as db:
-            repo = SqlTransactionRepo(db)
-            rows = await repo.fetch_transactions_for_ML_Model(ids)
-
-            updates = []
-            for txn_id, amount, payment_channel, pending, txn_date, merchant in rows:
-                date_str = (
-                    txn_date.isoformat()
-                    if isinstance(txn_date, DateType)
-                    else (str(txn_date) if txn_date else None)
+            jobs = await SqlFraudScoringJobRepo(db).claim_batch(
+                self.max_batch_size,
+                lease_seconds=self.lease_seconds,
+                max_attempts=self.max_attempts,
+            )
+            await db.commit()
+        if not jobs:
+            return 0
+
+        try:
+            self._load_pipeline_model()
+            async with self.session_factory() as db:
+                await self._score_chunk(
+                    self._transaction_repo(db), [txn_id for _, txn_id, _ in jobs]
+                )
+                await SqlFraudScoringJobRepo(db).mark_done(jobs)
+                await db.commit()
+        except Exception as e:
+            metrics.FAILED.inc(len(jobs))
+            logger.exception("fraud scoring failed for %d jobs", len(jobs))
+            async with self.session_factory() as db:
+                await SqlFraudScoringJobRepo(db).mark_failed(
+                    jobs,
+                    f"{type(e).__name__}: {e}",
+                    max_attempts=self.max_attempts,
+                    retry_base_seconds=self.retry_base_seconds,
                 )
-                
-                features = {
-                    "amount": float(amount or 0.0),
-                    "payment_channel": payment_channel,
-                    "pending": bool(pending),
-                    "date": date_str,
-                    "merchant_name": merchant,
-                }
-
-                prediction_score, is_suspected, risk_tier = predict_single(
-                    features, 
-                    self._feature_state, 
-                    self._models
+                await db.commit()
+
+        return len(jobs)
+
+
+
+    # scores rows the caller already has in memory (see payload_to_row); returns the
+    # updates for set_fraud_results
+    async def score_rows(self, rows) -> list[tuple[int, float, bool, str, int, str | None]]:
+        self._load_pipeline_model()
+        return await self._score_rows(rows)
+
+
+    # scores transaction shaped dicts that aren't stored (POST /fraud/score), nothing is
+    # written; a few rows go through the registry's precomputed lookup tables on the
+    # loop, bigger lists through the executor like any other batch
+    async def score_payloads(self, payloads: list[dict]) -> list[tuple[float, bool, str]]:
+        self._load_pipeline_model()
+        snapshot = await self.merchant_stats.current() if self.merchant_stats is not None else None
+        online = self._online_detector(self._feature_state)
+        if online is not None and not (online.replace_scores and online.ready):
+            online = None
+        if len(payloads) <= MAX_ROW_LOOP and online is None:
+            return self.registry.scorer().score(payloads, snapshot)
+
+        batch = [dict(payload) for payload in payloads]
+        if snapshot is not None:
+            snapshot.annotate(batch)
+        if online is not None:
+            # scored like stored transactions, but nothing is learned from them
+            results = await online.score(batch, self._feature_state, learn=False)
+            if results is not None:
+                return results
+        return await self.executor.score(batch, self._feature_state, self._models)
+
+
+    # the online detector when it was built for this bundle's features
+    def _online_detector(self, feature_state) -> OnlineDetector | None:
+        if self.online is None or not self.online.accepts(feature_state):
+            return None
+        return self.online
+
+
+    async def _run_prediction(self, ids: list[int]) -> None:
+        try:
+            self._load_pipeline_model()
+            async with self.session_factory() as db:
+                repo = self._transaction_repo(db)
+
+                # each chunk is fetched, scored in one vectorized call and written back
+                for start in range(0, len(ids), self.max_batch_size):
+                    await self._score_chunk(repo, ids[start:start + self.max_batch_size])
+
+                await db.commit()
+        except Exception:
+            # nothing was committed, every id counts as failed
+            metrics.FAILED.inc(len(ids))
+            logger.exception("fraud scoring failed for %d transactions", len(ids))
+            raise
+
+
+    async def _score_chunk(self, repo, ids) -> None:
+        started = time.perf_counter()
+        rows = await repo.fetch_transactions_for_ML_Model(ids)
+        metrics.FETCH_SECONDS.observe(time.perf_counter() - started)
+
+        updates = await self._score_rows(rows)
+
+        started = time.perf_counter()
+        await repo.set_fraud_results(updates)
+        metrics.WRITE_SECONDS.observe(time.perf_counter() - started)
+
+
+    async def _score_rows(self, rows) -> list[tuple[int, float, bool, str, int, str | None]]:
+        started = time.perf_counter()
+        # another batch on this service may pick up a promoted bundle while this one awaits
+        feature_state, models = self._feature_state, self._models
+        model_version = self._model_version
+        online = self._online_detector(feature_state)
+        total = len(rows or [])
+        rows, fingerprints = fingerprint_rows(
+            rows,
+            model_version,
+            skip_unchanged=self.skip_unchanged,
+            profiles=uses_profiles(feature_state),
+        )
+        metrics.SKIPPED.inc(total - len(rows))
+        if not rows:
+            return []
+
+        txn_ids, batch = rows_to_batch(rows)
+        if self.merchant_stats is not None:
+            (await self.merchant_stats.current()).annotate(batch)
+        shadow_profiles = self.shadow is not None and self.shadow.uses_profiles()
+        if uses_profiles(feature_state) or shadow_profiles:
+            # rows carry their insert time snapshot, only older rows read the current profile
+            user_ids = {
+                txn["user_id"] for txn in batch
+                if txn["user_id"] is not None and not has_profile_snapshot(txn)
+            }
+            if user_ids:
+                annotate_profiles(batch, await self.user_profiles(user_ids))
+        metrics.FEATURES_SECONDS.observe(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # the bundle always scores, sketches, drift and shadow follow its scores
+        drift = self.drift if self.drift is not None and self.drift.accepts(feature_state) else None
+        online_results = data = None
+        if online is None and drift is None:
+            results = await self.executor.score(batch, feature_state, models)
+        else:
+            # the online detector and the drift histograms share one feature matrix,
+            # built off the loop next to the forest
+            async def _side():
+                matrix = await asyncio.to_thread(build_feature_matrix, batch, feature_state)
+                if online is None:
+                    return matrix, None
+                # the detector learns from every batch; its scores are only stored when
+                # FRAUD_ONLINE_SCORES opts in, decided before the batch came in
+                use_online = online.replace_scores and online.ready
+                return matrix, await online.score(
+                    batch, feature_state, use=use_online, data=matrix
                 )
-                updates.append((txn_id, prediction_score, is_suspected, risk_tier))
 
-            await repo.set_fraud_results(updates)
-            await db.commit()
\ No newline at end of file
+            results, (data, online_results) = await asyncio.gather(
+                self.executor.score(batch, feature_state, models), _side(),
+            )
+        metrics.INFERENCE_SECONDS.observe(time.perf_counter() - started)
+        metrics.SCORED.inc(len(results))
+        if self.score_sketches is not None:
+            self.score_sketches.add(model_version, [score for score, _, _ in results])
+        if drift is not None:
+            # only queued, the base feature columns are binned in the background
+            drift.submit(model_version, data[:, :NUMBER_FEATURES], feature_state)
+        if self.shadow is not None:
+            # only queued, the candidate is scored and written in the background
+            self.shadow.submit(txn_ids, batch, results)
+
+        stored = results
+        if online_results is not None:
+            stored = online_results
+            metrics.ONLINE_SCORED.inc(len(stored))
+        return [
+            (txn_id, prediction_score, is_suspected, risk_tier, fingerprint, model_version)
+            for txn_id, fingerprint, (prediction_score, is_suspected, risk_tier)
+            in zip(txn_ids, fingerprints, stored)
+        ]
+
+
+# loader for MerchantStatsCache, reads the merchant_amount_stats table in its own session
+def merchant_stats_loader(session_factory: async_sessionmaker[AsyncSession], min_count: int = 1):
+    async def _load():
+        async with session_factory() as db:
+            return await SqlMerchantStatsRepo(db).load_all(min_count)
+    return _load
+
+
+# loader for FraudDetectionService.user_profiles, one query for a batch's users in its own session
+def user_profile_loader(session_factory: async_sessionmaker[AsyncSession]):
+    async def _load(user_ids):
+        async with session_factory() as db:
+            return await SqlUserSpendProfileRepo(db).load_many(user_ids)
+    return _load
+
+
+# writer for ShadowScorer, each shadow batch is saved in its own session
+def shadow_score_writer(session_factory: async_sessionmaker[AsyncSession]):
+    async def _write(model_version, rows):
+        async with session_factory() as db:
+            await SqlShadowScoreRepo(db).save(model_version, rows)
+            await db.commit()
+    return _write
+
+
+# flusher for ScoreSketches, each version's sketch is merged in its own session
+def score_sketch_flusher(session_factory: async_sessionmaker[AsyncSession]):
+    async def _flush(model_version, sketch):
+        async with session_factory() as db:
+            thresholds = await SqlScoreSketchRepo(db).merge(model_version, sketch)
+            await db.commit()
+            return thresholds
+    return _flush
+
+
+# loader and merger for OnlineDetector checkpoints, each in its own session
+def online_detector_loader(session_factory: async_sessionmaker[AsyncSession]):
+    async def _load(name):
+        async with session_factory() as db:
+            return await SqlOnlineDetectorRepo(db).load(name)
+    return _load
+
+
+def online_detector_merger(session_factory: async_sessionmaker[AsyncSession]):
+    async def _merge(name, delta):
+        async with session_factory() as db:
+            state = await SqlOnlineDetectorRepo(db).merge(name, delta)
+            await db.commit()
+            return state
+    return _merge
+
+
+# flusher for DriftMonitor, each day's counts are added in their own session
+def feature_histogram_flusher(session_factory: async_sessionmaker[AsyncSession]):
+    async def _flush(day, model_version, histograms):
+        async with session_factory() as db:
+            await SqlFeatureHistogramRepo(db).merge(day, model_version, histograms)
+            await db.commit()
+    return _flush
+
+
+# (id, amount, payment_channel, pending, date, merchant_name[, fraud_fingerprint[, user_id
+# [, profile_features]]]) repo rows into the ids and the feature dicts predict_batch expects
+def rows_to_batch(rows) -> tuple[list[int], list[dict]]:
+    txn_ids = []
+    batch = []
+    for txn_id, amount, payment_channel, pending, txn_date, merchant, *rest in rows:
+        date_str = (
+            txn_date.isoformat()
+            if isinstance(txn_date, DateType)
+            else (str(txn_date) if txn_date else None)
+        )
+
+        txn_ids.append(txn_id)
+        batch.append({
+            "amount": float(amount or 0.0),
+            "payment_channel": payment_channel,
+            "pending": bool(pending),
+            "date": date_str,
+            "merchant_name": merchant,
+            "user_id": rest[1] if len(rest) > 1 else None,
+        })
+        if len(rest) > 2 and rest[2] is not None:
+            # the profile as of the transaction's insert, see user_profile.py
+            batch[-1].update(zip(PROFILE_COLUMNS, (float(v) for v in rest[2])))
+    return txn_ids, batch
+
+
+# a Plaid transaction payload as a repo row, so a freshly upserted sync page can be
+# scored without reading it back through fetch_transactions_for_ML_Model
+def payload_to_row(
+        txn_id: int,
+        plaid_txn: dict,
+        stored_fingerprint: int | None = None,
+        user_id: int | None = None,
+        profile_features: list[float] | None = None,
+    ) -> tuple:
+    return (
+        txn_id,
+        plaid_txn.get("amount"),
+        plaid_txn.get("payment_channel"),
+        bool(plaid_txn.get("pending", False)),
+        plaid_txn.get("date"),
+        plaid_txn.get("merchant_name"),
+        stored_fingerprint,
+        user_id,
+        profile_features,
+    )
+
+
+# fingerprint per row, rows whose stored fingerprint (optional 7th column) already
+# matches are dropped when skip_unchanged; returns the rows left and their fingerprints.
+# the profile snapshot (optional 9th column) is hashed with the row, with profiles on
+# a row without one reads the current profile, which can change, so it is never skipped
+def fingerprint_rows(
+        rows,
+        model_version,
+        *,
+        skip_unchanged: bool = True,
+        profiles: bool = False,
+) -> tuple[list, list[int]]:
+
+    kept, fingerprints = [], []
+    for row in rows or []:
+        snapshot = row[8] if len(row) > 8 else None
+        fingerprint = feature_fingerprint(*row[1:6], model_version, snapshot)
+        unchanged = len(row) > 6 and row[6] == fingerprint
+        if skip_unchanged and unchanged and (snapshot is not None or not profiles):
+            continue
+        kept.append(row)
+        fingerprints.append(fingerprint)
+
+    skipped = len(rows or []) - len(kept)
+    if skipped:
+        logger.debug("skipped %d unchanged transactions", skipped)
+    return kept, fingerprints
+
+
+
+# long running workers draining fraud_scoring_jobs, started in the app lifespan
+# each worker claims with SKIP LOCKED so several workers / app instances can share the table
+class FraudScoringWorkers:
+    def __init__(
+            self,
+            service: FraudDetectionService,
+            *,
+            workers: int = 1,
+            poll_interval: float = 5.0,
+        ):
+        self.service = service
+        self.workers = max(1, int(workers))
+        self.poll_interval = float(poll_interval)
+        self._tasks: list[asyncio.Task] = []
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"fraud-scoring-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    # lets in flight batches finish, anything not yet claimed stays in the table
+    async def shutdown(self) -> None:
+        self._stopping = True
+        self.wake()
+        tasks, self._tasks = self._tasks, []
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                claimed = await self.service.process_next_batch()
+            except Exception:
+                logger.exception("fraud scoring worker failed to claim jobs")
+                claimed = 0
+
+            # keep draining while there is work, otherwise sleep until woken or the poll interval
+            if claimed == 0 and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+
+# process wide workers, the app lifespan sets them up
+_active_workers: FraudScoringWorkers | None = None
+
+
+def get_scoring_workers() -> FraudScoringWorkers | None:
+    return _active_workers
+
+
+def set_scoring_workers(workers: FraudScoringWorkers | None) -> None:
+    global _active_workers
+    _active_workers = workers
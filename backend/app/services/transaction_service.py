@@ -1,12 +1,22 @@
+import logging
+import time
 from datetime import date
 
+import anyio
 from fastapi import HTTPException
 
 from app.db_interfaces import AccountRepo, BudgetCategoryRepo, ConnectionItemRepo, TransactionRepo
 from app.domain.entities import TransactionsPageEntity
 from app.security.crypto import decrypt
-from app.services.fraud_detection_service import FraudDetectionService
+from app.services.fraud_detection_service import FraudDetectionService, payload_to_row
 from app.services.plaid_service import PlaidService
+from app.utils.pipeline import run_pipeline
+from fraud_detection import metrics
+
+logger = logging.getLogger(__name__)
+
+# Plaid pages buffered between each pipeline stage of a sync
+DEFAULT_PIPELINE_DEPTH = 2
 
 
 class TransactionService:
@@ -14,7 +24,8 @@ class TransactionService:
                  account_repo: AccountRepo, connection_item_repo: ConnectionItemRepo, 
                  plaid: PlaidService,
                  budget_category_repo: BudgetCategoryRepo,
-                 fraud_detection_svc: FraudDetectionService
+                 fraud_detection_svc: FraudDetectionService,
+                 pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
                 ):
         self.transaction_repo = transaction_repo
         self.account_repo = account_repo
@@ -22,6 +33,7 @@ class TransactionService:
         self.plaid = plaid
         self.budget_category_repo = budget_category_repo
         self.fraud_detection_svc = fraud_detection_svc
+        self.pipeline_depth = max(1, int(pipeline_depth))
 
 
     async def sync_connection_item(self, item_id: int, user_id: int) -> dict:
@@ -31,48 +43,102 @@ class TransactionService:
 
         access_token = decrypt(item.access_token_encrypted)
         cursor = item.transactions_cursor
-
-        added = modified = removed = 0
-        to_check_fraud_ids = []
+        counts = {"added": 0, "modified": 0, "removed": 0}
 
         today = date.today()
         month_start = date(today.year, today.month, 1)
         bumped = 0
 
-        while True:
-            changed = await self.plaid.transactions_sync(access_token, cursor)
-            for txn in changed["added"] + changed["modified"]:
-                # ensure 2 transactions with current month
-                if bumped < 2 and txn.get("date"):
+        fraud = self.fraud_detection_svc
+        score_inline = fraud.enabled and fraud.score_inline
+        # the repos share the request session, which can't run two statements at once
+        db_lock = anyio.Lock()
+
+        # fetch page -> bulk upsert -> score from the in memory payload -> write,
+        # the next Plaid page is fetched while the previous one is being scored
+        async def fetch_pages():
+            nonlocal cursor
+            while True:
+                changed = await self.plaid.transactions_sync(access_token, cursor)
+                cursor = changed["next_cursor"]
+                yield changed
+                if not changed["has_more"]:
+                    return
+
+        async def upsert_pages(pages):
+            nonlocal bumped
+            async for changed in pages:
+                txns = changed["added"] + changed["modified"]
+                for txn in txns:
+                    # ensure 2 transactions with current month
+                    if bumped < 2 and txn.get("date"):
+                        try:
+                            txn_date = txn["date"]
+                            if txn_date < month_start:
+                                txn["date"] = today.isoformat()
+                                bumped += 1
+                        except (TypeError, ValueError):
+                            pass
+
+                async with db_lock:
+                    stored = await self.transaction_repo.upsert_many_from_plaid(item, txns)
+                    if changed["removed"]:
+                        await self.transaction_repo.mark_removed([r["transaction_id"]
+                                                                  for r in changed["removed"]])
+
+                counts["added"] += len(changed["added"])
+                counts["modified"] += len(changed["modified"])
+                counts["removed"] += len(changed["removed"])
+
+                yield [
+                    payload_to_row(txn_id, txn, fingerprint, item.user_id, profile_features)
+                    for (txn_id, fingerprint, profile_features), txn in zip(stored, txns)
+                    if txn_id
+                ]
+
+        async def score_pages(row_pages):
+            async for rows in row_pages:
+                updates = None
+                if score_inline and rows:
                     try:
-                        txn_date = txn["date"]
-                        if txn_date < month_start:
-                            txn["date"] = today.isoformat()
-                            bumped += 1
-                    except ValueError:
-                        pass
-
-                txn_id = await self.transaction_repo.upsert_from_plaid(item, txn)
-
-                if txn_id:
-                    to_check_fraud_ids.append(txn_id)
-
-            if changed["removed"]:
-                await self.transaction_repo.mark_removed([r["transaction_id"] 
-                                                          for r in changed["removed"]])
-
-            added += len(changed["added"]) 
-            modified += len(changed["modified"]) 
-            removed += len(changed["removed"])
-
-            cursor = changed["next_cursor"]
-            if not changed["has_more"]:
-                break
+                        # a slow page is given up on, its rows go to the outbox instead
+                        with anyio.move_on_after(fraud.inline_timeout_seconds) as scope:
+                            # a transaction listed twice in a page is scored once
+                            updates = await fraud.score_rows(
+                                list({r[0]: r for r in rows}.values())
+                            )
+                        if scope.cancelled_caught:
+                            logger.warning(
+                                "inline fraud scoring took over %.1fs for %d rows, enqueued",
+                                fraud.inline_timeout_seconds, len(rows),
+                            )
+                    except Exception:
+                        # falls back to the job outbox, the sync itself doesn't fail
+                        logger.exception("inline fraud scoring failed for %d rows", len(rows))
+                yield rows, updates
+
+        async def write_results(scored_pages):
+            async for rows, updates in scored_pages:
+                async with db_lock:
+                    if updates is None:
+                        # scoring jobs go into the same db transaction as the upserts
+                        await fraud.enqueue_ids([r[0] for r in rows])
+                    elif updates:
+                        started = time.perf_counter()
+                        await self.transaction_repo.set_fraud_results(updates)
+                        metrics.WRITE_SECONDS.observe(time.perf_counter() - started)
+
+        await run_pipeline(
+            fetch_pages(), upsert_pages, score_pages,
+            sink=write_results,
+            maxsize=self.pipeline_depth,
+        )
 
         await self.connection_item_repo.update_transactions_cursor(item_id=item.id, cursor=cursor)
-        self.fraud_detection_svc.enqueue_ids(to_check_fraud_ids)
+        # committed now, wake the scoring workers instead of waiting for their next poll
+        fraud.notify_workers()
 
-        return {"ok": True, "added": added, "modified": modified, "removed": removed}
+        return {"ok": True, **counts}
 
 
 
@@ -11,9 +11,17 @@ from app.services.fraud_detection_service import FraudDetectionService
 from app.services.plaid_service import PlaidService
 from app.services.transaction_service import TransactionService
 from app.services.user_service import UserService
+from fraud_detection.drift import get_drift_monitor
+from fraud_detection.merchant_stats import get_merchant_stats_cache
+from fraud_detection.online_detector import get_online_detector
+from fraud_detection.quantile_sketch import get_score_sketches
+from fraud_detection.shadow import get_shadow_scorer
 from infrastructure.db.repos.account_repo import SqlAccountRepo
 from infrastructure.db.repos.budget_category_repo import SqlBudgetCategoryRepo
 from infrastructure.db.repos.connectionItem_repo import SqlConnectionItemRepo
+from infrastructure.db.repos.feature_histogram_repo import SqlFeatureHistogramRepo
+from infrastructure.db.repos.fraud_scoring_job_repo import SqlFraudScoringJobRepo
+from infrastructure.db.repos.score_sketch_repo import SqlScoreSketchRepo
 from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
 from infrastructure.db.repos.user_repo import SqlUserRepo
 from infrastructure.db.session import SessionLocal, get_db
@@ -70,11 +78,35 @@ async def get_fraud_detection_service(
         # uses background service to run in tandem so need SessionLocal
         session_factory=SessionLocal,
         # transaction_repo=transaction_repo,
-        model_path="fraud_detection/fraud_model.joblib",
+        model_path=settings.FRAUD_MODEL_PATH,
         enabled=True,
-        
+        max_batch_size=settings.FRAUD_MAX_BATCH_SIZE,
+        # jobs are enqueued on the request session so they commit with the synced transactions
+        job_repo=SqlFraudScoringJobRepo(db),
+        max_attempts=settings.FRAUD_JOB_MAX_ATTEMPTS,
+        lease_seconds=settings.FRAUD_JOB_LEASE_SECONDS,
+        retry_base_seconds=settings.FRAUD_JOB_RETRY_SECONDS,
+        skip_unchanged=settings.FRAUD_SKIP_UNCHANGED,
+        # sync pages are scored in the request, with the same live merchant stats as the workers
+        score_inline=settings.FRAUD_INLINE_SCORING,
+        inline_timeout_seconds=settings.FRAUD_INLINE_SCORING_TIMEOUT_SECONDS,
+        merchant_stats=get_merchant_stats_cache(),
+        shadow=get_shadow_scorer(),
+        score_sketches=get_score_sketches(),
+        drift=get_drift_monitor(),
+        online=get_online_detector(),
     ) 
 
+# live score quantiles for the fraud model admin endpoints
+async def get_score_sketch_repo(db: AsyncSession = Depends(get_db)) -> SqlScoreSketchRepo:
+    return SqlScoreSketchRepo(db)
+
+# per day feature histograms for the drift report
+async def get_feature_histogram_repo(
+        db: AsyncSession = Depends(get_db)
+    ) -> SqlFeatureHistogramRepo:
+    return SqlFeatureHistogramRepo(db)
+
 async def get_transaction_service(
         db: AsyncSession = Depends(get_db), 
         plaid: PlaidService = Depends(get_plaid_service),
@@ -92,7 +124,8 @@ async def get_transaction_service(
         transaction_repo=transaction_repo,
         plaid=plaid,
         budget_category_repo=budget_category_repo,
-        fraud_detection_svc=fraud_detection_svc
+        fraud_detection_svc=fraud_detection_svc,
+        pipeline_depth=settings.SYNC_PIPELINE_DEPTH,
     )
 
 
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from app.config import get_settings
+from app.services.fraud_detection_service import (
+    FraudDetectionService,
+    FraudScoringWorkers,
+    feature_histogram_flusher,
+    merchant_stats_loader,
+    online_detector_loader,
+    online_detector_merger,
+    score_sketch_flusher,
+    set_scoring_workers,
+    shadow_score_writer,
+)
+from fraud_detection.drift import DriftMonitor, set_drift_monitor
+from fraud_detection.features import feature_count
+from fraud_detection.inference_executor import (
+    ThreadPoolInferenceExecutor,
+    create_inference_executor,
+    set_inference_executor,
+)
+from fraud_detection.merchant_stats import MerchantStatsCache, set_merchant_stats_cache
+from fraud_detection.model_registry import ModelRegistry, model_registry
+from fraud_detection.model_versions import ModelWatcher, active_model_path
+from fraud_detection.online_detector import HalfSpaceTrees, OnlineDetector, set_online_detector
+from fraud_detection.quantile_sketch import ScoreSketches, set_score_sketches
+from fraud_detection.shadow import ShadowScorer, set_shadow_scorer
+from infrastructure.db.engine import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+
+# the fraud scoring components of one app process, started in order and shut down in reverse
+class FraudScoring:
+    def __init__(self, settings, session_factory):
+        self.settings = settings
+        self.session_factory = session_factory
+        self.model_path = settings.FRAUD_MODEL_PATH
+        self.executor = None
+        self.model_watcher = None
+        self.merchant_stats = None
+        self.shadow = None
+        self.score_sketches = None
+        self.drift = None
+        self.online = None
+        self.workers = None
+
+    async def start(self):
+        await self._load_model()
+        await self._start_executor()
+        await self._start_model_watcher()
+        self._start_merchant_stats()
+        await self._start_shadow()
+        await self._start_score_sketches()
+        await self._start_drift()
+        await self._start_online()
+        await self._start_workers()
+
+    async def shutdown(self):
+        set_scoring_workers(None)
+        set_merchant_stats_cache(None)
+        if self.workers is not None:
+            await self.workers.shutdown()
+        set_shadow_scorer(None)
+        if self.shadow is not None:
+            await self.shadow.shutdown()
+            await self.shadow.executor.shutdown()
+        set_online_detector(None)
+        if self.online is not None:
+            # last checkpoint, so rows learned since the previous one aren't lost
+            await self.online.shutdown()
+        set_drift_monitor(None)
+        if self.drift is not None:
+            await self.drift.shutdown()
+        set_score_sketches(None)
+        if self.score_sketches is not None:
+            # last flush, so scores since the previous one aren't lost
+            await self.score_sketches.shutdown()
+        if self.model_watcher is not None:
+            await self.model_watcher.shutdown()
+        set_inference_executor(None)
+        if self.executor is not None:
+            await self.executor.shutdown()
+
+    # load the fraud model once per worker before serving requests
+    async def _load_model(self):
+        settings = self.settings
+        self.model_path = active_model_path(
+            settings.FRAUD_MODEL_REGISTRY_DIR, settings.FRAUD_MODEL_PATH
+        )
+        model_registry.compact = settings.FRAUD_COMPACT_MODEL
+        if os.path.exists(self.model_path):
+            await asyncio.to_thread(model_registry.load, self.model_path)
+            # so the first POST /fraud/score doesn't build the lookup tables
+            model_registry.scorer()
+        else:
+            logger.warning(
+                "fraud model not found at %s, scoring will load it on first use", self.model_path
+            )
+
+    # scoring runs off the event loop so API requests don't wait on the tree walk,
+    # concurrent callers are coalesced into one call per FRAUD_BATCH_MAX_ROWS / _WAIT_MS
+    async def _start_executor(self):
+        settings = self.settings
+        mode = settings.FRAUD_INFERENCE_MODE
+        if mode == "process" and not os.path.exists(self.model_path):
+            # process workers preload the bundle when they start, inline loads it on first use
+            logger.warning(
+                "fraud model not found at %s, process inference falls back to inline",
+                self.model_path,
+            )
+            mode = "inline"
+        self.executor = create_inference_executor(
+            mode,
+            model_path=self.model_path,
+            workers=settings.FRAUD_INFERENCE_WORKERS,
+            max_pending=settings.FRAUD_INFERENCE_MAX_PENDING,
+            compact=settings.FRAUD_COMPACT_MODEL,
+            batch_max_rows=settings.FRAUD_BATCH_MAX_ROWS,
+            batch_max_wait_ms=settings.FRAUD_BATCH_MAX_WAIT_MS,
+        )
+        await self.executor.start()
+        set_inference_executor(self.executor)
+
+    # follows promotions made through any app process, no restart needed
+    async def _start_model_watcher(self):
+        registry_dir = self.settings.FRAUD_MODEL_REGISTRY_DIR
+        if registry_dir:
+            self.model_watcher = ModelWatcher(
+                registry_dir,
+                registry=model_registry,
+                executor=self.executor,
+                poll_seconds=self.settings.FRAUD_MODEL_POLL_SECONDS,
+            )
+            await self.model_watcher.start()
+
+    # z-score features use merchant_amount_stats, reloaded every refresh interval
+    def _start_merchant_stats(self):
+        settings = self.settings
+        if settings.FRAUD_LIVE_MERCHANT_STATS:
+            self.merchant_stats = MerchantStatsCache(
+                merchant_stats_loader(
+                    self.session_factory, settings.FRAUD_MERCHANT_STATS_MIN_COUNT
+                ),
+                refresh_seconds=settings.FRAUD_MERCHANT_STATS_REFRESH_SECONDS,
+                min_count=settings.FRAUD_MERCHANT_STATS_MIN_COUNT,
+            )
+        set_merchant_stats_cache(self.merchant_stats)
+
+    # candidate bundle in shadow mode, one thread of its own so it can't crowd out live scoring
+    async def _start_shadow(self):
+        settings = self.settings
+        if settings.FRAUD_SHADOW_MODEL_PATH:
+            shadow_registry = ModelRegistry(compact=settings.FRAUD_COMPACT_MODEL)
+            await asyncio.to_thread(shadow_registry.load, settings.FRAUD_SHADOW_MODEL_PATH)
+            self.shadow = ShadowScorer(
+                shadow_registry,
+                shadow_score_writer(self.session_factory),
+                executor=ThreadPoolInferenceExecutor(workers=1),
+                max_pending=settings.FRAUD_SHADOW_MAX_PENDING,
+            )
+            await self.shadow.executor.start()
+            await self.shadow.start()
+        set_shadow_scorer(self.shadow)
+
+    # live score quantiles, merged into fraud_score_sketches and recalibrated thresholds
+    # read back every flush
+    async def _start_score_sketches(self):
+        settings = self.settings
+        if settings.FRAUD_SCORE_SKETCHES:
+            self.score_sketches = ScoreSketches(
+                score_sketch_flusher(self.session_factory),
+                registry=model_registry,
+                k=settings.FRAUD_SCORE_SKETCH_K,
+                flush_seconds=settings.FRAUD_SCORE_SKETCH_FLUSH_SECONDS,
+            )
+            await self.score_sketches.start()
+        set_score_sketches(self.score_sketches)
+
+    # per day feature histograms for the drift report, binned off the live path
+    async def _start_drift(self):
+        settings = self.settings
+        if settings.FRAUD_DRIFT_MONITOR:
+            self.drift = DriftMonitor(
+                feature_histogram_flusher(self.session_factory),
+                max_pending=settings.FRAUD_DRIFT_MAX_PENDING,
+                flush_seconds=settings.FRAUD_DRIFT_FLUSH_SECONDS,
+            )
+            await self.drift.start()
+        set_drift_monitor(self.drift)
+
+    # learns from every stored batch, state shared with the other workers through
+    # fraud_online_detectors; the trees are sized for the loaded bundle's features
+    async def _start_online(self):
+        settings = self.settings
+        if settings.FRAUD_ONLINE_DETECTOR:
+            if model_registry.loaded:
+                self.online = OnlineDetector(
+                    HalfSpaceTrees(
+                        feature_count(model_registry.get()[0]),
+                        n_trees=settings.FRAUD_ONLINE_TREES,
+                        depth=settings.FRAUD_ONLINE_DEPTH,
+                        window=settings.FRAUD_ONLINE_WINDOW,
+                    ),
+                    loader=online_detector_loader(self.session_factory),
+                    merger=online_detector_merger(self.session_factory),
+                    checkpoint_seconds=settings.FRAUD_ONLINE_CHECKPOINT_SECONDS,
+                    replace_scores=settings.FRAUD_ONLINE_SCORES,
+                )
+                await self.online.restore()
+                await self.online.start()
+            else:
+                logger.warning("online fraud detector needs a loaded model, it stays off")
+        set_online_detector(self.online)
+
+    # drains the fraud_scoring_jobs outbox, including jobs left over from before a restart
+    async def _start_workers(self):
+        settings = self.settings
+        self.workers = FraudScoringWorkers(
+            FraudDetectionService(
+                session_factory=self.session_factory,
+                model_path=self.model_path,
+                max_batch_size=settings.FRAUD_MAX_BATCH_SIZE,
+                executor=self.executor,
+                max_attempts=settings.FRAUD_JOB_MAX_ATTEMPTS,
+                lease_seconds=settings.FRAUD_JOB_LEASE_SECONDS,
+                retry_base_seconds=settings.FRAUD_JOB_RETRY_SECONDS,
+                merchant_stats=self.merchant_stats,
+                skip_unchanged=settings.FRAUD_SKIP_UNCHANGED,
+                shadow=self.shadow,
+                score_sketches=self.score_sketches,
+                drift=self.drift,
+                online=self.online,
+            ),
+            workers=settings.FRAUD_SCORING_WORKERS,
+            poll_interval=settings.FRAUD_WORKER_POLL_SECONDS,
+        )
+        if settings.FRAUD_SCORING_WORKERS > 0:
+            await self.workers.start()
+            set_scoring_workers(self.workers)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    fraud_scoring = FraudScoring(get_settings(), SessionLocal)
+    await fraud_scoring.start()
+    yield
+    await fraud_scoring.shutdown()
+    await engine.dispose()
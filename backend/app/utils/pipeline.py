@@ -0,0 +1,57 @@
+import math
+
+import anyio
+
+# chains async generator stages into a pipeline, each stage runs in its own task and
+# hands items to the next through a bounded stream, so a slow stage holds back the
+# ones before it instead of letting items pile up in memory
+#   await run_pipeline(pages(), upsert, score, sink=write)
+# `sink` is an async function consuming the last stage's items, its result is returned;
+# an exception in any stage is re-raised from here and the other stages are cancelled
+
+
+class _Failed:
+    def __init__(self, exc: Exception):
+        self.exc = exc
+
+
+async def _drain(receive):
+    async for item in receive:
+        if isinstance(item, _Failed):
+            raise item.exc
+        yield item
+
+
+async def _pump(items, send) -> None:
+    async with send:
+        try:
+            async for item in items:
+                await send.send(item)
+        except Exception as e:
+            # handed downstream, the sink re-raises it and everything else gets cancelled
+            await send.send(_Failed(e))
+
+
+async def run_pipeline(source, *stages, sink, maxsize: int = 2):
+    size = math.inf if maxsize is None else max(1, int(maxsize))
+    result = error = None
+    async with anyio.create_task_group() as tg:
+        send, receive = anyio.create_memory_object_stream(size)
+        tg.start_soon(_pump, source, send)
+        for stage in stages:
+            send, next_receive = anyio.create_memory_object_stream(size)
+            tg.start_soon(_pump, stage(_drain(receive)), send)
+            receive = next_receive
+
+        try:
+            async with receive:
+                result = await sink(_drain(receive))
+        except Exception as e:
+            error = e
+        # the stages are done or stuck behind a failed one, either way they can go
+        tg.cancel_scope.cancel()
+
+    # raised outside the task group so callers see the exception itself
+    if error is not None:
+        raise error
+    return result
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import sklearn
+
+from app.services.fraud_detection_service import FraudDetectionService
+from benchmarks.synthetic import generate_transactions, train_bundle
+from fraud_detection.compact_model import export_compact_bundle
+from fraud_detection.fast_scorer import FastScorer
+from fraud_detection.features import build_feature_matrix
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+
+# times each stage of fraud scoring on seeded synthetic batches and writes JSON
+#   python -m benchmarks.run --output bench.json
+#   python -m benchmarks.run --sizes 1,100,10000 --baseline main.json --fail-on-regression
+# results are keyed by (stage, rows) so a run can be compared to any earlier one
+
+DEFAULT_SIZES = (1, 100, 10_000, 1_000_000)
+DEFAULT_TRAIN_ROWS = 30_000
+DEFAULT_TOLERANCE = 0.25
+STAGES = (
+    "features", "scaling", "score_samples", "score_samples_compact", "run_prediction", "fast_score",
+)
+
+
+class _InMemorySession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, _exc_type, _exc, _tb):
+        return False
+
+    async def commit(self):
+        return None
+
+
+# stands in for SqlTransactionRepo so _run_prediction can be timed without a database
+class InMemoryTransactionRepo:
+    def __init__(self, rows_by_id: dict):
+        self.rows_by_id = rows_by_id
+        self.results = 0
+
+    async def fetch_transactions_for_ML_Model(self, ids):
+        return [self.rows_by_id[i] for i in ids if i in self.rows_by_id]
+
+    async def set_fraud_results(self, updates):
+        self.results += len(updates)
+        return len(updates)
+
+
+def _repo_rows(df) -> dict:
+    ids = df["transaction_id"].tolist()
+    return {
+        txn_id: (txn_id, amount, channel, pending, date, merchant)
+        for txn_id, amount, channel, pending, date, merchant in zip(
+            ids, df["amount"].tolist(), df["payment_channel"].tolist(), df["pending"].tolist(),
+            df["date"].tolist(), df["merchant_name"].tolist(),
+        )
+    }
+
+
+def _time(fn, repeats: int) -> list[float]:
+    fn()  # warm up caches and lazy lookups
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _repeats_for(rows: int, repeat: int | None) -> int:
+    if repeat is not None:
+        return max(1, repeat)
+    # small batches are noisy, big ones are slow
+    return 20 if rows <= 100 else (5 if rows <= 10_000 else 1)
+
+
+def run_benchmarks(
+        sizes=DEFAULT_SIZES,
+        *,
+        seed: int = 7,
+        train_rows: int = DEFAULT_TRAIN_ROWS,
+        n_estimators: int = 500,
+        repeat: int | None = None,
+        stages=STAGES,
+        log=print,
+    ) -> dict:
+
+    started = time.perf_counter()
+    train_frame = generate_transactions(train_rows, seed=seed + 1)
+    bundle = train_bundle(train_frame, n_estimators=n_estimators)
+    feature_state, models = bundle["feature_state"], bundle["models"]
+    compact_state, compact_models = export_compact_bundle(feature_state, models)
+    # POST /fraud/score path, the registry serves it from the compact bundle by default
+    fast_scorer = FastScorer(compact_state, compact_models)
+    elapsed = time.perf_counter() - started
+    log(f"trained {n_estimators} tree bundle on {train_rows} rows in {elapsed:.1f}s")
+
+    # goes through the same joblib load path the service uses
+    model_dir = tempfile.TemporaryDirectory()
+    model_path = os.path.join(model_dir.name, "fraud_model.joblib")
+    joblib.dump(bundle, model_path)
+    registry = ModelRegistry()
+    feature_state, models = registry.ensure_loaded(model_path)
+
+    results = []
+    for rows in sizes:
+        df = generate_transactions(rows, seed=seed)
+        repeats = _repeats_for(rows, repeat)
+        X = build_feature_matrix(df, feature_state)
+        X_scaled = feature_state["scaler"].transform(X)
+
+        repo = InMemoryTransactionRepo(_repo_rows(df))
+        svc = FraudDetectionService(
+            session_factory=_InMemorySession,
+            model_path=model_path,
+            registry=registry,
+            executor=InferenceExecutor(),
+            transaction_repo_factory=lambda _db: repo,
+        )
+        ids = df["transaction_id"].tolist()
+        records = df.to_dict("records")
+
+        stage_fns = {
+            "features": lambda: build_feature_matrix(df, feature_state),
+            "scaling": lambda: feature_state["scaler"].transform(X),
+            "score_samples": lambda: models["isolation_forest"].score_samples(X_scaled),
+            "score_samples_compact": (
+                lambda: compact_models["isolation_forest"].score_samples(X_scaled)
+            ),
+            "run_prediction": lambda: asyncio.run(svc._run_prediction(ids)),
+            "fast_score": lambda: fast_scorer.score(records),
+        }
+        for stage in stages:
+            timings = _time(stage_fns[stage], repeats)
+            median = statistics.median(timings)
+            results.append({
+                "stage": stage,
+                "rows": int(rows),
+                "repeats": repeats,
+                "median_seconds": median,
+                "min_seconds": min(timings),
+                "rows_per_second": rows / median if median > 0 else None,
+            })
+            log(f"{stage:>22} {rows:>9} rows  {median * 1000:10.3f} ms  "
+                f"{rows / median if median > 0 else 0:14.0f} rows/sec")
+
+    model_dir.cleanup()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "train_rows": train_rows,
+            "n_estimators": n_estimators,
+        },
+        "results": results,
+    }
+
+
+# stages that got slower than baseline * (1 + tolerance), only (stage, rows) pairs in both runs
+def compare(current: dict, baseline: dict, *, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    previous = {(r["stage"], r["rows"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        before = previous.get((result["stage"], result["rows"]))
+        if before is None or not before["median_seconds"]:
+            continue
+        ratio = result["median_seconds"] / before["median_seconds"]
+        if ratio > 1.0 + tolerance:
+            regressions.append({
+                "stage": result["stage"],
+                "rows": result["rows"],
+                "baseline_seconds": before["median_seconds"],
+                "current_seconds": result["median_seconds"],
+                "ratio": ratio,
+            })
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description="Fraud scoring benchmarks"
+    )
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated batch sizes")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--train-rows", type=int, default=DEFAULT_TRAIN_ROWS)
+    parser.add_argument("--estimators", type=int, default=500)
+    parser.add_argument(
+        "--repeat", type=int, default=None, help="timed runs per stage (default by size)"
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown vs baseline, 0.25 = 25%%")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages {sorted(unknown)}, expected some of {STAGES}")
+
+    report = run_benchmarks(
+        [int(s) for s in args.sizes.split(",") if s],
+        seed=args.seed,
+        train_rows=args.train_rows,
+        n_estimators=args.estimators,
+        repeat=args.repeat,
+        stages=stages,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), tolerance=args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['stage']} @ {r['rows']} rows: "
+                  f"{r['baseline_seconds'] * 1000:.3f} ms -> {r['current_seconds'] * 1000:.3f} ms "
+                  f"({r['ratio']:.2f}x)")
+        if not regressions:
+            print(f"no regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from fraud_detection.features import build_feature_matrix
+
+# seeded, vectorized port of fraud_detection/Synthetic-Data-Creation.ipynb
+# same merchants, per account preferences, gamma amounts and anomaly mix, but
+# generated column at a time so 1M rows takes seconds instead of minutes
+
+MERCHANTS = [
+    {"name": "Uber", "channel_probs": (0.95, 0.05, 0.0),
+     "amt_shape": 2.0, "amt_scale": 4.0, "hour_bias": (18, 23)},
+    {"name": "Starbucks", "channel_probs": (0.10, 0.90, 0.0),
+     "amt_shape": 2.5, "amt_scale": 3.5, "hour_bias": (6, 10)},
+    {"name": "Target", "channel_probs": (0.40, 0.60, 0.0),
+     "amt_shape": 3.0, "amt_scale": 12.0, "hour_bias": (12, 19)},
+    {"name": "Walmart", "channel_probs": (0.30, 0.70, 0.0),
+     "amt_shape": 3.0, "amt_scale": 10.0, "hour_bias": (11, 20)},
+    {"name": "Comcast", "channel_probs": (0.85, 0.00, 0.15),
+     "amt_shape": 2.0, "amt_scale": 50.0, "hour_bias": (8, 18)},
+    {"name": "Airbnb", "channel_probs": (0.99, 0.00, 0.01),
+     "amt_shape": 1.5, "amt_scale": 150.0, "hour_bias": (9, 22)},
+    {"name": "Delta", "channel_probs": (0.99, 0.00, 0.01),
+     "amt_shape": 1.6, "amt_scale": 180.0, "hour_bias": (8, 21)},
+    {"name": "Apple", "channel_probs": (0.80, 0.20, 0.0),
+     "amt_shape": 2.0, "amt_scale": 60.0, "hour_bias": (10, 22)},
+    {"name": "Spotify", "channel_probs": (1.00, 0.00, 0.0),
+     "amt_shape": 1.2, "amt_scale": 15.0, "hour_bias": (0, 23)},
+    {"name": "DoorDash", "channel_probs": (0.95, 0.05, 0.0),
+     "amt_shape": 2.1, "amt_scale": 12.0, "hour_bias": (17, 22)},
+    {"name": "CVS", "channel_probs": (0.15, 0.85, 0.0),
+     "amt_shape": 2.6, "amt_scale": 9.0, "hour_bias": (9, 20)},
+    {"name": "Home Depot", "channel_probs": (0.35, 0.65, 0.0),
+     "amt_shape": 2.8, "amt_scale": 35.0, "hour_bias": (10, 19)},
+    {"name": "Lyft", "channel_probs": (0.98, 0.02, 0.0),
+     "amt_shape": 1.9, "amt_scale": 5.0, "hour_bias": (18, 23)},
+    {"name": "Netflix", "channel_probs": (1.00, 0.00, 0.0),
+     "amt_shape": 1.2, "amt_scale": 16.0, "hour_bias": (0, 23)},
+    {"name": "Gas Station", "channel_probs": (0.05, 0.90, 0.05),
+     "amt_shape": 2.5, "amt_scale": 25.0, "hour_bias": (6, 22)},
+]
+CHANNELS = np.array(["online", "in_store", "other"], dtype=object)
+ANOMALY_MERCHANTS = [
+    "UnfamiliarSeller", "WeirdSellerID", "SketchySellerHandle", "Merchant_99999", "Store_XYZ",
+]
+
+START_DATE = np.datetime64("2025-06-01T00:00")
+DAYS_SPAN = 122
+# the notebook gives each account 120-320 transactions
+TXNS_PER_ACCOUNT = 220
+
+
+def generate_transactions(n: int, *, seed: int = 7, anomaly_rate: float = 0.02) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = int(n)
+    n_accounts = max(1, n // TXNS_PER_ACCOUNT)
+    n_merchants = len(MERCHANTS)
+
+    # per account favourite merchants with dirichlet weights, spend scale and hour shift
+    fav_k = rng.integers(5, 10, size=n_accounts)
+    fav_idx = np.argsort(rng.random((n_accounts, n_merchants)), axis=1)[:, :9]
+    fav_weights = np.zeros((n_accounts, 9))
+    for a in range(n_accounts):
+        fav_weights[a, :fav_k[a]] = rng.dirichlet(np.ones(fav_k[a]))
+    fav_cum = np.cumsum(fav_weights, axis=1)
+    spend_scale = rng.uniform(0.6, 1.8, size=n_accounts)
+    hour_shift = rng.integers(-2, 3, size=n_accounts)
+
+    account = rng.integers(0, n_accounts, size=n)
+    pick = (rng.random(n)[:, None] > fav_cum[account]).sum(axis=1)
+    merchant = fav_idx[account, np.minimum(pick, fav_k[account] - 1)]
+
+    shape = np.array([m["amt_shape"] for m in MERCHANTS])[merchant]
+    scale = np.array([m["amt_scale"] for m in MERCHANTS])[merchant]
+    amount = np.round(np.maximum(1.0, rng.gamma(shape, scale) * spend_scale[account]), 2)
+
+    hour_centers = np.array([sum(m["hour_bias"]) / 2.0 for m in MERCHANTS])
+    hour_center = hour_centers[merchant] + hour_shift[account]
+    hour = np.clip(rng.normal(hour_center, 2.5), 0, 23).astype(int)
+    minute = rng.integers(0, 60, size=n)
+    day = rng.integers(0, DAYS_SPAN, size=n)
+    when = (
+        START_DATE
+        + day.astype("timedelta64[D]")
+        + hour.astype("timedelta64[h]")
+        + minute.astype("timedelta64[m]")
+    )
+
+    channel_cum = np.cumsum(np.array([m["channel_probs"] for m in MERCHANTS]), axis=1)
+    channel_cum /= channel_cum[:, -1:]
+    channel = CHANNELS[(rng.random(n)[:, None] > channel_cum[merchant]).sum(axis=1)]
+
+    is_online = channel == "online"
+    pending = rng.random(n) < np.where(is_online, 0.08, 0.03)
+
+    df = pd.DataFrame({
+        "transaction_id": np.arange(1, n + 1),
+        "account_id": account + 1,
+        "merchant_name": np.array([m["name"] for m in MERCHANTS], dtype=object)[merchant],
+        "amount": amount,
+        "payment_channel": channel,
+        "pending": pending,
+        "date": when,
+        "is_anomaly": np.zeros(n, dtype=bool),
+    })
+    _add_anomalies(df, rng, anomaly_rate)
+    df["date"] = np.datetime_as_string(df["date"].to_numpy().astype("datetime64[s]"), unit="s")
+    return df
+
+
+# same four anomaly types and proportions as the notebook
+def _add_anomalies(df: pd.DataFrame, rng, anomaly_rate: float) -> None:
+    n_anomaly = int(len(df) * anomaly_rate)
+    if n_anomaly == 0:
+        return
+    idx = rng.permutation(rng.choice(len(df), size=n_anomaly, replace=False))
+    n_high, n_new, n_odd = int(n_anomaly * 0.45), int(n_anomaly * 0.30), int(n_anomaly * 0.15)
+    high, new, odd, flip = np.split(idx, [n_high, n_high + n_new, n_high + n_new + n_odd])
+
+    amount = df["amount"].to_numpy()
+    amount[high] = np.round(amount[high] * rng.uniform(25, 80, size=len(high)), 2)
+    amount[new] = np.round(amount[new] * rng.uniform(10, 30, size=len(new)), 2)
+    amount[flip] = np.round(amount[flip] * rng.uniform(1.2, 2.0, size=len(flip)), 2)
+    df["amount"] = amount
+
+    merchant = df["merchant_name"].to_numpy()
+    merchant[new] = rng.choice(ANOMALY_MERCHANTS, size=len(new))
+    df["merchant_name"] = merchant
+
+    channel = df["payment_channel"].to_numpy()
+    channel[np.concatenate([new, odd, flip])] = "online"
+    df["payment_channel"] = channel
+
+    dates = df["date"].to_numpy()
+    odd_hours = rng.integers(2, 5, size=len(odd)).astype("timedelta64[h]")
+    dates[odd] = dates[odd].astype("datetime64[D]") + odd_hours
+    df["date"] = dates
+
+    df.loc[idx, "is_anomaly"] = True
+
+
+# trains a bundle the way Fraud-Detection-Model-final.ipynb does, same keys and thresholds
+def train_bundle(
+        df: pd.DataFrame,
+        *,
+        n_estimators: int = 500,
+        contamination: float = 0.02,
+        random_state: int = 42,
+        n_jobs: int | None = -1,
+    ) -> dict:
+
+    merchant_encoder = LabelEncoder().fit(
+        pd.concat(
+            [df["merchant_name"].fillna("Unknown"), pd.Series(["Unknown"])], ignore_index=True
+        )
+    )
+    channel_encoder = LabelEncoder().fit(
+        pd.concat([df["payment_channel"].fillna("online"), pd.Series(["online", "in_store"])],
+                  ignore_index=True)
+    )
+    grp = df.groupby("merchant_name", dropna=False)["amount"]
+    feature_state = {
+        "merchant_encoder": merchant_encoder,
+        "channel_encoder": channel_encoder,
+        "merchant_mean": grp.mean().to_dict(),
+        "merchant_std": grp.std().fillna(0.0).to_dict(),
+    }
+
+    data = build_feature_matrix(df, feature_state)
+    feature_state["scaler"] = StandardScaler().fit(data)
+    train_data = feature_state["scaler"].transform(data)
+
+    forest = IsolationForest(
+        contamination=contamination,
+        n_estimators=n_estimators,
+        random_state=random_state,
+        n_jobs=n_jobs,
+    ).fit(train_data)
+
+    train_scores = -forest.score_samples(train_data)
+    feature_state["risk_thresholds"] = {
+        "LOW_RISK_MAX": float(np.quantile(train_scores, 0.90)),
+        "HIGH_RISK_MIN": float(np.quantile(train_scores, 0.98)),
+    }
+    models = {
+        "isolation_forest": forest,
+        "contamination": contamination,
+        "random_state": random_state,
+    }
+    return {"feature_state": feature_state, "models": models}
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from fraud_detection.compact_model import (
+    CompactIsolationForest,
+    CompactLabelEncoder,
+    CompactStandardScaler,
+    export_compact_bundle,
+)
+
+# on disk bundle: a directory of .npy arrays plus manifest.json
+# arrays are opened with np.load(mmap_mode="r") so every worker on a host
+# shares the same page cache pages instead of unpickling its own copy
+
+BUNDLE_FORMAT = "finguard-fraud-bundle"
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+# training report train.py writes next to every versioned bundle
+METADATA_FILE = "training.json"
+# extra detectors of an ensemble bundle (see ensemble.py), pickled with joblib since
+# they aren't plain arrays; their big arrays are still memory mapped on load
+DETECTORS_FILE = "detectors.joblib"
+
+FOREST_ARRAYS = (
+    "feature", "threshold", "children_left", "children_right", "leaf_value", "roots",
+)
+
+
+def is_mmap_bundle(path) -> bool:
+    path = str(path)
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, MANIFEST_FILE))
+    return os.path.basename(path) == MANIFEST_FILE
+
+
+def save_mmap_bundle(feature_state, models, directory, *, model_version: str | None = None) -> str:
+    feature_state, models = export_compact_bundle(feature_state, models)
+    os.makedirs(directory, exist_ok=True)
+
+    arrays = {}
+    forest = models['isolation_forest']
+    forest_arrays = forest.to_arrays()
+    for name in FOREST_ARRAYS:
+        arrays[f"forest_{name}"] = np.asarray(forest_arrays[name])
+
+    scaler = feature_state['scaler']
+    if scaler.mean_ is not None:
+        arrays["scaler_mean"] = scaler.mean_
+    if scaler.scale_ is not None:
+        arrays["scaler_scale"] = scaler.scale_
+
+    # fixed width unicode so the class lists can be memory mapped too
+    arrays["merchant_classes"] = _as_unicode(feature_state['merchant_encoder'].classes_)
+    arrays["channel_classes"] = _as_unicode(feature_state['channel_encoder'].classes_)
+
+    index = MerchantStatsIndex.build(feature_state['merchant_mean'], feature_state['merchant_std'])
+    arrays.update(index.to_arrays())
+
+    files = {}
+    for name, arr in arrays.items():
+        filename = f"{name}.npy"
+        np.save(os.path.join(directory, filename), np.ascontiguousarray(arr), allow_pickle=False)
+        files[name] = {"file": filename, "dtype": str(arr.dtype), "shape": list(arr.shape)}
+
+    scalars = {
+        "max_depth": int(forest.max_depth),
+        "denominator": float(forest.denominator),
+        "offset": float(forest.offset_),
+        "n_features_in": int(forest.n_features_in_),
+    }
+    extra_state = {
+        k: float(feature_state[k])
+        for k in ('global_amount_mean', 'global_amount_std') if k in feature_state
+    }
+    if 'feature_version' in feature_state:
+        extra_state['feature_version'] = int(feature_state['feature_version'])
+    if feature_state.get('feature_reference') is not None:
+        # plain lists and ints, fits in the manifest
+        extra_state['feature_reference'] = feature_state['feature_reference']
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "model_version": model_version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "arrays": files,
+        "forest": scalars,
+        "feature_state": extra_state,
+        "risk_thresholds": {
+            k: float(v) for k, v in (feature_state.get('risk_thresholds') or {}).items()
+        },
+        "models": {
+            k: v for k, v in models.items()
+            if k != 'isolation_forest' and isinstance(v, (int, float, str, bool, type(None)))
+        },
+    }
+    if models.get('ensemble'):
+        joblib.dump(models['detectors'], os.path.join(directory, DETECTORS_FILE))
+        manifest["ensemble"] = models['ensemble']
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return directory
+
+
+def read_manifest(path) -> dict:
+    directory = _bundle_dir(path)
+    with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{directory} is not a {BUNDLE_FORMAT} directory")
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(
+            f"unsupported bundle format_version {manifest.get('format_version')}, "
+            f"expected {BUNDLE_FORMAT_VERSION}"
+        )
+    return manifest
+
+
+def load_mmap_bundle(path, *, mmap_mode: str | None = "r"):
+    directory = _bundle_dir(path)
+    manifest = read_manifest(directory)
+    arrays = {
+        name: np.load(
+            os.path.join(directory, info["file"]), mmap_mode=mmap_mode, allow_pickle=False
+        )
+        for name, info in manifest["arrays"].items()
+    }
+
+    forest = CompactIsolationForest.from_arrays({
+        **{name: arrays[f"forest_{name}"] for name in FOREST_ARRAYS},
+        **manifest["forest"],
+    })
+
+    index = MerchantStatsIndex.from_arrays(arrays)
+    feature_state = {
+        'merchant_encoder': CompactLabelEncoder(arrays["merchant_classes"]),
+        'channel_encoder': CompactLabelEncoder(arrays["channel_classes"]),
+        'merchant_mean': index.column("mean"),
+        'merchant_std': index.column("std"),
+        'scaler': CompactStandardScaler(arrays.get("scaler_mean"), arrays.get("scaler_scale")),
+        'risk_thresholds': dict(manifest.get("risk_thresholds") or {}),
+        **manifest.get("feature_state", {}),
+    }
+    models = {'isolation_forest': forest, **manifest.get("models", {})}
+    if manifest.get("ensemble"):
+        models['ensemble'] = manifest["ensemble"]
+        models['detectors'] = joblib.load(
+            os.path.join(directory, DETECTORS_FILE), mmap_mode=mmap_mode
+        )
+    return feature_state, models
+
+
+def _bundle_dir(path) -> str:
+    path = str(path)
+    return os.path.dirname(path) if os.path.basename(path) == MANIFEST_FILE else path
+
+
+def _as_unicode(values) -> np.ndarray:
+    return np.asarray([str(v) for v in np.asarray(values).tolist()], dtype=np.str_)
+
+
+def stable_hash(key: str) -> int:
+    # python's hash() is salted per process, this one is the same in every worker
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# merchant -> (mean, std) kept as arrays sorted by a stable 64 bit hash of the name,
+# a lookup is a binary search over the hashes plus a check of the stored key
+class MerchantStatsIndex:
+    def __init__(self, hashes, keys, mean, std):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.keys = np.asarray(keys)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+
+    @classmethod
+    def build(cls, merchant_mean, merchant_std) -> "MerchantStatsIndex":
+        # only string keys can ever match, missing merchants are replaced with 'Unknown'
+        keys = sorted(k for k in merchant_mean if isinstance(k, str))
+        hashes = np.array([stable_hash(k) for k in keys], dtype=np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        return cls(
+            hashes[order],
+            np.asarray(keys, dtype=np.str_)[order] if keys else np.asarray([], dtype="<U1"),
+            np.array([float(merchant_mean[keys[i]]) for i in order], dtype=np.float64),
+            np.array([float(merchant_std.get(keys[i], 0.0)) for i in order], dtype=np.float64),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "MerchantStatsIndex":
+        return cls(
+            arrays["merchant_stat_hashes"], arrays["merchant_stat_keys"],
+            arrays["merchant_stat_mean"], arrays["merchant_stat_std"],
+        )
+
+    def to_arrays(self) -> dict:
+        return {
+            "merchant_stat_hashes": self.hashes,
+            "merchant_stat_keys": self.keys,
+            "merchant_stat_mean": self.mean,
+            "merchant_stat_std": self.std,
+        }
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def position(self, key) -> int:
+        if not isinstance(key, str):
+            return -1
+        h = np.uint64(stable_hash(key))
+        pos = int(np.searchsorted(self.hashes, h, side="left"))
+        # walk the (almost always single) run of equal hashes
+        while pos < len(self.hashes) and self.hashes[pos] == h:
+            if self.keys[pos] == key:
+                return pos
+            pos += 1
+        return -1
+
+    def column(self, name: str) -> "MerchantStatsColumn":
+        return MerchantStatsColumn(self, getattr(self, name))
+
+
+# read only dict-like view of one stats column, so feature code using
+# `merchant in merchant_mean` / merchant_std.get(...) works unchanged
+class MerchantStatsColumn(Mapping):
+    def __init__(self, index: MerchantStatsIndex, values):
+        self.index = index
+        self.values_ = values
+
+    def __getitem__(self, key):
+        pos = self.index.position(key)
+        if pos < 0:
+            raise KeyError(key)
+        return float(self.values_[pos])
+
+    def __contains__(self, key) -> bool:
+        return self.index.position(key) >= 0
+
+    def __iter__(self):
+        return (str(k) for k in self.index.keys)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+# python -m fraud_detection.bundle_format fraud_model.joblib fraud_model_bundle [version]
+def main(argv=None):
+    from fraud_detection.prediction import load_pipeline
+
+    args = argv if argv is not None else sys.argv[1:]
+    if len(args) not in (2, 3):
+        print(
+            "usage: python -m fraud_detection.bundle_format <bundle.joblib> <output_dir> [version]"
+        )
+        return 2
+
+    feature_state, models = load_pipeline(args[0])
+    version = args[2] if len(args) == 3 else None
+    save_mmap_bundle(feature_state, models, args[1], model_version=version)
+    print(f"wrote {args[1]}/{MANIFEST_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import sys
+
+import numpy as np
+
+# NumPy only stand-ins for the sklearn objects in the bundle, an exported
+# bundle can be unpickled and scored without importing sklearn at all
+
+TREE_LEAF = -1
+# bounds the (rows x trees) node matrix walked per step, small enough to stay in cache
+MAX_CELLS_PER_CHUNK = 100_000
+
+
+def average_path_length(n_samples_leaf):
+    # same as sklearn.ensemble._iforest._average_path_length
+    n = np.asarray(n_samples_leaf, dtype=float)
+    out = np.zeros(n.shape)
+    mask_1 = n <= 1
+    mask_2 = n == 2
+    not_mask = ~np.logical_or(mask_1, mask_2)
+    out[mask_2] = 1.0
+    out[not_mask] = (
+        2.0 * (np.log(n[not_mask] - 1.0) + np.euler_gamma)
+        - 2.0 * (n[not_mask] - 1.0) / n[not_mask]
+    )
+    return out
+
+
+# every tree of the forest flattened into one set of contiguous node arrays
+#   feature / threshold  - split of each node, leaves point at feature 0 with +inf
+#   children_left/right  - global node index, leaves point back at themselves and
+#                          the right child always sits right after the left one
+#   leaf_value           - depth + average path length correction - 1, per leaf
+#   roots                - index of each tree's root node
+class CompactIsolationForest:
+    def __init__(
+            self,
+            *,
+            feature,
+            threshold,
+            children_left,
+            children_right,
+            leaf_value,
+            roots,
+            max_depth: int,
+            denominator: float,
+            offset: float,
+            n_features_in: int,
+        ):
+        # native int width so the hot loop indexes without casting and
+        # memory mapped arrays are used as they are, without a copy
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        # float32 thresholds (see fraud_detection/variants.py) are kept as they are,
+        # rows are then compared in float32 too
+        threshold = np.asarray(threshold)
+        self.threshold = np.ascontiguousarray(
+            threshold, dtype=np.float32 if threshold.dtype == np.float32 else np.float64
+        )
+        self.children_left = np.ascontiguousarray(children_left, dtype=np.intp)
+        self.children_right = np.ascontiguousarray(children_right, dtype=np.intp)
+        self.leaf_value = np.ascontiguousarray(leaf_value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        is_leaf = self.children_left == np.arange(len(self.children_left))
+        if not np.array_equal(self.children_right, np.where(is_leaf, self.children_left,
+                                                            self.children_left + 1)):
+            raise ValueError("right children must directly follow left children")
+        self.max_depth = int(max_depth)
+        self.denominator = float(denominator)
+        self.offset_ = float(offset)
+        self.n_features_in_ = int(n_features_in)
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    # same values as IsolationForest.score_samples (negative, lower is more anomalous)
+    def score_samples(self, X):
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has shape {X.shape}, expected (n, {self.n_features_in_}) features"
+            )
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")
+
+        n = X.shape[0]
+        depths = np.zeros(n)
+        rows_per_chunk = max(1, MAX_CELLS_PER_CHUNK // max(1, self.n_estimators))
+        for start in range(0, n, rows_per_chunk):
+            depths[start:start + rows_per_chunk] = self._depths(X[start:start + rows_per_chunk])
+
+        if self.denominator != 0:
+            scores = 2 ** (-(depths / self.denominator))
+        else:
+            scores = np.ones(n)
+        return -scores
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        is_inlier = np.ones(len(X), dtype=int)
+        is_inlier[self.decision_function(X) < 0] = -1
+        return is_inlier
+
+    # walks all trees for a chunk of rows at once, one level per step
+    def _depths(self, X):
+        n_features = X.shape[1]
+        flat = X.astype(self.threshold.dtype).ravel()
+        row_offset = (np.arange(X.shape[0], dtype=np.intp) * n_features)[:, None]
+
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            x = flat[row_offset + self.feature[node]]
+            # inputs are finite so x > threshold is the same as sklearn's "not x <= threshold",
+            # leaves have an +inf threshold and stay where they are
+            node = self.children_left[node] + (x > self.threshold[node])
+
+        # added tree by tree in the same order sklearn accumulates them, cumsum is a
+        # sequential accumulate (unlike sum's pairwise one) without a python loop per tree
+        return np.cumsum(self.leaf_value[node], axis=1)[:, -1]
+
+    def to_arrays(self) -> dict:
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children_left": self.children_left,
+            "children_right": self.children_right,
+            "leaf_value": self.leaf_value,
+            "roots": self.roots,
+            "max_depth": np.int64(self.max_depth),
+            "denominator": np.float64(self.denominator),
+            "offset": np.float64(self.offset_),
+            "n_features_in": np.int64(self.n_features_in_),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "CompactIsolationForest":
+        return cls(**{k: arrays[k] for k in (
+            "feature", "threshold", "children_left", "children_right",
+            "leaf_value", "roots", "max_depth", "denominator", "offset", "n_features_in",
+        )})
+
+
+class CompactStandardScaler:
+    def __init__(self, mean=None, scale=None):
+        self.mean_ = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale_ = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    # same steps as StandardScaler.transform
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64, copy=True)
+        if self.mean_ is not None:
+            X -= self.mean_
+        if self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+
+class CompactLabelEncoder:
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+        self._lookup = None
+
+    def transform(self, values):
+        # built on first use, batch scoring only reads classes_
+        if self._lookup is None:
+            self._lookup = {c: i for i, c in enumerate(self.classes_.tolist())}
+        try:
+            return np.array([self._lookup[v] for v in values], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: [{e.args[0]!r}]") from None
+
+
+def export_isolation_forest(forest) -> CompactIsolationForest:
+    n_features = int(forest.n_features_in_)
+    subsample_features = forest._max_features != n_features
+    per_tree_path_lengths = getattr(forest, "_decision_path_lengths", None)
+    per_tree_avg_lengths = getattr(forest, "_average_path_length_per_tree", None)
+
+    features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for t, (estimator, tree_features) in enumerate(
+        zip(forest.estimators_, forest.estimators_features_)
+    ):
+        tree = estimator.tree_
+        order, new_ids = _sibling_order(tree.children_left, tree.children_right)
+        is_leaf = tree.children_left[order] == TREE_LEAF
+        node_ids = np.arange(tree.node_count)
+        left = new_ids[np.maximum(tree.children_left[order], 0)]
+
+        feature = tree.feature[order].astype(np.int64)
+        if subsample_features:
+            # trees were fit on X[:, tree_features], map back to the full matrix
+            feature = np.where(is_leaf, 0, np.asarray(tree_features)[np.maximum(feature, 0)])
+        feature = np.where(is_leaf, 0, feature)
+
+        if per_tree_path_lengths is not None:
+            path_lengths = per_tree_path_lengths[t]
+            avg_lengths = per_tree_avg_lengths[t]
+        else:
+            path_lengths = _node_depths(tree.children_left, tree.children_right)
+            avg_lengths = average_path_length(tree.n_node_samples)
+
+        leaf_value = (np.asarray(path_lengths) + np.asarray(avg_lengths) - 1.0)[order]
+
+        features.append(feature)
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+        lefts.append(np.where(is_leaf, node_ids, left) + offset)
+        rights.append(np.where(is_leaf, node_ids, left + 1) + offset)
+        leaf_values.append(np.where(is_leaf, leaf_value, 0.0))
+        roots.append(offset)
+
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += tree.node_count
+
+    denominator = len(forest.estimators_) * average_path_length([forest._max_samples])[0]
+
+    return CompactIsolationForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        children_left=np.concatenate(lefts),
+        children_right=np.concatenate(rights),
+        leaf_value=np.concatenate(leaf_values),
+        roots=np.array(roots),
+        max_depth=max_depth,
+        denominator=denominator,
+        offset=forest.offset_,
+        n_features_in=n_features,
+    )
+
+
+# breadth first order where each node's two children get consecutive ids,
+# returns the old id for each new position and the new id for each old node
+def _sibling_order(children_left, children_right):
+    order = [0]
+    i = 0
+    while i < len(order):
+        node = order[i]
+        i += 1
+        if children_left[node] != TREE_LEAF:
+            order.append(children_left[node])
+            order.append(children_right[node])
+
+    order = np.asarray(order, dtype=np.intp)
+    new_ids = np.empty(len(order), dtype=np.intp)
+    new_ids[order] = np.arange(len(order))
+    return order, new_ids
+
+
+# depth of every node with the root at 1, same as Tree.compute_node_depths
+def _node_depths(children_left, children_right):
+    depths = np.zeros(len(children_left))
+    depths[0] = 1.0
+    for node in range(len(children_left)):
+        if children_left[node] != TREE_LEAF:
+            depths[children_left[node]] = depths[node] + 1.0
+            depths[children_right[node]] = depths[node] + 1.0
+    return depths
+
+
+# swaps the sklearn objects in a loaded bundle for their compact versions
+def export_compact_bundle(feature_state, models):
+    feature_state = dict(feature_state)
+    models = dict(models)
+
+    scaler = feature_state.get('scaler')
+    if scaler is not None and not isinstance(scaler, CompactStandardScaler):
+        feature_state['scaler'] = CompactStandardScaler(
+            getattr(scaler, 'mean_', None) if getattr(scaler, 'with_mean', True) else None,
+            getattr(scaler, 'scale_', None) if getattr(scaler, 'with_std', True) else None,
+        )
+    for key in ('merchant_encoder', 'channel_encoder'):
+        encoder = feature_state.get(key)
+        if encoder is not None and not isinstance(encoder, CompactLabelEncoder):
+            feature_state[key] = CompactLabelEncoder(encoder.classes_)
+
+    forest = models.get('isolation_forest')
+    if forest is not None and not isinstance(forest, CompactIsolationForest):
+        models['isolation_forest'] = export_isolation_forest(forest)
+
+    return feature_state, models
+
+
+# python -m fraud_detection.compact_model fraud_model.joblib fraud_model_compact.joblib
+def main(argv=None):
+    import joblib
+
+    from fraud_detection.prediction import load_pipeline
+
+    args = argv if argv is not None else sys.argv[1:]
+    if len(args) != 2:
+        print("usage: python -m fraud_detection.compact_model <bundle.joblib> <output.joblib>")
+        return 2
+
+    feature_state, models = export_compact_bundle(*load_pipeline(args[0]))
+    joblib.dump({'feature_state': feature_state, 'models': models}, args[1])
+    forest = models['isolation_forest']
+    print(f"exported {forest.n_estimators} trees, {forest.n_nodes} nodes -> {args[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import math
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from fraud_detection import metrics
+from fraud_detection.features import BASE_FEATURE_NAMES, NUMBER_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# feature drift: training stores fixed-bin histograms of the 12 base features in the
+# bundle (feature_state["feature_reference"]), bins cut at the training deciles and at
+# every value for features with few distinct values. Each scored batch is handed to
+# DriftMonitor.submit, which only queues it; a background task builds the batch's
+# features off the event loop and adds them to this process's histograms for
+# (UTC day, model version). Histograms with the same edges add up bin by bin, so every
+# process periodically merges its counts into fraud_feature_histograms and the table row
+# is that day's histogram across all workers. The report compares those counts with the
+# reference through PSI and KS, nothing has to reread the transactions table.
+
+DEFAULT_BINS = 10
+DEFAULT_FLUSH_SECONDS = 60.0
+# queued batches, at FRAUD_MAX_BATCH_SIZE rows each
+DEFAULT_MAX_PENDING = 16
+DEFAULT_REPORT_DAYS = 7
+# PSI above 0.2 is the usual "population has shifted" rule of thumb
+DEFAULT_PSI_ALERT = 0.2
+# share given to empty bins so PSI stays finite
+PSI_EPSILON = 1e-4
+
+
+# inner bin edges per column, a value x lands in bin searchsorted(edges, x, side="right")
+def bin_edges(X: np.ndarray, bins: int = DEFAULT_BINS) -> list[np.ndarray]:
+    edges = []
+    for column in np.asarray(X, dtype=float).T:
+        column = column[np.isfinite(column)]
+        if len(column) == 0:
+            edges.append(np.zeros(0))
+            continue
+        values = np.unique(column)
+        if len(values) <= bins:
+            # a bin per value seen in training, plus one for anything above the last
+            edges.append(np.append(values, np.nextafter(values[-1], math.inf)))
+        else:
+            edges.append(np.unique(np.quantile(column, np.linspace(0, 1, bins + 1)[1:-1])))
+    return edges
+
+
+class FeatureHistograms:
+    def __init__(self, edges):
+        self.edges = [np.asarray(e, dtype=float) for e in edges]
+        self.counts = [np.zeros(len(e) + 1, dtype=np.int64) for e in self.edges]
+        self.rows = 0
+
+    def update(self, X: np.ndarray) -> None:
+        X = np.asarray(X, dtype=float)
+        if len(X) == 0:
+            return
+        for j, edges in enumerate(self.edges):
+            # nan sorts after every edge, so it counts in the top bin
+            bins = np.searchsorted(edges, X[:, j], side="right")
+            self.counts[j] += np.bincount(bins, minlength=len(edges) + 1)
+        self.rows += len(X)
+
+    # same edges only, the bundle a histogram was built with fixes them
+    def merge(self, other: "FeatureHistograms") -> "FeatureHistograms":
+        if other is None or other.rows == 0:
+            return self
+        for mine, theirs in zip(self.counts, other.counts):
+            mine += theirs
+        self.rows += other.rows
+        return self
+
+    def add_counts(self, counts, rows: int) -> "FeatureHistograms":
+        for mine, theirs in zip(self.counts, counts or []):
+            mine += np.asarray(theirs, dtype=np.int64)
+        self.rows += int(rows)
+        return self
+
+    def count_lists(self) -> list[list[int]]:
+        return [c.tolist() for c in self.counts]
+
+
+# reference histograms of a training matrix, kept JSON friendly so the memory mapped
+# bundle can carry them in its manifest
+def reference_histograms(X: np.ndarray, bins: int = DEFAULT_BINS) -> dict:
+    X = np.asarray(X, dtype=float)[:, :NUMBER_FEATURES]
+    edges = bin_edges(X, bins)
+    histograms = FeatureHistograms(edges)
+    histograms.update(X)
+    return {
+        "features": list(BASE_FEATURE_NAMES),
+        "edges": [e.tolist() for e in edges],
+        "counts": histograms.count_lists(),
+        "rows": histograms.rows,
+    }
+
+
+def reference_of(feature_state) -> dict | None:
+    return (feature_state or {}).get("feature_reference")
+
+
+def _shares(counts) -> np.ndarray:
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    return counts / total if total else counts
+
+
+# population stability index, sum over bins of (actual - expected) * ln(actual / expected)
+def psi(expected, actual, epsilon: float = PSI_EPSILON) -> float:
+    e = np.maximum(_shares(expected), epsilon)
+    a = np.maximum(_shares(actual), epsilon)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+# Kolmogorov-Smirnov distance at the bin edges, the largest gap between the two CDFs
+def ks_distance(expected, actual) -> float:
+    return float(np.max(np.abs(np.cumsum(_shares(expected)) - np.cumsum(_shares(actual)))))
+
+
+# counts: one bin count list per feature, as FeatureHistograms.count_lists returns them
+def drift_report(
+        reference: dict,
+        counts,
+        rows: int,
+        *,
+        psi_alert: float = DEFAULT_PSI_ALERT,
+    ) -> dict:
+
+    features = {}
+    for name, expected, actual in zip(reference["features"], reference["counts"], counts):
+        if rows == 0:
+            features[name] = {"psi": None, "ks": None}
+            continue
+        features[name] = {"psi": psi(expected, actual), "ks": ks_distance(expected, actual)}
+    scored = [f for f in features.values() if f["psi"] is not None]
+    return {
+        "rows": int(rows),
+        "reference_rows": int(reference.get("rows", 0)),
+        "max_psi": max((f["psi"] for f in scored), default=None),
+        "drifted": [
+            name for name, f in features.items() if f["psi"] is not None and f["psi"] > psi_alert
+        ],
+        "features": features,
+    }
+
+
+# report over several days plus a line per day, daily maps day -> FeatureHistograms
+def window_report(reference: dict, daily: dict, *, psi_alert: float = DEFAULT_PSI_ALERT) -> dict:
+    total = FeatureHistograms(reference["edges"])
+    days = []
+    for day in sorted(daily):
+        histograms = daily[day]
+        total.merge(histograms)
+        report = drift_report(
+            reference, histograms.count_lists(), histograms.rows, psi_alert=psi_alert
+        )
+        days.append({
+            "day": day.isoformat(),
+            "rows": report["rows"],
+            "max_psi": report["max_psi"],
+            "drifted": report["drifted"],
+        })
+    return {
+        **drift_report(reference, total.count_lists(), total.rows, psi_alert=psi_alert),
+        "days": days,
+    }
+
+
+class DriftMonitor:
+    def __init__(
+            self,
+            flusher=None,
+            *,
+            max_pending: int = DEFAULT_MAX_PENDING,
+            flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+        ):
+        # async (day, model_version, FeatureHistograms) -> None, see feature_histogram_flusher
+        self.flusher = flusher
+        self.max_pending = max(1, int(max_pending))
+        self.flush_seconds = float(flush_seconds)
+        # (day, model_version) -> counts not flushed yet
+        self.pending: dict[tuple[date, str], FeatureHistograms] = {}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.create_task(self._run(), name="fraud-drift-monitor")
+            self._flush_task = asyncio.create_task(self._flush_loop(), name="fraud-drift-flush")
+
+    # bins what is already queued, flushes it, then stops
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            await self._queue.put(None)
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = self._flush_task = self._queue = None
+        await self.flush()
+
+    # waits until every batch submitted so far is binned
+    async def drain(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    # whether submit would take a batch scored with this bundle, so the caller only
+    # builds the feature matrix when it is wanted
+    def accepts(self, feature_state) -> bool:
+        return self._queue is not None and reference_of(feature_state) is not None
+
+    # X is the batch's base feature columns (the first NUMBER_FEATURES of
+    # build_feature_matrix), built once by the scoring path; never waits, False when
+    # the bundle has no reference, the monitor isn't running or it's too far behind
+    def submit(self, model_version: str | None, X, feature_state) -> bool:
+        reference = reference_of(feature_state)
+        if self._queue is None or reference is None or len(X) == 0:
+            return False
+        try:
+            self._queue.put_nowait((model_version or "unknown", X, reference))
+        except asyncio.QueueFull:
+            metrics.DRIFT_DROPPED.inc(len(X))
+            return False
+        return True
+
+    def add(self, model_version: str, reference: dict, X, day: date | None = None) -> None:
+        key = (day or datetime.now(timezone.utc).date(), model_version)
+        histograms = self.pending.get(key)
+        if histograms is None:
+            histograms = self.pending[key] = FeatureHistograms(reference["edges"])
+        histograms.update(X)
+
+    # this process's unflushed counts for a version, by day
+    def pending_for(self, model_version: str) -> dict[date, FeatureHistograms]:
+        return {day: h for (day, version), h in self.pending.items() if version == model_version}
+
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        for (day, version), histograms in pending.items():
+            try:
+                await self.flusher(day, version, histograms)
+            except Exception:
+                logger.exception("feature histogram flush failed for %s %s", version, day)
+                # counts binned while this flush was awaiting went to a fresh histogram
+                self.pending[(day, version)] = histograms.merge(self.pending.get((day, version)))
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                model_version, X, reference = item
+                self.add(model_version, reference, X)
+            except Exception:
+                metrics.DRIFT_DROPPED.inc(len(item[1]))
+                logger.exception(
+                    "feature histogram update failed for %d transactions", len(item[1])
+                )
+            finally:
+                self._queue.task_done()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+# process wide monitor, the app lifespan sets it up
+_active_monitor: DriftMonitor | None = None
+
+
+def get_drift_monitor() -> DriftMonitor | None:
+    return _active_monitor
+
+
+def set_drift_monitor(monitor: DriftMonitor | None) -> None:
+    global _active_monitor
+    _active_monitor = monitor
@@ -0,0 +1,394 @@
+import argparse
+import asyncio
+import logging
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fraud_detection import metrics
+
+logger = logging.getLogger(__name__)
+
+# several detectors in one bundle: models["isolation_forest"] stays the primary and
+# models["detectors"] holds the extra ones (anything with score_samples, higher = more
+# normal, e.g. LocalOutlierFactor(novelty=True)). models["ensemble"] is plain JSON:
+#   detectors   names in scoring order, the primary first
+#   combine     "rank_average" or "max"
+#   reference   per detector, REFERENCE_POINTS quantiles of its training anomaly scores
+#   fraud_threshold  combined score above which a row counts as suspected
+#   primary_thresholds  fraud_threshold / LOW_RISK_MAX / HIGH_RISK_MIN calibrated on the
+#               primary's rank alone, used while a detector sits out
+#   budgets     per extra detector, max_ms_per_1k and max_bytes
+# Each detector scores the same scaled matrix on its own thread (sklearn's tree walks
+# and neighbor queries release the GIL), its scores become ranks in its own training
+# distribution and the ranks are averaged or maxed into a 0..1 fraud score. The risk
+# thresholds in feature_state are calibrated on that combined score.
+# Budgets are checked when the ensemble is built, memory again when a bundle loads
+# (the registry refuses it), and latency on every batch: a detector whose running cost
+# goes over budget sits out the next DEFAULT_SKIP_BATCHES batches, counted on /metrics.
+# The combined thresholds only hold for the full ensemble, so while any detector sits
+# out the batch is scored by the primary's rank alone against primary_thresholds
+
+PRIMARY = "isolation_forest"
+COMBINE_RULES = ("rank_average", "max")
+DEFAULT_COMBINE = "rank_average"
+DETECTOR_KINDS = ("lof",)
+REFERENCE_POINTS = 1001
+DEFAULT_MAX_MS_PER_1K = 50.0
+DEFAULT_MAX_MB = 64.0
+DEFAULT_SKIP_BATCHES = 50
+# weight of the newest batch in a detector's running latency
+LATENCY_SMOOTHING = 0.2
+# batches smaller than this get the same time allowance as one this size
+BUDGET_ROWS = 1000
+DEFAULT_LOF_NEIGHBORS = 20
+# LOF keeps its training rows and compares every scored row with all of them (brute
+# force beats a KD-tree on 12 dims), 4k rows is about 35 ms per 1000 scored rows
+DEFAULT_MAX_FIT_ROWS = 4_000
+MAX_DETECTOR_THREADS = 4
+DEFAULT_LOW_QUANTILE = 0.90
+DEFAULT_HIGH_QUANTILE = 0.98
+
+
+def is_ensemble(models) -> bool:
+    return bool(models.get("ensemble"))
+
+
+# name -> model in scoring order, the primary forest first
+def detector_models(models) -> dict:
+    names = models["ensemble"]["detectors"] if is_ensemble(models) else [PRIMARY]
+    extra = models.get("detectors") or {}
+    return {name: models[PRIMARY] if name == PRIMARY else extra[name] for name in names}
+
+
+# where each score falls in the detector's training scores, 0..1
+def to_rank(scores: np.ndarray, grid) -> np.ndarray:
+    grid = np.asarray(grid, dtype=float)
+    return np.interp(scores, grid, np.linspace(0.0, 1.0, len(grid)))
+
+
+def combine_ranks(ranks: list[np.ndarray], rule: str) -> np.ndarray:
+    if rule == "rank_average":
+        return np.mean(ranks, axis=0)
+    if rule == "max":
+        return np.max(ranks, axis=0)
+    raise ValueError(f"unknown combine rule '{rule}', expected one of {COMBINE_RULES}")
+
+
+# running latency per detector, keyed by the model object so a promoted bundle starts fresh
+class LatencyGuard:
+    def __init__(self, max_ms_per_1k: float, *, skip_batches: int = DEFAULT_SKIP_BATCHES):
+        self.max_ms_per_1k = float(max_ms_per_1k)
+        self.skip_batches = max(1, int(skip_batches))
+        self.ms_per_1k: float | None = None
+        self.skip_left = 0
+        self._lock = threading.Lock()
+
+    # False while the detector is sitting out batches; the batch after that is a probe
+    def allow(self) -> bool:
+        with self._lock:
+            if self.skip_left > 0:
+                self.skip_left -= 1
+                return False
+            return True
+
+    def record(self, seconds: float, rows: int) -> bool:
+        ms_per_1k = seconds * 1000.0 * BUDGET_ROWS / max(rows, BUDGET_ROWS)
+        with self._lock:
+            if self.ms_per_1k is None:
+                self.ms_per_1k = ms_per_1k
+            else:
+                self.ms_per_1k += LATENCY_SMOOTHING * (ms_per_1k - self.ms_per_1k)
+            over = self.ms_per_1k > self.max_ms_per_1k
+            if over:
+                self.skip_left = self.skip_batches
+                # the probe after the break starts from its own timing
+                self.ms_per_1k = None
+            return over
+
+
+_guards: "weakref.WeakKeyDictionary[object, LatencyGuard]" = weakref.WeakKeyDictionary()
+_guards_lock = threading.Lock()
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _guard(model, budget: dict) -> LatencyGuard:
+    with _guards_lock:
+        guard = _guards.get(model)
+        if guard is None:
+            guard = _guards[model] = LatencyGuard(
+                budget.get("max_ms_per_1k", DEFAULT_MAX_MS_PER_1K)
+            )
+        return guard
+
+
+def _detector_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(MAX_DETECTOR_THREADS, thread_name_prefix="fraud-detector")
+        return _pool
+
+
+def _anomaly_scores(model, data) -> tuple[np.ndarray, float]:
+    started = time.perf_counter()
+    scores = -np.asarray(model.score_samples(data), dtype=float)
+    return scores, time.perf_counter() - started
+
+
+# the primary's own cut-offs on its rank; bundles built before they were stored get the
+# quantile levels, the primary's rank is uniform over the sample it was calibrated on
+def primary_thresholds(models) -> dict:
+    stored = models["ensemble"].get("primary_thresholds")
+    if stored:
+        return stored
+    contamination = float(models.get("contamination") or 0.02)
+    return {
+        "fraud_threshold": 1.0 - contamination,
+        "LOW_RISK_MAX": DEFAULT_LOW_QUANTILE,
+        "HIGH_RISK_MIN": DEFAULT_HIGH_QUANTILE,
+    }
+
+
+# combined 0..1 fraud score per row, the suspected cut-off and the risk thresholds to
+# tier it with (None for the bundle's own); the extra detectors run on the pool while
+# the primary forest scores on the calling thread. A batch where any detector sits out
+# is scored by the primary alone, with the primary's thresholds
+def ensemble_scores(data, models) -> tuple[np.ndarray, float, dict | None]:
+    config = models["ensemble"]
+    budgets = config.get("budgets") or {}
+    rows = len(data)
+
+    extra = {name: model for name, model in detector_models(models).items() if name != PRIMARY}
+    sitting_out = [
+        name for name, model in extra.items()
+        if not _guard(model, budgets.get(name) or {}).allow()
+    ]
+    futures = {}
+    for name in sitting_out:
+        metrics.DETECTOR_SKIPPED.labels(name).inc(rows)
+    if not sitting_out:
+        futures = {
+            name: _detector_pool().submit(_anomaly_scores, model, data)
+            for name, model in extra.items()
+        }
+
+    primary_scores, seconds = _anomaly_scores(models[PRIMARY], data)
+    metrics.DETECTOR_SECONDS.labels(PRIMARY).observe(seconds)
+    ranks = [to_rank(primary_scores, config["reference"][PRIMARY])]
+    if sitting_out:
+        metrics.ENSEMBLE_FALLBACK.inc(rows)
+        thresholds = primary_thresholds(models)
+        return ranks[0], float(thresholds["fraud_threshold"]), thresholds
+    for name, future in futures.items():
+        scores, seconds = future.result()
+        metrics.DETECTOR_SECONDS.labels(name).observe(seconds)
+        model = models["detectors"][name]
+        if _guard(model, budgets.get(name) or {}).record(seconds, rows):
+            logger.warning(
+                "fraud detector %s is over its latency budget, skipping it for %d batches",
+                name, DEFAULT_SKIP_BATCHES,
+            )
+        ranks.append(to_rank(scores, config["reference"][name]))
+    return combine_ranks(ranks, config["combine"]), float(config["fraud_threshold"]), None
+
+
+# refuses a bundle whose extra detectors don't fit their memory budget, measure is
+# model -> bytes (the registry passes estimate_nbytes)
+def check_memory_budgets(models, measure) -> dict:
+    if not is_ensemble(models):
+        return {}
+    budgets = models["ensemble"].get("budgets") or {}
+    sizes = {}
+    for name, model in (models.get("detectors") or {}).items():
+        sizes[name] = int(measure(model))
+        max_bytes = (budgets.get(name) or {}).get("max_bytes")
+        if max_bytes is not None and sizes[name] > max_bytes:
+            raise ValueError(
+                f"fraud detector {name} needs {sizes[name]} bytes, its budget is {max_bytes}"
+            )
+    return sizes
+
+
+def _lof(X, *, neighbors: int = DEFAULT_LOF_NEIGHBORS, n_jobs=None, **_):
+    from sklearn.neighbors import LocalOutlierFactor
+
+    return LocalOutlierFactor(
+        n_neighbors=neighbors, novelty=True, algorithm="brute", n_jobs=n_jobs
+    ).fit(X)
+
+
+DETECTOR_FACTORIES = {"lof": _lof}
+
+
+# the best of `repeats` timings of a detector on BUDGET_ROWS rows, in ms
+def _time_detector(model, X, repeats: int = 3) -> float:
+    sample = X[:BUDGET_ROWS]
+    best = min(_anomaly_scores(model, sample)[1] for _ in range(max(1, repeats)))
+    return best * 1000.0 * BUDGET_ROWS / max(len(sample), 1)
+
+
+# fits the extra detectors on X (the scaled training sample), calibrates the combined
+# score and checks every detector against its budget; returns the new bundle and a report
+def build_ensemble(
+        feature_state,
+        models,
+        X: np.ndarray,
+        *,
+        detectors=("lof",),
+        combine: str = DEFAULT_COMBINE,
+        contamination: float | None = None,
+        low_quantile: float = DEFAULT_LOW_QUANTILE,
+        high_quantile: float = DEFAULT_HIGH_QUANTILE,
+        max_ms_per_1k: float = DEFAULT_MAX_MS_PER_1K,
+        max_mb: float = DEFAULT_MAX_MB,
+        max_fit_rows: int = DEFAULT_MAX_FIT_ROWS,
+        random_state: int = 42,
+        log=print,
+    ) -> tuple[dict, dict, dict]:
+
+    # the registry module imports prediction, which imports this one
+    from fraud_detection.model_registry import estimate_nbytes
+
+    if combine not in COMBINE_RULES:
+        raise ValueError(f"unknown combine rule '{combine}', expected one of {COMBINE_RULES}")
+    unknown = [d for d in detectors if d not in DETECTOR_FACTORIES]
+    if unknown or not detectors:
+        raise ValueError(f"detectors must be some of {DETECTOR_KINDS}, got {list(detectors)}")
+    contamination = float(contamination or models.get("contamination") or 0.02)
+
+    rng = np.random.default_rng(random_state)
+    fit_rows = X if len(X) <= max_fit_rows else X[np.sort(rng.choice(len(X), max_fit_rows, False))]
+    extra = {}
+    report = {"detectors": {}}
+    budget = {"max_ms_per_1k": float(max_ms_per_1k), "max_bytes": int(max_mb * 1024 * 1024)}
+    for kind in detectors:
+        started = time.perf_counter()
+        model = DETECTOR_FACTORIES[kind](fit_rows)
+        ms_per_1k = _time_detector(model, X)
+        nbytes = int(estimate_nbytes(model))
+        report["detectors"][kind] = {
+            "fit_rows": len(fit_rows),
+            "fit_seconds": time.perf_counter() - started,
+            "ms_per_1k": ms_per_1k,
+            "bytes": nbytes,
+        }
+        log(f"[{kind}] {ms_per_1k:.1f} ms per {BUDGET_ROWS} rows, {nbytes / 1e6:.1f} MB")
+        if ms_per_1k > budget["max_ms_per_1k"]:
+            raise ValueError(
+                f"{kind} takes {ms_per_1k:.1f} ms per {BUDGET_ROWS} rows, "
+                f"budget {budget['max_ms_per_1k']}"
+            )
+        if nbytes > budget["max_bytes"]:
+            raise ValueError(f"{kind} needs {nbytes} bytes, budget {budget['max_bytes']}")
+        extra[kind] = model
+
+    names = [PRIMARY, *extra]
+    scores = {PRIMARY: _anomaly_scores(models[PRIMARY], X)[0]}
+    scores.update({name: _anomaly_scores(model, X)[0] for name, model in extra.items()})
+    reference = {
+        name: np.quantile(s, np.linspace(0.0, 1.0, REFERENCE_POINTS)).tolist()
+        for name, s in scores.items()
+    }
+    combined = combine_ranks([to_rank(scores[n], reference[n]) for n in names], combine)
+    primary = to_rank(scores[PRIMARY], reference[PRIMARY])
+
+    config = {
+        "detectors": names,
+        "combine": combine,
+        "reference": reference,
+        "fraud_threshold": float(np.quantile(combined, 1.0 - contamination)),
+        "primary_thresholds": {
+            "fraud_threshold": float(np.quantile(primary, 1.0 - contamination)),
+            "LOW_RISK_MAX": float(np.quantile(primary, low_quantile)),
+            "HIGH_RISK_MIN": float(np.quantile(primary, high_quantile)),
+        },
+        "budgets": {name: dict(budget) for name in extra},
+    }
+    feature_state = {
+        **feature_state,
+        "risk_thresholds": {
+            "LOW_RISK_MAX": float(np.quantile(combined, low_quantile)),
+            "HIGH_RISK_MIN": float(np.quantile(combined, high_quantile)),
+        },
+    }
+    models = {**models, "detectors": extra, "ensemble": config}
+    report.update({
+        "combine": combine,
+        "fraud_threshold": config["fraud_threshold"],
+        "risk_thresholds": feature_state["risk_thresholds"],
+        "sample_rows": len(X),
+    })
+    return feature_state, models, report
+
+
+# python -m fraud_detection.ensemble <bundle> --output-dir fraud_detection/models
+def main(argv=None) -> int:
+    from fraud_detection.compact_model import export_compact_bundle
+    from fraud_detection.model_registry import bundle_version
+    from fraud_detection.prediction import load_pipeline
+    from fraud_detection.train import save_training_bundle
+    from fraud_detection.variants import DEFAULT_SAMPLE_ROWS, _sample_from_db
+
+    parser = argparse.ArgumentParser(
+        prog="python -m fraud_detection.ensemble",
+        description="Add detectors next to a bundle's forest and save it as a new version.",
+    )
+    parser.add_argument("model", help="bundle whose forest stays the primary detector")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--version", default=None)
+    parser.add_argument("--detectors", default="lof",
+                        help=f"comma separated, any of {','.join(DETECTOR_KINDS)}")
+    parser.add_argument("--combine", choices=COMBINE_RULES, default=DEFAULT_COMBINE)
+    parser.add_argument("--max-ms-per-1k", type=float, default=DEFAULT_MAX_MS_PER_1K,
+                        help=f"latency budget per detector for {BUDGET_ROWS} rows")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help="memory budget per detector")
+    parser.add_argument("--sample-rows", type=int, default=DEFAULT_SAMPLE_ROWS)
+    parser.add_argument("--format", choices=("mmap", "joblib"), default="mmap")
+    args = parser.parse_args(argv)
+
+    feature_state, models = export_compact_bundle(*load_pipeline(args.model))
+    try:
+        X, _ = asyncio.run(_sample_from_db(feature_state, sample_rows=max(1, args.sample_rows)))
+        feature_state, models, report = build_ensemble(
+            feature_state, models, X,
+            detectors=[d.strip() for d in args.detectors.split(",") if d.strip()],
+            combine=args.combine, max_ms_per_1k=args.max_ms_per_1k, max_mb=args.max_mb,
+        )
+    except ValueError as e:
+        print(e)
+        return 1
+
+    source_version = bundle_version(args.model)
+    version = args.version or (
+        f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{'-'.join(models['detectors'])}"
+    )
+    metadata = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "source_model": args.model,
+        "source_version": source_version,
+        "ensemble": report,
+    }
+    try:
+        path = save_training_bundle(
+            feature_state, models, metadata, args.output_dir, version, bundle_format=args.format,
+        )
+    except FileExistsError as e:
+        print(e)
+        return 1
+    print(f"saved {source_version} + {', '.join(models['detectors'])} as {version} to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    # this may needs to be done for any asyncio.run because issues with windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from fraud_detection.features import NUMBER_FEATURES, PROFILE_COLUMNS, feature_count, uses_profiles
+from fraud_detection.prediction import predict_batch, score_matrix
+
+# low latency scorer for a handful of transactions at a time (POST /fraud/score)
+# everything that doesn't depend on the transaction is computed once per bundle:
+# merchant / channel codes with their z-score stats, the scaler as plain arrays and
+# the risk thresholds; a row then costs a few dict lookups and one pass over the trees
+# values match predict_batch exactly, bigger batches go through it directly
+
+# past this many rows the vectorized build_feature_matrix path is faster
+MAX_ROW_LOOP = 64
+MAX_CACHED_DATES = 10_000
+
+
+class FastScorer:
+    def __init__(self, feature_state, models):
+        self.feature_state = feature_state
+        self.models = models
+        self.n_features = feature_count(feature_state)
+        self.profile_columns = PROFILE_COLUMNS if uses_profiles(feature_state) else ()
+
+        thresholds = feature_state.get('risk_thresholds', {})
+        self.low_risk_max = thresholds.get('LOW_RISK_MAX')
+        self.high_risk_min = thresholds.get('HIGH_RISK_MIN')
+
+        merchant_classes = feature_state['merchant_encoder'].classes_.tolist()
+        channel_classes = feature_state['channel_encoder'].classes_.tolist()
+        if 'Unknown' not in merchant_classes or 'online' not in channel_classes:
+            raise ValueError("encoders are missing the 'Unknown' / 'online' fallback classes")
+        self.channel_codes = {c: i for i, c in enumerate(channel_classes)}
+
+        # merchant -> (code, mean, denom), mean is None when the bundle has no stats for it
+        mean_merchant = feature_state['merchant_mean']
+        std_merchant = feature_state['merchant_std']
+        self.merchants = {}
+        for code, merchant in enumerate(merchant_classes):
+            if merchant in mean_merchant:
+                m_std = float(std_merchant.get(merchant, 0.0))
+                denom = (m_std if m_std and m_std > 0 else 1.0) + 1e-6
+                self.merchants[merchant] = (code, float(mean_merchant[merchant]), denom)
+            else:
+                self.merchants[merchant] = (code, None, None)
+        self.unknown_merchant = self.merchants['Unknown']
+        self.online_code = self.channel_codes['online']
+
+        # None means the row's own amount, same as create_row without a saved global mean
+        g_mean = feature_state.get('global_amount_mean')
+        self.global_mean = float(g_mean) if 'global_amount_mean' in feature_state else None
+        g_std = float(feature_state.get('global_amount_std', 1.0))
+        self.global_denom = (g_std if g_std and g_std > 0 else 1.0) + 1e-6
+
+        scaler = feature_state['scaler']
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        n = self.n_features
+        self.scale_mean = np.zeros(n) if mean is None else np.asarray(mean, dtype=float)
+        self.scale_std = np.ones(n) if scale is None else np.asarray(scale, dtype=float)
+
+        self._dates: dict = {}
+
+    # (score, is_suspected, risk_tier) per transaction dict; merchant_stats is an
+    # optional MerchantStatsSnapshot whose live stats replace the bundle's ones
+    def score(self, transactions, merchant_stats=None) -> list[tuple[float, bool, str]]:
+        if len(transactions) > MAX_ROW_LOOP:
+            batch = [dict(txn) for txn in transactions]
+            if merchant_stats is not None:
+                merchant_stats.annotate(batch)
+            return predict_batch(batch, self.feature_state, self.models)
+        if not transactions:
+            return []
+
+        data = self.features(transactions, merchant_stats)
+        data -= self.scale_mean
+        data /= self.scale_std
+        return score_matrix(data, self.models, self.low_risk_max, self.high_risk_min)
+
+    # per row equivalent of build_feature_matrix / create_row
+    def features(self, transactions, merchant_stats=None) -> np.ndarray:
+        data = np.zeros((len(transactions), self.n_features))
+        for i, txn in enumerate(transactions):
+            row = data[i]
+            amount = float(txn.get('amount', 0.0))
+            row[0] = amount
+            # same as max(amount, 0.0), keeps nan and -0.0 the way the builtin does
+            row[1] = 0.0 if amount < 0.0 else math.log1p(amount)
+            row[2:7] = self._date_row(txn.get('date'))
+
+            merchant = txn.get('merchant_name', 'Unknown')
+            code, m_mean, m_denom = self.merchants.get(merchant) or self.unknown_merchant
+            row[7] = code
+            channel = txn.get('payment_channel', 'online')
+            row[8] = self.channel_codes.get(channel, self.online_code)
+            row[9] = 1.0 if txn.get('pending', False) else 0.0
+
+            live = merchant_stats.get(merchant) if merchant_stats is not None else None
+            if live is not None:
+                live_std = live[1]
+                denom = (live_std if live_std > 0 else 1.0) + 1e-6
+                z = (amount - live[0]) / denom
+            elif m_mean is not None:
+                z = (amount - m_mean) / m_denom
+            else:
+                g_mean = amount if self.global_mean is None else self.global_mean
+                z = (amount - g_mean) / self.global_denom
+            z = min(max(z, -5.0), 5.0) if not math.isnan(z) else z
+            row[10] = z
+            row[11] = abs(z)
+
+            for j, column in enumerate(self.profile_columns):
+                value = txn.get(column)
+                if value is not None and math.isfinite(value):
+                    row[NUMBER_FEATURES + j] = value
+        return data
+
+    def _date_row(self, value):
+        if isinstance(value, datetime) and not pd.isna(value):
+            return _date_parts(value, value.hour)
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return _date_parts(value, 0)
+
+        # string dates repeat a lot, each distinct value is parsed once
+        key = value if isinstance(value, str) else None
+        parts = self._dates.get(key) if key is not None else None
+        if parts is None:
+            dt = _parse_date(value)
+            if pd.isna(dt):
+                # create_row scores unparseable and missing dates as right now, never cached
+                now = datetime.utcnow()
+                return _date_parts(now, now.hour)
+            parts = _date_parts(dt, dt.hour)
+            if key is not None:
+                if len(self._dates) >= MAX_CACHED_DATES:
+                    self._dates.clear()
+                self._dates[key] = parts
+        return parts
+
+
+# ISO strings (what Plaid and the API send) parse the same with fromisoformat, in
+# microseconds instead of pd.to_datetime's tenths of a millisecond
+def _parse_date(value):
+    if isinstance(value, str) and value[4:5] == '-':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return pd.to_datetime(value, errors='coerce')
+
+
+def _date_parts(dt, hour):
+    weekday = dt.weekday()
+    return (weekday, dt.day, dt.month, hour, 1 if weekday >= 5 else 0)
+
@@ -0,0 +1,224 @@
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+NUMBER_FEATURES = 12
+# columns of build_feature_matrix, in order
+BASE_FEATURE_NAMES = (
+    'amount', 'log_amount', 'day_of_week', 'day', 'month', 'hour', 'is_weekend',
+    'merchant_code', 'channel_code', 'pending', 'merchant_amount_z', 'abs_merchant_amount_z',
+)
+# bundles whose feature_state has feature_version >= 2 also read the user profile
+# features (see user_profile.py), appended after the 12 base features
+BEHAVIORAL_FEATURE_VERSION = 2
+PROFILE_COLUMNS = (
+    'user_amount_z', 'user_merchant_share', 'user_txn_1h', 'user_txn_24h', 'user_txn_7d',
+)
+
+# column name -> value used by create_row when the key is missing
+FEATURE_COLUMNS = ('amount', 'date', 'merchant_name', 'payment_channel', 'pending')
+# optional live merchant stats (see merchant_stats.py), rows without them use the bundle's stats
+LIVE_STATS_COLUMNS = ('merchant_amount_mean', 'merchant_amount_std')
+OPTIONAL_COLUMNS = LIVE_STATS_COLUMNS + PROFILE_COLUMNS
+
+
+def uses_profiles(state) -> bool:
+    return int(state.get('feature_version', 1)) >= BEHAVIORAL_FEATURE_VERSION
+
+
+def feature_count(state) -> int:
+    return NUMBER_FEATURES + (len(PROFILE_COLUMNS) if uses_profiles(state) else 0)
+
+
+# columnar version of create_row, builds the whole (n, 12) matrix for a batch, (n, 17)
+# for behavioral bundles where missing profile columns count as 0
+# accepts a DataFrame, a dict of column -> array or a list of transaction dicts
+# every column is computed so the values match create_row exactly for the same input
+def build_feature_matrix(data, state):
+    columns, n = _to_columns(data)
+    if n == 0:
+        return np.zeros((0, feature_count(state)))
+
+    amount = _amount_feature(columns.get('amount'), n)
+    dates = _date_features(columns.get('date'), n)
+
+    merchant_encoder = state['merchant_encoder']
+    channel_encoder = state['channel_encoder']
+
+    merchant_codes = _encode(columns.get('merchant_name'), merchant_encoder, 'Unknown', n)
+    channel_codes = _encode(columns.get('payment_channel'), channel_encoder, 'online', n)
+
+    pending = _truthy(columns.get('pending'), n)
+    z = _zscore(amount, merchant_codes, merchant_encoder.classes_, state)
+    if columns.get('merchant_amount_mean') is not None:
+        z = _live_zscore(
+            z, amount, columns['merchant_amount_mean'], columns.get('merchant_amount_std')
+        )
+
+    matrix = np.empty((n, feature_count(state)), dtype=float)
+    matrix[:, 0] = amount
+    # same as max(amount, 0.0), keeps nan and -0.0 the way the builtin does
+    matrix[:, 1] = np.log1p(np.where(0.0 > amount, 0.0, amount))
+    matrix[:, 2:7] = dates
+    matrix[:, 7] = merchant_codes
+    matrix[:, 8] = channel_codes
+    matrix[:, 9] = pending
+    matrix[:, 10] = z
+    matrix[:, 11] = np.abs(z)
+    if uses_profiles(state):
+        for i, c in enumerate(PROFILE_COLUMNS):
+            values = columns.get(c)
+            matrix[:, NUMBER_FEATURES + i] = 0.0 if values is None else np.nan_to_num(
+                np.asarray(values, dtype=float), nan=0.0, posinf=0.0, neginf=0.0
+            )
+    return matrix
+
+
+def _to_columns(data):
+    if isinstance(data, pd.DataFrame):
+        columns = {
+            c: data[c].to_numpy() for c in FEATURE_COLUMNS + OPTIONAL_COLUMNS if c in data.columns
+        }
+        return columns, len(data)
+
+    if isinstance(data, Mapping):
+        columns = {c: np.asarray(data[c]) for c in FEATURE_COLUMNS + OPTIONAL_COLUMNS if c in data}
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("feature columns must all be the same length")
+        return columns, (lengths.pop() if lengths else 0)
+
+    # list of transaction dicts, a key missing from a row gets the create_row default
+    rows = list(data or [])
+    defaults = {
+        'amount': 0.0,
+        'date': None,
+        'merchant_name': 'Unknown',
+        'payment_channel': 'online',
+        'pending': False,
+    }
+    columns = {}
+    for c in FEATURE_COLUMNS:
+        values = np.empty(len(rows), dtype=object)
+        values[:] = [row.get(c, defaults[c]) for row in rows]
+        columns[c] = values
+    for c in OPTIONAL_COLUMNS:
+        if any(c in row for row in rows):
+            columns[c] = np.array([row.get(c) for row in rows], dtype=float)
+    return columns, len(rows)
+
+
+def _amount_feature(values, n):
+    if values is None:
+        return np.zeros(n)
+    return np.asarray(values, dtype=float)
+
+
+def _date_row(dt):
+    return (dt.dayofweek, dt.day, dt.month, dt.hour, 1 if dt.dayofweek >= 5 else 0)
+
+
+# dates repeat a lot in a batch, so each distinct value is parsed once with the
+# same scalar pd.to_datetime call create_row uses and then gathered back per row
+def _date_features(values, n):
+    now = pd.Timestamp(datetime.utcnow())
+
+    if values is None:
+        return np.tile(np.array(_date_row(now), dtype=float), (n, 1))
+
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        index = pd.DatetimeIndex(values)
+        missing = np.asarray(index.isna())
+        out = np.column_stack([
+            index.dayofweek, index.day, index.month, index.hour,
+            (index.dayofweek >= 5).astype(int),
+        ]).astype(float)
+        out[missing] = _date_row(now)
+        return out
+
+    codes, uniques = pd.factorize(values)
+    table = np.empty((len(uniques) + 1, 5), dtype=float)
+    for i, value in enumerate(uniques):
+        dt = pd.to_datetime(value, errors='coerce')
+        if pd.isna(dt):
+            dt = now
+        table[i] = _date_row(dt)
+
+    # missing values get code -1 which lands on the fallback row
+    table[-1] = _date_row(now)
+    return table[codes]
+
+
+# vectorized LabelEncoder.transform, unseen or missing values use the fallback class
+def _encode(values, encoder, fallback, n):
+    index = pd.Index(encoder.classes_)
+    if fallback not in index:
+        raise ValueError(f"y contains previously unseen labels: ['{fallback}']")
+    fallback_code = index.get_loc(fallback)
+
+    if values is None:
+        return np.full(n, fallback_code, dtype=np.intp)
+
+    codes = index.get_indexer(np.asarray(values, dtype=object))
+    codes[codes < 0] = fallback_code
+    return codes
+
+
+def _truthy(values, n):
+    if values is None:
+        return np.zeros(n)
+
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values.astype(float)
+    if values.dtype.kind in 'iuf':
+        # nan != 0 is True which matches bool(nan)
+        return (values != 0).astype(float)
+    return np.fromiter((1.0 if bool(v) else 0.0 for v in values), dtype=float, count=n)
+
+
+def _zscore(amount, merchant_codes, classes, state):
+    mean_merchant = state['merchant_mean']
+    std_merchant = state['merchant_std']
+
+    # merchant stats only need looking up once for each merchant in the batch
+    uniq_codes, inverse = np.unique(merchant_codes, return_inverse=True)
+    has_stats = np.zeros(len(uniq_codes), dtype=bool)
+    m_mean = np.zeros(len(uniq_codes))
+    m_denom = np.ones(len(uniq_codes))
+    for i, code in enumerate(uniq_codes):
+        merchant = classes[code]
+        if merchant in mean_merchant:
+            has_stats[i] = True
+            m_mean[i] = float(mean_merchant[merchant])
+            m_std = float(std_merchant.get(merchant, 0.0))
+            m_denom[i] = m_std if m_std and m_std > 0 else 1.0
+
+    # create_row falls back to the row's own amount when no global mean was saved
+    if 'global_amount_mean' in state:
+        g_mean = float(state['global_amount_mean'])
+    else:
+        g_mean = amount
+    g_std = float(state.get('global_amount_std', 1.0))
+    g_denom = g_std if g_std and g_std > 0 else 1.0
+
+    with np.errstate(invalid='ignore'):
+        merchant_z = (amount - m_mean[inverse]) / (m_denom[inverse] + 1e-6)
+        global_z = (amount - g_mean) / (g_denom + 1e-6)
+        z = np.where(has_stats[inverse], merchant_z, global_z)
+    return np.clip(z, -5.0, 5.0)
+
+
+# rows carrying live merchant stats get their z-score from those, same formula as above
+def _live_zscore(z, amount, live_mean, live_std):
+    live_mean = np.asarray(live_mean, dtype=float)
+    live_std = np.zeros(len(live_mean)) if live_std is None else np.asarray(live_std, dtype=float)
+    has_live = np.isfinite(live_mean)
+    denom = np.where(np.isfinite(live_std) & (live_std > 0), live_std, 1.0)
+
+    with np.errstate(invalid='ignore'):
+        live_z = np.clip((amount - live_mean) / (denom + 1e-6), -5.0, 5.0)
+    return np.where(has_live, live_z, z)
@@ -0,0 +1,48 @@
+import hashlib
+
+# stable 64 bit hash of everything the model reads for one transaction plus the
+# model version, stored next to the score so an unchanged transaction (a Plaid
+# "modified" event that only touched name or category, a pending -> posted merge
+# with the same amount and merchant) is not scored again
+# live merchant stats are left out on purpose, they drift slowly and a new
+# model version (or seed.rescore) picks the drift up
+# the user profile snapshot taken at insert (transactions.profile_features) is part
+# of it when the row has one, rows without one read the profile as it is now, see
+# fingerprint_rows
+
+FINGERPRINT_VERSION = "1"
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+# the same transaction hashes the same whether amount is a Decimal from the db or a
+# float from the Plaid payload and whether date is a date or its iso string
+def feature_fingerprint(
+        amount,
+        payment_channel,
+        pending,
+        txn_date,
+        merchant_name,
+        model_version,
+        profile_features=None,
+) -> int:
+
+    key = "\x1f".join((
+        FINGERPRINT_VERSION,
+        f"{float(amount or 0.0):.2f}",
+        _text(payment_channel),
+        "1" if pending else "0",
+        _text(txn_date),
+        _text(merchant_name),
+        _text(model_version),
+        ",".join(f"{float(v):.6f}" for v in profile_features or ()),
+    ))
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    # signed so it fits a postgres BIGINT
+    return int.from_bytes(digest, "big", signed=True)
@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fraud_detection import metrics
+from fraud_detection.compact_model import export_compact_bundle
+from fraud_detection.prediction import load_pipeline, predict_batch
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ("inline", "thread", "process")
+DEFAULT_BATCH_MAX_ROWS = 1000
+DEFAULT_BATCH_MAX_WAIT_MS = 2.0
+
+
+# runs predict_batch for the fraud service, the mode decides where the CPU work happens
+#   inline  - on the event loop (tests, scripts)
+#   thread  - thread pool, sklearn releases the GIL for most of the tree walk
+#   process - process pool with the bundle preloaded in every worker
+# max_pending bounds how many batches can be submitted at once, extra callers wait
+class InferenceExecutor:
+    mode = "inline"
+
+    def __init__(self, *, max_pending: int = 8):
+        self.max_pending = max(1, int(max_pending))
+        self._slots: asyncio.Semaphore | None = None
+        # batches holding a slot right now, reported on /metrics
+        self.in_flight = 0
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def start(self) -> None:
+        return None
+
+    async def shutdown(self) -> None:
+        return None
+
+    # a promoted bundle, only process workers keep their own copy to replace
+    async def swap_model(self, model_path: str) -> None:
+        return None
+
+    async def score(self, batch, feature_state, models) -> list[tuple[float, bool, str]]:
+        async with self.slots:
+            self.in_flight += 1
+            try:
+                return await self._score(batch, feature_state, models)
+            finally:
+                self.in_flight -= 1
+
+    async def _score(self, batch, feature_state, models):
+        return predict_batch(batch, feature_state, models)
+
+
+class ThreadPoolInferenceExecutor(InferenceExecutor):
+    mode = "thread"
+
+    def __init__(self, *, workers: int = 2, max_pending: int = 8):
+        super().__init__(max_pending=max_pending)
+        self.workers = max(1, int(workers))
+        self._pool: ThreadPoolExecutor | None = None
+
+    async def start(self) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="fraud-inference"
+            )
+
+    async def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def _score(self, batch, feature_state, models):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, predict_batch, batch, feature_state, models
+        )
+
+
+class ProcessPoolInferenceExecutor(InferenceExecutor):
+    mode = "process"
+
+    def __init__(
+            self,
+            model_path: str,
+            *,
+            workers: int = 2,
+            max_pending: int = 8,
+            compact: bool = False,
+        ):
+        super().__init__(max_pending=max_pending)
+        self.model_path = model_path
+        self.compact = compact
+        self.workers = max(1, int(workers))
+        self._pool: ProcessPoolExecutor | None = None
+
+    # spawns every worker and waits for each one to finish loading the bundle
+    async def start(self) -> None:
+        if self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.model_path, self.compact),
+        )
+        await self._warm(self._pool)
+
+    async def _warm(self, pool: ProcessPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(pool, _worker_ready) for _ in range(self.workers)
+        ])
+
+    # a warmed pool with the new bundle replaces the old one, batches already
+    # submitted to the old pool still finish there before it shuts down
+    async def swap_model(self, model_path: str) -> None:
+        if self._pool is None:
+            self.model_path = model_path
+            return
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(model_path, self.compact),
+        )
+        try:
+            await self._warm(pool)
+        except BaseException:
+            pool.shutdown(wait=False)
+            raise
+        previous, self._pool, self.model_path = self._pool, pool, model_path
+        previous.shutdown(wait=False)
+
+    async def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    # workers score with their own preloaded copy, the bundle is never pickled per call;
+    # recalibrated risk thresholds (see quantile_sketch.py) go along with the batch and
+    # the metrics the worker recorded (e.g. per detector timings) come back with it
+    async def _score(self, batch, feature_state, models):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        thresholds = None
+        if feature_state and feature_state.get("risk_thresholds_recalibrated"):
+            thresholds = feature_state["risk_thresholds"]
+        results, recorded = await loop.run_in_executor(
+            self._pool, _score_in_worker, list(batch), thresholds
+        )
+        metrics.metrics.merge(recorded)
+        return results
+
+
+class _PendingScore:
+    __slots__ = ("batch", "feature_state", "models", "future", "enqueued_at")
+
+    def __init__(self, batch, feature_state, models, future):
+        self.batch = batch
+        self.feature_state = feature_state
+        self.models = models
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+# coalesces concurrent score() calls (inline sync scoring, outbox workers, API
+# requests) into one vectorized call on the wrapped executor; a batch is flushed
+# once it holds max_rows rows or its oldest caller has waited max_wait_ms, then
+# each caller gets back just its own slice of the results
+# callers scoring with a different bundle (e.g. mid model swap) are never mixed
+class MicroBatchingExecutor(InferenceExecutor):
+    def __init__(
+            self,
+            inner: InferenceExecutor,
+            *,
+            max_rows: int = DEFAULT_BATCH_MAX_ROWS,
+            max_wait_ms: float = DEFAULT_BATCH_MAX_WAIT_MS,
+        ):
+        super().__init__(max_pending=inner.max_pending)
+        self.inner = inner
+        self.mode = inner.mode
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: asyncio.Queue | None = None
+        self._dispatcher: asyncio.Task | None = None
+        # requests taken off the queue but not flushed yet, shutdown flushes them
+        self._collecting: list[_PendingScore] = []
+        self._flushing: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        await self.inner.start()
+        if self._dispatcher is None:
+            self._queue = asyncio.Queue()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+            # nobody is left waiting on an unanswered future
+            leftover = self._collecting
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+            self._collecting = []
+            if leftover:
+                await self._flush(leftover)
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.inner.shutdown()
+
+    async def swap_model(self, model_path: str) -> None:
+        await self.inner.swap_model(model_path)
+
+    async def score(self, batch, feature_state, models) -> list[tuple[float, bool, str]]:
+        if not batch:
+            return []
+        if self._dispatcher is None:
+            # not started (scripts, tests), nothing to coalesce with
+            return await self.inner.score(batch, feature_state, models)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingScore(batch, feature_state, models, future))
+        return await future
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            self._collecting = [first]
+            rows = len(first.batch)
+            deadline = first.enqueued_at + self.max_wait
+            while rows < self.max_rows:
+                if self._queue.empty():
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    request = self._queue.get_nowait()
+                self._collecting.append(request)
+                rows += len(request.batch)
+
+            groups: dict[tuple[int, int], list[_PendingScore]] = {}
+            for request in self._collecting:
+                key = (id(request.feature_state), id(request.models))
+                groups.setdefault(key, []).append(request)
+            self._collecting = []
+            # keep collecting while this batch runs, the inner executor bounds concurrency
+            for group in groups.values():
+                task = loop.create_task(self._flush(group))
+                self._flushing.add(task)
+                task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, requests: list[_PendingScore]) -> None:
+        requests = [r for r in requests if not r.future.done()]
+        if not requests:
+            return
+        now = time.perf_counter()
+        for request in requests:
+            metrics.DISPATCH_WAIT_SECONDS.observe(now - request.enqueued_at)
+        combined = [txn for request in requests for txn in request.batch]
+        metrics.DISPATCH_BATCH_ROWS.observe(len(combined))
+        metrics.DISPATCH_BATCH_CALLERS.observe(len(requests))
+
+        self.in_flight += 1
+        try:
+            first = requests[0]
+            results = await self.inner.score(combined, first.feature_state, first.models)
+        except Exception as exc:
+            logger.exception("coalesced inference for %d callers failed", len(requests))
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+            return
+        finally:
+            self.in_flight -= 1
+
+        offset = 0
+        for request in requests:
+            end = offset + len(request.batch)
+            if not request.future.done():
+                request.future.set_result(results[offset:end])
+            offset = end
+
+
+def create_inference_executor(
+        mode: str,
+        *,
+        model_path: str | None = None,
+        workers: int = 2,
+        max_pending: int = 8,
+        compact: bool = False,
+        batch_max_rows: int = 0,
+        batch_max_wait_ms: float = DEFAULT_BATCH_MAX_WAIT_MS,
+    ) -> InferenceExecutor:
+
+    if mode == "inline":
+        executor = InferenceExecutor(max_pending=max_pending)
+    elif mode == "thread":
+        executor = ThreadPoolInferenceExecutor(workers=workers, max_pending=max_pending)
+    elif mode == "process":
+        if not model_path:
+            raise ValueError("process inference mode needs a model_path")
+        executor = ProcessPoolInferenceExecutor(
+            model_path, workers=workers, max_pending=max_pending, compact=compact
+        )
+    else:
+        raise ValueError(f"unknown inference mode '{mode}', expected one of {INFERENCE_MODES}")
+
+    # batch_max_rows = 0 scores every caller's batch on its own
+    if batch_max_rows > 0:
+        return MicroBatchingExecutor(
+            executor, max_rows=batch_max_rows, max_wait_ms=batch_max_wait_ms
+        )
+    return executor
+
+
+# process wide executor, the app lifespan swaps in the configured one
+_active_executor: InferenceExecutor | None = None
+
+
+def get_inference_executor() -> InferenceExecutor:
+    global _active_executor
+    if _active_executor is None:
+        _active_executor = InferenceExecutor()
+    return _active_executor
+
+
+def set_inference_executor(executor: InferenceExecutor | None) -> None:
+    global _active_executor
+    _active_executor = executor
+
+
+# process pool worker side
+_worker_bundle: dict = {}
+
+
+def _init_worker(model_path: str, compact: bool = False) -> None:
+    # a forked worker starts with a copy of the parent's values, they're not its own
+    metrics.metrics.drain()
+    feature_state, models = load_pipeline(model_path)
+    if compact:
+        feature_state, models = export_compact_bundle(feature_state, models)
+    _worker_bundle["feature_state"], _worker_bundle["models"] = feature_state, models
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _score_in_worker(batch, risk_thresholds=None):
+    feature_state = _worker_bundle["feature_state"]
+    if risk_thresholds and risk_thresholds != feature_state.get("risk_thresholds"):
+        feature_state = {**feature_state, "risk_thresholds": risk_thresholds}
+    results = predict_batch(batch, feature_state, _worker_bundle["models"])
+    return results, metrics.metrics.drain()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# running per merchant amount statistics (Welford), kept up to date in the
+# merchant_amount_stats table as transactions are upserted; scoring reads them
+# through an in memory snapshot instead of aggregating the transactions table
+
+# merchants need this many transactions before their live stats replace the training ones
+DEFAULT_MIN_COUNT = 5
+DEFAULT_REFRESH_SECONDS = 300.0
+
+
+# one Welford step, same arithmetic as the SQL upsert in SqlMerchantStatsRepo
+def welford_update(count: int, mean: float, m2: float, x: float) -> tuple[int, float, float]:
+    count += 1
+    delta = x - mean
+    mean += delta / count
+    m2 += delta * (x - mean)
+    return count, mean, m2
+
+
+# combines two partial (count, mean, m2) results (Chan et al.)
+def welford_merge(
+        a: tuple[int, float, float],
+        b: tuple[int, float, float],
+) -> tuple[int, float, float]:
+
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
+
+
+# takes partial b back out of the combined (count, mean, m2) total, the inverse of
+# welford_merge; used when transactions are removed or their amount changes
+def welford_unmerge(
+        total: tuple[int, float, float],
+        b: tuple[int, float, float],
+) -> tuple[int, float, float]:
+
+    n, mean, m2 = total
+    n_b, mean_b, m2_b = b
+    n_a = n - n_b
+    if n_a <= 0:
+        return 0, 0.0, 0.0
+    mean_a = (n * mean - n_b * mean_b) / n_a
+    delta = mean_b - mean_a
+    # rounding can leave a tiny negative m2 behind, it is a sum of squares
+    m2_a = max(m2 - m2_b - delta * delta * n_a * n_b / n, 0.0)
+    return n_a, mean_a, m2_a
+
+
+# sample std like pandas .std(), which is what the training notebook used
+def welford_std(count: int, m2: float) -> float:
+    if count < 2:
+        return 0.0
+    return math.sqrt(max(m2, 0.0) / (count - 1))
+
+
+# read only merchant -> (mean, std) view of the table at one point in time
+class MerchantStatsSnapshot:
+    def __init__(
+            self,
+            stats=None,
+            *,
+            min_count: int = DEFAULT_MIN_COUNT,
+            loaded_at: float | None = None,
+    ):
+        self.min_count = max(1, int(min_count))
+        self.loaded_at = loaded_at if loaded_at is not None else time.monotonic()
+        self._stats = {
+            merchant: (float(mean), welford_std(int(count), float(m2)))
+            for merchant, (count, mean, m2) in (stats or {}).items()
+            if merchant is not None and int(count) >= self.min_count
+        }
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def __contains__(self, merchant) -> bool:
+        return merchant in self._stats
+
+    def get(self, merchant) -> tuple[float, float] | None:
+        return self._stats.get(merchant)
+
+    # adds merchant_amount_mean / merchant_amount_std to each transaction dict
+    # that has live stats, build_feature_matrix prefers them over the bundle's
+    def annotate(self, batch: list[dict]) -> list[dict]:
+        if not self._stats:
+            return batch
+        for txn in batch:
+            stats = self._stats.get(txn.get('merchant_name'))
+            if stats is not None:
+                txn['merchant_amount_mean'], txn['merchant_amount_std'] = stats
+        return batch
+
+
+# process wide snapshot holder, reloads through `loader` once the snapshot is
+# older than refresh_seconds; concurrent callers share a single reload
+class MerchantStatsCache:
+    def __init__(
+            self,
+            loader=None,
+            *,
+            refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+            min_count: int = DEFAULT_MIN_COUNT,
+        ):
+        # async callable returning {merchant: (count, mean, m2)}
+        self.loader = loader
+        self.refresh_seconds = float(refresh_seconds)
+        self.min_count = max(1, int(min_count))
+        self._snapshot: MerchantStatsSnapshot | None = None
+        self._refresh_lock: asyncio.Lock | None = None
+
+    @property
+    def snapshot(self) -> MerchantStatsSnapshot | None:
+        return self._snapshot
+
+    def is_stale(self) -> bool:
+        return (
+            self._snapshot is None
+            or time.monotonic() - self._snapshot.loaded_at >= self.refresh_seconds
+        )
+
+    async def refresh(self) -> MerchantStatsSnapshot:
+        stats = await self.loader()
+        self._snapshot = MerchantStatsSnapshot(stats, min_count=self.min_count)
+        return self._snapshot
+
+    async def current(self) -> MerchantStatsSnapshot:
+        if not self.is_stale():
+            return self._snapshot
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self.is_stale():
+                try:
+                    await self.refresh()
+                except Exception:
+                    # keep scoring on the previous (or the bundle's) stats,
+                    # retry after the next interval
+                    logger.exception("merchant stats refresh failed")
+                    if self._snapshot is None:
+                        self._snapshot = MerchantStatsSnapshot(min_count=self.min_count)
+                    else:
+                        self._snapshot.loaded_at = time.monotonic()
+            return self._snapshot
+
+
+# process wide cache, the app lifespan sets it up so request scoped services share it
+_active_cache: MerchantStatsCache | None = None
+
+
+def get_merchant_stats_cache() -> MerchantStatsCache | None:
+    return _active_cache
+
+
+def set_merchant_stats_cache(cache: MerchantStatsCache | None) -> None:
+    global _active_cache
+    _active_cache = cache
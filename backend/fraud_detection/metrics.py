@@ -0,0 +1,315 @@
+import bisect
+import math
+import threading
+
+# small in process metrics registry rendered in the Prometheus text format
+# (GET /metrics), no client library needed; recording is a dict lookup and an
+# add under the value's own lock, the inference and ensemble threads record too
+# each process (uvicorn worker) reports its own values, process pool workers send
+# theirs back with each batch (drain / merge) so they show up in the parent's
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds, from a sub millisecond single row score up to a slow 1M row chunk
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+# rows per coalesced inference call
+ROW_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    # the value recorded since the last drain, reset to zero
+    def drain(self) -> float:
+        with self._lock:
+            value, self.value = self.value, 0.0
+        return value
+
+    def merge(self, value: float) -> None:
+        self.inc(value)
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # one slot per bucket plus +Inf, made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    # a consistent (counts, sum) pair for rendering
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def drain(self) -> tuple[list[int], float]:
+        with self._lock:
+            drained = self.counts, self.sum
+            self.counts, self.sum = [0] * (len(self.buckets) + 1), 0.0
+        return drained
+
+    def merge(self, value: tuple[list[int], float]) -> None:
+        counts, total = value
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.sum += total
+
+
+# one metric name with its labelled children, a metric without labels records directly
+class Metric:
+    def __init__(self, kind: str, name: str, documentation: str, labelnames=(), buckets=None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._children: dict[tuple, object] = {}
+        self._default = None if self.labelnames else self._new_child()
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        if self.kind == "counter":
+            return _CounterValue()
+        if self.kind == "gauge":
+            return _GaugeValue()
+        return _HistogramValue(self.buckets)
+
+    # bind once outside hot loops, e.g. FETCH = STAGE_SECONDS.labels("fetch")
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+    def __getattr__(self, attr):
+        # inc / set / observe on a metric without labels
+        default = self.__dict__.get("_default")
+        if default is None:
+            raise AttributeError(attr)
+        return getattr(default, attr)
+
+    def _samples(self):
+        if self._default is not None:
+            yield (), self._default
+        with self._lock:
+            children = sorted(self._children.items())
+        yield from children
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in self._samples():
+            if self.kind != "histogram":
+                labels = _labels(self.labelnames, values)
+                lines.append(f"{self.name}{labels} {_number(child.value)}")
+                continue
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = _labels(self.labelnames, values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, kind, name, documentation, labelnames=(), buckets=None) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Metric(kind, name, documentation, labelnames, buckets)
+        elif metric.kind != kind:
+            raise ValueError(f"{name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Metric:
+        return self._register("counter", name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Metric:
+        return self._register("gauge", name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=None) -> Metric:
+        return self._register("histogram", name, documentation, labelnames, buckets)
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # counter and histogram values recorded since the last drain, reset to zero;
+    # a process pool worker returns them with each batch. gauges are left out,
+    # they describe the process they live in
+    def drain(self) -> list[tuple[str, tuple, object]]:
+        drained = []
+        for metric in self._metrics.values():
+            if metric.kind == "gauge":
+                continue
+            for values, child in metric._samples():
+                drained.append((metric.name, values, child.drain()))
+        return drained
+
+    # adds what another process drained into this registry's values
+    def merge(self, drained) -> None:
+        for name, values, value in drained or ():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            child = metric.labels(*values) if values else metric._default
+            child.merge(value)
+
+
+# process wide registry, the scoring code records into it and /metrics renders it
+metrics = MetricsRegistry()
+
+
+# fraud scoring metrics, shared by the request path, the outbox workers and inline sync scoring
+STAGE_SECONDS = metrics.histogram(
+    "fraud_scoring_stage_seconds", "Time per scoring batch spent in each stage.", ("stage",)
+)
+FETCH_SECONDS = STAGE_SECONDS.labels("fetch")
+FEATURES_SECONDS = STAGE_SECONDS.labels("features")
+INFERENCE_SECONDS = STAGE_SECONDS.labels("inference")
+WRITE_SECONDS = STAGE_SECONDS.labels("write")
+
+SCORED = metrics.counter("fraud_transactions_scored_total", "Transactions scored.")
+SKIPPED = metrics.counter(
+    "fraud_transactions_skipped_total",
+    "Transactions not rescored because their inputs are unchanged.",
+)
+FAILED = metrics.counter(
+    "fraud_transactions_failed_total", "Transactions in batches that failed to score."
+)
+
+JOBS = metrics.gauge("fraud_scoring_jobs", "Scoring jobs in the outbox by status.", ("status",))
+IN_FLIGHT = metrics.gauge(
+    "fraud_inference_in_flight", "Batches currently being scored by the executor."
+)
+MODEL_INFO = metrics.gauge(
+    "fraud_model_info", "Loaded fraud model version, always 1.", ("version",)
+)
+
+# micro-batching dispatcher, how well concurrent callers get coalesced and what it costs them
+DISPATCH_BATCH_ROWS = metrics.histogram(
+    "fraud_dispatch_batch_rows", "Rows per coalesced inference call.", buckets=ROW_BUCKETS
+)
+DISPATCH_BATCH_CALLERS = metrics.histogram(
+    "fraud_dispatch_batch_callers", "Scoring requests merged into one inference call.",
+    buckets=ROW_BUCKETS,
+)
+DISPATCH_WAIT_SECONDS = metrics.histogram(
+    "fraud_dispatch_queue_wait_seconds", "Time a scoring request waited in the dispatcher queue."
+)
+
+# candidate bundle in shadow mode, scored off the live path
+SHADOW_SCORED = metrics.counter(
+    "fraud_shadow_scored_total", "Transactions scored by the shadow model."
+)
+SHADOW_DROPPED = metrics.counter(
+    "fraud_shadow_dropped_total",
+    "Transactions the shadow model skipped because it fell behind or failed.",
+)
+SHADOW_SECONDS = metrics.histogram(
+    "fraud_shadow_inference_seconds", "Time per batch scoring with the shadow model."
+)
+# ensemble bundles, per detector cost and rows a detector sat out over its latency budget
+DETECTOR_SECONDS = metrics.histogram(
+    "fraud_detector_seconds", "Time per batch each ensemble detector spent scoring.", ("detector",)
+)
+DETECTOR_SKIPPED = metrics.counter(
+    "fraud_detector_skipped_total",
+    "Rows an ensemble detector skipped while over its latency budget.",
+    ("detector",),
+)
+ENSEMBLE_FALLBACK = metrics.counter(
+    "fraud_ensemble_fallback_total",
+    "Rows scored by the primary detector alone because another detector sat out.",
+)
+DRIFT_DROPPED = metrics.counter(
+    "fraud_drift_dropped_total",
+    "Transactions left out of the feature drift histograms because the monitor fell behind"
+    " or failed.",
+)
+# online Half-Space Trees detector, rows it learned from and reference windows it went through
+ONLINE_LEARNED = metrics.counter(
+    "fraud_online_learned_total", "Transactions the online detector learned from."
+)
+ONLINE_SCORED = metrics.counter(
+    "fraud_online_scored_total",
+    "Transactions stored with the online detector's score instead of the bundle's.",
+)
+ONLINE_WINDOWS = metrics.gauge(
+    "fraud_online_windows", "Reference windows the online detector has rolled over."
+)
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fraud_detection.bundle_format import (
+    MANIFEST_FILE,
+    METADATA_FILE,
+    is_mmap_bundle,
+    read_manifest,
+)
+from fraud_detection.compact_model import export_compact_bundle
+from fraud_detection.ensemble import check_memory_budgets
+from fraud_detection.fast_scorer import FastScorer
+from fraud_detection.prediction import load_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+# holds the loaded model bundle for the whole process so every service
+# instance scores with the same feature_state / models instead of reloading it
+class ModelRegistry:
+    def __init__(self, *, compact: bool = False):
+        # compact swaps the sklearn objects for the NumPy only engine after loading
+        self.compact = compact
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._feature_state = None
+        self._models = None
+        # the loaded bundle's own thresholds, a recalibration can be undone back to them
+        self._bundle_risk_thresholds = None
+        # lookup tables for POST /fraud/score, built on first use after every load
+        self._scorer: FastScorer | None = None
+
+        self.model_path: str | None = None
+        self.model_version: str | None = None
+        self.load_seconds: float | None = None
+        self.memory_bytes: int | None = None
+        self.mapped_bytes: int | None = None
+        self.file_bytes: int | None = None
+        self.loaded_at: datetime | None = None
+        # bumped on every activate, services compare it to notice a promoted bundle
+        self.generation = 0
+
+
+    @property
+    def loaded(self) -> bool:
+        return self._models is not None
+
+
+    # loads (and compacts) a bundle without touching the active one, see activate
+    def prepare(self, model_path: str) -> dict:
+        started = time.perf_counter()
+        feature_state, models = load_pipeline(model_path)
+        if self.compact:
+            feature_state, models = export_compact_bundle(feature_state, models)
+        # an ensemble bundle whose extra detectors outgrew their memory budget is refused
+        check_memory_budgets(models, lambda model: estimate_nbytes(model, count_mapped=True))
+        return {
+            "feature_state": feature_state,
+            "models": models,
+            "model_path": model_path,
+            "model_version": bundle_version(model_path),
+            "load_seconds": time.perf_counter() - started,
+        }
+
+
+    # swaps the active bundle in one step; callers already holding the previous
+    # feature_state / models finish with them, the next get() sees the new one
+    def activate(self, candidate: dict, scorer: FastScorer | None = None) -> None:
+        feature_state, models = candidate["feature_state"], candidate["models"]
+        bundle = {"feature_state": feature_state, "models": models}
+        memory_bytes = estimate_nbytes(bundle)
+        mapped_bytes = estimate_nbytes(bundle, count_mapped=True) - memory_bytes
+
+        with self._lock:
+            self._feature_state, self._models = feature_state, models
+            self._bundle_risk_thresholds = feature_state.get("risk_thresholds")
+            self._scorer = scorer
+            self.model_path = candidate["model_path"]
+            self.model_version = candidate["model_version"]
+            self.load_seconds = candidate["load_seconds"]
+            self.memory_bytes = memory_bytes
+            self.mapped_bytes = mapped_bytes
+            self.file_bytes = _path_size(self.model_path)
+            self.loaded_at = datetime.now(timezone.utc)
+            self.generation += 1
+
+        logger.info("fraud model loaded: %s", self.stats())
+
+
+    # new risk tiers for the active bundle (see quantile_sketch.py), None goes back to the
+    # bundle's own; swapped like a promotion so batches already scoring keep the
+    # thresholds they started with
+    def set_risk_thresholds(self, thresholds: dict | None) -> None:
+        with self._lock:
+            if not self.loaded:
+                raise RuntimeError("fraud model has not been loaded")
+            feature_state = {
+                k: v for k, v in self._feature_state.items()
+                if k not in ("risk_thresholds", "risk_thresholds_recalibrated")
+            }
+            if thresholds is None:
+                if self._bundle_risk_thresholds is not None:
+                    feature_state["risk_thresholds"] = self._bundle_risk_thresholds
+            else:
+                feature_state["risk_thresholds"] = {k: float(v) for k, v in thresholds.items()}
+                feature_state["risk_thresholds_recalibrated"] = True
+            self._feature_state = feature_state
+            self._scorer = None
+            self.generation += 1
+
+
+    @property
+    def risk_thresholds_recalibrated(self) -> bool:
+        with self._lock:
+            return bool(self.loaded and self._feature_state.get("risk_thresholds_recalibrated"))
+
+
+    def load(self, model_path: str):
+        candidate = self.prepare(model_path)
+        self.activate(candidate)
+        return candidate["feature_state"], candidate["models"]
+
+
+    # loads only the first time (or when asked for a different bundle)
+    def ensure_loaded(self, model_path: str):
+        with self._load_lock:
+            with self._lock:
+                if self.loaded and self.model_path == model_path:
+                    return self._feature_state, self._models
+            return self.load(model_path)
+
+
+    def get(self):
+        with self._lock:
+            if not self.loaded:
+                raise RuntimeError("fraud model has not been loaded")
+            return self._feature_state, self._models
+
+
+    # (feature_state, models, model_version, generation) read together, so a
+    # promotion can't land between them
+    def active(self):
+        with self._lock:
+            if not self.loaded:
+                raise RuntimeError("fraud model has not been loaded")
+            return self._feature_state, self._models, self.model_version, self.generation
+
+
+    def scorer(self) -> FastScorer:
+        with self._lock:
+            if not self.loaded:
+                raise RuntimeError("fraud model has not been loaded")
+            if self._scorer is None:
+                self._scorer = FastScorer(self._feature_state, self._models)
+            return self._scorer
+
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "model_path": self.model_path,
+            "model_version": self.model_version,
+            "compact": self.compact,
+            "load_seconds": self.load_seconds,
+            "memory_bytes": self.memory_bytes,
+            "mapped_bytes": self.mapped_bytes,
+            "file_bytes": self.file_bytes,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "generation": self.generation,
+        }
+
+
+# identifies the bundle in score fingerprints and fraud_model_version: the manifest's
+# model_version when the mmap bundle has one, the training.json next to a joblib file
+# written by train.py, otherwise a hash of the joblib file (or of manifest.json)
+def bundle_version(path: str) -> str:
+    if is_mmap_bundle(path):
+        version = read_manifest(path).get("model_version")
+        if version:
+            return str(version)
+        path = os.path.join(path, MANIFEST_FILE) if os.path.isdir(path) else path
+    if not os.path.isfile(path):
+        return str(path)
+
+    metadata_path = os.path.join(os.path.dirname(path), METADATA_FILE)
+    if os.path.isfile(metadata_path):
+        with open(metadata_path, encoding="utf-8") as f:
+            version = json.load(f).get("model_version")
+        if version:
+            return str(version)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _path_size(path: str) -> int | None:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path)
+            for f in files
+        )
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def _is_memory_mapped(arr: np.ndarray) -> bool:
+    base = arr
+    while isinstance(base, np.ndarray):
+        if isinstance(base, np.memmap):
+            return True
+        base = base.base
+    return isinstance(base, mmap.mmap)
+
+
+# rough in-memory size of a bundle, counts numpy buffers (including the
+# node arrays inside sklearn trees) and the python containers holding them
+# memory mapped arrays live in the shared page cache and are skipped unless count_mapped
+def estimate_nbytes(obj, _seen=None, *, count_mapped: bool = False) -> int:
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    def _size(value):
+        return estimate_nbytes(value, seen, count_mapped=count_mapped)
+
+    if isinstance(obj, np.ndarray):
+        if not count_mapped and _is_memory_mapped(obj):
+            return 0
+        return int(obj.nbytes)
+    if isinstance(obj, np.generic):
+        return int(obj.nbytes)
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, (int, float, bool, type(None))):
+        return 8
+    if isinstance(obj, dict):
+        return sum(_size(k) + _size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(_size(v) for v in obj)
+
+    # sklearn Tree (and the KDTree / BallTree behind LocalOutlierFactor) keeps its nodes
+    # in C arrays that only show up through __getstate__
+    if type(obj).__name__ in ("Tree", "KDTree", "BallTree") and hasattr(obj, "__getstate__"):
+        return _size(obj.__getstate__())
+    if hasattr(obj, "__dict__"):
+        return _size(vars(obj))
+    return 0
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime
+
+from fraud_detection.bundle_format import is_mmap_bundle
+from fraud_detection.fast_scorer import FastScorer
+from fraud_detection.model_registry import ModelRegistry, model_registry
+from fraud_detection.prediction import predict_batch
+
+logger = logging.getLogger(__name__)
+
+# versioned bundles in one directory (FRAUD_MODEL_REGISTRY_DIR), the layout train.py writes:
+#   <registry_dir>/<version>/                    memory mapped bundle, or
+#   <registry_dir>/<version>/fraud_model.joblib  joblib bundle
+#   <registry_dir>/ACTIVE                        name of the promoted version
+# promoting loads and warms the candidate next to the active bundle, swaps it in and
+# rewrites ACTIVE; every other app process notices the new pointer through ModelWatcher
+
+ACTIVE_FILE = "ACTIVE"
+JOBLIB_FILE = "fraud_model.joblib"
+WARMUP_ROWS = 32
+DEFAULT_POLL_SECONDS = 30.0
+
+# one promotion at a time per process, so ACTIVE always names the bundle that went live
+_promote_lock: asyncio.Lock | None = None
+
+
+def list_versions(registry_dir: str) -> list[str]:
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.isdir(os.path.join(registry_dir, name))
+    )
+
+
+# bundle path for a version, the value FRAUD_MODEL_PATH would have pointed at
+def version_path(registry_dir: str, version: str) -> str:
+    if not version or version in (".", "..") or os.sep in version or "/" in version:
+        raise ValueError(f"invalid model version '{version}'")
+    directory = os.path.join(registry_dir, version)
+    if is_mmap_bundle(directory):
+        return directory
+    path = os.path.join(directory, JOBLIB_FILE)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"model version {version} not found in {registry_dir}")
+    return path
+
+
+def read_active(registry_dir: str) -> str | None:
+    path = os.path.join(registry_dir, ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+# the promoted version wins over FRAUD_MODEL_PATH, for the app and the seed scripts alike
+def active_model_path(registry_dir: str | None, default_path: str) -> str:
+    active_version = read_active(registry_dir) if registry_dir else None
+    if active_version:
+        return version_path(registry_dir, active_version)
+    return default_path
+
+
+# write then rename, a process polling ACTIVE never reads half a version name
+def write_active(registry_dir: str, version: str) -> None:
+    path = os.path.join(registry_dir, ACTIVE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, path)
+
+
+# one row per merchant the bundle knows (up to WARMUP_ROWS), dated now
+def warmup_batch(feature_state) -> list[dict]:
+    merchants = feature_state["merchant_encoder"].classes_.tolist()[:WARMUP_ROWS]
+    channels = feature_state["channel_encoder"].classes_.tolist()
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    return [
+        {
+            "amount": 10.0 * (i + 1),
+            "merchant_name": merchant,
+            "payment_channel": channels[i % len(channels)],
+            "pending": False,
+            "date": now,
+        }
+        for i, merchant in enumerate(merchants)
+    ]
+
+
+# scores the warmup batch through both scoring paths, so lazy lookups and page faults
+# on mapped arrays happen here instead of on the first real request; a bundle that
+# can't score it is rejected before it goes live
+def warm_bundle(feature_state, models) -> FastScorer:
+    batch = warmup_batch(feature_state)
+    scorer = FastScorer(feature_state, models)
+    results = predict_batch(batch, feature_state, models) + scorer.score(batch[:1])
+    if len(results) != len(batch) + 1 or not all(math.isfinite(r[0]) for r in results):
+        raise ValueError("candidate model returned invalid scores for the warmup batch")
+    return scorer
+
+
+# loads, warms and activates a version; the registry swaps its reference in one step
+# so in flight batches finish on the bundle they started with
+# publish=False is used by ModelWatcher, which is following an ACTIVE written elsewhere
+async def promote(
+        version: str,
+        registry_dir: str,
+        *,
+        registry: ModelRegistry | None = None,
+        executor=None,
+        publish: bool = True,
+    ) -> dict:
+
+    global _promote_lock
+    registry = registry or model_registry
+    path = version_path(registry_dir, version)
+    if _promote_lock is None:
+        _promote_lock = asyncio.Lock()
+
+    async with _promote_lock:
+        try:
+            candidate = await asyncio.to_thread(registry.prepare, path)
+            scorer = await asyncio.to_thread(
+                warm_bundle, candidate["feature_state"], candidate["models"]
+            )
+        except Exception as e:
+            # the active bundle keeps serving, nothing was swapped
+            raise ValueError(f"model version {version} could not be loaded: {e}") from e
+
+        if executor is not None:
+            # process workers score with their own copy, they switch before the registry does
+            await executor.swap_model(path)
+        registry.activate(candidate, scorer)
+        if publish:
+            write_active(registry_dir, version)
+
+    logger.info("fraud model %s promoted from %s", version, path)
+    return registry.stats()
+
+
+# polls ACTIVE and promotes locally when it points at a bundle this process isn't
+# serving, so every uvicorn worker follows a promotion without a restart
+class ModelWatcher:
+    def __init__(
+            self,
+            registry_dir: str,
+            *,
+            registry: ModelRegistry | None = None,
+            executor=None,
+            poll_seconds: float = DEFAULT_POLL_SECONDS,
+        ):
+        self.registry_dir = registry_dir
+        self.registry = registry or model_registry
+        self.executor = executor
+        self.poll_seconds = float(poll_seconds)
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="fraud-model-watcher")
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # True when a new version was promoted
+    async def check(self) -> bool:
+        version = read_active(self.registry_dir)
+        if version is None:
+            return False
+        path = version_path(self.registry_dir, version)
+        if self.registry.loaded and self.registry.model_path == path:
+            return False
+        await promote(
+            version, self.registry_dir,
+            registry=self.registry, executor=self.executor, publish=False,
+        )
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.check()
+            except Exception:
+                # keep serving the current bundle, the next poll tries again
+                logger.exception("fraud model watcher failed to follow %s", self.registry_dir)
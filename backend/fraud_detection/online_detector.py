@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import threading
+
+import numpy as np
+
+from fraud_detection import metrics
+from fraud_detection.features import build_feature_matrix, feature_count
+from fraud_detection.quantile_sketch import KLLSketch
+
+logger = logging.getLogger(__name__)
+
+# online anomaly detector that keeps learning from live traffic: Half-Space Trees
+# (Tan, Ting, Liu 2011). Every tree is a full binary tree of random axis-aligned halvings
+# of a random work space around [0, 1]^F, fixed by the seed, so every process builds the
+# same trees. Each node counts the rows passing through it in two windows: the latest
+# one being filled and the reference one (the last full window) that scores are read
+# from, mass * 2^depth summed down each path; little mass means an anomaly. Learning a
+# row adds 1 along its path in every tree, O(trees * depth) whatever the history.
+# All state is a few (trees, nodes) float32 arrays. Processes learn into their own delta
+# and periodically merge it into fraud_online_detectors under a row lock: the shared
+# latest window fills with every worker's rows, rolls over into the reference once it
+# has `window` rows, and every process adopts the shared reference on the same merge,
+# which is also how a restarted process picks up where the others are.
+# Scores become ranks among recent scores (KLL sketch of the reference window's scores,
+# merged the same way), tiers are then fixed shares of traffic like at training time.
+# They only replace the bundle's stored scores with replace_scores; the bundle keeps
+# scoring every batch either way, so its version, fingerprints, score sketches, drift
+# histograms and the shadow comparison never see the detector's scores.
+
+DEFAULT_TREES = 25
+DEFAULT_DEPTH = 10
+DEFAULT_WINDOW = 1000
+DEFAULT_SEED = 42
+# a path stops counting below this share of the window in a node
+DEFAULT_SIZE_LIMIT = 0.01
+DEFAULT_CHECKPOINT_SECONDS = 30.0
+DEFAULT_LOW_QUANTILE = 0.90
+DEFAULT_HIGH_QUANTILE = 0.98
+DEFAULT_CONTAMINATION = 0.02
+# scaled features are clipped to +-CLIP standard deviations and mapped onto [0, 1]
+CLIP = 4.0
+# scores a calibration sketch needs before ranks are read from it
+CALIBRATION_MIN_COUNT = 500
+
+
+class HalfSpaceTrees:
+    def __init__(
+            self,
+            n_features: int,
+            *,
+            n_trees: int = DEFAULT_TREES,
+            depth: int = DEFAULT_DEPTH,
+            window: int = DEFAULT_WINDOW,
+            seed: int = DEFAULT_SEED,
+            size_limit: float = DEFAULT_SIZE_LIMIT,
+        ):
+        self.n_features = int(n_features)
+        self.n_trees = max(1, int(n_trees))
+        self.depth = max(1, int(depth))
+        self.window = max(1, int(window))
+        self.seed = int(seed)
+        self.size_limit = float(size_limit)
+
+        self.dims, self.splits = _build_trees(self.n_trees, self.depth, self.n_features, self.seed)
+        n_nodes = 2 ** (self.depth + 1) - 1
+        self.mass_ref = np.zeros((self.n_trees, n_nodes), dtype=np.float32)
+        self.mass_latest = np.zeros((self.n_trees, n_nodes), dtype=np.float32)
+        self.latest_rows = 0
+        self.windows = 0
+
+    # everything that fixes the trees, checkpoints only merge when these match
+    def params(self) -> dict:
+        return {
+            "n_features": self.n_features,
+            "n_trees": self.n_trees,
+            "depth": self.depth,
+            "window": self.window,
+            "seed": self.seed,
+            "size_limit": self.size_limit,
+        }
+
+    @property
+    def name(self) -> str:
+        p = self.params()
+        return f"hst-f{p['n_features']}-t{p['n_trees']}-d{p['depth']}-w{p['window']}-s{p['seed']}"
+
+    # node index per (level, tree, row), root to leaf
+    def paths(self, X) -> np.ndarray:
+        u = np.clip((np.asarray(X, dtype=float) + CLIP) / (2 * CLIP), 0.0, 1.0)
+        n = len(u)
+        trees = np.arange(self.n_trees)[:, None]
+        rows = np.arange(n)[None, :]
+        node = np.zeros((self.n_trees, n), dtype=np.int64)
+        paths = np.empty((self.depth + 1, self.n_trees, n), dtype=np.int64)
+        paths[0] = node
+        for level in range(self.depth):
+            right = u[rows, self.dims[trees, node]] >= self.splits[trees, node]
+            node = 2 * node + 1 + right
+            paths[level + 1] = node
+        return paths
+
+    # mass score per row, higher = more normal (like score_samples)
+    def score_samples(self, X, paths=None) -> np.ndarray:
+        paths = self.paths(X) if paths is None else paths
+        mass = self.mass_ref[np.arange(self.n_trees)[None, :, None], paths]
+        # a path counts down to (and including) its first node under the size limit
+        deep_enough = mass >= self.size_limit * self.window
+        active = np.ones_like(mass, dtype=bool)
+        active[1:] = np.logical_and.accumulate(deep_enough[:-1], axis=0)
+        weights = (2.0 ** np.arange(self.depth + 1))[:, None, None]
+        return (mass * weights * active).sum(axis=(0, 1))
+
+    def learn(self, X, paths=None) -> int:
+        paths = self.paths(X) if paths is None else paths
+        flat = (np.arange(self.n_trees)[None, :, None] * self.mass_latest.shape[1] + paths).ravel()
+        self.mass_latest += np.bincount(flat, minlength=self.mass_latest.size).reshape(
+            self.mass_latest.shape
+        ).astype(np.float32)
+        self.latest_rows += paths.shape[2]
+        return paths.shape[2]
+
+    # the filled latest window becomes the reference, scaled to `window` rows so scores
+    # stay on one scale when a merge overshoots it
+    def rollover(self) -> None:
+        self.mass_ref = self.mass_latest * np.float32(self.window / max(self.latest_rows, 1))
+        self.mass_latest = np.zeros_like(self.mass_latest)
+        self.latest_rows = 0
+        self.windows += 1
+
+
+def _build_trees(n_trees: int, depth: int, n_features: int, seed: int):
+    rng = np.random.default_rng(seed)
+    internal = 2 ** depth - 1
+    dims = np.empty((n_trees, internal), dtype=np.int16)
+    splits = np.empty((n_trees, internal), dtype=np.float64)
+    for t in range(n_trees):
+        # work space of the tree, a random box at least as wide as [0, 1] on every side
+        s = rng.uniform(0.0, 1.0, n_features)
+        r = 2.0 * np.maximum(s, 1.0 - s)
+        lo = np.empty((internal, n_features))
+        hi = np.empty((internal, n_features))
+        lo[0], hi[0] = s - r, s + r
+        for node in range(internal):
+            d = int(rng.integers(n_features))
+            mid = (lo[node, d] + hi[node, d]) / 2.0
+            dims[t, node], splits[t, node] = d, mid
+            for child, side in ((2 * node + 1, 0), (2 * node + 2, 1)):
+                if child < internal:
+                    lo[child], hi[child] = lo[node], hi[node]
+                    if side == 0:
+                        hi[child, d] = mid
+                    else:
+                        lo[child, d] = mid
+    return dims, splits
+
+
+# shared checkpoint + one process's delta; shared is None before the first merge.
+# state dicts: params, mass_ref, mass_latest, latest_rows, windows, calibration,
+# previous_calibration (sketch dicts)
+def merge_checkpoint(shared: dict | None, delta: dict) -> dict:
+    if shared is None:
+        shared = {
+            "params": delta["params"],
+            "mass_ref": np.zeros_like(delta["mass_latest"]),
+            "mass_latest": np.zeros_like(delta["mass_latest"]),
+            "latest_rows": 0,
+            "windows": 0,
+            "calibration": None,
+            "previous_calibration": None,
+        }
+    elif shared["params"] != delta["params"]:
+        raise ValueError("online detector checkpoint was written with different parameters")
+
+    window = int(delta["params"]["window"])
+    mass_latest = shared["mass_latest"] + delta["mass_latest"]
+    latest_rows = int(shared["latest_rows"]) + int(delta["latest_rows"])
+    calibration = KLLSketch.from_dict(shared.get("calibration")).merge(
+        KLLSketch.from_dict(delta["calibration"])
+    )
+    merged = {**shared, "mass_latest": mass_latest, "latest_rows": latest_rows}
+    merged["calibration"] = calibration.to_dict()
+    if latest_rows >= window:
+        merged.update({
+            "mass_ref": (mass_latest * np.float32(window / latest_rows)).astype(np.float32),
+            "mass_latest": np.zeros_like(mass_latest),
+            "latest_rows": 0,
+            "windows": int(shared["windows"]) + 1,
+            # scores against the new reference start a new sketch
+            "calibration": None,
+            "previous_calibration": calibration.to_dict(),
+        })
+    return merged
+
+
+class OnlineDetector:
+    def __init__(
+            self,
+            detector: HalfSpaceTrees,
+            *,
+            loader=None,
+            merger=None,
+            checkpoint_seconds: float = DEFAULT_CHECKPOINT_SECONDS,
+            low_quantile: float = DEFAULT_LOW_QUANTILE,
+            high_quantile: float = DEFAULT_HIGH_QUANTILE,
+            contamination: float = DEFAULT_CONTAMINATION,
+            replace_scores: bool = False,
+        ):
+        self.detector = detector
+        # async name -> checkpoint state or None
+        self.loader = loader
+        # async (name, delta state) -> merged checkpoint state, see merge_checkpoint;
+        # None keeps the detector to this process, it rolls its own windows over
+        self.merger = merger
+        self.checkpoint_seconds = float(checkpoint_seconds)
+        self.low_quantile = float(low_quantile)
+        self.high_quantile = float(high_quantile)
+        self.contamination = float(contamination)
+        # stored scores come from the detector once it is ready; off, it only learns and
+        # the bundle's scores are stored
+        self.replace_scores = bool(replace_scores)
+
+        # scores against the current reference (this process's since the last merge
+        # on top of the shared ones) and against the previous reference
+        self.calibration = KLLSketch()
+        self.pending_calibration = KLLSketch()
+        self.previous_calibration: KLLSketch | None = None
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def name(self) -> str:
+        return self.detector.name
+
+    # scores come from the trees once a first window has been learned and enough
+    # scores against it are in to rank by; until then the detector only learns
+    @property
+    def ready(self) -> bool:
+        if self.detector.windows == 0:
+            return False
+        previous = self.previous_calibration.count if self.previous_calibration else 0
+        current = self.calibration.count + self.pending_calibration.count
+        return max(current, previous) >= CALIBRATION_MIN_COUNT
+
+    def accepts(self, feature_state) -> bool:
+        return feature_count(feature_state) == self.detector.n_features
+
+    async def score(
+            self,
+            batch,
+            feature_state,
+            *,
+            learn: bool = True,
+            use: bool = True,
+            data=None,
+        ):
+
+        return await asyncio.to_thread(
+            self.score_batch, batch, feature_state, learn=learn, use=use, data=data
+        )
+
+    # (score, is_fraud, tier) per transaction, None while not ready or when use=False
+    # (the caller decided on the forest before the batch came in); learn=True also
+    # counts the batch into the latest window. score = share of recent scores below it;
+    # data is the batch's build_feature_matrix when the caller already has it
+    def score_batch(
+            self,
+            batch,
+            feature_state,
+            *,
+            learn: bool = True,
+            use: bool = True,
+            data=None,
+        ):
+
+        if data is None:
+            data = build_feature_matrix(batch, feature_state)
+        if len(data) == 0:
+            return [] if use and self.ready else None
+        X = feature_state["scaler"].transform(data)
+        with self._lock:
+            paths = self.detector.paths(X)
+            results = None
+            if self.detector.windows > 0:
+                # little mass = anomalous, so rank the negated mass score
+                anomaly = -self.detector.score_samples(X, paths)
+                sketch = self._calibration_sketch() if use else None
+                if learn:
+                    self.pending_calibration.update(anomaly)
+                if sketch is not None:
+                    results = self._results(sketch, anomaly)
+            if learn:
+                metrics.ONLINE_LEARNED.inc(self.detector.learn(X, paths))
+                if self.merger is None and self.detector.latest_rows >= self.detector.window:
+                    self._rollover_locally()
+        return results
+
+    # scores against the current reference once there are enough, else the previous one's
+    def _calibration_sketch(self) -> KLLSketch | None:
+        if self.calibration.count + self.pending_calibration.count >= CALIBRATION_MIN_COUNT:
+            return self.calibration.copy().merge(self.pending_calibration)
+        previous = self.previous_calibration
+        if previous is not None and previous.count >= CALIBRATION_MIN_COUNT:
+            return previous
+        return None
+
+    def _results(self, sketch: KLLSketch, anomaly: np.ndarray):
+        ranks = np.asarray(sketch.cdf(anomaly), dtype=float)
+        fraud_rank = 1.0 - self.contamination
+        return [
+            (
+                float(rank),
+                bool(rank >= fraud_rank),
+                "high" if rank >= self.high_quantile
+                else "medium" if rank >= self.low_quantile else "low",
+            )
+            for rank in ranks
+        ]
+
+    def _rollover_locally(self) -> None:
+        self.detector.rollover()
+        metrics.ONLINE_WINDOWS.set(self.detector.windows)
+        self.previous_calibration = self.calibration.merge(self.pending_calibration)
+        self.calibration = KLLSketch()
+        self.pending_calibration = KLLSketch()
+
+    def adopt(self, state: dict) -> None:
+        with self._lock:
+            self._adopt(state)
+
+    def _adopt(self, state: dict) -> None:
+        self.detector.mass_ref = np.asarray(state["mass_ref"], dtype=np.float32)
+        self.detector.windows = int(state["windows"])
+        metrics.ONLINE_WINDOWS.set(self.detector.windows)
+        self.calibration = KLLSketch.from_dict(state.get("calibration"))
+        previous = state.get("previous_calibration")
+        self.previous_calibration = KLLSketch.from_dict(previous) if previous else None
+
+    # picks up the shared state on start, so a restart scores like the other workers
+    async def restore(self) -> bool:
+        if self.loader is None:
+            return False
+        state = await self.loader(self.name)
+        if state is None:
+            return False
+        if state["params"] != self.detector.params():
+            logger.warning("online detector checkpoint %s has other parameters, ignored", self.name)
+            return False
+        self.adopt(state)
+        return True
+
+    # hands this process's rows since the last checkpoint to the merger and adopts the result;
+    # a failed merge puts the delta back
+    async def checkpoint(self) -> None:
+        if self.merger is None:
+            return
+        with self._lock:
+            delta = {
+                "params": self.detector.params(),
+                "mass_latest": self.detector.mass_latest,
+                "latest_rows": self.detector.latest_rows,
+                "calibration": self.pending_calibration.to_dict(),
+            }
+            self.detector.mass_latest = np.zeros_like(self.detector.mass_latest)
+            self.detector.latest_rows = 0
+            pending, self.pending_calibration = self.pending_calibration, KLLSketch()
+        try:
+            state = await self.merger(self.name, delta)
+        except Exception:
+            logger.exception("online detector checkpoint failed for %s", self.name)
+            with self._lock:
+                self.detector.mass_latest += delta["mass_latest"]
+                self.detector.latest_rows += delta["latest_rows"]
+                self.pending_calibration = pending.merge(self.pending_calibration)
+            return
+        self.adopt(state)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="fraud-online-detector")
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.checkpoint()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_seconds)
+            await self.checkpoint()
+
+
+# process wide detector, the app lifespan sets it up when FRAUD_ONLINE_DETECTOR is on
+_active_detector: OnlineDetector | None = None
+
+
+def get_online_detector() -> OnlineDetector | None:
+    return _active_detector
+
+
+def set_online_detector(detector: OnlineDetector | None) -> None:
+    global _active_detector
+    _active_detector = detector
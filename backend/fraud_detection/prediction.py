@@ -3,16 +3,22 @@ import pandas as pd
 import joblib
 from datetime import datetime
 
-NUMBER_FEATURES = 12
+from fraud_detection.bundle_format import is_mmap_bundle, load_mmap_bundle
+from fraud_detection.ensemble import ensemble_scores, is_ensemble
+from fraud_detection.features import (  # noqa: F401
+    NUMBER_FEATURES,
+    PROFILE_COLUMNS,
+    build_feature_matrix,
+    uses_profiles,
+)
+
 
 def create_matrix(df, state):
-    rows = []
-    for _, row in df.iterrows():
-        rows.append(create_row(row, state))
-    return np.vstack(rows) if rows else np.zeros((0, NUMBER_FEATURES))
+    return build_feature_matrix(df, state)
 
 
 # converting the transaction into numbers to be added to the matrix
+# per row reference version, build_feature_matrix must stay in step with it
 def create_row(txn, state):
     features = []
 
@@ -81,35 +87,21 @@ def create_row(txn, state):
 
     features.append(z)
     features.append(abs(z))
+
+    # user profile features, only behavioral bundles were trained with them
+    if uses_profiles(state):
+        for column in PROFILE_COLUMNS:
+            value = txn.get(column)
+            features.append(0.0 if value is None or not np.isfinite(value) else float(value))
     return np.array(features, dtype=float)
 
-# using scaler created to normalize data
+# using scaler created to normalize data, accepts anything build_feature_matrix does
 def apply_scaler(df, state):
     data = create_matrix(df, state)
     return state['scaler'].transform(data)
 
 def predict_single(transaction, feature_state, models):
-    df = pd.DataFrame([transaction])
-
-    thresholds = feature_state.get('risk_thresholds', {})
-    LOW_RISK_MAX  = thresholds.get('LOW_RISK_MAX')
-    HIGH_RISK_MIN = thresholds.get('HIGH_RISK_MIN')
-    
-    data = apply_scaler(df, feature_state)
-
-    if_pred = models['isolation_forest'].predict(data)[0]
-    if_score = float(-models['isolation_forest'].score_samples(data)[0])
-
-    is_fraud = (if_pred == -1)
-
-    if if_score >= HIGH_RISK_MIN:
-        tier = "high"
-    elif if_score >= LOW_RISK_MAX:
-        tier = "medium"
-    else:
-        tier = "low"
-
-    return if_score, bool(is_fraud), tier
+    return predict_batch([transaction], feature_state, models)[0]
     # {
     #     'is_fraud': bool(is_fraud),
     #     'fraud_score': if_score,
@@ -118,8 +110,57 @@ def predict_single(transaction, feature_state, models):
     # }
 
 
+# scores a whole batch with one scaler transform and one pass over the trees
+# returns a (score, is_fraud, tier) tuple per transaction, same as predict_single
+def predict_batch(transactions, feature_state, models):
+    thresholds = feature_state.get('risk_thresholds', {})
+    LOW_RISK_MAX  = thresholds.get('LOW_RISK_MAX')
+    HIGH_RISK_MIN = thresholds.get('HIGH_RISK_MIN')
+
+    data = create_matrix(transactions, feature_state)
+    if len(data) == 0:
+        return []
+    data = feature_state['scaler'].transform(data)
+    return score_matrix(data, models, LOW_RISK_MAX, HIGH_RISK_MIN)
+
+
+# scaled matrix -> (score, is_fraud, tier) tuples, with the forest alone or with every
+# detector of an ensemble bundle (see ensemble.py), whose combined score is 0..1
+def score_matrix(data, models, LOW_RISK_MAX, HIGH_RISK_MIN):
+    if is_ensemble(models):
+        combined, fraud_threshold, thresholds = ensemble_scores(data, models)
+        if thresholds is not None:
+            # a detector sat out, the bundle's thresholds are for the full ensemble
+            LOW_RISK_MAX, HIGH_RISK_MIN = thresholds["LOW_RISK_MAX"], thresholds["HIGH_RISK_MIN"]
+        # negated so score_results' "raw score below offset" means above the cut-off
+        return score_results(-combined, -fraud_threshold, LOW_RISK_MAX, HIGH_RISK_MIN)
+    forest = models['isolation_forest']
+    return score_results(forest.score_samples(data), forest.offset_, LOW_RISK_MAX, HIGH_RISK_MIN)
+
+
+# turns IsolationForest.score_samples output into (score, is_fraud, tier) tuples
+def score_results(raw_scores, offset, LOW_RISK_MAX, HIGH_RISK_MIN):
+    # IsolationForest.predict is -1 where score_samples - offset_ < 0,
+    # reusing the raw scores avoids walking every tree a second time
+    is_fraud = (raw_scores - offset) < 0
+    scores = -raw_scores
+
+    tiers = np.where(
+        scores >= HIGH_RISK_MIN, "high",
+        np.where(scores >= LOW_RISK_MAX, "medium", "low"),
+    )
+
+    return [
+        (float(score), bool(fraud), str(tier))
+        for score, fraud, tier in zip(scores, is_fraud, tiers)
+    ]
+
+
 # will need util to load model and data
+# accepts the memory mapped bundle directory (or its manifest.json) or a legacy joblib file
 def load_pipeline(filepath):
+    if is_mmap_bundle(filepath):
+        return load_mmap_bundle(filepath)
     bundle = joblib.load(filepath)
     return bundle['feature_state'], bundle['models']
 
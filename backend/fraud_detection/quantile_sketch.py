@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import math
+
+import numpy as np
+
+from fraud_detection.model_registry import ModelRegistry, model_registry
+
+logger = logging.getLogger(__name__)
+
+# live score quantiles per model version. Every scored batch goes into a KLL sketch
+# (Karnin, Lang, Liberty 2016): levels of sorted samples where an item on level i
+# stands for 2^i scores, a full level is sorted and every other item promoted, so
+# memory stays at a few times k floats however many scores go in and two sketches
+# merge by concatenating their levels. Each process keeps a sketch per version and
+# periodically merges it into fraud_score_sketches, the table row is the sketch of
+# every score that version produced across all workers.
+# recalibrating stores new risk thresholds on the row; every process picks them up
+# on its next flush, so tiers move without retraining or restarting. A reset clears
+# them and every process goes back to the bundle's own thresholds the same way
+
+DEFAULT_K = 400
+DEFAULT_FLUSH_SECONDS = 60.0
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.98, 0.99)
+# quantile of the live scores each threshold is recalibrated to, same as train.py
+DEFAULT_LOW_QUANTILE = 0.90
+DEFAULT_HIGH_QUANTILE = 0.98
+# scores a version needs before its thresholds can be recalibrated
+DEFAULT_MIN_RECALIBRATION_COUNT = 1000
+
+
+class KLLSketch:
+    def __init__(self, k: int = DEFAULT_K, *, seed=None):
+        self.k = max(8, int(k))
+        self.levels: list[np.ndarray] = [np.zeros(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.count
+
+    # items kept, what the sketch costs in memory
+    @property
+    def size(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    # the top level holds k items, each level below 2/3 of the one above it
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        if other is None or other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for i, level in enumerate(other.levels):
+            self.levels[i] = np.concatenate([self.levels[i], level])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    # a level over capacity keeps one item when it has an odd count and promotes
+    # every other item of the rest (random start) with twice the weight
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                items = np.sort(self.levels[level])
+                odd = len(items) % 2
+                promoted = items[odd:][int(self._rng.integers(2))::2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def _weighted(self) -> tuple[np.ndarray, np.ndarray]:
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level), 2.0 ** i) for i, level in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    # smallest kept value with at least a q share of the weight at or below it,
+    # np.quantile(method="inverted_cdf") on everything that went in
+    def quantiles(self, qs) -> list[float | None]:
+        if self.count == 0:
+            return [None for _ in qs]
+        items, cumulative = self._weighted()
+        total = cumulative[-1]
+        result = []
+        for q in qs:
+            q = min(max(float(q), 0.0), 1.0)
+            if q <= 0.0:
+                result.append(self.min)
+            elif q >= 1.0:
+                result.append(self.max)
+            else:
+                idx = min(int(np.searchsorted(cumulative, q * total)), len(items) - 1)
+                result.append(float(items[idx]))
+        return result
+
+    # estimated share of scores below each value
+    def cdf(self, values) -> list[float | None]:
+        if self.count == 0:
+            return [None for _ in values]
+        items, cumulative = self._weighted()
+        total = cumulative[-1]
+        idx = np.searchsorted(items, np.asarray(values, dtype=float), side="left")
+        below = np.where(idx > 0, cumulative[np.maximum(idx - 1, 0)], 0.0)
+        return [float(b / total) for b in below]
+
+    def copy(self) -> "KLLSketch":
+        return KLLSketch.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "levels": [level.tolist() for level in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "KLLSketch":
+        data = data or {}
+        sketch = cls(data.get("k", DEFAULT_K))
+        sketch.levels = [np.asarray(level, dtype=float) for level in data.get("levels") or [[]]]
+        sketch.count = int(data.get("count", 0))
+        if sketch.count:
+            sketch.min, sketch.max = float(data["min"]), float(data["max"])
+        return sketch
+
+
+# LOW_RISK_MAX / HIGH_RISK_MIN at the given quantiles of the live scores
+def recalibrated_thresholds(
+        sketch: KLLSketch,
+        *,
+        low_quantile: float = DEFAULT_LOW_QUANTILE,
+        high_quantile: float = DEFAULT_HIGH_QUANTILE,
+    ) -> dict:
+
+    if not 0.0 < low_quantile < high_quantile < 1.0:
+        raise ValueError("quantiles must satisfy 0 < low_quantile < high_quantile < 1")
+    if sketch.count == 0:
+        raise ValueError("no scores recorded for this model version")
+    low, high = sketch.quantiles([low_quantile, high_quantile])
+    return {"LOW_RISK_MAX": low, "HIGH_RISK_MIN": high}
+
+
+# estimated share of scores each tier gets under the thresholds, see score_results
+def tier_shares(sketch: KLLSketch, thresholds: dict) -> dict | None:
+    if sketch.count == 0 or not thresholds:
+        return None
+    below_low, below_high = sketch.cdf([thresholds["LOW_RISK_MAX"], thresholds["HIGH_RISK_MIN"]])
+    return {"low": below_low, "medium": below_high - below_low, "high": 1.0 - below_high}
+
+
+# swaps the registry's thresholds when the stored ones differ, True when they did;
+# None (nothing stored, or a reset) puts a recalibrated bundle back on its own
+def apply_thresholds(registry: ModelRegistry, thresholds: dict | None) -> bool:
+    if not registry.loaded:
+        return False
+    if not thresholds:
+        if not registry.risk_thresholds_recalibrated:
+            return False
+        registry.set_risk_thresholds(None)
+        return True
+    if registry.get()[0].get("risk_thresholds") == thresholds:
+        return False
+    registry.set_risk_thresholds(thresholds)
+    return True
+
+
+# per process sketches, flushed through `flusher` every flush_seconds
+class ScoreSketches:
+    def __init__(
+            self,
+            flusher=None,
+            *,
+            registry: ModelRegistry | None = None,
+            k: int = DEFAULT_K,
+            flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+        ):
+        # async (model_version, sketch or None) -> stored thresholds for that version or None
+        self.flusher = flusher
+        self.registry = registry or model_registry
+        self.k = max(8, int(k))
+        self.flush_seconds = float(flush_seconds)
+        self.pending: dict[str, KLLSketch] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, model_version: str | None, scores) -> None:
+        version = model_version or "unknown"
+        sketch = self.pending.get(version)
+        if sketch is None:
+            sketch = self.pending[version] = KLLSketch(self.k)
+        sketch.update(scores)
+
+    # scores of this process not flushed yet
+    def pending_sketch(self, model_version: str) -> KLLSketch | None:
+        return self.pending.get(model_version)
+
+    # the stored sketch plus this process's unflushed scores, the stored one is left as is
+    def live_sketch(self, model_version: str, stored: KLLSketch | None) -> KLLSketch:
+        sketch = stored.copy() if stored is not None else KLLSketch(self.k)
+        return sketch.merge(self.pending_sketch(model_version))
+
+    # merges every pending sketch into the store and applies the active version's stored
+    # thresholds; a failed merge is kept for the next flush
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        active = self.registry.model_version if self.registry.loaded else None
+        if active is not None and active not in pending:
+            # nothing scored since the last flush, still follow a recalibration
+            pending[active] = None
+
+        for version, sketch in pending.items():
+            try:
+                thresholds = await self.flusher(version, sketch)
+            except Exception:
+                logger.exception("score sketch flush failed for %s", version)
+                if sketch is not None:
+                    # scores added while this flush was awaiting went to a fresh sketch
+                    self.pending[version] = sketch.merge(self.pending.get(version))
+                continue
+            if version != self.registry.model_version:
+                continue
+            if apply_thresholds(self.registry, thresholds):
+                logger.info(
+                    "fraud model %s risk thresholds recalibrated to %s",
+                    version, thresholds or "the bundle's",
+                )
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="fraud-score-sketches")
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+# process wide sketches, the app lifespan sets them up
+_active_sketches: ScoreSketches | None = None
+
+
+def get_score_sketches() -> ScoreSketches | None:
+    return _active_sketches
+
+
+def set_score_sketches(sketches: ScoreSketches | None) -> None:
+    global _active_sketches
+    _active_sketches = sketches
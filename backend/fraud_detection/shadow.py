@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from fraud_detection import metrics
+from fraud_detection.features import uses_profiles
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# shadow mode: a candidate bundle scores the same batches as the live one without
+# touching the stored scores. The scoring service hands every scored batch (already
+# annotated with live merchant stats / profiles) to ShadowScorer.submit, which only
+# queues it; one background task scores the queue on its own executor and writes
+# (live, candidate) score pairs to fraud_shadow_scores. A full queue drops the batch,
+# so the candidate can fall behind but never slows down the live write-back.
+# shadow_report turns those pairs plus reviewed labels into the comparison report.
+
+TIERS = ("low", "medium", "high")
+TIER_CODES = {tier: code for code, tier in enumerate(TIERS)}
+REVIEW_LABELS = ("fraud", "not_fraud")
+
+# queued batches, at FRAUD_MAX_BATCH_SIZE rows each
+DEFAULT_MAX_PENDING = 16
+# share of the highest scores whose overlap between the two models is reported
+DEFAULT_TOP_FRACTION = 0.02
+
+
+# side table rows: (transaction_id, primary_score, primary_tier, shadow_score, shadow_tier)
+def shadow_rows(txn_ids, primary_results, shadow_results) -> list[tuple]:
+    return [
+        (txn_id, primary_score, TIER_CODES[primary_tier], shadow_score, TIER_CODES[shadow_tier])
+        for txn_id, (primary_score, _, primary_tier), (shadow_score, _, shadow_tier)
+        in zip(txn_ids, primary_results, shadow_results)
+    ]
+
+
+class ShadowScorer:
+    def __init__(
+            self,
+            registry: ModelRegistry,
+            writer,
+            *,
+            executor: InferenceExecutor | None = None,
+            max_pending: int = DEFAULT_MAX_PENDING,
+        ):
+        # holds the candidate bundle, never the live one
+        self.registry = registry
+        # async (model_version, rows) -> None, see shadow_score_writer
+        self.writer = writer
+        # separate from the live executor so candidate batches never queue in front of live ones
+        self.executor = executor or InferenceExecutor()
+        self.max_pending = max(1, int(max_pending))
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def model_version(self) -> str | None:
+        return self.registry.model_version
+
+    # the live service annotates profile columns when either bundle reads them
+    def uses_profiles(self) -> bool:
+        return self.registry.loaded and uses_profiles(self.registry.get()[0])
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.create_task(self._run(), name="fraud-shadow-scorer")
+
+    # scores what is already queued, then stops
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            await self._queue.put(None)
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._queue = None
+
+    # waits until every batch submitted so far is written
+    async def drain(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    # never waits; False when the scorer isn't running or is too far behind
+    def submit(self, txn_ids, batch, primary_results) -> bool:
+        if self._queue is None or not txn_ids:
+            return False
+        try:
+            self._queue.put_nowait((list(txn_ids), batch, list(primary_results)))
+        except asyncio.QueueFull:
+            metrics.SHADOW_DROPPED.inc(len(txn_ids))
+            return False
+        return True
+
+    async def score(self, txn_ids, batch, primary_results) -> int:
+        feature_state, models, model_version, _ = self.registry.active()
+        started = time.perf_counter()
+        results = await self.executor.score(batch, feature_state, models)
+        metrics.SHADOW_SECONDS.observe(time.perf_counter() - started)
+
+        rows = shadow_rows(txn_ids, primary_results, results)
+        await self.writer(model_version, rows)
+        metrics.SHADOW_SCORED.inc(len(rows))
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                await self.score(*item)
+            except Exception:
+                # the live scores are already written, only this batch's comparison is lost
+                metrics.SHADOW_DROPPED.inc(len(item[0]))
+                logger.exception("shadow scoring failed for %d transactions", len(item[0]))
+            finally:
+                self._queue.task_done()
+
+
+# Spearman correlation, average ranks for ties like scipy's spearmanr
+def spearman(a, b) -> float | None:
+    if len(a) < 2:
+        return None
+    rank_a = pd.Series(a).rank().to_numpy()
+    rank_b = pd.Series(b).rank().to_numpy()
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return None
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+# share of the top k rows by one model's scores that are also in the other's top k
+def top_overlap(a, b, fraction: float = DEFAULT_TOP_FRACTION) -> float | None:
+    if len(a) == 0:
+        return None
+    k = max(1, math.ceil(len(a) * fraction))
+    top_a = np.argsort(-np.asarray(a), kind="stable")[:k]
+    top_b = np.argsort(-np.asarray(b), kind="stable")[:k]
+    return len(np.intersect1d(top_a, top_b)) / k
+
+
+# first model's tier -> second model's tier -> rows, tiers as TIER_CODES
+def tier_confusion(a, b) -> dict:
+    a, b = np.asarray(a), np.asarray(b)
+    return {
+        tier_a: {
+            tier_b: int(np.sum((a == code_a) & (b == code_b)))
+            for code_b, tier_b in enumerate(TIERS)
+        }
+        for code_a, tier_a in enumerate(TIERS)
+    }
+
+
+def _label_metrics(tiers, is_fraud) -> dict:
+    report = {}
+    for name, flagged in (("high", tiers == TIER_CODES["high"]), ("medium_or_high", tiers > 0)):
+        hits = int(np.sum(flagged & is_fraud))
+        report[f"precision_{name}"] = hits / int(flagged.sum()) if flagged.any() else None
+        report[f"recall_{name}"] = hits / int(is_fraud.sum()) if is_fraud.any() else None
+    return report
+
+
+# rows as SqlShadowScoreRepo.fetch_report_chunk returns them:
+# (transaction_id, primary_score, primary_tier, shadow_score, shadow_tier, fraud_review_status)
+def shadow_report(rows, *, top_fraction: float = DEFAULT_TOP_FRACTION) -> dict:
+    rows = list(rows)
+    n = len(rows)
+    primary_score = np.array([r[1] for r in rows], dtype=float)
+    primary_tier = np.array([r[2] for r in rows], dtype=int)
+    shadow_score = np.array([r[3] for r in rows], dtype=float)
+    shadow_tier = np.array([r[4] for r in rows], dtype=int)
+    status = np.array([r[5] for r in rows], dtype=object)
+
+    reviewed = np.isin(status, REVIEW_LABELS)
+    is_fraud = status[reviewed] == "fraud"
+
+    return {
+        "rows": n,
+        "rank_agreement": {
+            "spearman": spearman(primary_score, shadow_score),
+            "top_fraction": top_fraction,
+            "top_overlap": top_overlap(primary_score, shadow_score, top_fraction),
+        },
+        "tiers": {
+            "flip_rate": float(np.mean(primary_tier != shadow_tier)) if n else None,
+            "raised": int(np.sum(shadow_tier > primary_tier)),
+            "lowered": int(np.sum(shadow_tier < primary_tier)),
+            # live tier -> candidate tier -> rows
+            "confusion": tier_confusion(primary_tier, shadow_tier),
+        },
+        "labels": {
+            "reviewed": int(reviewed.sum()),
+            "fraud": int(is_fraud.sum()),
+            "primary": _label_metrics(primary_tier[reviewed], is_fraud),
+            "shadow": _label_metrics(shadow_tier[reviewed], is_fraud),
+        },
+    }
+
+
+# process wide shadow scorer, the app lifespan sets it up when FRAUD_SHADOW_MODEL_PATH is set
+_active_shadow: ShadowScorer | None = None
+
+
+def get_shadow_scorer() -> ShadowScorer | None:
+    return _active_shadow
+
+
+def set_shadow_scorer(shadow: ShadowScorer | None) -> None:
+    global _active_shadow
+    _active_shadow = shadow
@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from fraud_detection.bundle_format import METADATA_FILE, save_mmap_bundle
+from fraud_detection.drift import reference_histograms
+from fraud_detection.features import BEHAVIORAL_FEATURE_VERSION, build_feature_matrix
+from fraud_detection.merchant_stats import welford_merge, welford_std
+from fraud_detection.user_profile import UserProfileTracker
+
+# trains a bundle straight from the transactions table, same features and model
+# as Fraud-Detection-Model-final.ipynb but streamed in id ordered chunks:
+#   python -m fraud_detection.train --output-dir fraud_detection/models
+# pass 1 collects encoder classes, merchant / global amount stats and a seeded
+# sample for the forest, pass 2 fits the scaler chunk by chunk, so memory is
+# bounded by --chunk-size and --max-samples rather than the table size
+# rows users reviewed as fraud are left out of the fit and used to report recall
+# new bundles are behavioral (feature_version 2): each pass replays the rows through
+# per user profiles so every row gets the profile features it would have been scored with,
+# --base-features trains the original 12 feature model
+
+DEFAULT_CHUNK_SIZE = 20_000
+# IsolationForest only looks at 256 rows per tree, a large uniform sample fits the same model
+DEFAULT_MAX_SAMPLES = 250_000
+DEFAULT_OUTPUT_DIR = "fraud_detection/models"
+DEFAULT_LOW_QUANTILE = 0.90
+DEFAULT_HIGH_QUANTILE = 0.98
+EXCLUDED_LABELS = ("fraud",)
+EVALUATION_LABELS = ("fraud", "not_fraud")
+# labelled rows kept in memory for the evaluation report
+MAX_LABELLED_ROWS = 50_000
+
+
+# (id, amount, payment_channel, pending, date, merchant_name, fraud_review_status
+# [, user_id[, profile_features]]) rows -> columns build_feature_matrix accepts, converted
+# the way rows_to_batch does for scoring
+def rows_to_columns(rows) -> dict:
+    ids, amounts, channels, pendings, dates, merchants, statuses, *rest = zip(*rows)
+    columns = {
+        "id": np.asarray(ids, dtype=np.int64),
+        "amount": np.array([float(a or 0.0) for a in amounts]),
+        "payment_channel": np.array(channels, dtype=object),
+        "pending": np.array([bool(p) for p in pendings]),
+        "date": np.array(
+            [d.isoformat() if hasattr(d, "isoformat") else d for d in dates], dtype=object
+        ),
+        "merchant_name": np.array(merchants, dtype=object),
+        "label": np.array([getattr(s, "value", s) for s in statuses], dtype=object),
+    }
+    if rest:
+        columns["user_id"] = np.array(rest[0], dtype=object)
+    if len(rest) > 1:
+        # one stored snapshot (or None) per row, not a 2d array
+        snapshots = np.empty(len(ids), dtype=object)
+        snapshots[:] = list(rest[1])
+        columns["profile_features"] = snapshots
+    return columns
+
+
+def _chunk_columns(rows, tracker: UserProfileTracker | None) -> dict:
+    columns = rows_to_columns(rows)
+    if tracker is not None:
+        tracker.annotate_columns(columns)
+    columns.pop("profile_features", None)
+    return columns
+
+
+def _take(columns: dict, mask) -> dict:
+    return {k: v[mask] for k, v in columns.items()}
+
+
+def _concat(a: dict | None, b: dict) -> dict:
+    if a is None:
+        return b
+    return {k: np.concatenate([a[k], b[k]]) for k in b}
+
+
+def _moments(values: np.ndarray) -> tuple[int, float, float]:
+    if len(values) == 0:
+        return 0, 0.0, 0.0
+    mean = float(values.mean())
+    return len(values), mean, float(((values - mean) ** 2).sum())
+
+
+# everything pass 1 learns about the table
+class TrainingScan:
+    def __init__(self, *, max_samples: int = DEFAULT_MAX_SAMPLES, random_state: int = 42):
+        self.max_samples = max(1, int(max_samples))
+        self._rng = np.random.default_rng(random_state)
+
+        self.rows = 0
+        self.last_id = 0
+        self.label_counts: dict[str, int] = {}
+        self.merchants: set = set()
+        self.channels: set = set()
+        self.merchant_moments: dict[str, tuple[int, float, float]] = {}
+        self.global_moments = (0, 0.0, 0.0)
+
+        self.sample: dict | None = None
+        self._sample_keys = np.zeros(0)
+        self.labelled: dict | None = None
+
+
+    def add(self, columns: dict) -> None:
+        n = len(columns["id"])
+        self.rows += n
+        self.last_id = max(self.last_id, int(columns["id"].max()))
+        for label, count in zip(*np.unique(columns["label"].astype(str), return_counts=True)):
+            self.label_counts[str(label)] = self.label_counts.get(str(label), 0) + int(count)
+
+        # the encoders see every row like the notebook, the stats only normal ones
+        self.merchants.update(m for m in pd.unique(columns["merchant_name"]) if m is not None)
+        self.channels.update(c for c in pd.unique(columns["payment_channel"]) if c is not None)
+
+        normal = _take(columns, ~np.isin(columns["label"], EXCLUDED_LABELS))
+        self.global_moments = welford_merge(self.global_moments, _moments(normal["amount"]))
+
+        frame = pd.DataFrame({"merchant": normal["merchant_name"], "amount": normal["amount"]})
+        grp = frame.dropna(subset=["merchant"]).groupby("merchant")["amount"]
+        grp = grp.agg(["count", "mean", "var"]).fillna(0.0)
+        for merchant, count, mean, var in zip(grp.index, grp["count"], grp["mean"], grp["var"]):
+            chunk = (int(count), float(mean), float(var) * (int(count) - 1))
+            self.merchant_moments[merchant] = welford_merge(
+                self.merchant_moments.get(merchant, (0, 0.0, 0.0)), chunk
+            )
+
+        self._add_sample(normal)
+
+        labelled = _take(columns, np.isin(columns["label"], EVALUATION_LABELS))
+        room = MAX_LABELLED_ROWS - (0 if self.labelled is None else len(self.labelled["id"]))
+        if room > 0 and len(labelled["id"]):
+            self.labelled = _concat(self.labelled, _take(labelled, slice(0, room)))
+
+
+    # bottom-k of a seeded random key per row is a uniform sample that can be
+    # built chunk by chunk; kept in id order so the forest sees the same rows in the same order
+    def _add_sample(self, columns: dict) -> None:
+        keys = self._rng.random(len(columns["id"]))
+        sample = _concat(self.sample, columns)
+        keys = np.concatenate([self._sample_keys, keys])
+        if len(keys) > self.max_samples:
+            keep = np.sort(np.argpartition(keys, self.max_samples - 1)[:self.max_samples])
+            sample, keys = _take(sample, keep), keys[keep]
+        self.sample, self._sample_keys = sample, keys
+
+
+    def feature_state(self) -> dict:
+        merchant_encoder = LabelEncoder().fit(
+            np.array(sorted(self.merchants | {"Unknown"}), dtype=object)
+        )
+        channel_encoder = LabelEncoder().fit(
+            np.array(sorted(self.channels | {"online", "in_store"}), dtype=object)
+        )
+        g_count, g_mean, g_m2 = self.global_moments
+        return {
+            "merchant_encoder": merchant_encoder,
+            "channel_encoder": channel_encoder,
+            "merchant_mean": {m: mean for m, (_, mean, _) in self.merchant_moments.items()},
+            "merchant_std": {
+                m: welford_std(n, m2) for m, (n, _, m2) in self.merchant_moments.items()
+            },
+            "global_amount_mean": g_mean,
+            "global_amount_std": welford_std(g_count, g_m2) or 1.0,
+        }
+
+
+# id ordered chunks from fetch_chunk(after_id, limit), the next chunk is already
+# being fetched while the caller works on the current one
+async def iter_chunks(fetch_chunk, chunk_size: int, *, max_id: int | None = None):
+    next_fetch = asyncio.ensure_future(fetch_chunk(0, chunk_size))
+    try:
+        while next_fetch is not None:
+            rows = await next_fetch
+            next_fetch = None
+            full = len(rows) >= chunk_size
+            if max_id is not None:
+                rows = [r for r in rows if r[0] <= max_id]
+            if not rows:
+                return
+            if full and (max_id is None or rows[-1][0] < max_id):
+                next_fetch = asyncio.ensure_future(fetch_chunk(rows[-1][0], chunk_size))
+            yield rows
+    finally:
+        if next_fetch is not None:
+            next_fetch.cancel()
+
+
+def _score_parallel(forest, X, n_jobs):
+    # score_samples ignores the forest's n_jobs, the threading backend spreads the trees over cores
+    with joblib.parallel_config(backend="threading", n_jobs=n_jobs):
+        return -forest.score_samples(X)
+
+
+def _tiers(scores, thresholds):
+    return np.where(
+        scores >= thresholds["HIGH_RISK_MIN"], "high",
+        np.where(scores >= thresholds["LOW_RISK_MAX"], "medium", "low"),
+    )
+
+
+# how the new thresholds treat rows users already reviewed
+def evaluate_labels(labelled: dict | None, feature_state, forest, n_jobs=None) -> dict:
+    if labelled is None or len(labelled["id"]) == 0:
+        return {}
+    X = feature_state["scaler"].transform(build_feature_matrix(labelled, feature_state))
+    scores = _score_parallel(forest, X, n_jobs)
+    tiers = _tiers(scores, feature_state["risk_thresholds"])
+    report = {}
+    for label in EVALUATION_LABELS:
+        mask = labelled["label"] == label
+        if mask.any():
+            report[label] = {
+                "rows": int(mask.sum()),
+                "flagged_medium_or_high": float(np.mean(tiers[mask] != "low")),
+                "flagged_high": float(np.mean(tiers[mask] == "high")),
+            }
+    return report
+
+
+async def train_model(
+        fetch_chunk,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_samples: int = DEFAULT_MAX_SAMPLES,
+        n_estimators: int = 500,
+        contamination: float = 0.02,
+        random_state: int = 42,
+        n_jobs: int | None = -1,
+        low_quantile: float = DEFAULT_LOW_QUANTILE,
+        high_quantile: float = DEFAULT_HIGH_QUANTILE,
+        behavioral: bool = True,
+        log=print,
+    ) -> tuple[dict, dict, dict]:
+
+    started = time.perf_counter()
+    chunk_size = max(1, int(chunk_size))
+
+    scan = TrainingScan(max_samples=max_samples, random_state=random_state)
+    tracker = UserProfileTracker() if behavioral else None
+    async for rows in iter_chunks(fetch_chunk, chunk_size):
+        columns = await asyncio.to_thread(_chunk_columns, rows, tracker)
+        await asyncio.to_thread(scan.add, columns)
+        log(f"[scan] id <= {scan.last_id}: {scan.rows} rows")
+    if scan.sample is None or len(scan.sample["id"]) == 0:
+        raise ValueError("no transactions to train on")
+
+    feature_state = scan.feature_state()
+    if behavioral:
+        feature_state["feature_version"] = BEHAVIORAL_FEATURE_VERSION
+
+    # pass 2, stops at pass 1's last id so rows synced in between don't skew the scaler;
+    # a fresh replay gives every row the same profile features as in pass 1
+    scaler = StandardScaler()
+    trained_rows = 0
+    tracker = UserProfileTracker() if behavioral else None
+    async for rows in iter_chunks(fetch_chunk, chunk_size, max_id=scan.last_id):
+        columns = await asyncio.to_thread(_chunk_columns, rows, tracker)
+        normal = _take(columns, ~np.isin(columns["label"], EXCLUDED_LABELS))
+        if len(normal["id"]):
+            X = await asyncio.to_thread(build_feature_matrix, normal, feature_state)
+            scaler.partial_fit(X)
+            trained_rows += len(X)
+        log(f"[scaler] id <= {int(columns['id'][-1])}: {trained_rows} rows")
+    feature_state["scaler"] = scaler
+
+    sample_features = build_feature_matrix(scan.sample, feature_state)
+    # what live traffic is compared against for drift, see drift.py
+    feature_state["feature_reference"] = reference_histograms(sample_features)
+    train_data = scaler.transform(sample_features)
+    forest = IsolationForest(
+        contamination=contamination,
+        n_estimators=n_estimators,
+        random_state=random_state,
+        n_jobs=n_jobs,
+    )
+    fit_started = time.perf_counter()
+    await asyncio.to_thread(forest.fit, train_data)
+    fit_seconds = time.perf_counter() - fit_started
+    log(f"[forest] {n_estimators} trees on {len(train_data)} rows in {fit_seconds:.1f}s")
+
+    train_scores = _score_parallel(forest, train_data, n_jobs)
+    feature_state["risk_thresholds"] = {
+        "LOW_RISK_MAX": float(np.quantile(train_scores, low_quantile)),
+        "HIGH_RISK_MIN": float(np.quantile(train_scores, high_quantile)),
+    }
+    models = {
+        "isolation_forest": forest,
+        "contamination": contamination,
+        "random_state": random_state,
+    }
+
+    metadata = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "rows_scanned": scan.rows,
+        "rows_trained": trained_rows,
+        "sample_rows": len(train_data),
+        "last_id": scan.last_id,
+        "label_counts": scan.label_counts,
+        "params": {
+            "chunk_size": chunk_size,
+            "max_samples": scan.max_samples,
+            "n_estimators": n_estimators,
+            "contamination": contamination,
+            "random_state": random_state,
+            "low_quantile": low_quantile,
+            "high_quantile": high_quantile,
+            "excluded_labels": list(EXCLUDED_LABELS),
+            "feature_version": int(feature_state.get("feature_version", 1)),
+        },
+        "risk_thresholds": feature_state["risk_thresholds"],
+        "evaluation": evaluate_labels(scan.labelled, feature_state, forest, n_jobs),
+        "versions": {"sklearn": sklearn.__version__, "numpy": np.__version__},
+    }
+    metadata["seconds"] = time.perf_counter() - started
+    return feature_state, models, metadata
+
+
+# writes <output_dir>/<version>/, either the memory mapped bundle or a joblib file,
+# plus training.json; returns the path FRAUD_MODEL_PATH should point at
+def save_training_bundle(
+        feature_state,
+        models,
+        metadata: dict,
+        output_dir: str,
+        version: str,
+        *,
+        bundle_format: str = "mmap",
+    ) -> str:
+
+    directory = os.path.join(output_dir, version)
+    if os.path.exists(directory):
+        raise FileExistsError(f"model version {version} already exists in {output_dir}")
+
+    metadata = {**metadata, "model_version": version, "format": bundle_format}
+    if bundle_format == "mmap":
+        path = save_mmap_bundle(feature_state, models, directory, model_version=version)
+    elif bundle_format == "joblib":
+        os.makedirs(directory)
+        path = os.path.join(directory, "fraud_model.joblib")
+        joblib.dump({"feature_state": feature_state, "models": models, "metadata": metadata}, path)
+    else:
+        raise ValueError(f"unknown bundle format {bundle_format}")
+
+    with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return path
+
+
+async def _train_from_db(**kwargs):
+    from infrastructure.db.engine import SessionLocal, engine
+    from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
+
+    try:
+        async with SessionLocal() as db:
+            return await train_model(SqlTransactionRepo(db).fetch_training_chunk, **kwargs)
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fraud_detection.train",
+        description="Train a fraud model bundle from the transactions table.",
+    )
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--version", default=None, help="bundle version, defaults to a UTC timestamp"
+    )
+    parser.add_argument("--format", choices=("mmap", "joblib"), default="mmap")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-samples", type=int, default=DEFAULT_MAX_SAMPLES,
+                        help="rows the forest is fitted on")
+    parser.add_argument("--estimators", type=int, default=500)
+    parser.add_argument("--contamination", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--jobs", type=int, default=-1, help="cores for fitting and scoring, -1 = all"
+    )
+    parser.add_argument("--base-features", action="store_true",
+                        help="train without the per user profile features (feature_version 1)")
+    args = parser.parse_args(argv)
+
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    if os.path.exists(os.path.join(args.output_dir, version)):
+        print(f"model version {version} already exists in {args.output_dir}")
+        return 1
+
+    try:
+        feature_state, models, metadata = asyncio.run(_train_from_db(
+            chunk_size=args.chunk_size,
+            max_samples=args.max_samples,
+            n_estimators=args.estimators,
+            contamination=args.contamination,
+            random_state=args.seed,
+            n_jobs=args.jobs,
+            behavioral=not args.base_features,
+        ))
+    except ValueError as e:
+        print(e)
+        return 1
+
+    path = save_training_bundle(
+        feature_state, models, metadata, args.output_dir, version, bundle_format=args.format,
+    )
+    rows, seconds = metadata["rows_scanned"], metadata["seconds"]
+    print(f"saved {version} to {path} ({rows} rows in {seconds:.1f}s)")
+    print(f"thresholds {metadata['risk_thresholds']}, evaluation {metadata['evaluation']}")
+    return 0
+
+
+if __name__ == "__main__":
+    # this may needs to be done for any asyncio.run because issues with windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+from fraud_detection.features import PROFILE_COLUMNS
+from fraud_detection.merchant_stats import welford_std, welford_update
+
+# per user spending profile kept in the user_spend_profile table and updated as
+# transactions are inserted: running amount moments (Welford), how often the user
+# pays each merchant and hourly transaction counts, so the behavioral features are
+# computed from one row per user instead of the user's history
+# a transaction's features are snapshotted when it is inserted (UserSpendProfile.snapshot,
+# stored in transactions.profile_features): the profile holds the user's earlier rows plus
+# that one, never its page-mates or later history. Live scoring, the outbox, rescoring and
+# the training replay (UserProfileTracker) all read that same snapshot
+
+# velocity windows in hours, matching PROFILE_COLUMNS' user_txn_1h / 24h / 7d; Plaid
+# dates are days, so every transaction sits at midnight and user_txn_1h and user_txn_24h
+# both count the same calendar day, user_txn_7d that day and the 6 before it. The 1h
+# column is kept so bundles trained with it still line up
+WINDOW_HOURS = (1, 24, 168)
+# hour buckets kept behind the newest one, so a back-dated transaction (an initial sync
+# comes in newest first) still sees the history around its own date
+HISTORY_HOURS = 90 * 24
+# merchants a profile keeps counts for, the least used are dropped past this
+MAX_TRACKED_MERCHANTS = 500
+
+
+# hours since the epoch per value (date, datetime, iso string or datetime64), -1 when
+# missing or unparsable; distinct values are parsed once like _date_features does
+def hour_index(values) -> np.ndarray:
+    values = np.asarray(values if values is not None else [], dtype=object)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    codes, uniques = pd.factorize(values)
+    table = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    for i, value in enumerate(uniques):
+        dt = pd.to_datetime(value, errors='coerce')
+        if pd.isna(dt):
+            continue
+        if dt.tzinfo is not None:
+            dt = dt.tz_convert(None)
+        table[i] = dt.value // 3_600_000_000_000
+    return table[codes]
+
+
+class UserSpendProfile:
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 merchant_counts: dict | None = None, hour_counts: dict | None = None):
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.merchant_counts = {str(k): int(v) for k, v in (merchant_counts or {}).items()}
+        # json object keys are strings once stored
+        self.hour_counts = {int(k): int(v) for k, v in (hour_counts or {}).items()}
+
+    @classmethod
+    def from_row(cls, row) -> "UserSpendProfile":
+        return cls(
+            row.txn_count, row.amount_mean, row.amount_m2, row.merchant_counts, row.hour_counts
+        )
+
+    def to_values(self) -> dict:
+        return {
+            "txn_count": self.count,
+            "amount_mean": self.mean,
+            "amount_m2": self.m2,
+            "merchant_counts": self.merchant_counts,
+            "hour_counts": {str(k): v for k, v in sorted(self.hour_counts.items())},
+        }
+
+    def add(self, amount, merchant_name, hour: int | None, *, prune: bool = True) -> None:
+        if amount is not None:
+            self.count, self.mean, self.m2 = welford_update(
+                self.count, self.mean, self.m2, float(amount)
+            )
+        if merchant_name:
+            self.merchant_counts[merchant_name] = self.merchant_counts.get(merchant_name, 0) + 1
+            if len(self.merchant_counts) > MAX_TRACKED_MERCHANTS:
+                keep = sorted(self.merchant_counts.items(), key=lambda kv: -kv[1])
+                self.merchant_counts = dict(keep[:MAX_TRACKED_MERCHANTS])
+        if hour is not None and hour >= 0:
+            self.hour_counts[hour] = self.hour_counts.get(hour, 0) + 1
+        if prune:
+            self.prune()
+
+    def prune(self) -> None:
+        if self.hour_counts:
+            cutoff = max(self.hour_counts) - HISTORY_HOURS
+            for old in [h for h in self.hour_counts if h <= cutoff]:
+                del self.hour_counts[old]
+
+    # adds the transaction and returns its PROFILE_COLUMNS, read before pruning so a
+    # transaction older than the kept history still counts itself
+    def snapshot(self, amount, merchant_name, hour: int | None) -> tuple:
+        self.add(amount, merchant_name, hour, prune=False)
+        values = self.features(amount, merchant_name, hour)
+        self.prune()
+        return values
+
+    # PROFILE_COLUMNS for one transaction: amount z-score against the user's own
+    # spending, share of the user's transactions at this merchant and how many
+    # transactions the user had in each window ending at the transaction's hour
+    def features(self, amount, merchant_name, hour: int | None) -> tuple:
+        std = welford_std(self.count, self.m2)
+        z = 0.0
+        if self.count >= 2 and amount is not None:
+            denom = std if std > 0 else 1.0
+            z = float(np.clip((float(amount) - self.mean) / (denom + 1e-6), -5.0, 5.0))
+        share = self.merchant_counts.get(merchant_name, 0) / self.count if self.count else 0.0
+
+        velocity = [0.0] * len(WINDOW_HOURS)
+        if hour is not None and hour >= 0:
+            for h, c in self.hour_counts.items():
+                for i, window in enumerate(WINDOW_HOURS):
+                    if hour - window < h <= hour:
+                        velocity[i] += c
+        return (z, float(share), *velocity)
+
+
+# adds PROFILE_COLUMNS from the user's current profile to each transaction dict that
+# has no stored snapshot, i.e. rows inserted before transactions.profile_features
+def annotate(batch: list[dict], profiles: dict) -> list[dict]:
+    if not profiles:
+        return batch
+    hours = hour_index([txn.get('date') for txn in batch])
+    for txn, hour in zip(batch, hours):
+        profile = profiles.get(txn.get('user_id'))
+        if profile is None or has_snapshot(txn):
+            continue
+        values = profile.features(txn.get('amount'), txn.get('merchant_name'), int(hour))
+        txn.update(zip(PROFILE_COLUMNS, values))
+    return batch
+
+
+def has_snapshot(txn: dict) -> bool:
+    return txn.get(PROFILE_COLUMNS[0]) is not None
+
+
+# replays transactions in id order through in memory profiles, the way the table
+# would have seen them; rows with a stored snapshot (a "profile_features" column) train
+# on it, so they get exactly the features they were scored with
+class UserProfileTracker:
+    def __init__(self):
+        self.profiles: dict = {}
+
+    # columns as rows_to_columns builds them, adds one array per PROFILE_COLUMNS entry
+    def annotate_columns(self, columns: dict) -> dict:
+        n = len(columns["id"])
+        out = np.zeros((n, len(PROFILE_COLUMNS)))
+        users = columns.get("user_id")
+        if users is None:
+            for i, name in enumerate(PROFILE_COLUMNS):
+                columns[name] = out[:, i]
+            return columns
+
+        hours = hour_index(columns["date"])
+        amounts, merchants = columns["amount"], columns["merchant_name"]
+        stored = columns.pop("profile_features", None)
+        for row in range(n):
+            user = users[row]
+            if user is None:
+                continue
+            profile = self.profiles.get(user)
+            if profile is None:
+                profile = self.profiles[user] = UserSpendProfile()
+            hour = int(hours[row])
+            values = profile.snapshot(amounts[row], merchants[row], hour)
+            if stored is not None and stored[row] is not None:
+                values = stored[row]
+            out[row] = values
+
+        for i, name in enumerate(PROFILE_COLUMNS):
+            columns[name] = out[:, i]
+        return columns
@@ -0,0 +1,424 @@
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fraud_detection.compact_model import (
+    CompactIsolationForest,
+    average_path_length,
+    export_compact_bundle,
+)
+from fraud_detection.features import build_feature_matrix, uses_profiles
+from fraud_detection.model_registry import bundle_version
+from fraud_detection.prediction import load_pipeline
+from fraud_detection.shadow import spearman, tier_confusion
+from fraud_detection.train import (
+    DEFAULT_CHUNK_SIZE,
+    EVALUATION_LABELS,
+    MAX_LABELLED_ROWS,
+    _chunk_columns,
+    _concat,
+    _take,
+    iter_chunks,
+    save_training_bundle,
+)
+from fraud_detection.user_profile import UserProfileTracker
+
+# cheaper versions of a bundle's forest and what they cost / lose against it:
+#   python -m fraud_detection.variants fraud_detection/models/<version> \
+#       --output-dir fraud_detection/models
+# every combination of the first N trees, a depth cap and float32 thresholds is scored
+# on a sample of the transactions table; each variant reports its throughput and how
+# closely it follows the full forest (Spearman on scores, tier confusion, recall of the
+# rows the full forest flags, recall of rows reviewed as fraud). The fastest variant
+# that stays within --min-spearman / --min-recall is written as a new versioned bundle
+# variants with fewer trees or shallower trees score on a different scale, their offset
+# and risk thresholds are moved so they flag the same share of the sample as the full forest
+
+DEFAULT_TREE_COUNTS = (50, 100, 200)
+DEFAULT_DEPTH_CAPS = (6,)
+DEFAULT_SAMPLE_ROWS = 50_000
+DEFAULT_REPEATS = 3
+DEFAULT_MIN_SPEARMAN = 0.98
+DEFAULT_MIN_RECALL = 0.95
+# leaf sizes are recovered from leaf values up to this many samples per tree
+MAX_LEAF_SAMPLES = 1 << 16
+
+
+# edges from the tree's root for every node, one vectorized step per level
+def node_depths(forest: CompactIsolationForest) -> np.ndarray:
+    depths = np.zeros(forest.n_nodes, dtype=np.intp)
+    is_leaf = forest.children_left == np.arange(forest.n_nodes)
+    frontier = forest.roots
+    for depth in range(1, forest.max_depth + 1):
+        frontier = frontier[~is_leaf[frontier]]
+        if len(frontier) == 0:
+            break
+        left = forest.children_left[frontier]
+        depths[left] = depth
+        depths[left + 1] = depth
+        frontier = np.concatenate([left, left + 1])
+    return depths
+
+
+# training samples that reached each node; leaves store depth + c(n) (see compact_model),
+# c is increasing so n is read back off a table, inner nodes sum their children
+def node_samples(forest: CompactIsolationForest, depths: np.ndarray | None = None) -> np.ndarray:
+    depths = node_depths(forest) if depths is None else depths
+    is_leaf = forest.children_left == np.arange(forest.n_nodes)
+
+    grid = np.arange(1, MAX_LEAF_SAMPLES + 1)
+    path_lengths = average_path_length(grid)
+    samples = np.zeros(forest.n_nodes, dtype=np.int64)
+    leaf_c = forest.leaf_value[is_leaf] - depths[is_leaf]
+    samples[is_leaf] = np.rint(np.interp(leaf_c, path_lengths, grid)).astype(np.int64)
+
+    for depth in range(int(depths.max(initial=0)) - 1, -1, -1):
+        inner = np.flatnonzero((depths == depth) & ~is_leaf)
+        left = forest.children_left[inner]
+        samples[inner] = samples[left] + samples[left + 1]
+    return samples
+
+
+# the first n_trees trees, their nodes are one contiguous block of the arrays
+def tree_subset(forest: CompactIsolationForest, n_trees: int) -> CompactIsolationForest:
+    n_trees = min(max(1, int(n_trees)), forest.n_estimators)
+    if n_trees == forest.n_estimators:
+        return forest
+    end = int(forest.roots[n_trees])
+    depths = node_depths(forest)[:end]
+    return CompactIsolationForest(
+        feature=forest.feature[:end],
+        threshold=forest.threshold[:end],
+        children_left=forest.children_left[:end],
+        children_right=forest.children_right[:end],
+        leaf_value=forest.leaf_value[:end],
+        roots=forest.roots[:n_trees],
+        max_depth=int(depths.max(initial=0)),
+        # the mean path length is over fewer trees
+        denominator=forest.denominator * n_trees / forest.n_estimators,
+        offset=forest.offset_,
+        n_features_in=forest.n_features_in_,
+    )
+
+
+# every tree cut at max_depth edges, the cut nodes become leaves valued the way
+# sklearn values a leaf holding that many samples; deeper nodes are dropped
+def depth_capped(forest: CompactIsolationForest, max_depth: int) -> CompactIsolationForest:
+    max_depth = max(0, int(max_depth))
+    if max_depth >= forest.max_depth:
+        return forest
+
+    depths = node_depths(forest)
+    node_ids = np.arange(forest.n_nodes)
+    is_leaf = forest.children_left == node_ids
+    cut = (depths == max_depth) & ~is_leaf
+    keep = depths <= max_depth
+
+    leaf_value = np.where(
+        cut, depths + average_path_length(node_samples(forest, depths)), forest.leaf_value
+    )
+    # nodes are breadth first per tree, so the kept ones stay in order and siblings stay adjacent
+    new_ids = np.cumsum(keep) - 1
+    leaves = is_leaf | cut
+    left = new_ids[np.where(leaves, node_ids, forest.children_left)]
+    return CompactIsolationForest(
+        feature=np.where(cut, 0, forest.feature)[keep],
+        threshold=np.where(cut, np.inf, forest.threshold)[keep],
+        children_left=left[keep],
+        children_right=np.where(leaves, left, left + 1)[keep],
+        leaf_value=leaf_value[keep],
+        roots=new_ids[forest.roots],
+        max_depth=max_depth,
+        denominator=forest.denominator,
+        offset=forest.offset_,
+        n_features_in=forest.n_features_in_,
+    )
+
+
+# same trees with float32 split thresholds, half the threshold bytes and float32 comparisons
+def float32_thresholds(forest: CompactIsolationForest) -> CompactIsolationForest:
+    arrays = forest.to_arrays()
+    arrays["threshold"] = np.asarray(forest.threshold, dtype=np.float32)
+    return CompactIsolationForest.from_arrays(arrays)
+
+
+def forest_nbytes(forest: CompactIsolationForest) -> int:
+    return int(sum(getattr(v, "nbytes", 0) for v in forest.to_arrays().values()))
+
+
+# name -> (forest, n_trees, depth cap, float32) for every combination of the knobs;
+# the full forest is always included as "full"
+def build_variants(
+        forest: CompactIsolationForest,
+        *,
+        tree_counts=DEFAULT_TREE_COUNTS,
+        depth_caps=DEFAULT_DEPTH_CAPS,
+        float32: bool = True,
+    ) -> dict:
+
+    counts = sorted({int(n) for n in tree_counts if 0 < int(n) < forest.n_estimators})
+    caps = sorted({int(d) for d in depth_caps if 0 < int(d) < forest.max_depth})
+    variants = {}
+    for n_trees in [*counts, None]:
+        subset = forest if n_trees is None else tree_subset(forest, n_trees)
+        for cap in [*caps, None]:
+            capped = subset if cap is None else depth_capped(subset, cap)
+            for as_float32 in ((False, True) if float32 else (False,)):
+                variant = float32_thresholds(capped) if as_float32 else capped
+                parts = [f"trees{n_trees}" if n_trees else "", f"depth{cap}" if cap else "",
+                         "f32" if as_float32 else ""]
+                name = "-".join(p for p in parts if p) or "full"
+                variants[name] = (variant, n_trees or forest.n_estimators, cap, as_float32)
+    return variants
+
+
+def tier_codes(scores, thresholds) -> np.ndarray:
+    return np.where(
+        scores >= thresholds["HIGH_RISK_MIN"], 2,
+        np.where(scores >= thresholds["LOW_RISK_MAX"], 1, 0),
+    )
+
+
+# offset and thresholds that flag the same share of the sample as the full forest's did
+def calibrate(raw, reference_raw, offset: float, thresholds: dict) -> tuple[float, dict]:
+    suspected = float(np.mean(reference_raw < offset))
+    calibrated = {
+        key: float(np.quantile(-raw, np.mean(-reference_raw < value)))
+        for key, value in thresholds.items()
+    }
+    return float(np.quantile(raw, suspected)), calibrated
+
+
+def _rows_per_second(forest, X, repeats: int) -> float:
+    best = np.inf
+    for _ in range(max(1, int(repeats))):
+        started = time.perf_counter()
+        forest.score_samples(X)
+        best = min(best, time.perf_counter() - started)
+    return len(X) / best if best > 0 else 0.0
+
+
+# X: scaled sample, labelled: (scaled rows, review labels) or None
+def sweep(
+        forest: CompactIsolationForest,
+        thresholds: dict,
+        X,
+        *,
+        labelled=None,
+        tree_counts=DEFAULT_TREE_COUNTS,
+        depth_caps=DEFAULT_DEPTH_CAPS,
+        float32: bool = True,
+        repeats: int = DEFAULT_REPEATS,
+        log=print,
+    ) -> tuple[list[dict], dict]:
+
+    reference_raw = forest.score_samples(X)
+    reference_tiers = tier_codes(-reference_raw, thresholds)
+    reference_suspected = reference_raw < forest.offset_
+    reference_speed = _rows_per_second(forest, X, repeats)
+
+    results, built = [], {}
+    for name, (variant, n_trees, cap, as_float32) in build_variants(
+        forest, tree_counts=tree_counts, depth_caps=depth_caps, float32=float32,
+    ).items():
+        raw = variant.score_samples(X)
+        offset, variant_thresholds = variant.offset_, dict(thresholds)
+        if variant is not forest and (n_trees != forest.n_estimators or cap is not None):
+            offset, variant_thresholds = calibrate(raw, reference_raw, forest.offset_, thresholds)
+        tiers = tier_codes(-raw, variant_thresholds)
+        suspected = raw < offset
+        speed = _rows_per_second(variant, X, repeats)
+
+        result = {
+            "name": name,
+            "trees": n_trees,
+            "max_depth": variant.max_depth,
+            "float32": as_float32,
+            "nodes": variant.n_nodes,
+            "bytes": forest_nbytes(variant),
+            "rows_per_sec": speed,
+            "speedup": speed / reference_speed if reference_speed else None,
+            "spearman": spearman(reference_raw, raw),
+            "tier_agreement": float(np.mean(tiers == reference_tiers)),
+            "tier_confusion": tier_confusion(reference_tiers, tiers),
+            "anomaly_recall": (
+                float(np.mean(suspected[reference_suspected]))
+                if reference_suspected.any() else None
+            ),
+            "offset": offset,
+            "risk_thresholds": variant_thresholds,
+        }
+        if labelled is not None and len(labelled[0]):
+            is_fraud = np.asarray(labelled[1]) == "fraud"
+            if is_fraud.any():
+                labelled_tiers = tier_codes(-variant.score_samples(labelled[0]), variant_thresholds)
+                result["fraud_recall_medium_or_high"] = float(np.mean(labelled_tiers[is_fraud] > 0))
+        results.append(result)
+        built[name] = variant
+        log(f"[{name}] {speed:.0f} rows/sec, spearman {result['spearman']}, "
+            f"tier agreement {result['tier_agreement']:.4f}, recall {result['anomaly_recall']}")
+    return results, built
+
+
+# fastest variant that keeps the rank order and still flags the full forest's anomalies
+def best_variant(
+        results: list[dict],
+        *,
+        min_spearman: float = DEFAULT_MIN_SPEARMAN,
+        min_recall: float = DEFAULT_MIN_RECALL,
+    ) -> dict:
+
+    eligible = [
+        r for r in results
+        if r["name"] == "full" or (
+            (r["spearman"] or 0.0) >= min_spearman and (r["anomaly_recall"] or 0.0) >= min_recall
+        )
+    ]
+    return max(eligible, key=lambda r: (r["rows_per_sec"], -r["nodes"]))
+
+
+# the bundle with its forest swapped for the variant and the calibrated offset / thresholds
+def variant_bundle(feature_state, models, forest: CompactIsolationForest, result: dict):
+    feature_state, models = export_compact_bundle(feature_state, models)
+    arrays = forest.to_arrays()
+    arrays["offset"] = np.float64(result["offset"])
+    feature_state["risk_thresholds"] = dict(result["risk_thresholds"])
+    models["isolation_forest"] = CompactIsolationForest.from_arrays(arrays)
+    return feature_state, models
+
+
+# uniform sample of the table (bottom-k of a seeded key per row, like TrainingScan) plus
+# up to MAX_LABELLED_ROWS reviewed rows; behavioral bundles replay every row through
+# the user profiles so the sample has the profile features it was scored with
+async def load_sample(
+        fetch_chunk,
+        feature_state,
+        *,
+        sample_rows: int = DEFAULT_SAMPLE_ROWS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        random_state: int = 42,
+    ):
+
+    rng = np.random.default_rng(random_state)
+    tracker = UserProfileTracker() if uses_profiles(feature_state) else None
+    sample, keys, labelled = None, np.zeros(0), None
+    async for rows in iter_chunks(fetch_chunk, max(1, int(chunk_size))):
+        columns = await asyncio.to_thread(_chunk_columns, rows, tracker)
+        sample = _concat(sample, columns)
+        keys = np.concatenate([keys, rng.random(len(columns["id"]))])
+        if len(keys) > sample_rows:
+            keep = np.sort(np.argpartition(keys, sample_rows - 1)[:sample_rows])
+            sample, keys = _take(sample, keep), keys[keep]
+
+        reviewed = _take(columns, np.isin(columns["label"], EVALUATION_LABELS))
+        room = MAX_LABELLED_ROWS - (0 if labelled is None else len(labelled["id"]))
+        if room > 0 and len(reviewed["id"]):
+            labelled = _concat(labelled, _take(reviewed, slice(0, room)))
+
+    if sample is None:
+        raise ValueError("no transactions to evaluate on")
+    scaler = feature_state["scaler"]
+    X = scaler.transform(build_feature_matrix(sample, feature_state))
+    if labelled is None:
+        return X, None
+    return X, (scaler.transform(build_feature_matrix(labelled, feature_state)), labelled["label"])
+
+
+async def _sample_from_db(feature_state, **kwargs):
+    from infrastructure.db.engine import SessionLocal, engine
+    from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
+
+    try:
+        async with SessionLocal() as db:
+            return await load_sample(
+                SqlTransactionRepo(db).fetch_training_chunk, feature_state, **kwargs
+            )
+    finally:
+        await engine.dispose()
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fraud_detection.variants",
+        description="Measure smaller variants of a fraud model bundle and save the best one.",
+    )
+    parser.add_argument("model", help="bundle to derive variants from")
+    parser.add_argument("--trees", type=_ints, default=list(DEFAULT_TREE_COUNTS),
+                        help="comma separated tree counts")
+    parser.add_argument("--depths", type=_ints, default=list(DEFAULT_DEPTH_CAPS),
+                        help="comma separated depth caps")
+    parser.add_argument("--no-float32", action="store_true", help="skip float32 threshold variants")
+    parser.add_argument("--sample-rows", type=int, default=DEFAULT_SAMPLE_ROWS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help="timing runs per variant, the best one counts")
+    parser.add_argument("--min-spearman", type=float, default=DEFAULT_MIN_SPEARMAN)
+    parser.add_argument("--min-recall", type=float, default=DEFAULT_MIN_RECALL)
+    parser.add_argument("--output-dir", default=None,
+                        help="save the best variant here as a new version, omit to only report")
+    parser.add_argument("--version", default=None, help="version of the saved variant")
+    parser.add_argument("--format", choices=("mmap", "joblib"), default="mmap")
+    args = parser.parse_args(argv)
+
+    feature_state, models = export_compact_bundle(*load_pipeline(args.model))
+    forest = models["isolation_forest"]
+    print(f"{args.model}: {forest.n_estimators} trees, {forest.n_nodes} nodes, "
+          f"max depth {forest.max_depth}")
+
+    try:
+        X, labelled = asyncio.run(_sample_from_db(
+            feature_state, sample_rows=max(1, args.sample_rows), chunk_size=args.chunk_size,
+        ))
+    except ValueError as e:
+        print(e)
+        return 1
+
+    results, built = sweep(
+        forest, feature_state["risk_thresholds"], X,
+        labelled=labelled, tree_counts=args.trees, depth_caps=args.depths,
+        float32=not args.no_float32, repeats=args.repeats,
+    )
+    best = best_variant(results, min_spearman=args.min_spearman, min_recall=args.min_recall)
+    print(f"best: {best['name']} ({best['speedup']:.2f}x, spearman {best['spearman']}, "
+          f"recall {best['anomaly_recall']})")
+
+    if args.output_dir is None or best["name"] == "full":
+        return 0
+
+    source_version = bundle_version(args.model)
+    version = args.version or (
+        f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{best['name']}"
+    )
+    metadata = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "source_model": args.model,
+        "source_version": source_version,
+        "variant": best,
+        "sweep": results,
+        "sample_rows": len(X),
+    }
+    try:
+        path = save_training_bundle(
+            *variant_bundle(feature_state, models, built[best["name"]], best),
+            metadata, args.output_dir, version, bundle_format=args.format,
+        )
+    except FileExistsError as e:
+        print(e)
+        return 1
+    print(f"saved {best['name']} of {source_version} as {version} to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    # this may needs to be done for any asyncio.run because issues with windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
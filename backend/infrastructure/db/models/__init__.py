@@ -2,4 +2,11 @@ from .user import User
 from .account import Account
 from .connectionItem import ConnectionItem
 from .transaction import Transaction
-from .budgetCategory import BudgetCategory
\ No newline at end of file
+from .budgetCategory import BudgetCategory
+from .fraudScoringJob import FraudScoringJob
+from .merchantAmountStats import MerchantAmountStats
+from .userSpendProfile import UserSpendProfile
+from .fraudShadowScore import FraudShadowScore
+from .fraudScoreSketch import FraudScoreSketch
+from .fraudFeatureHistogram import FraudFeatureHistogram
+from .fraudOnlineDetector import FraudOnlineDetector
\ No newline at end of file
@@ -0,0 +1,25 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import BigInteger, Date, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# fixed-bin counts of the 12 base features for one day's scores with one model version
+# (see fraud_detection/drift.py); the bins come from that version's bundle and each app
+# process adds its own counts in periodically
+class FraudFeatureHistogram(Base):
+    __tablename__ = "fraud_feature_histograms"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    model_version: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    # one list of bin counts per feature, in build_feature_matrix column order
+    counts: Mapped[list] = mapped_column(JSONB, nullable=False, default=list)
+    rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Integer, LargeBinary, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# shared state of an online Half-Space Trees detector (see fraud_detection/online_detector.py),
+# each app process merges the rows it learned from in periodically
+class FraudOnlineDetector(Base):
+    __tablename__ = "fraud_online_detectors"
+
+    name: Mapped[str] = mapped_column(String(128), primary_key=True)
+
+    # tree parameters, a process with other ones doesn't merge into the row
+    params: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # (trees, nodes) float32 node masses in np.save format
+    mass_ref: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    mass_latest: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    latest_rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    windows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # KLL sketches of the scores against the current and the previous reference window
+    calibration: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    previous_calibration: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# KLL sketch of every score a model version produced (see fraud_detection/quantile_sketch.py),
+# each app process merges its own sketch in periodically
+class FraudScoreSketch(Base):
+    __tablename__ = "fraud_score_sketches"
+
+    model_version: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    sketch: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # LOW_RISK_MAX / HIGH_RISK_MIN recalibrated from the sketch, null keeps the bundle's
+    risk_thresholds: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
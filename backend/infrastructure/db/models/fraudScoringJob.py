@@ -0,0 +1,50 @@
+import enum
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Enum, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+class FraudScoringJobStatus(str, enum.Enum):
+    pending    = "pending"
+    processing = "processing"
+    done       = "done"
+    dead       = "dead"
+
+
+# outbox row per transaction waiting to be scored, written in the same db transaction
+# as the upsert so a crash or restart can't lose it
+class FraudScoringJob(Base):
+    __tablename__ = "fraud_scoring_jobs"
+    __table_args__ = (
+        # claim query: next pending jobs that are due, oldest first
+        Index("ix_fraud_jobs_status_available_id", "status", "available_at", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+
+    # one job per transaction, re-enqueueing resets the existing row
+    transaction_id: Mapped[int] = mapped_column(
+        ForeignKey("transactions.id", ondelete="CASCADE"), unique=True, index=True
+    )
+
+    status: Mapped[FraudScoringJobStatus] = mapped_column(
+        Enum(FraudScoringJobStatus, name="fraud_scoring_job_status"),
+        nullable=False,
+        default=FraudScoringJobStatus.pending,
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # bumped on every re-enqueue so a worker holding an older claim can't mark it done
+    generation: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
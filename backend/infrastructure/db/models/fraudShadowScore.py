@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import REAL, DateTime, Integer, SmallInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# scores from a candidate bundle running in shadow mode (see fraud_detection/shadow.py)
+# next to what the live bundle gave the same transaction; kept narrow (real scores,
+# tier codes 0 low / 1 medium / 2 high) since a shadow run writes a row per scored transaction
+class FraudShadowScore(Base):
+    __tablename__ = "fraud_shadow_scores"
+
+    model_version: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # no foreign key, inline sync scoring writes before the transaction's own commit
+    transaction_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    primary_score: Mapped[float] = mapped_column(REAL, nullable=False)
+    primary_tier: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    shadow_score: Mapped[float] = mapped_column(REAL, nullable=False)
+    shadow_tier: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+    scored_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# running amount statistics per merchant (Welford: count, mean, sum of squared
+# differences), updated as transactions are inserted so scoring never aggregates transactions
+class MerchantAmountStats(Base):
+    __tablename__ = "merchant_amount_stats"
+
+    merchant_name: Mapped[str] = mapped_column(String(256), primary_key=True)
+
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    mean: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    m2: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
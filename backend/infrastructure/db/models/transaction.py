@@ -1,4 +1,6 @@
-from sqlalchemy import String, ForeignKey, DateTime, UniqueConstraint, Index, Boolean, Date, Numeric, Enum
+from sqlalchemy import String, ForeignKey, DateTime, UniqueConstraint, Index, Boolean, Date, Numeric, Enum, BigInteger
+from sqlalchemy import Float
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..base import Base
 
@@ -52,6 +54,12 @@ class Transaction(Base):
     fraud_score: Mapped[float | None]
     is_fraud_suspected: Mapped[bool] = mapped_column(Boolean, default=False)
     risk_level: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    # hash of the model inputs + model version the score was computed from
+    fraud_fingerprint: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # model bundle version the score came from (see model_versions.py)
+    fraud_model_version: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # the user's profile features (PROFILE_COLUMNS) as of this transaction's insert
+    profile_features: Mapped[list[float] | None] = mapped_column(ARRAY(Float), nullable=True)
     fraud_review_status: Mapped[FraudReviewStatus] = mapped_column(
         Enum(FraudReviewStatus, name="fraud_review_status"),
         nullable=False,
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+
+# rolling spending profile per user (see fraud_detection/user_profile.py), updated as
+# transactions are inserted so the behavioral features never scan a user's history
+class UserSpendProfile(Base):
+    __tablename__ = "user_spend_profile"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    # Welford moments of the user's amounts
+    txn_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    amount_mean: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    amount_m2: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    # merchant_name -> transactions, hours since epoch -> transactions in the last 7 days
+    merchant_counts: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    hour_counts: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
@@ -0,0 +1,61 @@
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fraud_detection.drift import FeatureHistograms
+from infrastructure.db.models.fraudFeatureHistogram import FraudFeatureHistogram
+
+
+class SqlFeatureHistogramRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # adds one process's counts to the day's row under a row lock, so flushes from
+    # several workers never lose each other's counts; no commit, the caller's
+    # transaction decides when they become visible
+    async def merge(self, day: date, model_version: str, histograms: FeatureHistograms) -> None:
+        if histograms.rows == 0:
+            return
+
+        await self.session.execute(
+            insert(FraudFeatureHistogram)
+            .values(day=day, model_version=model_version, counts=[], rows=0, updated_at=func.now())
+            .on_conflict_do_nothing(
+                index_elements=[FraudFeatureHistogram.day, FraudFeatureHistogram.model_version]
+            )
+        )
+        row = (await self.session.execute(
+            select(FraudFeatureHistogram)
+            .where(
+                FraudFeatureHistogram.day == day,
+                FraudFeatureHistogram.model_version == model_version,
+            )
+            .with_for_update()
+            # a row already in the session must be re-read under the lock
+            .execution_options(populate_existing=True)
+        )).scalar_one()
+
+        merged = FeatureHistograms(histograms.edges).add_counts(row.counts, row.rows)
+        merged.merge(histograms)
+        row.counts = merged.count_lists()
+        row.rows = merged.rows
+        row.updated_at = func.now()
+        await self.session.flush()
+
+
+    # [(day, counts, rows)] of a version from `since` on, oldest first
+    async def load(self, model_version: str, since: date) -> list[tuple[date, list, int]]:
+        result = await self.session.execute(
+            select(
+                FraudFeatureHistogram.day, FraudFeatureHistogram.counts, FraudFeatureHistogram.rows
+            )
+            .where(
+                FraudFeatureHistogram.model_version == model_version,
+                FraudFeatureHistogram.day >= since,
+            )
+            .order_by(FraudFeatureHistogram.day)
+        )
+        return [(row.day, row.counts, row.rows) for row in result]
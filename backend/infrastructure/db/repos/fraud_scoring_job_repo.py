@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Sequence
+
+from sqlalchemy import and_, case, cast, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from infrastructure.db.models.fraudScoringJob import FraudScoringJob, FraudScoringJobStatus
+
+MAX_ERROR_LENGTH = 512
+
+
+# claimed job: (job id, transaction id, generation at claim time)
+ClaimedJob = tuple[int, int, int]
+
+
+# typed enum literal, a bare parameter inside CASE would be sent as text
+def _status(status: FraudScoringJobStatus):
+    return cast(literal(status.value), FraudScoringJob.__table__.c.status.type)
+
+
+class SqlFraudScoringJobRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # adds a pending job per transaction, or resets the existing one so the
+    # latest version of the transaction gets scored again; no commit, the caller's
+    # transaction decides when the jobs become visible to workers
+    async def enqueue(self, transaction_ids: Iterable[int]) -> int:
+        ids = sorted({int(i) for i in transaction_ids or []})
+        if not ids:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        stmt = insert(FraudScoringJob).values([
+            {
+                "transaction_id": txn_id,
+                "status": FraudScoringJobStatus.pending,
+                "attempts": 0,
+                "generation": 0,
+                "available_at": now,
+                "created_at": now,
+            }
+            for txn_id in ids
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FraudScoringJob.transaction_id],
+            set_={
+                "status": FraudScoringJobStatus.pending,
+                "attempts": 0,
+                "generation": FraudScoringJob.generation + 1,
+                "last_error": None,
+                "available_at": now,
+                "locked_at": None,
+                "updated_at": now,
+            },
+        )
+        await self.session.execute(stmt)
+        await self.session.flush()
+        return len(ids)
+
+
+    # marks up to `limit` due jobs as processing and returns them, SKIP LOCKED lets
+    # any number of workers (and app instances) claim from the table without
+    # waiting on each other; processing jobs whose lease ran out are picked up again
+    async def claim_batch(
+            self,
+            limit: int,
+            *,
+            lease_seconds: float,
+            max_attempts: int,
+        ) -> list[ClaimedJob]:
+
+        now = func.now()
+        lease_expired = and_(
+            FraudScoringJob.status == FraudScoringJobStatus.processing,
+            FraudScoringJob.locked_at < now - timedelta(seconds=lease_seconds),
+        )
+
+        # a worker that keeps dying mid batch would otherwise retry forever
+        await self.session.execute(
+            update(FraudScoringJob)
+            .where(lease_expired, FraudScoringJob.attempts >= max_attempts)
+            .values(
+                status=FraudScoringJobStatus.dead,
+                last_error="lease expired",
+                locked_at=None,
+                updated_at=now,
+            )
+        )
+
+        due = (
+            select(FraudScoringJob.id)
+            .where(or_(
+                and_(
+                    FraudScoringJob.status == FraudScoringJobStatus.pending,
+                    FraudScoringJob.available_at <= now,
+                ),
+                lease_expired,
+            ))
+            .order_by(FraudScoringJob.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = (await self.session.execute(
+            update(FraudScoringJob)
+            .where(FraudScoringJob.id.in_(due))
+            .values(
+                status=FraudScoringJobStatus.processing,
+                attempts=FraudScoringJob.attempts + 1,
+                locked_at=now,
+                updated_at=now,
+            )
+            .returning(
+                FraudScoringJob.id, FraudScoringJob.transaction_id, FraudScoringJob.generation
+            )
+        )).all()
+        return sorted((int(r[0]), int(r[1]), int(r[2])) for r in rows)
+
+
+    # jobs re-enqueued while they were being scored have a newer generation and stay pending
+    async def mark_done(self, jobs: Sequence[ClaimedJob]) -> int:
+        if not jobs:
+            return 0
+
+        result = await self.session.execute(
+            update(FraudScoringJob)
+            .where(
+                tuple_(FraudScoringJob.id, FraudScoringJob.generation).in_(
+                    [(job_id, generation) for job_id, _, generation in jobs]
+                ),
+                FraudScoringJob.status == FraudScoringJobStatus.processing,
+            )
+            .values(
+                status=FraudScoringJobStatus.done,
+                last_error=None,
+                locked_at=None,
+                updated_at=func.now(),
+            )
+        )
+        await self.session.flush()
+        return result.rowcount or 0
+
+
+    # back to pending with exponential backoff, or dead once max_attempts is reached
+    async def mark_failed(
+            self,
+            jobs: Sequence[ClaimedJob],
+            error: str,
+            *,
+            max_attempts: int,
+            retry_base_seconds: float,
+        ) -> int:
+
+        if not jobs:
+            return 0
+
+        retries = func.power(2, FraudScoringJob.attempts - 1)
+        backoff = timedelta(seconds=retry_base_seconds) * retries
+        result = await self.session.execute(
+            update(FraudScoringJob)
+            .where(
+                tuple_(FraudScoringJob.id, FraudScoringJob.generation).in_(
+                    [(job_id, generation) for job_id, _, generation in jobs]
+                ),
+                FraudScoringJob.status == FraudScoringJobStatus.processing,
+            )
+            .values(
+                status=case(
+                    (FraudScoringJob.attempts >= max_attempts, _status(FraudScoringJobStatus.dead)),
+                    else_=_status(FraudScoringJobStatus.pending),
+                ),
+                available_at=func.now() + backoff,
+                last_error=(error or "")[:MAX_ERROR_LENGTH],
+                locked_at=None,
+                updated_at=func.now(),
+            )
+        )
+        await self.session.flush()
+        return result.rowcount or 0
+
+
+    async def count_by_status(self) -> dict[str, int]:
+        rows = (await self.session.execute(
+            select(FraudScoringJob.status, func.count()).group_by(FraudScoringJob.status)
+        )).all()
+        counts = {status.value: 0 for status in FraudScoringJobStatus}
+        for status, count in rows:
+            counts[getattr(status, "value", status)] = int(count)
+        return counts
@@ -0,0 +1,123 @@
+from sqlalchemy import BigInteger, Float, String, bindparam, case, cast, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fraud_detection.merchant_stats import welford_update
+from infrastructure.db.models.merchantAmountStats import MerchantAmountStats
+
+
+# merchant -> (count, mean, m2) of the given (merchant, amount) pairs
+def _partials(pairs) -> dict[str, tuple[int, float, float]]:
+    partials: dict[str, tuple[int, float, float]] = {}
+    for merchant_name, amount in pairs:
+        if not merchant_name or amount is None:
+            continue
+        partials[merchant_name] = welford_update(
+            *partials.get(merchant_name, (0, 0.0, 0.0)), float(amount)
+        )
+    return partials
+
+
+def _typed_array(items: list, item_type):
+    # explicit cast so postgres knows the element type of the bound list
+    return cast(bindparam(None, items, type_=ARRAY(item_type)), ARRAY(item_type))
+
+
+class SqlMerchantStatsRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # one Welford step, same as add_amounts with a single value
+    async def add_amount(self, merchant_name: str | None, amount) -> None:
+        await self.add_amounts([(merchant_name, amount)])
+
+
+    # (merchant, amount) pairs, e.g. every transaction a sync page inserted; each merchant's
+    # values are reduced to (count, mean, m2) with welford_update and merged into its row by
+    # one upsert (Chan et al., welford_merge in SQL); the SET expressions all read the old row
+    # so concurrent syncs for the same merchant serialize on the row lock
+    async def add_amounts(self, pairs) -> None:
+        partials = _partials(pairs)
+        if not partials:
+            return
+
+        ins = insert(MerchantAmountStats).values([
+            {
+                "merchant_name": name,
+                "count": count,
+                "mean": mean,
+                "m2": m2,
+                "updated_at": func.now(),
+            }
+            # sorted so two syncs lock shared merchants in the same order
+            for name, (count, mean, m2) in sorted(partials.items())
+        ])
+        stats = MerchantAmountStats.__table__.c
+        new = ins.excluded
+        old_count, new_count = cast(stats.count, Float), cast(new.count, Float)
+        total = old_count + new_count
+        delta = new.mean - stats.mean
+
+        stmt = ins.on_conflict_do_update(
+            index_elements=[MerchantAmountStats.merchant_name],
+            set_={
+                "count": stats.count + new.count,
+                "mean": stats.mean + delta * new_count / total,
+                "m2": stats.m2 + new.m2 + delta * delta * old_count * new_count / total,
+                "updated_at": func.now(),
+            },
+        )
+        await self.session.execute(stmt)
+
+
+    # (merchant, amount) pairs that no longer count, e.g. removed transactions or the
+    # pending amount a posted one replaced; reduced like add_amounts and taken back out of
+    # each merchant's row by one UPDATE (welford_unmerge in SQL)
+    async def remove_amounts(self, pairs) -> None:
+        partials = _partials(pairs)
+        if not partials:
+            return
+
+        names = sorted(partials)
+        part = func.unnest(
+            _typed_array(names, String),
+            _typed_array([partials[n][0] for n in names], BigInteger),
+            _typed_array([partials[n][1] for n in names], Float),
+            _typed_array([partials[n][2] for n in names], Float),
+        ).table_valued("merchant_name", "count", "mean", "m2").render_derived(name="part")
+
+        stats = MerchantAmountStats.__table__.c
+        total, removed = cast(stats.count, Float), cast(part.c.count, Float)
+        rest = total - removed
+        rest_mean = (total * stats.mean - removed * part.c.mean) / func.nullif(rest, 0)
+        delta = part.c.mean - rest_mean
+        await self.session.execute(
+            update(MerchantAmountStats)
+            .where(MerchantAmountStats.merchant_name == part.c.merchant_name)
+            .values(
+                count=func.greatest(stats.count - part.c.count, 0),
+                mean=case((rest > 0, rest_mean), else_=0.0),
+                m2=case((
+                    rest > 0,
+                    func.greatest(
+                        stats.m2 - part.c.m2 - delta * delta * rest * removed / total, 0.0
+                    ),
+                ), else_=0.0),
+                updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+    # merchant -> (count, mean, m2), one row per merchant so this stays small
+    async def load_all(self, min_count: int = 1) -> dict[str, tuple[int, float, float]]:
+        rows = (await self.session.execute(
+            select(
+                MerchantAmountStats.merchant_name,
+                MerchantAmountStats.count,
+                MerchantAmountStats.mean,
+                MerchantAmountStats.m2,
+            ).where(MerchantAmountStats.count >= min_count)
+        )).all()
+        return {name: (int(count), float(mean), float(m2)) for name, count, mean, m2 in rows}
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fraud_detection.online_detector import merge_checkpoint
+from infrastructure.db.models.fraudOnlineDetector import FraudOnlineDetector
+
+
+def _to_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array, dtype=np.float32), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _from_bytes(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def _state(row: FraudOnlineDetector) -> dict:
+    return {
+        "params": row.params,
+        "mass_ref": _from_bytes(row.mass_ref),
+        "mass_latest": _from_bytes(row.mass_latest),
+        "latest_rows": row.latest_rows,
+        "windows": row.windows,
+        "calibration": row.calibration,
+        "previous_calibration": row.previous_calibration,
+    }
+
+
+class SqlOnlineDetectorRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # checkpoint state of a detector (see merge_checkpoint), None before its first merge
+    async def load(self, name: str) -> dict | None:
+        row = (await self.session.execute(
+            select(FraudOnlineDetector).where(FraudOnlineDetector.name == name)
+        )).scalar_one_or_none()
+        return _state(row) if row is not None else None
+
+
+    # adds one process's learned rows to the shared state under a row lock, so merges
+    # from several workers never lose each other's rows; returns the merged state.
+    # no commit, the caller's transaction decides when the merge becomes visible
+    async def merge(self, name: str, delta: dict) -> dict:
+        empty = _to_bytes(np.zeros_like(delta["mass_latest"]))
+        await self.session.execute(
+            insert(FraudOnlineDetector)
+            .values(
+                name=name, params=delta["params"], mass_ref=empty, mass_latest=empty,
+                latest_rows=0, windows=0, updated_at=func.now(),
+            )
+            .on_conflict_do_nothing(index_elements=[FraudOnlineDetector.name])
+        )
+        row = (await self.session.execute(
+            select(FraudOnlineDetector)
+            .where(FraudOnlineDetector.name == name)
+            .with_for_update()
+            # a row already in the session must be re-read under the lock
+            .execution_options(populate_existing=True)
+        )).scalar_one()
+
+        merged = merge_checkpoint(_state(row), delta)
+        row.mass_ref = _to_bytes(merged["mass_ref"])
+        row.mass_latest = _to_bytes(merged["mass_latest"])
+        row.latest_rows = merged["latest_rows"]
+        row.windows = merged["windows"]
+        row.calibration = merged["calibration"]
+        row.previous_calibration = merged["previous_calibration"]
+        row.updated_at = func.now()
+        await self.session.flush()
+        return merged
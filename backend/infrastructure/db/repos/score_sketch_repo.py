@@ -0,0 +1,66 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fraud_detection.quantile_sketch import KLLSketch
+from infrastructure.db.models.fraudScoreSketch import FraudScoreSketch
+
+
+class SqlScoreSketchRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # (merged sketch, recalibrated thresholds) of a version, (None, None) before its first flush
+    async def load(self, model_version: str) -> tuple[KLLSketch | None, dict | None]:
+        row = (await self.session.execute(
+            select(FraudScoreSketch.sketch, FraudScoreSketch.risk_thresholds)
+            .where(FraudScoreSketch.model_version == model_version)
+        )).first()
+        if row is None:
+            return None, None
+        return KLLSketch.from_dict(row.sketch), row.risk_thresholds
+
+
+    # merges one process's sketch into the version's row under a row lock, so flushes
+    # from several workers never lose each other's scores; returns the stored thresholds.
+    # no commit, the caller's transaction decides when the merge becomes visible
+    async def merge(self, model_version: str, sketch: KLLSketch | None) -> dict | None:
+        if sketch is None or sketch.count == 0:
+            return (await self.load(model_version))[1]
+
+        await self.session.execute(
+            insert(FraudScoreSketch)
+            .values(model_version=model_version, sketch={}, count=0, updated_at=func.now())
+            .on_conflict_do_nothing(index_elements=[FraudScoreSketch.model_version])
+        )
+        row = (await self.session.execute(
+            select(FraudScoreSketch)
+            .where(FraudScoreSketch.model_version == model_version)
+            .with_for_update()
+            # a row already in the session must be re-read under the lock
+            .execution_options(populate_existing=True)
+        )).scalar_one()
+
+        merged = KLLSketch.from_dict(row.sketch).merge(sketch)
+        row.sketch = merged.to_dict()
+        row.count = merged.count
+        row.updated_at = func.now()
+        await self.session.flush()
+        return row.risk_thresholds
+
+
+    # every process applies these on its next flush, None goes back to the bundle's
+    async def set_risk_thresholds(self, model_version: str, thresholds: dict | None) -> None:
+        await self.session.execute(
+            insert(FraudScoreSketch)
+            .values(
+                model_version=model_version, sketch={}, count=0,
+                risk_thresholds=thresholds, updated_at=func.now(),
+            )
+            .on_conflict_do_update(
+                index_elements=[FraudScoreSketch.model_version],
+                set_={"risk_thresholds": thresholds, "updated_at": func.now()},
+            )
+        )
+        await self.session.commit()
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+from typing import Sequence
+
+from sqlalchemy import REAL, Integer, SmallInteger, String, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from infrastructure.db.models.fraudShadowScore import FraudShadowScore
+from infrastructure.db.models.transaction import Transaction
+from infrastructure.db.repos.transaction_repo import _typed_array
+
+SHADOW_SCORES_CHUNK = 5000
+
+
+class SqlShadowScoreRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # (transaction_id, primary_score, primary_tier, shadow_score, shadow_tier) per row, see
+    # fraud_detection.shadow.shadow_rows; a transaction scored again keeps its latest pair
+    async def save(self, model_version: str, rows: Sequence[tuple]) -> int:
+        if not rows:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        for start in range(0, len(rows), SHADOW_SCORES_CHUNK):
+            chunk = rows[start:start + SHADOW_SCORES_CHUNK]
+            scored = func.unnest(
+                _typed_array([int(r[0]) for r in chunk], Integer),
+                _typed_array([float(r[1]) for r in chunk], REAL),
+                _typed_array([int(r[2]) for r in chunk], SmallInteger),
+                _typed_array([float(r[3]) for r in chunk], REAL),
+                _typed_array([int(r[4]) for r in chunk], SmallInteger),
+            ).table_valued(
+                "transaction_id", "primary_score", "primary_tier", "shadow_score", "shadow_tier",
+            ).render_derived(name="scored")
+
+            stmt = insert(FraudShadowScore).from_select(
+                ["model_version", "transaction_id", "primary_score", "primary_tier",
+                 "shadow_score", "shadow_tier", "scored_at"],
+                select(
+                    literal(model_version, String),
+                    scored.c.transaction_id,
+                    scored.c.primary_score,
+                    scored.c.primary_tier,
+                    scored.c.shadow_score,
+                    scored.c.shadow_tier,
+                    literal(now, FraudShadowScore.__table__.c.scored_at.type),
+                ),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FraudShadowScore.model_version, FraudShadowScore.transaction_id],
+                set_={
+                    "primary_score": stmt.excluded.primary_score,
+                    "primary_tier": stmt.excluded.primary_tier,
+                    "shadow_score": stmt.excluded.shadow_score,
+                    "shadow_tier": stmt.excluded.shadow_tier,
+                    "scored_at": stmt.excluded.scored_at,
+                },
+            )
+            await self.session.execute(stmt)
+        await self.session.flush()
+        return len(rows)
+
+
+    # candidate versions with shadow scores and how many rows each has
+    async def versions(self) -> dict[str, int]:
+        rows = (await self.session.execute(
+            select(FraudShadowScore.model_version, func.count())
+            .group_by(FraudShadowScore.model_version)
+            .order_by(FraudShadowScore.model_version)
+        )).all()
+        return {version: int(count) for version, count in rows}
+
+
+    # keyset paged report input: (transaction_id, primary_score, primary_tier, shadow_score,
+    # shadow_tier, fraud_review_status); shadow rows whose transaction never committed drop out
+    async def fetch_report_chunk(
+            self,
+            model_version: str,
+            after_id: int,
+            limit: int,
+        ) -> list[tuple]:
+
+        rows = (await self.session.execute(
+            select(
+                FraudShadowScore.transaction_id,
+                FraudShadowScore.primary_score,
+                FraudShadowScore.primary_tier,
+                FraudShadowScore.shadow_score,
+                FraudShadowScore.shadow_tier,
+                Transaction.fraud_review_status,
+            )
+            .join(Transaction, Transaction.id == FraudShadowScore.transaction_id)
+            .where(
+                FraudShadowScore.model_version == model_version,
+                FraudShadowScore.transaction_id > after_id,
+            )
+            .order_by(FraudShadowScore.transaction_id)
+            .limit(limit)
+        )).all()
+        return [
+            (*row[:5], getattr(row[5], "value", row[5]))
+            for row in rows
+        ]
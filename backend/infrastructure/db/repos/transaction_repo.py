@@ -1,12 +1,17 @@
 from sqlalchemy import select, update, and_, or_, inspect as sa_inspect, func
+from sqlalchemy import cast, bindparam, literal_column
+from sqlalchemy import Integer, BigInteger, Float, Boolean, String, Numeric, Date
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.dialects.postgresql import insert, ARRAY, array
 from datetime import date
 from decimal import Decimal
 
 from pydantic import BaseModel
+from fraud_detection.features import PROFILE_COLUMNS
 from infrastructure.db.models import Transaction, Account
+from infrastructure.db.repos.merchant_stats_repo import SqlMerchantStatsRepo
+from infrastructure.db.repos.user_spend_profile_repo import SqlUserSpendProfileRepo
 from app.domain.entities import TransactionEntity, ConnectionItemEntity
 from app.utils.cursor import encode_cursor, decode_cursor
 
@@ -16,6 +21,27 @@ from typing import Sequence, Iterable
 
 PAGE_DEFAULT = 50
 PAGE_MAX = 200
+# rows per bulk fraud results statement
+FRAUD_RESULTS_CHUNK = 5000
+# rows per bulk Plaid upsert, ~15 bind params each stays well under the 32767 limit
+UPSERT_CHUNK = 1000
+# Plaid fields an upsert may change, a missing (None) value keeps the stored one
+PATCH_COLUMNS = {
+    "name": String,
+    "merchant_name": String,
+    "amount": Numeric(18, 2),
+    "iso_currency_code": String,
+    "date": Date,
+    "authorized_date": Date,
+    "category": String,
+    "category_id": String,
+    "payment_channel": String,
+}
+
+
+def _typed_array(items: list, item_type):
+    # explicit cast so postgres knows the element type of the bound list
+    return cast(bindparam(None, items, type_=ARRAY(item_type)), ARRAY(item_type))
 
 
 def _row_to_columns_dict(row: Transaction) -> dict:
@@ -35,60 +61,230 @@ def _to_entity(row: Transaction) -> TransactionEntity:
 class SqlTransactionRepo:
     def __init__(self, session: AsyncSession):
         self.session = session
+        self.merchant_stats = SqlMerchantStatsRepo(session)
+        self.user_profiles = SqlUserSpendProfileRepo(session)
 
 
     async def upsert_from_plaid(self, item: ConnectionItemEntity, plaid_data: dict) -> int:
-        plaid_id = plaid_data["transaction_id"]
-        pending_id = plaid_data.get("pending_transaction_id")
-        account_plaid_id = plaid_data["account_id"]
+        txn_id, *_ = (await self.upsert_many_from_plaid(item, [plaid_data]))[0]
+        return txn_id
 
-        account_id = (await self.session.execute(
-            select(Account.id).where(Account.plaid_account_id == account_plaid_id)
-        )).scalar_one_or_none()
 
-        # skipping if the account notin DB
-        if account_id is None:
-            return 0
+    # a whole transactions_sync page in a few statements: one account lookup, one
+    # INSERT ... ON CONFLICT for transactions replacing nothing, one UPDATE for posted
+    # transactions replacing their pending row and one INSERT for posted ones without
+    # one; returns (id, stored fraud_fingerprint, profile_features) per input transaction
+    # in order, (0, None, None) where the account isn't in the db
+    async def upsert_many_from_plaid(
+        self,
+        item: ConnectionItemEntity,
+        plaid_txns: Sequence[dict],
+    ) -> list[tuple[int, int | None, list | None]]:
 
-        patch = _to_patch(plaid_data) 
+        if not plaid_txns:
+            return []
 
-        if pending_id:
-            upd = (
-                update(Transaction)
-                .where(Transaction.pending_transaction_id == pending_id)
-                .values(plaid_transaction_id=plaid_id, pending=False, **patch)
-                .returning(Transaction.id)
+        account_ids = dict((await self.session.execute(
+            select(Account.plaid_account_id, Account.id).where(
+                Account.plaid_account_id.in_({t["account_id"] for t in plaid_txns})
             )
-            merged_id = (await self.session.execute(upd)).scalar_one_or_none()
-            if merged_id:
-                return merged_id
-
-        # inserting to db, using on conflict so only 1 pass
-        ins = insert(Transaction).values(
-            plaid_transaction_id=plaid_id,
-            pending_transaction_id=pending_id,
-            pending=plaid_data.get("pending", False),
-            account_id=account_id,
-            item_id=item.id,
-            user_id=item.user_id,
-            **patch,
+        )).all())
+
+        # the last copy of a transaction in the page wins, a statement can't touch a row twice
+        latest: dict[str, dict] = {}
+        for txn in plaid_txns:
+            if txn["account_id"] in account_ids:
+                latest[txn["transaction_id"]] = txn
+
+        # rows replacing nothing go in first, so a posted transaction finds the pending
+        # one it replaces even when both came in this page; posted ones without a
+        # pending row to take over are inserted after the merge
+        results: dict[str, tuple[int, int | None, list | None]] = {}
+        merges = [t for t in latest.values() if t.get("pending_transaction_id")]
+        await self._insert_chunks(
+            item, account_ids, [t for t in latest.values() if not t.get("pending_transaction_id")],
+            results,
+        )
+        if merges:
+            results.update(await self._merge_posted(merges))
+        await self._insert_chunks(
+            item, account_ids, [t for t in merges if t["transaction_id"] not in results], results,
         )
 
+        return [results.get(t["transaction_id"], (0, None, None)) for t in plaid_txns]
+
+
+    async def _insert_chunks(
+        self,
+        item: ConnectionItemEntity,
+        account_ids: dict[str, int],
+        txns: list[dict],
+        results: dict[str, tuple[int, int | None, list | None]],
+    ) -> None:
+        for start in range(0, len(txns), UPSERT_CHUNK):
+            results.update(await self._insert_or_update(
+                item, account_ids, txns[start:start + UPSERT_CHUNK]
+            ))
+
+
+    # posted transactions take over the row of the pending one they replace
+    async def _merge_posted(
+        self, txns: list[dict]
+    ) -> dict[str, tuple[int, int | None, list | None]]:
+        patches = [_to_patch(t) for t in txns]
+        for patch in patches:
+            # numeric arrays are bound as Decimal, floats from the payload would be rejected
+            if patch.get("amount") is not None:
+                patch["amount"] = Decimal(str(patch["amount"]))
+
+        posted = func.unnest(
+            _typed_array([t["pending_transaction_id"] for t in txns], String),
+            _typed_array([t["transaction_id"] for t in txns], String),
+            *[_typed_array([p.get(col) for p in patches], t) for col, t in PATCH_COLUMNS.items()],
+        ).table_valued(
+            "pending_transaction_id", "plaid_transaction_id", *PATCH_COLUMNS
+        ).render_derived(name="posted")
+
+        # the pending row as it was before this statement, for the merchant stats
+        before = aliased(Transaction, name="before")
+        rows = (await self.session.execute(
+            update(Transaction)
+            .where(
+                Transaction.pending_transaction_id == posted.c.pending_transaction_id,
+                before.id == Transaction.id,
+            )
+            .values(
+                plaid_transaction_id=posted.c.plaid_transaction_id,
+                pending=False,
+                **{col: func.coalesce(posted.c[col], getattr(Transaction, col))
+                   for col in PATCH_COLUMNS},
+            )
+            .returning(
+                posted.c.plaid_transaction_id,
+                Transaction.id,
+                Transaction.fraud_fingerprint,
+                # the pending row's snapshot, the posted one was never added to the profile
+                Transaction.profile_features,
+                before.merchant_name,
+                before.amount,
+                Transaction.merchant_name,
+                Transaction.amount,
+                before.removed,
+            )
+            .execution_options(synchronize_session=False)
+        )).all()
+
+        # a posted amount (e.g. with the tip) replaces the pending one in the merchant stats
+        changed = [
+            (row[4:6], row[6:8]) for row in rows
+            if not row[8] and tuple(row[4:6]) != tuple(row[6:8])
+        ]
+        if changed:
+            await self.merchant_stats.remove_amounts([old for old, _ in changed])
+            await self.merchant_stats.add_amounts([new for _, new in changed])
+        return {
+            plaid_id: (txn_id, fingerprint, features)
+            for plaid_id, txn_id, fingerprint, features, *_ in rows
+        }
+
+
+    async def _insert_or_update(
+        self,
+        item: ConnectionItemEntity,
+        account_ids: dict[str, int],
+        txns: list[dict],
+    ) -> dict[str, tuple[int, int | None, list | None]]:
+
+        patches = {t["transaction_id"]: _to_patch(t) for t in txns}
+        ins = insert(Transaction).values([
+            {
+                "plaid_transaction_id": t["transaction_id"],
+                "pending_transaction_id": t.get("pending_transaction_id"),
+                "pending": t.get("pending", False),
+                "account_id": account_ids[t["account_id"]],
+                "item_id": item.id,
+                "user_id": item.user_id,
+                **{col: patches[t["transaction_id"]].get(col) for col in PATCH_COLUMNS},
+            }
+            for t in txns
+        ])
+
+        # on conflict only the Plaid fields that came with the payload are updated
         upsert = ins.on_conflict_do_update(
             index_elements=[Transaction.plaid_transaction_id],
-            set_=patch,  # trying to limit updated to only plaid related fields
-        ).returning(Transaction.id)
+            set_={
+                col: func.coalesce(ins.excluded[col], getattr(Transaction, col))
+                for col in PATCH_COLUMNS
+            },
+        ).returning(
+            Transaction.plaid_transaction_id,
+            Transaction.id,
+            Transaction.fraud_fingerprint,
+            Transaction.profile_features,
+            literal_column("xmax = 0").label("inserted"),
+        )
+        rows = (await self.session.execute(upsert)).all()
+
+        # each transaction counts once in the merchant stats and the user's profile, on
+        # its first insert (re-syncs and the pending -> posted merge above don't add it again,
+        # the merge only swaps in the posted amount); a "modified" event that changes the
+        # amount in place keeps the inserted one in the stats, Plaid amount changes come
+        # through the posted merge
+        inserted = [
+            (txn_id, patches[plaid_id]) for plaid_id, txn_id, _, _, is_new in rows if is_new
+        ]
+        await self.merchant_stats.add_amounts([
+            (patch.get("merchant_name"), patch.get("amount")) for _, patch in inserted
+        ])
+        snapshots = await self.user_profiles.add_transactions([
+            (txn_id, item.user_id, patch.get("amount"), patch.get("merchant_name"),
+             patch.get("date"))
+            for txn_id, patch in inserted
+        ])
+        if snapshots:
+            await self._set_profile_features(snapshots)
+        return {
+            plaid_id: (txn_id, fingerprint, list(snapshots.get(txn_id, features or ())) or None)
+            for plaid_id, txn_id, fingerprint, features, _ in rows
+        }
 
-        return (await self.session.execute(upsert)).scalar_one()
 
+    # each new transaction's profile snapshot, one UPDATE ... FROM unnest(...) per page
+    async def _set_profile_features(self, snapshots: dict[int, tuple]) -> None:
+        ids = sorted(snapshots)
+        snap = func.unnest(
+            _typed_array(ids, Integer),
+            *[_typed_array([float(snapshots[i][k]) for i in ids], Float)
+              for k in range(len(PROFILE_COLUMNS))],
+        ).table_valued("id", *PROFILE_COLUMNS).render_derived(name="snap")
+        await self.session.execute(
+            update(Transaction)
+            .where(Transaction.id == snap.c.id)
+            .values(profile_features=array([snap.c[col] for col in PROFILE_COLUMNS]))
+            .execution_options(synchronize_session=False)
+        )
+
+
+    # profiles of the given users as this session sees them, including its own upserts
+    async def load_user_profiles(self, user_ids) -> dict:
+        return await self.user_profiles.load_many(user_ids)
 
 
+    # removed transactions are taken back out of the merchant stats, once; the user
+    # profiles keep them, their snapshots describe the history as it was at insert
     async def mark_removed(self, plaid_ids: list[str]) -> None:
         if not plaid_ids:
             return
-        await self.session.execute(
-            update(Transaction).where(Transaction.plaid_transaction_id.in_(plaid_ids)).values(removed=True)
-        )
+        removed = (await self.session.execute(
+            update(Transaction)
+            .where(
+                Transaction.plaid_transaction_id.in_(plaid_ids),
+                Transaction.removed.is_(False),
+            )
+            .values(removed=True)
+            .returning(Transaction.merchant_name, Transaction.amount)
+        )).all()
+        await self.merchant_stats.remove_amounts(removed)
         await self.session.flush()
 
 
@@ -204,7 +400,10 @@ class SqlTransactionRepo:
     
     async def fetch_transactions_for_ML_Model(
         self, ids: Iterable[int]
-    ) -> list[tuple[int, float | None, str | None, bool, object, str | None]]:
+    ) -> list[tuple[
+        int, float | None, str | None, bool, object, str | None, int | None, int,
+        list[float] | None,
+    ]]:
 
         rows = (await self.session.execute(
             select(
@@ -214,45 +413,147 @@ class SqlTransactionRepo:
                 Transaction.pending,
                 Transaction.date,
                 Transaction.merchant_name,
+                Transaction.fraud_fingerprint,
+                Transaction.user_id,
+                Transaction.profile_features,
             ).where(Transaction.id.in_(list(ids)))
         )).all()
         return rows
     
 
+    # keyset page of transactions still open for scoring, ordered by id
+    # after_id is exclusive and max_id inclusive so id ranges can be split between workers
+    async def fetch_rescore_chunk(
+        self,
+        after_id: int,
+        limit: int,
+        *,
+        max_id: int | None = None,
+    ) -> list[tuple[
+        int, float | None, str | None, bool, object, str | None, int | None, int,
+        list[float] | None,
+    ]]:
+
+        conditions = [
+            Transaction.id > after_id,
+            Transaction.removed.is_(False),
+            Transaction.fraud_review_status == "pending",
+        ]
+        if max_id is not None:
+            conditions.append(Transaction.id <= max_id)
+
+        rows = (await self.session.execute(
+            select(
+                Transaction.id,
+                Transaction.amount,
+                Transaction.payment_channel,
+                Transaction.pending,
+                Transaction.date,
+                Transaction.merchant_name,
+                Transaction.fraud_fingerprint,
+                Transaction.user_id,
+                Transaction.profile_features,
+            )
+            .where(*conditions)
+            .order_by(Transaction.id)
+            .limit(limit)
+        )).all()
+        return rows
+
+
+    async def rescore_id_bounds(self) -> tuple[int, int] | None:
+        low, high = (await self.session.execute(
+            select(func.min(Transaction.id), func.max(Transaction.id)).where(
+                Transaction.removed.is_(False),
+                Transaction.fraud_review_status == "pending",
+            )
+        )).one()
+        if low is None:
+            return None
+        return int(low), int(high)
+
+
+    # keyset page of every non-removed transaction with its review label, for training
+    async def fetch_training_chunk(
+        self,
+        after_id: int,
+        limit: int,
+    ) -> list[tuple[
+        int, float | None, str | None, bool, object, str | None, str, int, list[float] | None,
+    ]]:
+
+        rows = (await self.session.execute(
+            select(
+                Transaction.id,
+                Transaction.amount,
+                Transaction.payment_channel,
+                Transaction.pending,
+                Transaction.date,
+                Transaction.merchant_name,
+                Transaction.fraud_review_status,
+                Transaction.user_id,
+                Transaction.profile_features,
+            )
+            .where(Transaction.id > after_id, Transaction.removed.is_(False))
+            .order_by(Transaction.id)
+            .limit(limit)
+        )).all()
+        return rows
+
+
+    # one UPDATE ... FROM unnest(...) per chunk instead of a statement per transaction,
+    # rows a user already reviewed are left alone; returns how many rows changed
+    # updates are (id, score, is_suspected, risk_level[, fraud_fingerprint[, fraud_model_version]])
     async def set_fraud_results(
         self,
-        updates: Sequence[tuple[int, float, bool, str | None]],
-    ) -> bool:
+        updates: Sequence[tuple],
+    ) -> int:
         
         if not updates:
-            return False
+            return 0
 
         now = datetime.now(timezone.utc)
         updated_count = 0
 
-        for txn_id, prediction_score, is_suspected, risk_tier in updates:
-            values = {
-                "fraud_score": prediction_score,
-                "is_fraud_suspected": is_suspected,
-                "updated_at": now,
-            }
-
-            if hasattr(Transaction, "risk_level") and risk_tier is not None:
-                values["risk_level"] = risk_tier
+        for start in range(0, len(updates), FRAUD_RESULTS_CHUNK):
+            chunk = updates[start:start + FRAUD_RESULTS_CHUNK]
+            # one typed array per column, so the whole chunk is 6 bind params
+            scored = func.unnest(
+                _typed_array([int(u[0]) for u in chunk], Integer),
+                _typed_array([float(u[1]) for u in chunk], Float),
+                _typed_array([bool(u[2]) for u in chunk], Boolean),
+                _typed_array([u[3] for u in chunk], String),
+                # the model input fingerprint, updates without one clear it
+                _typed_array([u[4] if len(u) > 4 else None for u in chunk], BigInteger),
+                # bundle that produced the score, updates without one clear it
+                _typed_array([u[5] if len(u) > 5 else None for u in chunk], String),
+            ).table_valued(
+                "id", "fraud_score", "is_fraud_suspected", "risk_level", "fraud_fingerprint",
+                "fraud_model_version",
+            ).render_derived(name="scored")
 
             result = await self.session.execute(
                 update(Transaction)
                 .where(
-                    Transaction.id == txn_id, 
+                    Transaction.id == scored.c.id,
                     Transaction.fraud_review_status == "pending",
                 )
-                .values(**values)
+                .values(
+                    fraud_score=scored.c.fraud_score,
+                    is_fraud_suspected=scored.c.is_fraud_suspected,
+                    # a missing tier keeps the stored one
+                    risk_level=func.coalesce(scored.c.risk_level, Transaction.risk_level),
+                    fraud_fingerprint=scored.c.fraud_fingerprint,
+                    fraud_model_version=scored.c.fraud_model_version,
+                    updated_at=now,
+                )
+                .execution_options(synchronize_session=False)
             )
 
             updated_count += result.rowcount or 0
 
         await self.session.flush()
-        return updated_count > 0
+        return updated_count
     
     async def set_fraud_review(
         self,
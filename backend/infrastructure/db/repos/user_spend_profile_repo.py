@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fraud_detection.user_profile import UserSpendProfile, hour_index
+from infrastructure.db.models.userSpendProfile import UserSpendProfile as UserSpendProfileRow
+
+
+class SqlUserSpendProfileRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    # (txn_id, user_id, amount, merchant_name, date) per newly inserted transaction, e.g.
+    # a whole sync page; each user's profile row is locked, merged in python and written
+    # back once, users in sorted order so concurrent syncs lock them in the same order.
+    # returns txn_id -> its PROFILE_COLUMNS snapshot, rows added in id order like the
+    # training replay
+    async def add_transactions(self, txns) -> dict[int, tuple]:
+        by_user = defaultdict(list)
+        for txn_id, user_id, amount, merchant_name, txn_date in sorted(txns, key=lambda t: t[0]):
+            if user_id is not None:
+                by_user[user_id].append((txn_id, amount, merchant_name, txn_date))
+        if not by_user:
+            return {}
+
+        user_ids = sorted(by_user)
+        await self.session.execute(
+            insert(UserSpendProfileRow)
+            .values([
+                {"user_id": user_id, "txn_count": 0, "amount_mean": 0.0, "amount_m2": 0.0,
+                 "merchant_counts": {}, "hour_counts": {}, "updated_at": func.now()}
+                for user_id in user_ids
+            ])
+            .on_conflict_do_nothing(index_elements=[UserSpendProfileRow.user_id])
+        )
+        rows = (await self.session.execute(
+            select(UserSpendProfileRow)
+            .where(UserSpendProfileRow.user_id.in_(user_ids))
+            .order_by(UserSpendProfileRow.user_id)
+            .with_for_update()
+            # rows already in the session must be re-read under the lock
+            .execution_options(populate_existing=True)
+        )).scalars().all()
+
+        snapshots = {}
+        for row in rows:
+            profile = UserSpendProfile.from_row(row)
+            items = by_user[row.user_id]
+            hours = hour_index([txn_date for _, _, _, txn_date in items])
+            for (txn_id, amount, merchant_name, _), hour in zip(items, hours):
+                snapshots[txn_id] = profile.snapshot(amount, merchant_name, int(hour))
+            for key, value in profile.to_values().items():
+                setattr(row, key, value)
+            row.updated_at = func.now()
+        await self.session.flush()
+        return snapshots
+
+
+    # user_id -> UserSpendProfile for every user in a scoring batch, one query
+    async def load_many(self, user_ids) -> dict[int, UserSpendProfile]:
+        user_ids = sorted({int(u) for u in user_ids or [] if u is not None})
+        if not user_ids:
+            return {}
+        rows = (await self.session.execute(
+            select(
+                UserSpendProfileRow.user_id,
+                UserSpendProfileRow.txn_count,
+                UserSpendProfileRow.amount_mean,
+                UserSpendProfileRow.amount_m2,
+                UserSpendProfileRow.merchant_counts,
+                UserSpendProfileRow.hour_counts,
+            ).where(UserSpendProfileRow.user_id.in_(user_ids))
+        )).all()
+        return {row.user_id: UserSpendProfile.from_row(row) for row in rows}
@@ -1,12 +1,6 @@
-from contextlib import asynccontextmanager
-from fastapi import Depends
-from .engine import engine, SessionLocal
+from .engine import SessionLocal, engine  # noqa: F401
 
-@asynccontextmanager
-async def lifespan(app):
-    yield
-    await engine.dispose()
 
 async def get_db():
     async with SessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
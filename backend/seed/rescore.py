@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from app.config import get_settings
+from app.services.fraud_detection_service import (
+    fingerprint_rows,
+    merchant_stats_loader,
+    rows_to_batch,
+)
+from fraud_detection.features import uses_profiles
+from fraud_detection.merchant_stats import MerchantStatsSnapshot
+from fraud_detection.model_registry import ModelRegistry, bundle_version
+from fraud_detection.model_versions import active_model_path
+from fraud_detection.prediction import predict_batch
+from fraud_detection.user_profile import annotate as annotate_profiles
+from fraud_detection.user_profile import has_snapshot as has_profile_snapshot
+from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
+
+# rescores every non-removed transaction still pending review, e.g. after a new
+# model bundle ships:
+#   python -m seed.rescore --workers 4 --chunk-size 2000
+# it scores with the version promoted in FRAUD_MODEL_REGISTRY_DIR, like the app,
+# or FRAUD_MODEL_PATH when nothing is promoted
+# progress is checkpointed per id range in --checkpoint-dir, running the same
+# command again resumes where it stopped (--restart starts over). The plan is kept
+# for the bundle's version, so a new bundle shipped to the same path or a run that
+# already finished starts a fresh plan
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_CHECKPOINT_DIR = ".rescore"
+PLAN_FILE = "plan.json"
+
+
+# (after_id, max_id] ranges of roughly equal id width, one per worker
+def split_ranges(low: int, high: int, workers: int) -> list[tuple[int, int]]:
+    workers = max(1, min(int(workers), high - low + 1))
+    step = (high - low + 1) / workers
+    bounds = [low - 1 + round(step * i) for i in range(workers)] + [high]
+    return [(bounds[i], bounds[i + 1]) for i in range(workers)]
+
+
+def _write_json(path: str, data: dict) -> None:
+    # write then rename, a crash mid write never leaves a half checkpoint behind
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def range_checkpoint_path(checkpoint_dir: str, index: int) -> str:
+    return os.path.join(checkpoint_dir, f"range-{index}.json")
+
+
+async def rescore_range(
+        session_factory,
+        feature_state,
+        models,
+        *,
+        after_id: int,
+        max_id: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checkpoint_path: str | None = None,
+        label: str = "range",
+        merchant_stats: MerchantStatsSnapshot | None = None,
+        model_version: str | None = None,
+        skip_unchanged: bool = True,
+    ) -> dict:
+
+    checkpoint = (_read_json(checkpoint_path) if checkpoint_path else None) or {}
+    last_id = int(checkpoint.get("last_id", after_id))
+    rows_done = int(checkpoint.get("rows", 0))
+    updated = int(checkpoint.get("updated", 0))
+    skipped = int(checkpoint.get("skipped", 0))
+    scored_now = 0
+    started = time.perf_counter()
+
+    async with session_factory() as db:
+        repo = SqlTransactionRepo(db)
+        while last_id < max_id:
+            rows = await repo.fetch_rescore_chunk(last_id, chunk_size, max_id=max_id)
+            if not rows:
+                break
+
+            changed, fingerprints = fingerprint_rows(
+                rows,
+                model_version,
+                skip_unchanged=skip_unchanged,
+                profiles=uses_profiles(feature_state),
+            )
+            if changed:
+                txn_ids, batch = rows_to_batch(changed)
+                if merchant_stats is not None:
+                    merchant_stats.annotate(batch)
+                if uses_profiles(feature_state):
+                    # rows without an insert time snapshot read the current profile
+                    user_ids = {
+                        txn["user_id"] for txn in batch
+                        if txn["user_id"] is not None and not has_profile_snapshot(txn)
+                    }
+                    if user_ids:
+                        annotate_profiles(batch, await repo.load_user_profiles(user_ids))
+                results = predict_batch(batch, feature_state, models)
+                updated += await repo.set_fraud_results([
+                    (txn_id, score, is_suspected, risk_tier, fingerprint, model_version)
+                    for txn_id, fingerprint, (score, is_suspected, risk_tier)
+                    in zip(txn_ids, fingerprints, results)
+                ])
+                await db.commit()
+
+            # only move the checkpoint once the chunk is committed
+            last_id = max(r[0] for r in rows)
+            rows_done += len(rows)
+            scored_now += len(rows)
+            skipped += len(rows) - len(changed)
+            if checkpoint_path:
+                _write_json(checkpoint_path, {
+                    "last_id": last_id, "rows": rows_done, "updated": updated, "skipped": skipped,
+                })
+
+            elapsed = time.perf_counter() - started
+            rate = scored_now / elapsed if elapsed else 0.0
+            print(f"[{label}] id <= {last_id}: {rows_done} rows, {updated} updated, "
+                  f"{skipped} unchanged, {rate:.0f} rows/sec", flush=True)
+
+    return {
+        "rows": rows_done,
+        "updated": updated,
+        "skipped": skipped,
+        "scored": scored_now,
+        "seconds": time.perf_counter() - started,
+        "last_id": last_id,
+    }
+
+
+def _load_model(model_path: str, compact: bool):
+    registry = ModelRegistry(compact=compact)
+    feature_state, models = registry.load(model_path)
+    return feature_state, models, registry.model_version
+
+
+# process pool entry point, every worker opens its own engine and model copy
+def _rescore_range_in_process(
+        model_path,
+        compact,
+        after_id,
+        max_id,
+        chunk_size,
+        checkpoint_path,
+        label,
+        skip_unchanged=True,
+):
+    from infrastructure.db.engine import SessionLocal, engine
+
+    settings = get_settings()
+    feature_state, models, model_version = _load_model(model_path, compact)
+
+    async def _run():
+        try:
+            # one snapshot for the whole run, the stats barely move while rescoring
+            merchant_stats = None
+            if settings.FRAUD_LIVE_MERCHANT_STATS:
+                min_count = settings.FRAUD_MERCHANT_STATS_MIN_COUNT
+                stats = await merchant_stats_loader(SessionLocal, min_count)()
+                merchant_stats = MerchantStatsSnapshot(stats, min_count=min_count)
+
+            return await rescore_range(
+                SessionLocal, feature_state, models,
+                after_id=after_id, max_id=max_id, chunk_size=chunk_size,
+                checkpoint_path=checkpoint_path, label=label, merchant_stats=merchant_stats,
+                model_version=model_version, skip_unchanged=skip_unchanged,
+            )
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(_run())
+
+
+async def _id_bounds():
+    from infrastructure.db.engine import SessionLocal, engine
+
+    try:
+        async with SessionLocal() as db:
+            return await SqlTransactionRepo(db).rescore_id_bounds()
+    finally:
+        await engine.dispose()
+
+
+def _plan(args, model_path: str) -> dict | None:
+    plan_path = os.path.join(args.checkpoint_dir, PLAN_FILE)
+    plan = None if args.restart else _read_json(plan_path)
+    model_version = bundle_version(model_path)
+
+    if plan is not None and not plan.get("finished"):
+        if plan.get("model_version") == model_version:
+            print(f"resuming {len(plan['ranges'])} ranges from {args.checkpoint_dir}")
+            return plan
+        print(f"checkpoint in {args.checkpoint_dir} is for bundle {plan.get('model_version')}, "
+              f"starting over for {model_version}")
+
+    bounds = asyncio.run(_id_bounds())
+    if bounds is None:
+        print("no pending transactions to rescore")
+        return None
+
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    for name in os.listdir(args.checkpoint_dir):
+        if name.startswith("range-"):
+            os.remove(os.path.join(args.checkpoint_dir, name))
+
+    plan = {
+        "model_path": model_path,
+        "model_version": model_version,
+        "ranges": split_ranges(*bounds, args.workers),
+    }
+    _write_json(plan_path, plan)
+    return plan
+
+
+# every range went through, the next run plans again instead of resuming
+def _finish_plan(args, plan: dict) -> None:
+    _write_json(os.path.join(args.checkpoint_dir, PLAN_FILE), {**plan, "finished": True})
+
+
+def main(argv=None) -> int:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        prog="python -m seed.rescore",
+        description="Rescore all pending, non-removed transactions with the current fraud model.",
+    )
+    parser.add_argument(
+        "--model",
+        default=active_model_path(settings.FRAUD_MODEL_REGISTRY_DIR, settings.FRAUD_MODEL_PATH),
+        help="model bundle to score with, defaults to the promoted version",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes, each gets its own id range"
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR)
+    parser.add_argument("--restart", action="store_true", help="ignore any existing checkpoint")
+    parser.add_argument("--force", action="store_true",
+                        help="rescore rows whose fingerprint says nothing changed too")
+    args = parser.parse_args(argv)
+
+    plan = _plan(args, args.model)
+    if plan is None:
+        return 1
+
+    jobs = [
+        (args.model, settings.FRAUD_COMPACT_MODEL, after_id, max_id, max(1, args.chunk_size),
+         range_checkpoint_path(args.checkpoint_dir, i), f"range {i}", not args.force)
+        for i, (after_id, max_id) in enumerate(plan["ranges"])
+    ]
+
+    started = time.perf_counter()
+    if len(jobs) == 1:
+        results = [_rescore_range_in_process(*jobs[0])]
+    else:
+        # spawn so no worker inherits the parent's event loop or db connections
+        with ProcessPoolExecutor(max_workers=len(jobs), mp_context=get_context("spawn")) as pool:
+            results = list(pool.map(_rescore_range_in_process, *zip(*jobs)))
+    elapsed = time.perf_counter() - started
+    _finish_plan(args, plan)
+
+    scored = sum(r["scored"] for r in results)
+    rows, updated = sum(r["rows"] for r in results), sum(r["updated"] for r in results)
+    skipped = sum(r["skipped"] for r in results)
+    rate = scored / elapsed if elapsed else 0.0
+    print(f"done: {rows} rows, {updated} updated, {skipped} unchanged, "
+          f"{scored} this run in {elapsed:.1f}s ({rate:.0f} rows/sec)")
+    return 0
+
+
+if __name__ == "__main__":
+    # this may needs to be done for any asyncio.run because issues with windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
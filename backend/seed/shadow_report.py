@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from fraud_detection.shadow import DEFAULT_TOP_FRACTION, shadow_report
+from infrastructure.db.repos.shadow_score_repo import SqlShadowScoreRepo
+
+# compares a shadow model with the live one from fraud_shadow_scores:
+#   python -m seed.shadow_report --version 20261018-120000
+# prints rank agreement, tier flips and precision / recall against reviewed labels
+# as JSON; without --version it lists the versions that have shadow scores
+
+DEFAULT_CHUNK_SIZE = 20_000
+
+
+async def collect_rows(session_factory, model_version: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    rows = []
+    last_id = 0
+    async with session_factory() as db:
+        repo = SqlShadowScoreRepo(db)
+        while True:
+            chunk = await repo.fetch_report_chunk(model_version, last_id, chunk_size)
+            if not chunk:
+                break
+            rows.extend(chunk)
+            last_id = chunk[-1][0]
+    return rows
+
+
+async def _run(args) -> dict:
+    from infrastructure.db.engine import SessionLocal, engine
+
+    try:
+        if args.version is None:
+            async with SessionLocal() as db:
+                return {"versions": await SqlShadowScoreRepo(db).versions()}
+        rows = await collect_rows(SessionLocal, args.version, max(1, args.chunk_size))
+        return {
+            "model_version": args.version,
+            **shadow_report(rows, top_fraction=args.top_fraction),
+        }
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m seed.shadow_report",
+        description="Compare a shadow fraud model with the live one.",
+    )
+    parser.add_argument("--version", help="shadow model version, omit to list versions")
+    parser.add_argument("--top-fraction", type=float, default=DEFAULT_TOP_FRACTION,
+                        help="share of highest scores compared for top-k overlap")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", help="write the report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_run(args))
+    if args.version is not None and report["rows"] == 0:
+        print(f"no shadow scores for version {args.version}")
+        return 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    # this may needs to be done for any asyncio.run because issues with windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+
+from benchmarks.run import STAGES, compare, main, run_benchmarks
+from benchmarks.synthetic import generate_transactions, train_bundle
+from fraud_detection.features import build_feature_matrix
+
+
+############################
+# Synthetic Data Tests
+############################
+
+# TC-BENCH-DATA-001: same seed gives the same rows, in the shape the model expects
+def test_generate_transactions_seeded():
+    a = generate_transactions(2000, seed=3)
+    b = generate_transactions(2000, seed=3)
+    c = generate_transactions(2000, seed=4)
+
+    assert a.equals(b)
+    assert not a["amount"].equals(c["amount"])
+    assert len(a) == 2000 and a["transaction_id"].is_unique
+    assert set(a["payment_channel"]) <= {"online", "in_store", "other"}
+    assert (a["amount"] >= 1.0).all()
+    assert a["is_anomaly"].sum() == 40
+
+
+# TC-BENCH-DATA-002: tiny batches still work
+def test_generate_transactions_single_row():
+    df = generate_transactions(1)
+
+    assert len(df) == 1 and not df["is_anomaly"].any()
+
+
+# TC-BENCH-DATA-003: the trained bundle has the keys predict_batch reads
+def test_train_bundle_keys():
+    df = generate_transactions(500)
+    bundle = train_bundle(df, n_estimators=10, n_jobs=1)
+    thresholds = bundle["feature_state"]["risk_thresholds"]
+
+    assert {"merchant_encoder", "channel_encoder", "scaler", "merchant_mean", "merchant_std"} \
+        <= set(bundle["feature_state"])
+    assert thresholds["LOW_RISK_MAX"] <= thresholds["HIGH_RISK_MIN"]
+    X = bundle["feature_state"]["scaler"].transform(build_feature_matrix(df, bundle["feature_state"]))
+    assert np.isfinite(bundle["models"]["isolation_forest"].score_samples(X)).all()
+
+
+############################
+# Runner Tests
+############################
+
+# TC-BENCH-RUN-001: one result per stage and size, end to end included
+def test_run_benchmarks_results():
+    report = run_benchmarks([1, 50], train_rows=400, n_estimators=5, repeat=1, log=lambda _msg: None)
+
+    assert [(r["stage"], r["rows"]) for r in report["results"]] == [
+        (stage, rows) for rows in (1, 50) for stage in STAGES
+    ]
+    assert all(r["median_seconds"] > 0 for r in report["results"])
+    assert report["meta"]["n_estimators"] == 5
+    json.dumps(report)
+
+
+# TC-BENCH-RUN-002: only stages slower than the tolerance are regressions
+def test_compare_regressions():
+    baseline = {"results": [
+        {"stage": "features", "rows": 100, "median_seconds": 1.0},
+        {"stage": "scaling", "rows": 100, "median_seconds": 1.0},
+    ]}
+    current = {"results": [
+        {"stage": "features", "rows": 100, "median_seconds": 1.2},
+        {"stage": "scaling", "rows": 100, "median_seconds": 1.5},
+        {"stage": "scaling", "rows": 1000, "median_seconds": 9.0},
+    ]}
+
+    regressions = compare(current, baseline, tolerance=0.25)
+
+    assert [(r["stage"], r["rows"]) for r in regressions] == [("scaling", 100)]
+    assert regressions[0]["ratio"] == 1.5
+
+
+# TC-BENCH-RUN-003: CLI writes the JSON and fails on a regression when asked
+def test_main_fail_on_regression(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [
+        {"stage": "scaling", "rows": 10, "median_seconds": 1e-12},
+    ]}))
+    output = tmp_path / "out.json"
+    args = ["--sizes", "10", "--stages", "scaling", "--train-rows", "300", "--estimators", "3",
+            "--repeat", "1", "--output", str(output), "--baseline", str(baseline)]
+
+    assert main(args) == 0
+    assert main(args + ["--fail-on-regression"]) == 1
+    assert json.loads(output.read_text())["results"][0]["stage"] == "scaling"
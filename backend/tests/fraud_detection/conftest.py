@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from fraud_detection.features import build_feature_matrix
+
+MERCHANTS = ["Amazon", "Starbucks", "Uber", "Walmart", "Chevron", "Best Buy"]
+CHANNELS = ["online", "in_store", "other"]
+
+
+def _make_transactions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=120, freq="D").strftime("%Y-%m-%d")
+    return pd.DataFrame({
+        "amount": np.round(rng.gamma(2.0, 30.0, n), 2),
+        "merchant_name": rng.choice(MERCHANTS + ["New Merchant"], n),
+        "payment_channel": rng.choice(CHANNELS, n),
+        "pending": rng.random(n) < 0.1,
+        "date": rng.choice(dates, n),
+    })
+
+
+@pytest.fixture(scope="session")
+def make_transactions():
+    return _make_transactions
+
+
+# small version of the bundle the notebook trains, same keys and layout
+@pytest.fixture(scope="session")
+def bundle():
+    df = _make_transactions(2000, seed=42)
+
+    merchant_encoder = LabelEncoder().fit(MERCHANTS + ["Unknown"])
+    channel_encoder = LabelEncoder().fit(CHANNELS)
+    grp = df.groupby("merchant_name", dropna=False)["amount"]
+
+    feature_state = {
+        "merchant_encoder": merchant_encoder,
+        "channel_encoder": channel_encoder,
+        "merchant_mean": grp.mean().to_dict(),
+        "merchant_std": grp.std().fillna(0.0).to_dict(),
+    }
+    data = build_feature_matrix(df, feature_state)
+    feature_state["scaler"] = StandardScaler().fit(data)
+
+    forest = IsolationForest(contamination=0.02, n_estimators=50, random_state=42)
+    forest.fit(feature_state["scaler"].transform(data))
+
+    train_scores = -forest.score_samples(feature_state["scaler"].transform(data))
+    feature_state["risk_thresholds"] = {
+        "LOW_RISK_MAX": float(np.quantile(train_scores, 0.90)),
+        "HIGH_RISK_MIN": float(np.quantile(train_scores, 0.98)),
+    }
+
+    models = {"isolation_forest": forest, "contamination": 0.02, "random_state": 42}
+    return {"feature_state": feature_state, "models": models}
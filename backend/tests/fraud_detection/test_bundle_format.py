@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from fraud_detection.bundle_format import (
+    MANIFEST_FILE,
+    MerchantStatsIndex,
+    is_mmap_bundle,
+    read_manifest,
+    save_mmap_bundle,
+)
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import load_pipeline, predict_batch
+
+
+@pytest.fixture
+def bundle_dir(tmp_path, bundle):
+    directory = tmp_path / "fraud_model"
+    save_mmap_bundle(bundle["feature_state"], bundle["models"], directory, model_version="v1")
+    return directory
+
+
+############################
+# Memory mapped bundle Tests
+############################
+
+# TC-FRAUD-BUNDLE-001: directory bundle scores the same as the joblib bundle
+def test_mmap_bundle_predict_batch(bundle, bundle_dir, make_transactions):
+    rows = make_transactions(300, seed=9)
+    feature_state, models = load_pipeline(str(bundle_dir))
+
+    expected = predict_batch(rows, bundle["feature_state"], bundle["models"])
+    results = predict_batch(rows, feature_state, models)
+
+    np.testing.assert_allclose([r[0] for r in results], [e[0] for e in expected], atol=1e-12)
+    assert [r[1:] for r in results] == [e[1:] for e in expected]
+    assert feature_state["risk_thresholds"] == bundle["feature_state"]["risk_thresholds"]
+
+
+# TC-FRAUD-BUNDLE-002: arrays are memory mapped, not copied into the worker
+def test_mmap_bundle_arrays_mapped(bundle_dir):
+    feature_state, models = load_pipeline(str(bundle_dir / MANIFEST_FILE))
+
+    forest = models["isolation_forest"]
+    assert isinstance(forest.threshold, np.memmap) or isinstance(forest.threshold.base, np.memmap)
+    assert not forest.threshold.flags.writeable
+
+    registry = ModelRegistry()
+    registry.load(str(bundle_dir))
+    stats = registry.stats()
+    assert stats["mapped_bytes"] > stats["memory_bytes"]
+    assert stats["file_bytes"] > 0
+
+
+# TC-FRAUD-BUNDLE-003: manifest records the version and rejects other formats
+def test_mmap_bundle_manifest(bundle_dir):
+    manifest = read_manifest(bundle_dir)
+    assert manifest["model_version"] == "v1"
+    assert manifest["format_version"] == 1
+    assert is_mmap_bundle(bundle_dir) and is_mmap_bundle(bundle_dir / MANIFEST_FILE)
+
+    manifest["format_version"] = 99
+    (bundle_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        load_pipeline(str(bundle_dir))
+
+
+# TC-FRAUD-BUNDLE-004: merchant stats index behaves like the original dicts
+def test_merchant_stats_index():
+    index = MerchantStatsIndex.build(
+        {"Amazon": 48.5, "Uber": 14.2, float("nan"): 3.0},
+        {"Amazon": 20.3},
+    )
+    mean, std = index.column("mean"), index.column("std")
+
+    assert "Amazon" in mean and "Uber" in mean
+    assert "Walmart" not in mean and None not in mean
+    assert mean["Uber"] == 14.2
+    assert std.get("Uber", 0.0) == 0.0
+    assert std.get("Walmart", 0.0) == 0.0
+    assert sorted(mean) == ["Amazon", "Uber"]
+    with pytest.raises(KeyError):
+        mean["Walmart"]
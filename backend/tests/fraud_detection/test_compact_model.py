@@ -0,0 +1,104 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from fraud_detection.compact_model import (
+    CompactIsolationForest,
+    export_compact_bundle,
+    export_isolation_forest,
+)
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+
+############################
+# CompactIsolationForest Tests
+############################
+
+# TC-FRAUD-COMPACT-001: flattened forest reproduces score_samples and predict
+@pytest.mark.parametrize("max_features", [1.0, 0.6])
+def test_compact_forest_matches_sklearn(max_features):
+    rng = np.random.default_rng(0)
+    forest = IsolationForest(n_estimators=60, max_features=max_features, random_state=42)
+    forest.fit(rng.normal(size=(800, 12)))
+    compact = export_isolation_forest(forest)
+
+    X = rng.normal(size=(300, 12)) * 2
+    np.testing.assert_allclose(compact.score_samples(X), forest.score_samples(X), rtol=0, atol=1e-12)
+    assert np.array_equal(compact.predict(X), forest.predict(X))
+    assert compact.n_estimators == 60
+
+
+# TC-FRAUD-COMPACT-002: arrays round trip and the sibling layout is enforced
+def test_compact_forest_arrays_round_trip(bundle):
+    compact = export_isolation_forest(bundle["models"]["isolation_forest"])
+
+    restored = CompactIsolationForest.from_arrays(compact.to_arrays())
+    X = np.random.default_rng(1).normal(size=(50, 12))
+    assert np.array_equal(restored.score_samples(X), compact.score_samples(X))
+
+    arrays = compact.to_arrays()
+    arrays["children_right"] = arrays["children_right"][::-1].copy()
+    with pytest.raises(ValueError):
+        CompactIsolationForest.from_arrays(arrays)
+
+
+# TC-FRAUD-COMPACT-003: non finite inputs are rejected like sklearn does
+def test_compact_forest_rejects_nan(bundle):
+    compact = export_isolation_forest(bundle["models"]["isolation_forest"])
+    X = np.zeros((2, 12))
+    X[1, 3] = np.nan
+    with pytest.raises(ValueError):
+        compact.score_samples(X)
+
+
+# TC-FRAUD-COMPACT-004: compact bundle gives the same predict_batch results
+def test_compact_bundle_predict_batch(bundle, make_transactions):
+    rows = make_transactions(300, seed=5)
+    feature_state, models = export_compact_bundle(bundle["feature_state"], bundle["models"])
+
+    expected = predict_batch(rows, bundle["feature_state"], bundle["models"])
+    results = predict_batch(rows, feature_state, models)
+
+    np.testing.assert_allclose([r[0] for r in results], [e[0] for e in expected], atol=1e-12)
+    assert [r[1:] for r in results] == [e[1:] for e in expected]
+    # the original bundle is left untouched
+    assert isinstance(bundle["models"]["isolation_forest"], IsolationForest)
+
+
+# TC-FRAUD-COMPACT-005: an exported bundle loads and scores without importing sklearn
+def test_compact_bundle_without_sklearn(tmp_path, bundle):
+    path = tmp_path / "compact.joblib"
+    feature_state, models = export_compact_bundle(bundle["feature_state"], bundle["models"])
+    joblib.dump({"feature_state": feature_state, "models": models}, path)
+
+    script = (
+        "import sys\n"
+        "from fraud_detection.prediction import load_pipeline, predict_batch\n"
+        f"fs, m = load_pipeline({str(path)!r})\n"
+        "predict_batch([{'amount': 12.5, 'merchant_name': 'Uber'}], fs, m)\n"
+        "print('sklearn' in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_ROOT, capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "False"
+
+
+# TC-FRAUD-COMPACT-006: registry can swap in the compact engine after loading
+def test_registry_compact_load(tmp_path, bundle):
+    path = tmp_path / "fraud_model.joblib"
+    joblib.dump(bundle, path)
+
+    registry = ModelRegistry(compact=True)
+    _, models = registry.load(str(path))
+
+    assert isinstance(models["isolation_forest"], CompactIsolationForest)
+    assert registry.stats()["compact"] is True
@@ -0,0 +1,246 @@
+from datetime import date as DateType
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pytest
+
+import app.services.fraud_detection_service as svc_mod
+from app.services.fraud_detection_service import FraudDetectionService
+from fraud_detection.drift import (
+    DriftMonitor,
+    FeatureHistograms,
+    bin_edges,
+    drift_report,
+    ks_distance,
+    psi,
+    reference_histograms,
+    window_report,
+)
+from fraud_detection.features import BASE_FEATURE_NAMES, build_feature_matrix
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+
+
+# the monitor queue is an asyncio task, same as in the app lifespan
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _reference_state(bundle, make_transactions):
+    feature_state = dict(bundle["feature_state"])
+    X = build_feature_matrix(make_transactions(2000, seed=42), feature_state)
+    feature_state["feature_reference"] = reference_histograms(X)
+    return feature_state
+
+
+def _registry(tmp_path, feature_state, models):
+    path = tmp_path / "live.joblib"
+    joblib.dump({"feature_state": feature_state, "models": models}, path)
+    registry = ModelRegistry()
+    registry.load(str(path))
+    return registry
+
+
+def _rows(n=100, scale=1.0):
+    merchants = ["Amazon", "Starbucks", "Uber", "Walmart", "Chevron"]
+    return [
+        (i + 1, scale * 5.0 * (i % 23 + 1) ** 1.3, "online" if i % 2 else "in_store", False,
+         DateType(2025, 1, 1 + i % 28), merchants[i % len(merchants)])
+        for i in range(n)
+    ]
+
+
+# stands in for feature_histogram_flusher, adds counts up per (day, version) like the table
+class _Store:
+    def __init__(self):
+        self.rows = {}
+        self.fail = False
+
+    async def __call__(self, day, model_version, histograms):
+        if self.fail:
+            raise RuntimeError("db down")
+        stored = self.rows.setdefault((day, model_version), FeatureHistograms(histograms.edges))
+        stored.merge(histograms)
+
+
+############################
+# Drift Statistics Tests
+############################
+
+# TC-DRIFT-001: fixed bins, mergeable counts, PSI / KS near 0 for the same population and large for a shifted one
+def test_histograms_psi_and_ks():
+    rng = np.random.default_rng(1)
+    train = np.column_stack([rng.normal(50, 10, 20_000), rng.integers(0, 7, 20_000)])
+    edges = bin_edges(train)
+    # deciles for the continuous column, a bin per value (and one above) for the discrete one
+    assert len(edges[0]) == 9
+    np.testing.assert_array_equal(edges[1][:7], np.arange(7))
+    assert len(edges[1]) == 8
+
+    reference = FeatureHistograms(edges)
+    reference.update(train)
+    same = np.column_stack([rng.normal(50, 10, 5_000), rng.integers(0, 7, 5_000)])
+    shifted = np.column_stack([rng.normal(65, 10, 5_000), rng.integers(3, 9, 5_000)])
+
+    # counts from two processes add up to the counts of one
+    halves = FeatureHistograms(edges), FeatureHistograms(edges)
+    halves[0].update(same[:2_000])
+    halves[1].update(same[2_000:])
+    whole = FeatureHistograms(edges)
+    whole.update(same)
+    merged = halves[0].merge(halves[1])
+    assert merged.rows == whole.rows == 5_000
+    assert merged.count_lists() == whole.count_lists()
+    # a stored row read back
+    restored = FeatureHistograms(edges).add_counts(whole.count_lists(), whole.rows)
+    assert restored.count_lists() == whole.count_lists()
+
+    live = FeatureHistograms(edges)
+    live.update(shifted)
+    for j in range(2):
+        assert psi(reference.counts[j], whole.counts[j]) < 0.02
+        assert ks_distance(reference.counts[j], whole.counts[j]) < 0.03
+        assert psi(reference.counts[j], live.counts[j]) > 0.5
+        assert ks_distance(reference.counts[j], live.counts[j]) > 0.3
+    # values never seen in training (7, 8) get a bin of their own
+    assert live.counts[1][-1] > 0 and reference.counts[1][-1] == 0
+    assert psi([5, 5], [5, 5]) == 0.0
+
+
+# TC-DRIFT-002: the report flags shifted features, per day and over the window
+def test_drift_report(bundle, make_transactions):
+    feature_state = _reference_state(bundle, make_transactions)
+    reference = feature_state["feature_reference"]
+    assert reference["features"] == list(BASE_FEATURE_NAMES)
+    assert reference["rows"] == 2000
+    assert [sum(c) for c in reference["counts"]] == [2000] * 12
+
+    normal = build_feature_matrix(make_transactions(3000, seed=5), feature_state)
+    pricey = make_transactions(1000, seed=6)
+    pricey["amount"] = pricey["amount"] * 20
+    expensive = build_feature_matrix(pricey, feature_state)
+
+    daily = {
+        DateType(2025, 3, 1): FeatureHistograms(reference["edges"]),
+        DateType(2025, 3, 2): FeatureHistograms(reference["edges"]),
+    }
+    daily[DateType(2025, 3, 1)].update(normal)
+    daily[DateType(2025, 3, 2)].update(expensive)
+    report = window_report(reference, daily, psi_alert=0.2)
+
+    assert report["rows"] == 4000 and report["reference_rows"] == 2000
+    assert [d["day"] for d in report["days"]] == ["2025-03-01", "2025-03-02"]
+    assert report["days"][0]["drifted"] == []
+    assert {"amount", "log_amount"} <= set(report["days"][1]["drifted"])
+    assert "merchant_code" not in report["days"][1]["drifted"]
+    assert report["features"]["amount"]["psi"] > 0.2
+    assert report["max_psi"] == max(f["psi"] for f in report["features"].values())
+
+    empty = drift_report(reference, [[0]] * 12, 0)
+    assert empty["max_psi"] is None and empty["features"]["amount"]["psi"] is None
+
+
+############################
+# Drift Monitor Tests
+############################
+
+# TC-DRIFT-003: scored batches are binned off the live path and flushed per day, failures keep the counts
+@pytest.mark.anyio
+async def test_service_drift_monitor(tmp_path, bundle, make_transactions):
+    registry = _registry(tmp_path, _reference_state(bundle, make_transactions), bundle["models"])
+    store = _Store()
+    monitor = DriftMonitor(store, flush_seconds=3600)
+
+    def service(drift):
+        return FraudDetectionService(
+            session_factory=None,
+            model_path=registry.model_path,
+            registry=registry,
+            executor=InferenceExecutor(),
+            drift=drift,
+            skip_unchanged=False,
+        )
+
+    await monitor.start()
+    try:
+        expected = await service(None).score_rows(_rows())
+        updates = await service(monitor).score_rows(_rows())
+        await monitor.drain()
+        assert updates == expected
+
+        today = datetime.now(timezone.utc).date()
+        version = registry.model_version
+        [(day, histograms)] = monitor.pending_for(version).items()
+        assert day == today and histograms.rows == 100
+
+        store.fail = True
+        await monitor.flush()
+        await service(monitor).score_rows(_rows(40))
+        await monitor.drain()
+        assert monitor.pending_for(version)[today].rows == 140
+        store.fail = False
+    finally:
+        # the last flush happens on shutdown
+        await monitor.shutdown()
+
+    stored = store.rows[(today, version)]
+    assert stored.rows == 140 and monitor.pending == {}
+    batch = [
+        {"amount": r[1], "payment_channel": r[2], "pending": r[3],
+         "date": r[4].isoformat(), "merchant_name": r[5]}
+        for r in _rows() + _rows(40)
+    ]
+    direct = FeatureHistograms(stored.edges)
+    direct.update(build_feature_matrix(batch, registry.get()[0]))
+    assert stored.count_lists() == direct.count_lists()
+
+    # bundles without training histograms, or a stopped monitor, aren't monitored
+    X = build_feature_matrix(batch, registry.get()[0])
+    assert monitor.submit(version, X, registry.get()[0]) is False
+    assert not monitor.accepts(registry.get()[0])
+    await monitor.start()
+    try:
+        assert not monitor.accepts(bundle["feature_state"])
+        assert monitor.submit(version, X, bundle["feature_state"]) is False
+        assert monitor.accepts(registry.get()[0])
+        assert monitor.submit(version, X, registry.get()[0]) is True
+    finally:
+        await monitor.shutdown()
+
+
+# TC-DRIFT-004: the scoring path builds the batch's features once and the monitor bins those
+@pytest.mark.anyio
+async def test_service_drift_reuses_features(tmp_path, bundle, make_transactions, monkeypatch):
+    registry = _registry(tmp_path, _reference_state(bundle, make_transactions), bundle["models"])
+    store = _Store()
+    monitor = DriftMonitor(store, flush_seconds=3600)
+    built = []
+
+    def _build(batch, feature_state):
+        built.append(len(batch))
+        return build_feature_matrix(batch, feature_state)
+    monkeypatch.setattr(svc_mod, "build_feature_matrix", _build)
+
+    service = FraudDetectionService(
+        session_factory=None,
+        model_path=registry.model_path,
+        registry=registry,
+        executor=InferenceExecutor(),
+        drift=monitor,
+        skip_unchanged=False,
+    )
+    # not running, nothing is built for it
+    await service.score_rows(_rows(10))
+    assert built == []
+
+    await monitor.start()
+    try:
+        await service.score_rows(_rows(30))
+        await monitor.drain()
+    finally:
+        await monitor.shutdown()
+    assert built == [30]
+    [stored] = store.rows.values()
+    assert stored.rows == 30
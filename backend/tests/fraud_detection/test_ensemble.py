@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+import pytest
+
+from fraud_detection import ensemble, metrics
+from fraud_detection.bundle_format import load_mmap_bundle, save_mmap_bundle
+from fraud_detection.compact_model import export_compact_bundle
+from fraud_detection.ensemble import (
+    DEFAULT_SKIP_BATCHES,
+    PRIMARY,
+    build_ensemble,
+    ensemble_scores,
+    to_rank,
+)
+from fraud_detection.features import build_feature_matrix
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+
+
+def _scaled(bundle, make_transactions, n=2000, seed=11):
+    feature_state = bundle["feature_state"]
+    frame = make_transactions(n, seed=seed)
+    return feature_state["scaler"].transform(build_feature_matrix(frame, feature_state))
+
+
+def _batch(make_transactions, n=200, seed=12):
+    frame = make_transactions(n, seed=seed)
+    frame["date"] = frame["date"].astype(str)
+    return frame.to_dict("records")
+
+
+# stands in for a detector, remembers which thread scored it
+class _SlowDetector:
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.threads = []
+
+    def score_samples(self, X):
+        self.threads.append(threading.current_thread().name)
+        if self.seconds:
+            threading.Event().wait(self.seconds)
+        return -np.asarray(X)[:, 0]
+
+
+############################
+# Ensemble Tests
+############################
+
+# TC-ENSEMBLE-001: LOF next to the forest, combined scores calibrated into the usual tiers
+@pytest.mark.parametrize("combine", ["rank_average", "max"])
+def test_build_ensemble(bundle, make_transactions, combine):
+    X = _scaled(bundle, make_transactions)
+    feature_state, models, report = build_ensemble(
+        bundle["feature_state"], bundle["models"], X, combine=combine, log=lambda *_: None,
+    )
+    assert models["ensemble"]["detectors"] == [PRIMARY, "lof"]
+    assert set(report["detectors"]["lof"]) >= {"ms_per_1k", "bytes", "fit_rows"}
+    assert bundle["models"].get("ensemble") is None  # the source bundle is untouched
+
+    results = predict_batch(_batch(make_transactions, 2000, seed=11), feature_state, models)
+    scores = np.array([s for s, _, _ in results])
+    assert ((scores >= 0.0) & (scores <= 1.0)).all()
+    # the sample it was calibrated on lands in the tiers at the calibrated shares
+    tiers = [t for _, _, t in results]
+    assert tiers.count("high") == pytest.approx(0.02 * len(tiers), abs=0.01 * len(tiers))
+    assert tiers.count("low") == pytest.approx(0.90 * len(tiers), abs=0.02 * len(tiers))
+    assert sum(f for _, f, _ in results) == pytest.approx(0.02 * len(tiers), abs=0.01 * len(tiers))
+
+    # the ranks the combined score is made of
+    lof_ranks = to_rank(
+        -models["detectors"]["lof"].score_samples(X), models["ensemble"]["reference"]["lof"]
+    )
+    forest_ranks = to_rank(
+        -models[PRIMARY].score_samples(X), models["ensemble"]["reference"][PRIMARY]
+    )
+    expected = (lof_ranks + forest_ranks) / 2 if combine == "rank_average" else np.maximum(
+        lof_ranks, forest_ranks
+    )
+    np.testing.assert_allclose(ensemble_scores(X, models)[0], expected)
+
+    with pytest.raises(ValueError):
+        build_ensemble(bundle["feature_state"], bundle["models"], X, combine="median")
+    with pytest.raises(ValueError):
+        build_ensemble(
+            bundle["feature_state"], bundle["models"], X, max_ms_per_1k=1e-6, log=lambda *_: None,
+        )
+
+
+# TC-ENSEMBLE-002: the mmap bundle carries the detectors, the registry refuses one over its memory budget
+def test_ensemble_bundle_round_trip(tmp_path, bundle, make_transactions):
+    X = _scaled(bundle, make_transactions)
+    feature_state, models, _ = build_ensemble(
+        *export_compact_bundle(bundle["feature_state"], bundle["models"]), X, log=lambda *_: None,
+    )
+    batch = _batch(make_transactions)
+    expected = predict_batch(batch, feature_state, models)
+
+    directory = save_mmap_bundle(
+        feature_state, models, str(tmp_path / "ensemble"), model_version="e1"
+    )
+    loaded_state, loaded_models = load_mmap_bundle(directory)
+    assert loaded_models["ensemble"] == models["ensemble"]
+    assert predict_batch(batch, loaded_state, loaded_models) == expected
+
+    registry = ModelRegistry(compact=True)
+    registry.load(directory)
+    # a few rows go through the lookup table scorer, same scores as predict_batch
+    assert registry.scorer().score(batch[:5]) == expected[:5]
+
+    models["ensemble"]["budgets"]["lof"]["max_bytes"] = 1024
+    save_mmap_bundle(feature_state, models, str(tmp_path / "too-big"), model_version="e2")
+    with pytest.raises(ValueError, match="lof"):
+        registry.load(str(tmp_path / "too-big"))
+    assert registry.model_version == "e1"
+
+
+# TC-ENSEMBLE-003: extra detectors score on the pool, one over its latency budget sits out batches
+def test_detector_latency_budget(bundle, make_transactions):
+    X = _scaled(bundle, make_transactions, n=50)
+    fast, slow = _SlowDetector(), _SlowDetector(seconds=0.02)
+    reference = np.linspace(-3.0, 3.0, 101).tolist()
+    models = {
+        **bundle["models"],
+        "detectors": {"fast": fast, "slow": slow},
+        "ensemble": {
+            "detectors": [PRIMARY, "fast", "slow"],
+            "combine": "max",
+            "reference": {PRIMARY: reference, "fast": reference, "slow": reference},
+            "fraud_threshold": 0.99,
+            # 20 ms for a 50 row batch counts as 20 ms per 1000 rows
+            "budgets": {"fast": {"max_ms_per_1k": 1000.0}, "slow": {"max_ms_per_1k": 5.0}},
+        },
+    }
+    skipped = metrics.DETECTOR_SKIPPED.labels("slow").value
+
+    fallback = metrics.ENSEMBLE_FALLBACK.value
+
+    assert ensemble_scores(X, models)[2] is None
+    assert all(d.threads[0].startswith("fraud-detector") for d in (fast, slow))
+    for _ in range(DEFAULT_SKIP_BATCHES):
+        scores, fraud_threshold, thresholds = ensemble_scores(X, models)
+    # while slow sits out the primary scores alone, against its own thresholds
+    assert len(slow.threads) == 1 and len(fast.threads) == 1
+    assert metrics.DETECTOR_SKIPPED.labels("slow").value == skipped + DEFAULT_SKIP_BATCHES * len(X)
+    assert metrics.ENSEMBLE_FALLBACK.value == fallback + DEFAULT_SKIP_BATCHES * len(X)
+    np.testing.assert_allclose(
+        scores, to_rank(-models[PRIMARY].score_samples(X), reference)
+    )
+    assert thresholds["HIGH_RISK_MIN"] == 0.98 and fraud_threshold == thresholds["fraud_threshold"]
+
+    # after the break it is tried again
+    assert ensemble_scores(X, models)[2] is None
+    assert len(slow.threads) == 2 and len(fast.threads) == 2
+    ensemble._guards.clear()
+
+
+# TC-ENSEMBLE-004: with a detector sitting out, the primary's own calibration keeps the tier shares
+def test_skipped_detector_uses_primary_thresholds(bundle, make_transactions):
+    X = _scaled(bundle, make_transactions)
+    feature_state, models, _ = build_ensemble(
+        bundle["feature_state"], bundle["models"], X, log=lambda *_: None,
+    )
+    primary = models["ensemble"]["primary_thresholds"]
+    assert set(primary) == {"fraud_threshold", "LOW_RISK_MAX", "HIGH_RISK_MIN"}
+
+    ensemble._guard(models["detectors"]["lof"], {}).skip_left = 1
+    try:
+        results = predict_batch(_batch(make_transactions, 2000, seed=11), feature_state, models)
+    finally:
+        ensemble._guards.clear()
+
+    tiers = [t for _, _, t in results]
+    assert tiers.count("high") == pytest.approx(0.02 * len(tiers), abs=0.01 * len(tiers))
+    assert tiers.count("low") == pytest.approx(0.90 * len(tiers), abs=0.02 * len(tiers))
+    assert sum(f for _, f, _ in results) == pytest.approx(0.02 * len(tiers), abs=0.01 * len(tiers))
+    assert all(s >= primary["HIGH_RISK_MIN"] for s, _, t in results if t == "high")
@@ -0,0 +1,108 @@
+import math
+from datetime import date, datetime
+
+import joblib
+import numpy as np
+
+from fraud_detection.compact_model import export_compact_bundle
+from fraud_detection.fast_scorer import MAX_ROW_LOOP, FastScorer
+from fraud_detection.features import build_feature_matrix
+from fraud_detection.merchant_stats import MerchantStatsSnapshot
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+
+# rows that hit every fallback create_row has
+EDGE_ROWS = [
+    {"amount": 12.5, "merchant_name": "Starbucks", "payment_channel": "in_store",
+     "pending": False, "date": "2025-03-08T09:15:00"},
+    {"amount": 0.0, "merchant_name": None, "payment_channel": None, "pending": True,
+     "date": "2025-03-09"},
+    {"amount": -4.0, "merchant_name": "Never Seen", "payment_channel": "carrier pigeon",
+     "date": datetime(2025, 1, 4, 23, 5)},
+    {"amount": 880.0, "merchant_name": "Uber", "payment_channel": "online",
+     "date": date(2025, 2, 1)},
+    {"amount": 31.0, "merchant_name": "Amazon", "pending": 0},
+]
+
+
+def _rows(make_transactions, n, seed):
+    return make_transactions(n, seed=seed).to_dict("records") + EDGE_ROWS
+
+
+############################
+# FastScorer Tests
+############################
+
+# TC-FAST-SCORER-001: same scores, flags and tiers as predict_batch, sklearn and compact bundles
+def test_fast_scorer_matches_predict_batch(bundle, make_transactions):
+    rows = _rows(make_transactions, 40, seed=5)
+    compact_state, compact_models = export_compact_bundle(bundle["feature_state"], bundle["models"])
+
+    for feature_state, models in (
+        (bundle["feature_state"], bundle["models"]),
+        (compact_state, compact_models),
+    ):
+        scorer = FastScorer(feature_state, models)
+        expected = predict_batch(rows, feature_state, models)
+        results = [scorer.score([txn])[0] for txn in rows]
+
+        assert [(fraud, tier) for _, fraud, tier in results] == [
+            (fraud, tier) for _, fraud, tier in expected
+        ]
+        np.testing.assert_allclose([s for s, _, _ in results], [s for s, _, _ in expected])
+        # a small list is scored in one call with the same results
+        np.testing.assert_allclose(
+            [s for s, _, _ in scorer.score(rows[:MAX_ROW_LOOP])],
+            [s for s, _, _ in expected[:MAX_ROW_LOOP]],
+        )
+
+
+# TC-FAST-SCORER-002: live merchant stats replace the bundle's on both the row loop and batch path
+def test_fast_scorer_live_merchant_stats(bundle, make_transactions):
+    snapshot = MerchantStatsSnapshot({
+        "Starbucks": (50, 500.0, 49 * 40.0 ** 2),
+        "Uber": (50, 2.0, 0.0),
+    })
+    rows = _rows(make_transactions, MAX_ROW_LOOP + 20, seed=6)
+    scorer = FastScorer(bundle["feature_state"], bundle["models"])
+
+    annotated = snapshot.annotate([dict(txn) for txn in rows])
+    expected = predict_batch(annotated, bundle["feature_state"], bundle["models"])
+
+    np.testing.assert_allclose(
+        [s for s, _, _ in scorer.score(rows[:10], snapshot)], [s for s, _, _ in expected[:10]]
+    )
+    np.testing.assert_allclose(
+        [s for s, _, _ in scorer.score(rows, snapshot)], [s for s, _, _ in expected]
+    )
+    # the caller's dicts are never annotated in place
+    assert all("merchant_amount_mean" not in txn for txn in rows)
+
+
+# TC-FAST-SCORER-003: behavioral bundles read the profile columns, missing ones count as 0
+def test_fast_scorer_profile_features(bundle, make_transactions):
+    state = {**bundle["feature_state"], "feature_version": 2}
+    rows = _rows(make_transactions, 10, seed=7)
+    rows[0].update(user_amount_z=1.5, user_merchant_share=0.25, user_txn_1h=2, user_txn_24h=3)
+    rows[1].update(user_amount_z=math.nan, user_txn_7d=9)
+
+    expected = build_feature_matrix(rows, state)
+    scorer = FastScorer(state, bundle["models"])
+    # the current time only shows up for rows without a date
+    dated = [i for i, txn in enumerate(rows) if txn.get("date") is not None]
+    np.testing.assert_allclose(scorer.features(rows)[dated], expected[dated])
+
+
+# TC-FAST-SCORER-004: the registry builds the scorer once per loaded bundle
+def test_registry_scorer(tmp_path, bundle):
+    model_path = tmp_path / "fraud_model.joblib"
+    joblib.dump(bundle, model_path)
+
+    registry = ModelRegistry(compact=True)
+    registry.load(str(model_path))
+    scorer = registry.scorer()
+    assert registry.scorer() is scorer
+    assert scorer.models is registry.get()[1]
+
+    registry.load(str(model_path))
+    assert registry.scorer() is not scorer
@@ -0,0 +1,143 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import date as DateType, datetime
+from decimal import Decimal
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+import fraud_detection.features as features_mod
+import fraud_detection.prediction as prediction_mod
+from fraud_detection.features import NUMBER_FEATURES, build_feature_matrix
+from fraud_detection.prediction import create_row
+
+
+class _FixedDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2025, 3, 14, 9, 30)
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    # fallback dates use utcnow, pin it so both versions see the same clock
+    monkeypatch.setattr(features_mod, "datetime", _FixedDatetime)
+    monkeypatch.setattr(prediction_mod, "datetime", _FixedDatetime)
+
+
+@pytest.fixture
+def state():
+    merchant_encoder = LabelEncoder().fit(["Amazon", "Starbucks", "Uber", "Walmart", "Unknown"])
+    channel_encoder = LabelEncoder().fit(["online", "in_store", "other"])
+    return {
+        "merchant_encoder": merchant_encoder,
+        "channel_encoder": channel_encoder,
+        "merchant_mean": {"Amazon": 48.5, "Starbucks": 6.1, "Uber": 14.2, "Walmart": 60.0},
+        "merchant_std": {"Amazon": 20.3, "Starbucks": 1.9, "Uber": 0.0, "Walmart": float("nan")},
+        "scaler": None,
+    }
+
+
+def transactions():
+    return [
+        {"amount": 6.25, "merchant_name": "Starbucks", "payment_channel": "in_store",
+         "pending": False, "date": "2025-10-23T08:15:00"},
+        {"amount": 48.99, "merchant_name": "Amazon", "payment_channel": "online",
+         "pending": True, "date": "2025-10-22"},
+        {"amount": 2450.0, "merchant_name": "CryptoExchange.io", "payment_channel": "crypto",
+         "pending": False, "date": "2025-10-18T02:35:00"},
+        {"amount": 12.8, "merchant_name": "Uber", "payment_channel": None,
+         "pending": 1, "date": DateType(2025, 9, 20)},
+        {"amount": -35.0, "merchant_name": None, "payment_channel": "other",
+         "pending": 0, "date": None},
+        {"amount": 75.0, "merchant_name": "Walmart", "payment_channel": "in_store",
+         "pending": False, "date": "not a date"},
+        {"amount": 0.0, "merchant_name": "Amazon", "payment_channel": "online",
+         "pending": False, "date": "2025-10-22"},
+    ]
+
+
+def reference_matrix(rows, state):
+    return np.vstack([create_row(row, state) for row in rows])
+
+
+############################
+# build_feature_matrix Tests
+############################
+
+# TC-FRAUD-FEATURES-001: list of dicts matches create_row bit for bit
+def test_build_matrix_matches_create_row(state):
+    rows = transactions()
+
+    expected = reference_matrix(rows, state)
+    result = build_feature_matrix(rows, state)
+
+    assert result.shape == (len(rows), NUMBER_FEATURES)
+    assert result.dtype == np.float64
+    assert np.array_equal(result.view(np.uint64), expected.view(np.uint64))
+
+
+# TC-FRAUD-FEATURES-002: DataFrame input matches the iterrows path
+def test_build_matrix_dataframe(state):
+    df = pd.DataFrame(transactions())
+
+    expected = np.vstack([create_row(row, state) for _, row in df.iterrows()])
+    result = build_feature_matrix(df, state)
+
+    np.testing.assert_array_equal(result, expected)
+
+
+# TC-FRAUD-FEATURES-003: dict of column arrays, including a datetime64 date column
+def test_build_matrix_column_arrays(state):
+    columns = {
+        "amount": np.array([10.0, 250.0, 5.5]),
+        "merchant_name": np.array(["Uber", "Nowhere", "Amazon"], dtype=object),
+        "payment_channel": np.array(["online", "in_store", "online"], dtype=object),
+        "pending": np.array([False, True, False]),
+        "date": np.array(["2025-01-04T13:00", "NaT", "2025-01-06"], dtype="datetime64[ns]"),
+    }
+    rows = [
+        {"amount": 10.0, "merchant_name": "Uber", "payment_channel": "online",
+         "pending": False, "date": "2025-01-04T13:00"},
+        {"amount": 250.0, "merchant_name": "Nowhere", "payment_channel": "in_store",
+         "pending": True, "date": None},
+        {"amount": 5.5, "merchant_name": "Amazon", "payment_channel": "online",
+         "pending": False, "date": "2025-01-06"},
+    ]
+
+    np.testing.assert_array_equal(
+        build_feature_matrix(columns, state),
+        reference_matrix(rows, state),
+    )
+
+
+# TC-FRAUD-FEATURES-004: missing keys and saved global stats use the same defaults
+def test_build_matrix_defaults_and_global_stats(state):
+    state["global_amount_mean"] = 42.0
+    state["global_amount_std"] = 0.0
+    rows = [
+        {"amount": 99.0},
+        {"amount": Decimal("12.34"), "merchant_name": "Unseen", "date": "2025-06-01"},
+        {},
+    ]
+
+    np.testing.assert_array_equal(
+        build_feature_matrix(rows, state),
+        reference_matrix(rows, state),
+    )
+
+
+# TC-FRAUD-FEATURES-005: empty batch gives an empty matrix with 12 columns
+def test_build_matrix_empty(state):
+    assert build_feature_matrix([], state).shape == (0, NUMBER_FEATURES)
+    assert build_feature_matrix(pd.DataFrame(), state).shape == (0, NUMBER_FEATURES)
+
+
+# TC-FRAUD-FEATURES-006: create_matrix and the scaler keep working on the new builder
+def test_create_matrix_scaled(state):
+    df = pd.DataFrame(transactions())
+    state["scaler"] = StandardScaler().fit(reference_matrix(transactions(), state))
+
+    scaled = prediction_mod.apply_scaler(df, state)
+
+    expected = state["scaler"].transform(reference_matrix(transactions(), state))
+    np.testing.assert_array_equal(scaled, expected)
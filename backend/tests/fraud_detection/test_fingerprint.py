@@ -0,0 +1,47 @@
+from datetime import date as DateType
+from decimal import Decimal
+
+from fraud_detection.fingerprint import feature_fingerprint
+
+
+############################
+# Fingerprint Tests
+############################
+
+# TC-FINGERPRINT-001: db and Plaid representations of the same inputs hash the same
+def test_fingerprint_stable_across_types():
+    from_db = feature_fingerprint(Decimal("12.50"), "online", False, DateType(2025, 3, 1), "Uber", "v1")
+    from_plaid = feature_fingerprint(12.5, "online", 0, "2025-03-01", "Uber", "v1")
+
+    assert from_db == from_plaid
+    assert -(2 ** 63) <= from_db < 2 ** 63
+
+
+# TC-FINGERPRINT-002: every model input and the model version change the fingerprint
+def test_fingerprint_inputs():
+    base = (12.5, "online", False, "2025-03-01", "Uber", "v1")
+    changed = [
+        (12.51, "online", False, "2025-03-01", "Uber", "v1"),
+        (12.5, "in_store", False, "2025-03-01", "Uber", "v1"),
+        (12.5, "online", True, "2025-03-01", "Uber", "v1"),
+        (12.5, "online", False, "2025-03-02", "Uber", "v1"),
+        (12.5, "online", False, "2025-03-01", "Lyft", "v1"),
+        (12.5, "online", False, "2025-03-01", "Uber", "v2"),
+        (12.5, None, False, "2025-03-01", "Uber", "v1"),
+    ]
+
+    fingerprints = {feature_fingerprint(*base)} | {feature_fingerprint(*c) for c in changed}
+    assert len(fingerprints) == len(changed) + 1
+
+
+# TC-FINGERPRINT-003: the profile snapshot is hashed with the row, no snapshot hashes like before
+def test_fingerprint_profile_features():
+    base = (12.5, "online", False, "2025-03-01", "Uber", "v1")
+    snapshot = [0.5, 1.0, 2.0, 2.0, 3.0]
+
+    assert feature_fingerprint(*base, None) == feature_fingerprint(*base)
+    assert feature_fingerprint(*base, []) == feature_fingerprint(*base)
+    with_profile = feature_fingerprint(*base, snapshot)
+    assert with_profile != feature_fingerprint(*base)
+    assert with_profile == feature_fingerprint(*base, tuple(snapshot))
+    assert with_profile != feature_fingerprint(*base, [0.5, 1.0, 2.0, 2.0, 4.0])
@@ -0,0 +1,203 @@
+import asyncio
+
+import joblib
+import pytest
+
+import fraud_detection.inference_executor as executor_mod
+from fraud_detection import metrics
+from fraud_detection.inference_executor import (
+    InferenceExecutor,
+    MicroBatchingExecutor,
+    ProcessPoolInferenceExecutor,
+    ThreadPoolInferenceExecutor,
+    create_inference_executor,
+)
+from fraud_detection.prediction import predict_batch
+
+
+# the executors are built on asyncio loop executors, same as uvicorn runs them
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def batch(make_transactions):
+    return make_transactions(200, seed=11).to_dict("records")
+
+
+############################
+# InferenceExecutor Tests
+############################
+
+# TC-FRAUD-EXECUTOR-001: inline and thread pool give the same results as predict_batch
+@pytest.mark.anyio
+async def test_inline_and_thread_match(bundle, batch):
+    expected = predict_batch(batch, bundle["feature_state"], bundle["models"])
+
+    inline = InferenceExecutor()
+    threaded = ThreadPoolInferenceExecutor(workers=2)
+    try:
+        assert await inline.score(batch, bundle["feature_state"], bundle["models"]) == expected
+        assert await threaded.score(batch, bundle["feature_state"], bundle["models"]) == expected
+    finally:
+        await threaded.shutdown()
+
+
+# TC-FRAUD-EXECUTOR-002: process pool workers are pre-warmed with the bundle from disk
+@pytest.mark.anyio
+async def test_process_pool_prewarmed(tmp_path, bundle, batch):
+    model_path = tmp_path / "fraud_model.joblib"
+    joblib.dump(bundle, model_path)
+    expected = predict_batch(batch, bundle["feature_state"], bundle["models"])
+
+    executor = ProcessPoolInferenceExecutor(str(model_path), workers=1)
+    try:
+        await executor.start()
+        # models aren't sent to the worker, it scores with its own loaded copy
+        assert await executor.score(batch, None, None) == expected
+    finally:
+        await executor.shutdown()
+
+
+# TC-FRAUD-EXECUTOR-003: max_pending bounds how many batches run at once
+@pytest.mark.anyio
+async def test_max_pending_backpressure(monkeypatch):
+    running = {"now": 0, "peak": 0}
+
+    async def _slow_score(self, batch, feature_state, models):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return [(0.1, False, "low")] * len(batch)
+
+    monkeypatch.setattr(InferenceExecutor, "_score", _slow_score)
+
+    executor = InferenceExecutor(max_pending=2)
+    results = await asyncio.gather(*[executor.score([{}], None, None) for _ in range(6)])
+
+    assert len(results) == 6
+    assert running["peak"] == 2
+
+
+# TC-FRAUD-EXECUTOR-004: factory builds each mode and rejects unknown ones
+def test_create_inference_executor_modes():
+    assert create_inference_executor("inline").mode == "inline"
+    assert create_inference_executor("thread", workers=3).workers == 3
+    assert create_inference_executor("process", model_path="m.joblib").mode == "process"
+
+    with pytest.raises(ValueError):
+        create_inference_executor("process")
+    with pytest.raises(ValueError):
+        create_inference_executor("gpu")
+
+
+# TC-FRAUD-EXECUTOR-005: default executor is inline until the app configures one
+def test_get_inference_executor_default(monkeypatch):
+    monkeypatch.setattr(executor_mod, "_active_executor", None)
+    assert executor_mod.get_inference_executor().mode == "inline"
+
+    threaded = ThreadPoolInferenceExecutor()
+    executor_mod.set_inference_executor(threaded)
+    assert executor_mod.get_inference_executor() is threaded
+
+
+############################
+# MicroBatchingExecutor Tests
+############################
+
+class _RecordingExecutor(InferenceExecutor):
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.calls = []
+        self.fail = fail
+
+    async def _score(self, batch, feature_state, models):
+        self.calls.append(len(batch))
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return [(float(txn["i"]), False, "low") for txn in batch]
+
+
+# TC-FRAUD-EXECUTOR-006: concurrent callers share one inference call, each gets its own rows
+@pytest.mark.anyio
+async def test_micro_batching_coalesces_callers():
+    rows_before = metrics.DISPATCH_BATCH_ROWS.sum
+    waits_before = metrics.DISPATCH_WAIT_SECONDS.count
+    inner = _RecordingExecutor()
+    executor = MicroBatchingExecutor(inner, max_rows=1000, max_wait_ms=50)
+    await executor.start()
+    try:
+        batches = [[{"i": caller * 10 + j} for j in range(caller + 1)] for caller in range(4)]
+        results = await asyncio.gather(*[executor.score(b, None, None) for b in batches])
+    finally:
+        await executor.shutdown()
+
+    assert inner.calls == [10]
+    for batch, result in zip(batches, results):
+        assert [score for score, _, _ in result] == [float(txn["i"]) for txn in batch]
+    assert metrics.DISPATCH_BATCH_ROWS.sum - rows_before == 10
+    assert metrics.DISPATCH_WAIT_SECONDS.count - waits_before == 4
+
+
+# TC-FRAUD-EXECUTOR-007: a full batch flushes without waiting, a lone caller flushes after max_wait
+@pytest.mark.anyio
+async def test_micro_batching_flush_triggers():
+    inner = _RecordingExecutor()
+    executor = MicroBatchingExecutor(inner, max_rows=4, max_wait_ms=5000)
+    await executor.start()
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*[executor.score([{"i": i}, {"i": i}], None, None) for i in range(2)]),
+            timeout=1.0,
+        )
+        assert inner.calls == [4]
+
+        executor.max_wait = 0.01
+        assert await asyncio.wait_for(executor.score([{"i": 7}], None, None), timeout=1.0) == [
+            (7.0, False, "low")
+        ]
+        assert inner.calls == [4, 1]
+    finally:
+        await executor.shutdown()
+
+
+# TC-FRAUD-EXECUTOR-008: bundles are never mixed, a failure reaches every caller in the batch
+@pytest.mark.anyio
+async def test_micro_batching_groups_and_errors():
+    inner = _RecordingExecutor()
+    executor = MicroBatchingExecutor(inner, max_rows=1000, max_wait_ms=20)
+    old_models, new_models = {"v": 1}, {"v": 2}
+    await executor.start()
+    try:
+        await asyncio.gather(
+            executor.score([{"i": 1}], None, old_models),
+            executor.score([{"i": 2}, {"i": 3}], None, new_models),
+        )
+        assert sorted(inner.calls) == [1, 2]
+    finally:
+        await executor.shutdown()
+
+    failing = MicroBatchingExecutor(_RecordingExecutor(fail=True), max_rows=1000, max_wait_ms=20)
+    await failing.start()
+    try:
+        results = await asyncio.gather(
+            *[failing.score([{"i": i}], None, None) for i in range(3)], return_exceptions=True
+        )
+    finally:
+        await failing.shutdown()
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+# TC-FRAUD-EXECUTOR-009: factory wraps the configured mode when batching is on
+def test_create_inference_executor_batching():
+    executor = create_inference_executor(
+        "thread", workers=2, batch_max_rows=500, batch_max_wait_ms=3
+    )
+    assert isinstance(executor, MicroBatchingExecutor)
+    assert executor.mode == "thread"
+    assert executor.inner.workers == 2
+    assert executor.max_rows == 500
+    assert executor.max_wait == pytest.approx(0.003)
+
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from fraud_detection.features import build_feature_matrix
+from fraud_detection.merchant_stats import (
+    MerchantStatsCache,
+    MerchantStatsSnapshot,
+    welford_merge,
+    welford_std,
+    welford_unmerge,
+    welford_update,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _welford(values):
+    stats = (0, 0.0, 0.0)
+    for x in values:
+        stats = welford_update(*stats, x)
+    return stats
+
+
+############################
+# Welford Tests
+############################
+
+# TC-MERCHANT-STATS-001: incremental updates match the batch mean / sample std
+def test_welford_matches_numpy():
+    values = np.random.default_rng(3).lognormal(3.0, 1.0, 500)
+
+    count, mean, m2 = _welford(values)
+
+    assert count == 500
+    assert mean == pytest.approx(values.mean(), rel=1e-12)
+    assert welford_std(count, m2) == pytest.approx(values.std(ddof=1), rel=1e-12)
+    assert welford_std(1, 0.0) == 0.0
+
+
+# TC-MERCHANT-STATS-002: merging partial results equals one pass over everything
+def test_welford_merge():
+    values = np.random.default_rng(4).normal(50.0, 12.0, 300)
+
+    merged = welford_merge(_welford(values[:120]), _welford(values[120:]))
+    full = _welford(values)
+
+    assert merged[0] == full[0]
+    assert merged[1] == pytest.approx(full[1], rel=1e-12)
+    assert merged[2] == pytest.approx(full[2], rel=1e-9)
+    assert welford_merge((0, 0.0, 0.0), (0, 0.0, 0.0)) == (0, 0.0, 0.0)
+
+
+# TC-MERCHANT-STATS-007: unmerging a partial gives the stats of the rest, nothing left is zero
+def test_welford_unmerge():
+    values = np.random.default_rng(5).normal(50.0, 12.0, 300)
+
+    rest = welford_unmerge(_welford(values), _welford(values[200:]))
+    expected = _welford(values[:200])
+    assert rest[0] == expected[0]
+    assert rest[1] == pytest.approx(expected[1], rel=1e-9)
+    assert rest[2] == pytest.approx(expected[2], rel=1e-6)
+    assert welford_unmerge(_welford(values[:3]), _welford(values[:3])) == (0, 0.0, 0.0)
+    assert welford_unmerge(_welford([5.0, 5.0]), _welford([5.0]))[2] == 0.0
+
+
+############################
+# Snapshot / feature Tests
+############################
+
+# TC-MERCHANT-STATS-003: merchants under min_count are left to the bundle's stats
+def test_snapshot_annotate_min_count():
+    snapshot = MerchantStatsSnapshot(
+        {"Uber": (10, 20.0, 900.0), "NewShop": (2, 80.0, 8.0)}, min_count=5,
+    )
+    batch = [{"merchant_name": "Uber"}, {"merchant_name": "NewShop"}, {"merchant_name": None}]
+
+    snapshot.annotate(batch)
+
+    assert batch[0]["merchant_amount_mean"] == 20.0
+    assert batch[0]["merchant_amount_std"] == pytest.approx(10.0)
+    assert "merchant_amount_mean" not in batch[1] and "merchant_amount_mean" not in batch[2]
+
+
+# TC-MERCHANT-STATS-004: live stats replace the bundle's z-score only for annotated rows
+def test_build_matrix_uses_live_stats(bundle):
+    feature_state = bundle["feature_state"]
+    rows = [
+        {"amount": 55.0, "merchant_name": "Nowhere Inc", "payment_channel": "online",
+         "pending": False, "date": "2025-01-04"},
+        {"amount": 55.0, "merchant_name": "Nowhere Inc", "payment_channel": "online",
+         "pending": False, "date": "2025-01-04"},
+    ]
+    baseline = build_feature_matrix(rows, feature_state)
+
+    rows[0]["merchant_amount_mean"] = 25.0
+    rows[0]["merchant_amount_std"] = 10.0
+    live = build_feature_matrix(rows, feature_state)
+
+    assert live[0, 10] == pytest.approx(3.0, rel=1e-6)
+    assert live[0, 11] == pytest.approx(3.0, rel=1e-6)
+    np.testing.assert_array_equal(live[1], baseline[1])
+    np.testing.assert_array_equal(live[0, :10], baseline[0, :10])
+
+
+############################
+# MerchantStatsCache Tests
+############################
+
+# TC-MERCHANT-STATS-005: the snapshot is reused until refresh_seconds pass
+@pytest.mark.anyio
+async def test_cache_refresh_interval():
+    loads = []
+
+    async def _loader():
+        loads.append(1)
+        return {"Uber": (10, 20.0 + len(loads), 900.0)}
+
+    cache = MerchantStatsCache(_loader, refresh_seconds=3600, min_count=1)
+    first = await cache.current()
+    assert await cache.current() is first
+    assert loads == [1]
+
+    cache.refresh_seconds = 0
+    second = await cache.current()
+    assert second.get("Uber")[0] == 22.0
+    assert loads == [1, 1]
+
+
+# TC-MERCHANT-STATS-006: a failing reload keeps the previous snapshot
+@pytest.mark.anyio
+async def test_cache_refresh_failure_keeps_snapshot():
+    calls = []
+
+    async def _loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("db down")
+        return {"Uber": (10, 20.0, 900.0)}
+
+    cache = MerchantStatsCache(_loader, refresh_seconds=0, min_count=1)
+    await cache.current()
+    snapshot = await cache.current()
+
+    assert len(calls) == 2
+    assert snapshot.get("Uber")[0] == 20.0
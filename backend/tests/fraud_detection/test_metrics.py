@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from fraud_detection.metrics import MetricsRegistry
+
+
+############################
+# Registry Tests
+############################
+
+# TC-METRICS-001: counters and gauges render as Prometheus text, labels escaped
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    scored = registry.counter("scored_total", "Transactions scored.")
+    jobs = registry.gauge("jobs", "Jobs by status.", ("status",))
+
+    scored.inc()
+    scored.inc(4)
+    jobs.labels("pending").set(12)
+    jobs.labels('we"ird').set(1.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP scored_total Transactions scored.",
+        "# TYPE scored_total counter",
+        "scored_total 5",
+        "# HELP jobs Jobs by status.",
+        "# TYPE jobs gauge",
+        'jobs{status="pending"} 12',
+        'jobs{status="we\\"ird"} 1.5',
+    ]
+
+
+# TC-METRICS-002: histogram buckets are cumulative and end with +Inf, sum and count follow
+def test_render_histogram():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("stage_seconds", "Stage time.", ("stage",), buckets=(0.01, 0.1))
+    fetch = seconds.labels("fetch")
+    for value in (0.005, 0.01, 0.05, 3.0):
+        fetch.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'stage_seconds_bucket{stage="fetch",le="0.01"} 2',
+        'stage_seconds_bucket{stage="fetch",le="0.1"} 3',
+        'stage_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'stage_seconds_sum{stage="fetch"} 3.065',
+        'stage_seconds_count{stage="fetch"} 4',
+    ]
+    assert fetch.count == 4
+
+
+# TC-METRICS-003: registering a name again returns the same metric, a different type is an error
+def test_register_same_name():
+    registry = MetricsRegistry()
+    a = registry.counter("x_total", "X.")
+    assert registry.counter("x_total", "X.") is a
+    with pytest.raises(ValueError):
+        registry.gauge("x_total", "X.")
+    with pytest.raises(ValueError):
+        registry.gauge("g", "G.", ("a", "b")).labels("only-one")
+
+
+# TC-METRICS-004: values recorded from several threads at once all add up
+def test_record_from_threads():
+    registry = MetricsRegistry()
+    scored = registry.counter("scored_total", "Transactions scored.")
+    seconds = registry.histogram("detector_seconds", "Detector time.", ("detector",))
+
+    def _record():
+        for _ in range(2000):
+            scored.inc()
+            seconds.labels("iforest").observe(0.01)
+
+    threads = [threading.Thread(target=_record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert scored.value == 16000
+    assert seconds.labels("iforest").count == 16000
+    assert seconds.labels("iforest").sum == pytest.approx(160.0)
+
+
+# TC-METRICS-005: what a process pool worker drains is merged into the parent, gauges stay put
+def test_drain_and_merge():
+    worker, parent = MetricsRegistry(), MetricsRegistry()
+    for registry in (worker, parent):
+        registry.counter("skipped_total", "Skipped.", ("detector",))
+        registry.histogram("seconds", "Time.", buckets=(0.1,))
+        registry.gauge("in_flight", "In flight.")
+
+    worker.get("skipped_total").labels("lof").inc(5)
+    worker.get("seconds").observe(0.05)
+    worker.get("seconds").observe(1.0)
+    worker.get("in_flight").set(3)
+    parent.get("seconds").observe(0.05)
+
+    parent.merge(worker.drain())
+    assert parent.get("skipped_total").labels("lof").value == 5
+    assert parent.get("seconds").counts == [2, 1]
+    assert parent.get("seconds").sum == pytest.approx(1.1)
+    assert parent.get("in_flight").value == 0
+
+    # drained values start over, a second batch only sends what's new
+    assert worker.get("seconds").count == 0
+    worker.get("skipped_total").labels("lof").inc(2)
+    parent.merge(worker.drain())
+    assert parent.get("skipped_total").labels("lof").value == 7
@@ -0,0 +1,88 @@
+import json
+
+import joblib
+import numpy as np
+import pytest
+
+import fraud_detection.model_registry as registry_mod
+from fraud_detection.bundle_format import save_mmap_bundle
+from fraud_detection.model_registry import ModelRegistry, bundle_version, estimate_nbytes
+
+
+@pytest.fixture
+def model_file(tmp_path, bundle):
+    path = tmp_path / "fraud_model.joblib"
+    joblib.dump(bundle, path)
+    return str(path)
+
+
+############################
+# ModelRegistry Tests
+############################
+
+# TC-FRAUD-REGISTRY-001: load keeps the bundle and reports load time and size
+def test_registry_load_stats(model_file):
+    registry = ModelRegistry()
+    assert registry.stats()["loaded"] is False
+
+    feature_state, models = registry.load(model_file)
+
+    assert "scaler" in feature_state and "isolation_forest" in models
+    stats = registry.stats()
+    assert stats["loaded"] is True
+    assert stats["model_path"] == model_file
+    assert stats["load_seconds"] > 0
+    assert stats["file_bytes"] > 0
+    # the forest node arrays make up most of the bundle
+    assert stats["memory_bytes"] > 100_000
+
+
+# TC-FRAUD-REGISTRY-002: ensure_loaded only unpickles the bundle once
+def test_registry_ensure_loaded_once(monkeypatch, model_file):
+    registry = ModelRegistry()
+    loads = []
+    real_load = registry_mod.load_pipeline
+
+    def _counting_load(path):
+        loads.append(path)
+        return real_load(path)
+
+    monkeypatch.setattr(registry_mod, "load_pipeline", _counting_load)
+
+    first = registry.ensure_loaded(model_file)
+    second = registry.ensure_loaded(model_file)
+
+    assert loads == [model_file]
+    assert first[1] is second[1]
+    assert registry.get()[1] is first[1]
+
+
+# TC-FRAUD-REGISTRY-003: get before anything is loaded raises
+def test_registry_get_not_loaded():
+    with pytest.raises(RuntimeError):
+        ModelRegistry().get()
+
+
+# TC-FRAUD-REGISTRY-005: the model version comes from the manifest or the file contents
+def test_bundle_version(tmp_path, model_file, bundle):
+    directory = save_mmap_bundle(
+        bundle["feature_state"], bundle["models"], str(tmp_path / "v7"), model_version="v7",
+    )
+    registry = ModelRegistry()
+    registry.load(model_file)
+
+    assert bundle_version(directory) == "v7"
+    assert registry.model_version == bundle_version(model_file) == registry.stats()["model_version"]
+    joblib.dump({**bundle, "metadata": {"retrained": True}}, model_file)
+    assert bundle_version(model_file) != registry.model_version
+
+    # train.py's training.json names a joblib bundle's version
+    with open(tmp_path / "training.json", "w", encoding="utf-8") as f:
+        json.dump({"model_version": "20261018-120000"}, f)
+    assert bundle_version(model_file) == "20261018-120000"
+
+
+# TC-FRAUD-REGISTRY-004: estimate_nbytes counts arrays once
+def test_estimate_nbytes_shared_arrays():
+    arr = np.zeros(1000)
+    assert estimate_nbytes({"a": arr, "b": arr}) == arr.nbytes + 2
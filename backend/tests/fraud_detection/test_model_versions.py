@@ -0,0 +1,176 @@
+import os
+from datetime import date as DateType
+
+import joblib
+import numpy as np
+import pytest
+
+import fraud_detection.model_versions as versions_mod
+from app.services.fraud_detection_service import FraudDetectionService
+from fraud_detection.inference_executor import InferenceExecutor, ProcessPoolInferenceExecutor
+from fraud_detection.model_registry import ModelRegistry, bundle_version
+from fraud_detection.model_versions import (
+    ACTIVE_FILE,
+    ModelWatcher,
+    list_versions,
+    promote,
+    read_active,
+    version_path,
+)
+from fraud_detection.prediction import predict_batch
+
+
+# promotion runs blocking loads through asyncio.to_thread, same as the app lifespan
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def fresh_promote_lock(monkeypatch):
+    monkeypatch.setattr(versions_mod, "_promote_lock", None)
+
+
+def _shifted(bundle, shift):
+    thresholds = bundle["feature_state"]["risk_thresholds"]
+    feature_state = {
+        **bundle["feature_state"],
+        "risk_thresholds": {k: v + shift for k, v in thresholds.items()},
+    }
+    return {"feature_state": feature_state, "models": bundle["models"]}
+
+
+# v1 is the trained bundle, v2 the same forest with every threshold moved down so tiers differ
+@pytest.fixture
+def registry_dir(tmp_path, bundle):
+    for version, shift in (("v1", 0.0), ("v2", -0.2)):
+        os.makedirs(tmp_path / version)
+        joblib.dump(_shifted(bundle, shift), tmp_path / version / "fraud_model.joblib")
+    return str(tmp_path)
+
+
+def _rows():
+    return [
+        (1, 10.0, "online", False, DateType(2025, 1, 1), "Amazon"),
+        (2, 900.0, "in_store", True, DateType(2025, 1, 4), "Starbucks"),
+    ]
+
+
+############################
+# Model Versions Tests
+############################
+
+# TC-MODEL-VERSIONS-001: versions resolve to their bundle, names can't leave the directory
+def test_version_paths(registry_dir, tmp_path):
+    assert list_versions(registry_dir) == ["v1", "v2"]
+    v1_path = os.path.join(registry_dir, "v1", "fraud_model.joblib")
+    assert version_path(registry_dir, "v1") == v1_path
+    assert read_active(registry_dir) is None
+
+    with pytest.raises(FileNotFoundError):
+        version_path(registry_dir, "v3")
+    for bad in ("", "..", "../v1", "v1/fraud_model.joblib"):
+        with pytest.raises(ValueError):
+            version_path(registry_dir, bad)
+
+
+# TC-MODEL-VERSIONS-002: promote swaps the live bundle, bumps the generation and writes ACTIVE
+@pytest.mark.anyio
+async def test_promote_swaps_registry(registry_dir):
+    registry = ModelRegistry()
+    registry.load(version_path(registry_dir, "v1"))
+    old_state, _ = registry.get()
+    generation = registry.generation
+
+    stats = await promote("v2", registry_dir, registry=registry)
+
+    assert stats["model_version"] == registry.model_version
+    assert registry.generation == generation + 1
+    assert registry.get()[0] is not old_state
+    assert registry.model_path == version_path(registry_dir, "v2")
+    assert read_active(registry_dir) == "v2"
+    # warmed up front, the first request doesn't build the lookup tables
+    assert registry._scorer is not None
+
+
+# TC-MODEL-VERSIONS-003: a bundle that can't load is rejected and the live one keeps serving
+@pytest.mark.anyio
+async def test_promote_rejects_broken_bundle(registry_dir):
+    os.makedirs(os.path.join(registry_dir, "broken"))
+    with open(os.path.join(registry_dir, "broken", "fraud_model.joblib"), "wb") as f:
+        f.write(b"not a bundle")
+
+    registry = ModelRegistry()
+    registry.load(version_path(registry_dir, "v1"))
+    await promote("v1", registry_dir, registry=registry)
+    generation = registry.generation
+
+    with pytest.raises(ValueError):
+        await promote("broken", registry_dir, registry=registry)
+
+    assert registry.generation == generation
+    assert registry.model_path == version_path(registry_dir, "v1")
+    assert read_active(registry_dir) == "v1"
+
+
+# TC-MODEL-VERSIONS-004: a long lived service scores its next batch with the promoted bundle
+@pytest.mark.anyio
+async def test_service_follows_promotion(registry_dir, bundle):
+    registry = ModelRegistry()
+    svc = FraudDetectionService(
+        session_factory=None,
+        model_path=version_path(registry_dir, "v1"),
+        registry=registry,
+        executor=InferenceExecutor(),
+    )
+
+    before = await svc.score_rows(_rows())
+    await promote("v2", registry_dir, registry=registry)
+    after = await svc.score_rows(_rows())
+
+    assert {u[5] for u in before} == {bundle_version(version_path(registry_dir, "v1"))}
+    assert {u[5] for u in after} == {registry.model_version}
+    # same forest, only the tiers moved
+    np.testing.assert_allclose([u[1] for u in before], [u[1] for u in after])
+    expected = predict_batch(
+        [{"amount": 10.0, "payment_channel": "online", "pending": False,
+          "date": "2025-01-01", "merchant_name": "Amazon"}],
+        *_shifted(bundle, -0.2).values(),
+    )
+    assert after[0][3] == expected[0][2]
+
+
+# TC-MODEL-VERSIONS-005: the watcher promotes locally when another process moved ACTIVE
+@pytest.mark.anyio
+async def test_watcher_follows_active(registry_dir):
+    registry = ModelRegistry()
+    registry.load(version_path(registry_dir, "v1"))
+    watcher = ModelWatcher(registry_dir, registry=registry, poll_seconds=0.01)
+
+    assert await watcher.check() is False
+
+    with open(os.path.join(registry_dir, ACTIVE_FILE), "w", encoding="utf-8") as f:
+        f.write("v2\n")
+    assert await watcher.check() is True
+    assert registry.model_path == version_path(registry_dir, "v2")
+    assert await watcher.check() is False
+
+
+# TC-MODEL-VERSIONS-006: process workers are replaced by a warmed pool with the new bundle
+@pytest.mark.anyio
+async def test_process_executor_swap_model(registry_dir, bundle, make_transactions):
+    batch = make_transactions(50, seed=3).to_dict("records")
+    v2 = _shifted(bundle, -0.2)
+
+    executor = ProcessPoolInferenceExecutor(version_path(registry_dir, "v1"), workers=1)
+    try:
+        await executor.start()
+        assert await executor.score(batch, None, None) == predict_batch(
+            batch, bundle["feature_state"], bundle["models"]
+        )
+        await executor.swap_model(version_path(registry_dir, "v2"))
+        assert await executor.score(batch, None, None) == predict_batch(
+            batch, v2["feature_state"], v2["models"]
+        )
+    finally:
+        await executor.shutdown()
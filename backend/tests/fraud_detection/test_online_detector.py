@@ -0,0 +1,313 @@
+import joblib
+import numpy as np
+import pytest
+
+from app.services.fraud_detection_service import FraudDetectionService
+from fraud_detection import metrics
+from fraud_detection.drift import DriftMonitor, reference_histograms
+from fraud_detection.features import build_feature_matrix, feature_count
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.online_detector import (
+    CALIBRATION_MIN_COUNT,
+    HalfSpaceTrees,
+    OnlineDetector,
+    merge_checkpoint,
+)
+from fraud_detection.quantile_sketch import ScoreSketches
+
+
+# checkpoints run through async loaders / mergers, same as in the app lifespan
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _scaled(bundle, make_transactions, n, seed):
+    feature_state = bundle["feature_state"]
+    frame = make_transactions(n, seed=seed)
+    return feature_state["scaler"].transform(build_feature_matrix(frame, feature_state))
+
+
+def _batch(make_transactions, n, seed):
+    frame = make_transactions(n, seed=seed)
+    frame["date"] = frame["date"].astype(str)
+    return frame.to_dict("records")
+
+
+# stands in for online_detector_merger / _loader, one shared row like the table
+class _Store:
+    def __init__(self):
+        self.state = None
+        self.fail = False
+
+    async def merge(self, name, delta):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.state = merge_checkpoint(self.state, delta)
+        return self.state
+
+    async def load(self, name):
+        return self.state
+
+
+############################
+# Half-Space Trees Tests
+############################
+
+# TC-ONLINE-001: fixed size arrays, a row adds one along its path per tree, outliers get little mass
+def test_half_space_trees(bundle, make_transactions):
+    X = _scaled(bundle, make_transactions, 2000, seed=3)
+    trees = HalfSpaceTrees(X.shape[1], n_trees=10, depth=8, window=1000)
+    # every process builds the same trees from the seed
+    same = HalfSpaceTrees(X.shape[1], n_trees=10, depth=8, window=1000)
+    np.testing.assert_array_equal(trees.dims, same.dims)
+    np.testing.assert_array_equal(trees.splits, same.splits)
+    shape = trees.mass_latest.shape
+    assert shape == (10, 2 ** 9 - 1)
+
+    assert trees.learn(X[:1000]) == 1000 and trees.latest_rows == 1000
+    # each tree's root holds every row, each level of it as many again
+    np.testing.assert_array_equal(trees.mass_latest[:, 0], 1000)
+    assert trees.mass_latest.sum() == 10 * 9 * 1000
+    # in batches or one at a time, the counts are the same
+    for row in X[:50]:
+        same.learn(row[None, :])
+    same_batch = HalfSpaceTrees(X.shape[1], n_trees=10, depth=8, window=1000)
+    same_batch.learn(X[:50])
+    np.testing.assert_array_equal(same.mass_latest, same_batch.mass_latest)
+
+    trees.rollover()
+    assert trees.windows == 1 and trees.latest_rows == 0
+    assert trees.mass_latest.sum() == 0 and trees.mass_ref.shape == shape
+
+    normal = trees.score_samples(X[1000:])
+    outliers = trees.score_samples(X[1000:1020] * 4 + 3)
+    assert np.median(outliers) < np.quantile(normal, 0.05)
+    # learning more traffic never grows the state
+    trees.learn(X)
+    assert trees.mass_latest.shape == shape and trees.mass_ref.shape == shape
+
+
+# TC-ONLINE-002: worker deltas merge into one window like a single process, checkpoints restore
+@pytest.mark.anyio
+async def test_checkpoint_merge_and_restore(bundle, make_transactions):
+    X = _scaled(bundle, make_transactions, 1500, seed=4)
+    params = dict(n_trees=10, depth=8, window=1000)
+    single = HalfSpaceTrees(X.shape[1], **params)
+    single.learn(X[:1200])
+    single.rollover()
+
+    store = _Store()
+    workers = [
+        OnlineDetector(HalfSpaceTrees(X.shape[1], **params), loader=store.load, merger=store.merge)
+        for _ in range(2)
+    ]
+    for worker, part in zip(workers, (X[:700], X[700:1200])):
+        worker.detector.learn(part)
+    await workers[0].checkpoint()
+    assert store.state["latest_rows"] == 700 and store.state["windows"] == 0
+    # the second merge fills the window past `window` rows, it rolls over scaled to 1000 rows
+    await workers[1].checkpoint()
+    assert store.state["windows"] == 1 and store.state["latest_rows"] == 0
+    np.testing.assert_allclose(store.state["mass_ref"], single.mass_ref, rtol=1e-6)
+    np.testing.assert_array_equal(store.state["mass_ref"][:, 0], 1000)
+    assert workers[1].detector.windows == 1 and workers[0].detector.windows == 0
+    await workers[0].checkpoint()
+    np.testing.assert_array_equal(workers[0].detector.mass_ref, workers[1].detector.mass_ref)
+
+    # a failed merge keeps the rows for the next one
+    workers[0].detector.learn(X[1200:1300])
+    store.fail = True
+    await workers[0].checkpoint()
+    assert workers[0].detector.latest_rows == 100
+    store.fail = False
+    await workers[0].checkpoint()
+    assert workers[0].detector.latest_rows == 0 and store.state["latest_rows"] == 100
+
+    # a restarted process picks up the shared reference, other parameters don't
+    restarted = OnlineDetector(HalfSpaceTrees(X.shape[1], **params), loader=store.load)
+    assert await restarted.restore() is True
+    np.testing.assert_array_equal(restarted.detector.mass_ref, store.state["mass_ref"])
+    other = OnlineDetector(HalfSpaceTrees(X.shape[1], n_trees=5), loader=store.load)
+    assert await other.restore() is False and other.detector.windows == 0
+    with pytest.raises(ValueError):
+        merge_checkpoint(store.state, {**store.state, "params": other.detector.params()})
+
+
+############################
+# Online Scoring Tests
+############################
+
+def _registry(tmp_path, feature_state, models):
+    path = tmp_path / "live.joblib"
+    joblib.dump({"feature_state": feature_state, "models": models}, path)
+    registry = ModelRegistry()
+    registry.load(str(path))
+    return registry
+
+
+def _rows(make_transactions, seed, n=250):
+    return [
+        (i + 1, txn["amount"], txn["payment_channel"], txn["pending"],
+         txn["date"], txn["merchant_name"])
+        for i, txn in enumerate(_batch(make_transactions, n, seed))
+    ]
+
+
+# scores batches until the detector has a window and enough scores against it to rank by
+async def _warm_up(service, make_transactions):
+    seed = 0
+    while not service.online.ready:
+        await service.score_rows(_rows(make_transactions, seed))
+        seed += 1
+    return seed
+
+
+# stands in for score_sketch_flusher, returns recalibrated thresholds for the version
+class _SketchStore:
+    def __init__(self, thresholds):
+        self.thresholds = thresholds
+        self.versions = []
+
+    async def __call__(self, model_version, sketch):
+        self.versions.append(model_version)
+        return self.thresholds
+
+
+# TC-ONLINE-003: the service learns from every batch, online scores are stored only when opted in
+@pytest.mark.anyio
+async def test_service_online_scoring(tmp_path, bundle, make_transactions):
+    registry = _registry(tmp_path, bundle["feature_state"], bundle["models"])
+    feature_state = registry.get()[0]
+    online = OnlineDetector(
+        HalfSpaceTrees(feature_count(feature_state), window=500), replace_scores=True
+    )
+
+    def service(detector):
+        return FraudDetectionService(
+            session_factory=None,
+            model_path=registry.model_path,
+            registry=registry,
+            executor=InferenceExecutor(),
+            online=detector,
+            skip_unchanged=False,
+        )
+
+    # the first window only teaches it, then scores against it fill the calibration
+    seed = await _warm_up(service(online), make_transactions)
+    assert online.detector.windows >= 1
+    calibrated = online.calibration.count + online.pending_calibration.count
+    previous = online.previous_calibration.count if online.previous_calibration else 0
+    assert max(calibrated, previous) >= CALIBRATION_MIN_COUNT
+
+    stored = metrics.ONLINE_SCORED.value
+    updates = []
+    for seed in range(seed, seed + 8):
+        updates += await service(online).score_rows(_rows(make_transactions, seed))
+    # rows keep the bundle's version, the counter says where their scores came from
+    assert {u[5] for u in updates} == {registry.model_version}
+    assert metrics.ONLINE_SCORED.value == stored + len(updates)
+    scores = np.array([u[1] for u in updates])
+    assert ((scores >= 0.0) & (scores <= 1.0)).all()
+    # ranks among recent scores, so tiers land near their shares of the traffic
+    tiers = [u[3] for u in updates]
+    assert tiers.count("high") == pytest.approx(0.02 * len(tiers), abs=0.02 * len(tiers))
+    assert tiers.count("low") == pytest.approx(0.90 * len(tiers), abs=0.04 * len(tiers))
+
+    # payloads that aren't stored are scored the same way, without being learned from
+    learned = online.detector.latest_rows + online.detector.windows * online.detector.window
+    payloads = _batch(make_transactions, 3, seed=99)
+    pricey = dict(payloads[0], amount=payloads[0]["amount"] * 200)
+    results = await service(online).score_payloads(payloads + [pricey])
+    assert results[-1][2] == "high" and results[-1][1] is True
+    after = online.detector.latest_rows + online.detector.windows * online.detector.window
+    assert after == learned
+
+    # without the opt in it keeps learning, the bundle's scores are stored
+    online.replace_scores = False
+    rows = _rows(make_transactions, 500)
+    expected = await service(None).score_rows(rows)
+    assert await service(online).score_rows(rows) == expected
+    assert await service(online).score_payloads(payloads) == (
+        await service(None).score_payloads(payloads)
+    )
+    assert online.detector.latest_rows + online.detector.windows * 500 == after + 250
+
+    # a bundle with other features keeps the bundle's scores
+    online_other = OnlineDetector(HalfSpaceTrees(feature_count(feature_state) + 5))
+    assert online_other.accepts(feature_state) is False
+
+
+# TC-ONLINE-004: with online scores stored, sketches, drift and shadow still follow the bundle
+@pytest.mark.anyio
+async def test_online_scoring_keeps_bundle_monitoring(tmp_path, bundle, make_transactions):
+    feature_state = dict(bundle["feature_state"])
+    reference = build_feature_matrix(make_transactions(2000, seed=42), feature_state)
+    feature_state["feature_reference"] = reference_histograms(reference)
+    registry = _registry(tmp_path, feature_state, bundle["models"])
+    version = registry.model_version
+    online = OnlineDetector(
+        HalfSpaceTrees(feature_count(feature_state), window=500), replace_scores=True
+    )
+    thresholds = {"LOW_RISK_MAX": 0.5, "HIGH_RISK_MIN": 0.6}
+    sketch_store = _SketchStore(thresholds)
+    sketches = ScoreSketches(sketch_store, registry=registry)
+    histograms = {}
+
+    async def flush_histograms(day, model_version, counts):
+        histograms[model_version] = histograms.get(model_version, 0) + counts.rows
+
+    drift = DriftMonitor(flush_histograms, flush_seconds=3600)
+    shadow = []
+
+    class _Shadow:
+        def uses_profiles(self):
+            return False
+
+        def submit(self, txn_ids, batch, results):
+            shadow.append(results)
+
+    service = FraudDetectionService(
+        session_factory=None,
+        model_path=registry.model_path,
+        registry=registry,
+        executor=InferenceExecutor(),
+        online=online,
+        score_sketches=sketches,
+        drift=drift,
+        shadow=_Shadow(),
+        skip_unchanged=False,
+    )
+    await _warm_up(service, make_transactions)
+
+    await drift.start()
+    try:
+        sketches.pending = {}
+        shadow.clear()
+        rows = _rows(make_transactions, 1000)
+        updates = await service.score_rows(rows)
+        await drift.drain()
+    finally:
+        await drift.shutdown()
+    forest = await FraudDetectionService(
+        session_factory=None,
+        model_path=registry.model_path,
+        registry=registry,
+        executor=InferenceExecutor(),
+        skip_unchanged=False,
+    ).score_rows(rows)
+    assert [u[1] for u in updates] != [u[1] for u in forest]
+
+    # the loaded version's sketch gets the bundle's scores, not the detector's ranks
+    sketch = sketches.pending_sketch(version)
+    assert list(sketches.pending) == [version] and sketch.count == len(rows)
+    assert sketch.min == min(u[1] for u in forest) and sketch.max == max(u[1] for u in forest)
+    # so a recalibration stored for it is applied on the next flush
+    await sketches.flush()
+    assert sketch_store.versions == [version]
+    assert registry.get()[0]["risk_thresholds"] == thresholds
+    # the drift histograms are kept under the version the report asks for
+    assert histograms == {version: len(rows)}
+    # shadow compares the candidate with the bundle's scores
+    assert [r[0] for r in shadow[0]] == [u[1] for u in forest]
@@ -0,0 +1,52 @@
+import numpy as np
+
+from fraud_detection.prediction import apply_scaler, predict_batch, predict_single
+
+
+def expected_results(df, feature_state, models):
+    thresholds = feature_state["risk_thresholds"]
+    forest = models["isolation_forest"]
+    data = apply_scaler(df, feature_state)
+
+    results = []
+    for pred, raw in zip(forest.predict(data), forest.score_samples(data)):
+        score = float(-raw)
+        if score >= thresholds["HIGH_RISK_MIN"]:
+            tier = "high"
+        elif score >= thresholds["LOW_RISK_MAX"]:
+            tier = "medium"
+        else:
+            tier = "low"
+        results.append((score, bool(pred == -1), tier))
+    return results
+
+
+############################
+# predict_batch Tests
+############################
+
+# TC-FRAUD-BATCH-001: one pass gives the same label, score and tier as predict + score_samples
+def test_predict_batch_matches_forest(bundle, make_transactions):
+    df = make_transactions(500, seed=7)
+
+    results = predict_batch(df, bundle["feature_state"], bundle["models"])
+
+    assert results == expected_results(df, bundle["feature_state"], bundle["models"])
+    assert {tier for _, _, tier in results} <= {"low", "medium", "high"}
+
+
+# TC-FRAUD-BATCH-002: list of dicts and predict_single agree with the batch
+def test_predict_batch_list_and_single(bundle, make_transactions):
+    rows = make_transactions(20, seed=3).to_dict("records")
+
+    results = predict_batch(rows, bundle["feature_state"], bundle["models"])
+    singles = [predict_single(r, bundle["feature_state"], bundle["models"]) for r in rows]
+
+    assert len(results) == 20
+    np.testing.assert_allclose([r[0] for r in results], [s[0] for s in singles])
+    assert [r[1:] for r in results] == [s[1:] for s in singles]
+
+
+# TC-FRAUD-BATCH-003: empty batch returns no results
+def test_predict_batch_empty(bundle):
+    assert predict_batch([], bundle["feature_state"], bundle["models"]) == []
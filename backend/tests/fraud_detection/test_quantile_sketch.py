@@ -0,0 +1,221 @@
+from datetime import date as DateType
+
+import joblib
+import numpy as np
+import pytest
+
+from app.services.fraud_detection_service import FraudDetectionService
+from fraud_detection import inference_executor
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.quantile_sketch import (
+    KLLSketch,
+    ScoreSketches,
+    apply_thresholds,
+    recalibrated_thresholds,
+    tier_shares,
+)
+
+
+# flushes run on asyncio tasks, same as in the app lifespan
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _registry(tmp_path, bundle):
+    path = tmp_path / "live.joblib"
+    joblib.dump({"feature_state": bundle["feature_state"], "models": bundle["models"]}, path)
+    registry = ModelRegistry()
+    registry.load(str(path))
+    return registry
+
+
+def _rows(n=200):
+    merchants = ["Amazon", "Starbucks", "Uber", "Walmart", "Chevron"]
+    return [
+        (i + 1, 3.0 * (i % 37 + 1) ** 1.7, "online" if i % 2 else "in_store", False,
+         DateType(2025, 1, 1 + i % 28), merchants[i % len(merchants)])
+        for i in range(n)
+    ]
+
+
+# stands in for score_sketch_flusher, keeps one merged sketch per version like the table
+class _Store:
+    def __init__(self):
+        self.sketches = {}
+        self.thresholds = {}
+        self.fail = False
+
+    async def __call__(self, model_version, sketch):
+        if self.fail:
+            raise RuntimeError("db down")
+        if sketch is not None:
+            stored = self.sketches.setdefault(model_version, KLLSketch(sketch.k))
+            stored.merge(sketch)
+        return self.thresholds.get(model_version)
+
+
+############################
+# KLL Sketch Tests
+############################
+
+# TC-QUANTILE-SKETCH-001: quantiles stay within the rank error bound, merged sketches match one sketch
+def test_sketch_accuracy_and_merge():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.normal(0.45, 0.05, 150_000), rng.exponential(0.1, 50_000) + 0.5])
+    qs = [0.01, 0.5, 0.9, 0.98, 0.999]
+
+    whole = KLLSketch(200, seed=1)
+    for chunk in np.array_split(values, 200):
+        whole.update(chunk)
+    # four processes, each sees a quarter of the batches
+    parts = [KLLSketch(200, seed=s) for s in range(4)]
+    for i, chunk in enumerate(np.array_split(values, 200)):
+        parts[i % 4].update(chunk)
+    merged = KLLSketch(200, seed=9)
+    for part in parts:
+        merged.merge(part)
+
+    ordered = np.sort(values)
+    for sketch in (whole, merged):
+        assert sketch.count == len(values)
+        assert sketch.size < 2000
+        assert (sketch.min, sketch.max) == (values.min(), values.max())
+        # rank of each estimate in the real data is within 1% of the asked quantile
+        ranks = np.searchsorted(ordered, sketch.quantiles(qs)) / len(values)
+        np.testing.assert_allclose(ranks, qs, atol=0.01)
+        np.testing.assert_allclose(
+            sketch.cdf([0.45, 0.6]), [np.mean(values < 0.45), np.mean(values < 0.6)], atol=0.01
+        )
+
+    # nothing recorded yet
+    assert KLLSketch().quantiles([0.5]) == [None]
+    assert KLLSketch().merge(None).count == 0
+
+
+# TC-QUANTILE-SKETCH-002: the stored form round trips, thresholds come from the live quantiles
+def test_sketch_round_trip_and_recalibration():
+    sketch = KLLSketch(64, seed=2)
+    sketch.update(np.linspace(0.0, 1.0, 10_001))
+    restored = KLLSketch.from_dict(sketch.to_dict())
+    assert restored.count == sketch.count and restored.k == 64
+    assert restored.quantiles([0.1, 0.5, 0.9]) == sketch.quantiles([0.1, 0.5, 0.9])
+    assert KLLSketch.from_dict(None).count == 0
+
+    thresholds = recalibrated_thresholds(sketch, low_quantile=0.8, high_quantile=0.95)
+    assert thresholds["LOW_RISK_MAX"] == pytest.approx(0.8, abs=0.03)
+    assert thresholds["HIGH_RISK_MIN"] == pytest.approx(0.95, abs=0.03)
+    shares = tier_shares(sketch, thresholds)
+    assert shares["low"] == pytest.approx(0.8, abs=0.03)
+    assert shares["high"] == pytest.approx(0.05, abs=0.03)
+    assert sum(shares.values()) == pytest.approx(1.0)
+
+    with pytest.raises(ValueError):
+        recalibrated_thresholds(sketch, low_quantile=0.9, high_quantile=0.5)
+    with pytest.raises(ValueError):
+        recalibrated_thresholds(KLLSketch())
+
+
+############################
+# Score Sketches Tests
+############################
+
+# TC-QUANTILE-SKETCH-003: scored batches feed the sketch, stored thresholds retier the next batch
+@pytest.mark.anyio
+async def test_service_sketches_and_recalibration(tmp_path, bundle):
+    registry = _registry(tmp_path, bundle)
+    store = _Store()
+    sketches = ScoreSketches(store, registry=registry, k=64)
+    service = FraudDetectionService(
+        session_factory=None,
+        model_path=registry.model_path,
+        registry=registry,
+        executor=InferenceExecutor(),
+        score_sketches=sketches,
+        skip_unchanged=False,
+    )
+    version = registry.model_version
+
+    updates = await service.score_rows(_rows())
+    assert sketches.pending_sketch(version).count == len(updates)
+
+    # a failed flush keeps the scores for the next one
+    store.fail = True
+    await sketches.flush()
+    await service.score_rows(_rows(50))
+    assert sketches.pending_sketch(version).count == len(updates) + 50
+    store.fail = False
+    await sketches.flush()
+    assert sketches.pending == {}
+    assert store.sketches[version].count == len(updates) + 50
+
+    # recalibrated on another process: the top 10% of scores high, the next 40% medium
+    live = sketches.live_sketch(version, store.sketches[version])
+    store.thresholds[version] = recalibrated_thresholds(
+        live, low_quantile=0.5, high_quantile=0.9
+    )
+    generation = registry.generation
+    await sketches.flush()
+    assert registry.generation == generation + 1
+    assert registry.get()[0]["risk_thresholds"] == store.thresholds[version]
+    # nothing changed since, no second swap
+    await sketches.flush()
+    assert registry.generation == generation + 1
+
+    rescored = await service.score_rows(_rows())
+    assert [u[1] for u in rescored] == [u[1] for u in updates]
+    tiers = [u[3] for u in rescored]
+    assert tiers != [u[3] for u in updates]
+    assert tiers.count("high") == pytest.approx(len(tiers) * 0.1, abs=len(tiers) * 0.05)
+    assert tiers.count("low") == pytest.approx(len(tiers) * 0.5, abs=len(tiers) * 0.1)
+
+
+# TC-QUANTILE-SKETCH-004: process pool workers score with the thresholds sent along with the batch
+def test_worker_threshold_override(tmp_path, bundle):
+    path = tmp_path / "live.joblib"
+    joblib.dump({"feature_state": bundle["feature_state"], "models": bundle["models"]}, path)
+    inference_executor._init_worker(str(path))
+    batch = [
+        {"amount": r[1], "payment_channel": r[2], "pending": r[3],
+         "date": r[4].isoformat(), "merchant_name": r[5]}
+        for r in _rows(20)
+    ]
+    try:
+        default, _ = inference_executor._score_in_worker(batch)
+        everything_high, _ = inference_executor._score_in_worker(
+            batch, {"LOW_RISK_MAX": -10.0, "HIGH_RISK_MIN": -5.0}
+        )
+    finally:
+        inference_executor._worker_bundle.clear()
+
+    assert [s for s, _, _ in everything_high] == [s for s, _, _ in default]
+    assert {t for _, _, t in everything_high} == {"high"}
+
+
+# TC-QUANTILE-SKETCH-005: a reset puts every process back on the bundle's own thresholds
+@pytest.mark.anyio
+async def test_reset_recalibrated_thresholds(tmp_path, bundle):
+    registry = _registry(tmp_path, bundle)
+    store = _Store()
+    sketches = ScoreSketches(store, registry=registry, k=64)
+    version = registry.model_version
+    bundle_thresholds = registry.get()[0]["risk_thresholds"]
+    # nothing recalibrated, nothing to reset
+    assert apply_thresholds(registry, None) is False
+
+    store.thresholds[version] = {"LOW_RISK_MAX": -1.0, "HIGH_RISK_MIN": -0.5}
+    await sketches.flush()
+    assert registry.get()[0]["risk_thresholds"] == store.thresholds[version]
+    assert registry.risk_thresholds_recalibrated is True
+
+    # the reset clears the stored thresholds, the next flush follows
+    store.thresholds[version] = None
+    generation = registry.generation
+    await sketches.flush()
+    feature_state = registry.get()[0]
+    assert feature_state["risk_thresholds"] == bundle_thresholds
+    assert "risk_thresholds_recalibrated" not in feature_state
+    assert registry.generation == generation + 1
+    await sketches.flush()
+    assert registry.generation == generation + 1
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import date as DateType
+
+import joblib
+import numpy as np
+import pytest
+
+from app.services.fraud_detection_service import FraudDetectionService
+from fraud_detection import metrics
+from fraud_detection.inference_executor import InferenceExecutor
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+from fraud_detection.shadow import TIER_CODES, ShadowScorer, shadow_report
+
+
+# the shadow queue is an asyncio task, same as in the app lifespan
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _registry(tmp_path, bundle, name, shift=0.0):
+    thresholds = bundle["feature_state"]["risk_thresholds"]
+    feature_state = {
+        **bundle["feature_state"],
+        "risk_thresholds": {k: v + shift for k, v in thresholds.items()},
+    }
+    path = tmp_path / f"{name}.joblib"
+    joblib.dump({"feature_state": feature_state, "models": bundle["models"]}, path)
+    registry = ModelRegistry()
+    registry.load(str(path))
+    return registry
+
+
+class _Writer:
+    def __init__(self, fail_first: bool = False):
+        self.calls = []
+        self.fail_first = fail_first
+
+    async def __call__(self, model_version, rows):
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError("db down")
+        self.calls.append((model_version, list(rows)))
+
+
+def _rows(n=20):
+    merchants = ["Amazon", "Starbucks", "Uber", "Walmart", "Chevron"]
+    return [
+        (i + 1, 10.0 * (i + 1) ** 1.5, "online" if i % 2 else "in_store", False,
+         DateType(2025, 1, 1 + i % 28), merchants[i % len(merchants)])
+        for i in range(n)
+    ]
+
+
+############################
+# Shadow Report Tests
+############################
+
+# TC-SHADOW-001: rank agreement, tier flips and label precision from the side table rows
+def test_shadow_report():
+    low, medium, high = TIER_CODES["low"], TIER_CODES["medium"], TIER_CODES["high"]
+    rows = [
+        (1, 0.30, low, 0.31, low, "pending"),
+        (2, 0.40, low, 0.45, medium, "not_fraud"),
+        (3, 0.50, medium, 0.52, medium, "not_fraud"),
+        (4, 0.60, medium, 0.70, high, "fraud"),
+        (5, 0.70, high, 0.60, medium, "fraud"),
+        (6, 0.80, high, 0.90, high, "not_fraud"),
+    ]
+    report = shadow_report(rows, top_fraction=0.34)
+
+    assert report["rows"] == 6
+    # one adjacent swap in the middle of six ranks: 1 - 6 * 2 / (6 * 35)
+    assert report["rank_agreement"]["spearman"] == pytest.approx(1 - 12 / 210)
+    # top 3 live {6, 5, 4}, top 3 shadow {6, 4, 5}
+    assert report["rank_agreement"]["top_overlap"] == 1.0
+
+    tiers = report["tiers"]
+    assert tiers["flip_rate"] == pytest.approx(3 / 6)
+    assert (tiers["raised"], tiers["lowered"]) == (2, 1)
+    assert tiers["confusion"]["medium"] == {"low": 0, "medium": 1, "high": 1}
+
+    labels = report["labels"]
+    assert (labels["reviewed"], labels["fraud"]) == (5, 2)
+    assert labels["primary"]["precision_high"] == pytest.approx(1 / 2)
+    assert labels["primary"]["recall_high"] == pytest.approx(1 / 2)
+    assert labels["shadow"]["precision_medium_or_high"] == pytest.approx(2 / 5)
+    assert labels["shadow"]["recall_medium_or_high"] == 1.0
+
+    empty = shadow_report([])
+    assert empty["rows"] == 0 and empty["rank_agreement"]["spearman"] is None
+    assert empty["labels"]["primary"]["precision_high"] is None
+
+
+############################
+# Shadow Scorer Tests
+############################
+
+# TC-SHADOW-002: live results are untouched, the candidate's scores land in the side table
+@pytest.mark.anyio
+async def test_service_shadow_scores(tmp_path, bundle):
+    live = _registry(tmp_path, bundle, "live")
+    candidate = _registry(tmp_path, bundle, "candidate", shift=-0.2)
+    writer = _Writer()
+    shadow = ShadowScorer(candidate, writer)
+    await shadow.start()
+
+    def service(shadow):
+        return FraudDetectionService(
+            session_factory=None,
+            model_path=live.model_path,
+            registry=live,
+            executor=InferenceExecutor(),
+            shadow=shadow,
+            skip_unchanged=False,
+        )
+
+    try:
+        expected = await service(None).score_rows(_rows())
+        updates = await service(shadow).score_rows(_rows())
+        await shadow.drain()
+    finally:
+        await shadow.shutdown()
+
+    assert updates == expected
+    [(model_version, rows)] = writer.calls
+    assert model_version == candidate.model_version
+
+    batch = [
+        {"amount": r[1], "payment_channel": r[2], "pending": r[3],
+         "date": r[4].isoformat(), "merchant_name": r[5]}
+        for r in _rows()
+    ]
+    candidate_results = predict_batch(batch, *candidate.get())
+    assert [r[0] for r in rows] == [u[0] for u in updates]
+    np.testing.assert_allclose([r[1] for r in rows], [u[1] for u in updates])
+    assert [r[2] for r in rows] == [TIER_CODES[u[3]] for u in updates]
+    np.testing.assert_allclose([r[3] for r in rows], [s for s, _, _ in candidate_results])
+    assert [r[4] for r in rows] == [TIER_CODES[t] for _, _, t in candidate_results]
+
+
+# TC-SHADOW-003: a full queue drops batches instead of waiting, a failed write doesn't stop the task
+@pytest.mark.anyio
+async def test_shadow_scorer_backpressure(tmp_path, bundle):
+    candidate = _registry(tmp_path, bundle, "candidate")
+    writer = _Writer(fail_first=True)
+    shadow = ShadowScorer(candidate, writer, max_pending=1)
+    batch = [{"amount": 12.0, "payment_channel": "online", "pending": False,
+              "date": "2025-01-01", "merchant_name": "Amazon"}]
+    primary = [(0.5, False, "low")]
+
+    assert shadow.submit([1], batch, primary) is False  # not started
+    dropped = metrics.SHADOW_DROPPED.value
+    await shadow.start()
+    try:
+        assert shadow.submit([1], batch, primary) is True
+        assert shadow.submit([2], batch, primary) is False
+        assert metrics.SHADOW_DROPPED.value == dropped + 1
+
+        await shadow.drain()
+        assert shadow.submit([3], batch, primary) is True
+        await asyncio.wait_for(shadow.drain(), timeout=5)
+    finally:
+        await shadow.shutdown()
+
+    # the first write failed and was counted, the next batch still went through
+    assert metrics.SHADOW_DROPPED.value == dropped + 2
+    assert [[r[0] for r in rows] for _, rows in writer.calls] == [[3]]
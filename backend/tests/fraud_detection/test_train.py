@@ -0,0 +1,178 @@
+import json
+from datetime import date as DateType
+
+import numpy as np
+import pytest
+
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+from fraud_detection.train import (
+    TrainingScan,
+    rows_to_columns,
+    save_training_bundle,
+    train_model,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+MERCHANTS = ["Amazon", "Starbucks", "Uber", "Walmart", None]
+
+
+def _rows(n, seed=0, fraud_every=50):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(1, n + 1):
+        label = "fraud" if i % fraud_every == 0 else ("not_fraud" if i % 7 == 0 else "pending")
+        amount = 5000.0 if label == "fraud" else round(float(rng.gamma(2.0, 20.0)), 2)
+        rows.append((
+            i, amount, str(rng.choice(["online", "in_store"])), bool(rng.random() < 0.1),
+            DateType(2025, 1, 1 + i % 28), MERCHANTS[i % len(MERCHANTS)], label,
+        ))
+    return rows
+
+
+class MemoryTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def fetch_training_chunk(self, after_id, limit):
+        self.calls.append(after_id)
+        return [r for r in self.rows if r[0] > after_id][:limit]
+
+
+def _train(table, **kwargs):
+    kwargs = {"chunk_size": 300, "n_estimators": 20, "n_jobs": 1, "log": lambda _msg: None, **kwargs}
+    return train_model(table.fetch_training_chunk, **kwargs)
+
+
+############################
+# Scan Tests
+############################
+
+# TC-TRAIN-SCAN-001: streamed stats match one pass over the whole table, fraud rows left out
+def test_scan_matches_full_table():
+    rows = _rows(1000)
+    scan = TrainingScan(max_samples=10_000)
+    for start in range(0, len(rows), 128):
+        scan.add(rows_to_columns(rows[start:start + 128]))
+
+    normal = [r for r in rows if r[6] != "fraud"]
+    amazon = np.array([r[1] for r in normal if r[5] == "Amazon"])
+    state = scan.feature_state()
+
+    assert scan.rows == 1000 and scan.last_id == 1000
+    assert scan.label_counts == {"fraud": 20, "not_fraud": 140, "pending": 840}
+    assert state["merchant_mean"]["Amazon"] == pytest.approx(amazon.mean())
+    assert state["merchant_std"]["Amazon"] == pytest.approx(amazon.std(ddof=1))
+    assert state["global_amount_mean"] == pytest.approx(np.mean([r[1] for r in normal]))
+    assert None not in state["merchant_mean"]
+    assert "Unknown" in state["merchant_encoder"].classes_
+    assert len(scan.sample["id"]) == len(normal)
+
+
+# TC-TRAIN-SCAN-002: the sample is bounded, seeded and kept in id order
+def test_scan_sample_bounded():
+    def _sample(seed):
+        scan = TrainingScan(max_samples=200, random_state=seed)
+        rows = _rows(2000)
+        for start in range(0, len(rows), 300):
+            scan.add(rows_to_columns(rows[start:start + 300]))
+        return scan.sample["id"]
+
+    ids = _sample(1)
+
+    assert len(ids) == 200 and np.all(np.diff(ids) > 0)
+    assert np.array_equal(ids, _sample(1))
+    assert not np.array_equal(ids, _sample(2))
+
+
+############################
+# Training Tests
+############################
+
+# TC-TRAIN-001: chunks stream through both passes and produce a usable bundle
+@pytest.mark.anyio
+async def test_train_model_bundle():
+    table = MemoryTable(_rows(1000))
+
+    feature_state, models, metadata = await _train(table)
+
+    assert table.calls == [0, 300, 600, 900, 0, 300, 600, 900]
+    assert metadata["rows_scanned"] == 1000 and metadata["rows_trained"] == 980
+    thresholds = feature_state["risk_thresholds"]
+    assert thresholds["LOW_RISK_MAX"] <= thresholds["HIGH_RISK_MIN"]
+    assert feature_state["scaler"].n_samples_seen_ == 980
+    # the outsized fraud rows were never trained on, so they land in the top tier
+    assert metadata["evaluation"]["fraud"]["flagged_high"] == 1.0
+
+    results = predict_batch([{"amount": 12.0, "merchant_name": "Uber"}], feature_state, models)
+    assert results[0][2] in {"low", "medium", "high"}
+
+
+# TC-TRAIN-002: same table and seed give the same model
+@pytest.mark.anyio
+async def test_train_model_reproducible():
+    a = await _train(MemoryTable(_rows(600)), max_samples=300)
+    b = await _train(MemoryTable(_rows(600)), max_samples=300)
+
+    assert a[0]["risk_thresholds"] == b[0]["risk_thresholds"]
+    assert a[2]["sample_rows"] == 300
+
+
+# TC-TRAIN-003: an empty table is an error, not an empty bundle
+@pytest.mark.anyio
+async def test_train_model_empty():
+    with pytest.raises(ValueError):
+        await _train(MemoryTable([]))
+
+
+# TC-TRAIN-004: versioned bundle loads through the registry and won't be overwritten
+@pytest.mark.anyio
+@pytest.mark.parametrize("bundle_format", ["mmap", "joblib"])
+async def test_save_training_bundle(tmp_path, bundle_format):
+    feature_state, models, metadata = await _train(MemoryTable(_rows(600)))
+
+    path = save_training_bundle(
+        feature_state, models, metadata, str(tmp_path), "v2", bundle_format=bundle_format,
+    )
+    loaded_state, loaded_models = ModelRegistry().load(path)
+    written = json.loads((tmp_path / "v2" / "training.json").read_text())
+
+    assert written["model_version"] == "v2" and written["rows_scanned"] == 600
+    assert loaded_state["risk_thresholds"] == pytest.approx(feature_state["risk_thresholds"])
+    # the drift report's training histograms travel with the bundle
+    assert loaded_state["feature_reference"] == feature_state["feature_reference"]
+    assert feature_state["feature_reference"]["rows"] == metadata["sample_rows"]
+    batch = [{"amount": 40.0, "merchant_name": "Amazon", "payment_channel": "online"}]
+    assert predict_batch(batch, loaded_state, loaded_models)[0][0] == pytest.approx(
+        predict_batch(batch, feature_state, models)[0][0]
+    )
+    with pytest.raises(FileExistsError):
+        save_training_bundle(feature_state, models, metadata, str(tmp_path), "v2")
+
+
+# TC-TRAIN-005: rows with user ids train a behavioral bundle, the version survives the mmap format
+@pytest.mark.anyio
+async def test_train_model_behavioral(tmp_path):
+    rows = [r + (1 + r[0] % 4,) for r in _rows(600)]
+
+    feature_state, models, metadata = await _train(MemoryTable(rows))
+    base_state, _, _ = await _train(MemoryTable(rows), behavioral=False)
+
+    assert feature_state["feature_version"] == 2
+    assert metadata["params"]["feature_version"] == 2
+    assert feature_state["scaler"].n_features_in_ == 17
+    assert "feature_version" not in base_state and base_state["scaler"].n_features_in_ == 12
+
+    path = save_training_bundle(feature_state, models, metadata, str(tmp_path), "v3")
+    loaded_state, loaded_models = ModelRegistry().load(path)
+    assert loaded_state["feature_version"] == 2
+    batch = [{"amount": 40.0, "merchant_name": "Amazon", "user_amount_z": 0.5, "user_txn_24h": 3.0}]
+    assert predict_batch(batch, loaded_state, loaded_models)[0][0] == pytest.approx(
+        predict_batch(batch, feature_state, models)[0][0]
+    )
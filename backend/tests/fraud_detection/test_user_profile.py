@@ -0,0 +1,178 @@
+from datetime import date as DateType, datetime
+
+import numpy as np
+import pytest
+
+from fraud_detection.features import NUMBER_FEATURES, PROFILE_COLUMNS, build_feature_matrix
+from fraud_detection.prediction import create_row
+from fraud_detection.user_profile import (
+    HISTORY_HOURS,
+    UserProfileTracker,
+    UserSpendProfile,
+    annotate,
+    hour_index,
+)
+
+
+def _hour(value):
+    return int(hour_index([value])[0])
+
+
+############################
+# Profile Tests
+############################
+
+# TC-USER-PROFILE-001: dates, datetimes and iso strings land in the same hour bucket, missing is -1
+def test_hour_index():
+    assert _hour("2025-06-01") == _hour(DateType(2025, 6, 1)) == _hour(datetime(2025, 6, 1, 0, 30))
+    assert _hour("2025-06-01T05:10:00") == _hour("2025-06-01") + 5
+    assert list(hour_index([None, "not a date"])) == [-1, -1]
+
+
+# TC-USER-PROFILE-002: amount z-score and merchant share come from the user's own history
+def test_profile_amount_and_merchant_features():
+    profile = UserSpendProfile()
+    for amount in (10.0, 12.0, 14.0):
+        profile.add(amount, "Starbucks", None)
+    profile.add(12.0, "Uber", None)
+
+    z, share, *_ = profile.features(12.0, "Starbucks", None)
+    assert z == pytest.approx(0.0, abs=1e-9)
+    assert share == pytest.approx(0.75)
+
+    z, share, *_ = profile.features(500.0, "Apple", None)
+    assert z == 5.0
+    assert share == 0.0
+
+
+# TC-USER-PROFILE-003: velocity counts cover the 1h / 24h / 7d windows ending at the transaction
+def test_profile_velocity_windows():
+    profile = UserSpendProfile()
+    now = _hour("2025-06-10T12:00:00")
+    for offset in (0, 0, 3, 30, 200, HISTORY_HOURS + 5):
+        profile.add(5.0, "Uber", now - offset)
+
+    # the 200 hour old bucket is kept but outside the 7 day window, past the history it's dropped
+    assert now - 200 in profile.hour_counts
+    assert now - HISTORY_HOURS - 5 not in profile.hour_counts
+    assert profile.features(5.0, "Uber", now)[2:] == (2.0, 3.0, 4.0)
+    assert profile.features(5.0, "Uber", -1)[2:] == (0.0, 0.0, 0.0)
+
+
+# TC-USER-PROFILE-007: a snapshot sees the user's earlier rows and itself, never the rows added
+# after it, and a back-dated row still counts the history around its own date
+def test_profile_snapshot():
+    profile = UserSpendProfile()
+    newest = _hour("2025-06-10")
+    first = profile.snapshot(10.0, "Uber", newest)
+    assert first == (0.0, 1.0, 1.0, 1.0, 1.0)
+    assert profile.snapshot(10.0, "Uber", newest) == (0.0, 1.0, 2.0, 2.0, 2.0)
+
+    # an initial sync comes in newest first, 30 days back is well past the 7 day window
+    old = _hour("2025-05-11")
+    assert profile.snapshot(10.0, "Target", old)[2:] == (1.0, 1.0, 1.0)
+    assert profile.snapshot(10.0, "Target", old)[2:] == (2.0, 2.0, 2.0)
+    assert profile.hour_counts == {newest: 2, old: 2}
+    assert first == (0.0, 1.0, 1.0, 1.0, 1.0)
+
+
+# TC-USER-PROFILE-008: dates are days, so the 1h and 24h columns both count the same day
+def test_profile_day_buckets():
+    profile = UserSpendProfile()
+    for value in ("2025-06-01", "2025-06-03", "2025-06-03", "2025-06-08"):
+        profile.add(5.0, "Uber", _hour(value))
+
+    assert profile.features(5.0, "Uber", _hour("2025-06-03"))[2:] == (2.0, 2.0, 3.0)
+    assert profile.features(5.0, "Uber", _hour("2025-06-08"))[2:] == (1.0, 1.0, 3.0)
+    assert profile.features(5.0, "Uber", _hour("2025-06-09"))[2:] == (0.0, 0.0, 3.0)
+
+
+# TC-USER-PROFILE-004: stored values round trip, json keys come back as ints
+def test_profile_round_trip():
+    profile = UserSpendProfile()
+    profile.add(20.0, "Target", 100)
+    profile.add(30.0, "Target", 101)
+
+    values = profile.to_values()
+    assert values["hour_counts"] == {"100": 1, "101": 1}
+
+    class _Row:
+        pass
+    row = _Row()
+    for key, value in values.items():
+        setattr(row, key, value)
+
+    loaded = UserSpendProfile.from_row(row)
+    assert loaded.features(25.0, "Target", 101) == profile.features(25.0, "Target", 101)
+
+
+############################
+# Feature Tests
+############################
+
+# TC-USER-PROFILE-005: the training replay gives each row the features the live table would
+def test_tracker_matches_incremental_profile():
+    columns = {
+        "id": np.arange(1, 6),
+        "amount": np.array([10.0, 20.0, 30.0, 15.0, 900.0]),
+        "merchant_name": np.array(["Uber", "Uber", "Target", "Uber", "Apple"], dtype=object),
+        "date": np.array(["2025-06-01"] * 5, dtype=object),
+        "user_id": np.array([1, 1, 1, 2, 1], dtype=object),
+    }
+    UserProfileTracker().annotate_columns(columns)
+
+    profile = UserSpendProfile()
+    expected = []
+    for amount, merchant in ((10.0, "Uber"), (20.0, "Uber"), (30.0, "Target"), (900.0, "Apple")):
+        profile.add(amount, merchant, _hour("2025-06-01"))
+        expected.append(profile.features(amount, merchant, _hour("2025-06-01")))
+
+    user_1 = [0, 1, 2, 4]
+    for i, name in enumerate(PROFILE_COLUMNS):
+        assert columns[name][user_1] == pytest.approx([e[i] for e in expected])
+    assert columns["user_txn_24h"][3] == 1.0
+
+
+# TC-USER-PROFILE-006: behavioral bundles get 17 columns, batch and per row builders agree
+def test_behavioral_feature_matrix(bundle):
+    state = {**bundle["feature_state"], "feature_version": 2}
+    profile = UserSpendProfile()
+    profile.add(20.0, "Uber", _hour("2025-01-02"))
+    batch = annotate([
+        {"amount": 25.0, "merchant_name": "Uber", "payment_channel": "online",
+         "pending": False, "date": "2025-01-02", "user_id": 7},
+        {"amount": 60.0, "merchant_name": "Amazon", "payment_channel": "in_store",
+         "pending": True, "date": "2025-01-03", "user_id": 8},
+    ], {7: profile})
+
+    matrix = build_feature_matrix(batch, state)
+    assert matrix.shape == (2, NUMBER_FEATURES + len(PROFILE_COLUMNS))
+    expected = profile.features(25.0, "Uber", _hour("2025-01-02"))
+    assert matrix[0, NUMBER_FEATURES:] == pytest.approx(expected)
+    # no profile for user 8, its behavioral features are zero
+    assert not matrix[1, NUMBER_FEATURES:].any()
+    for i, txn in enumerate(batch):
+        assert create_row(txn, state) == pytest.approx(matrix[i])
+
+    # the original bundles keep their 12 columns
+    assert build_feature_matrix(batch, bundle["feature_state"]).shape == (2, NUMBER_FEATURES)
+
+
+# TC-USER-PROFILE-009: rows with a stored snapshot train on it, the replay still counts them
+def test_tracker_prefers_stored_snapshot():
+    stored = (1.5, 0.25, 4.0, 4.0, 9.0)
+    columns = {
+        "id": np.arange(1, 4),
+        "amount": np.array([10.0, 20.0, 30.0]),
+        "merchant_name": np.array(["Uber", "Uber", "Uber"], dtype=object),
+        "date": np.array(["2025-06-01"] * 3, dtype=object),
+        "user_id": np.array([1, 1, 1], dtype=object),
+        "profile_features": np.array([None, stored, None], dtype=object),
+    }
+    UserProfileTracker().annotate_columns(columns)
+
+    assert "profile_features" not in columns
+    row = [columns[name][1] for name in PROFILE_COLUMNS]
+    assert row == pytest.approx(stored)
+    assert columns["user_txn_24h"][0] == 1.0
+    assert columns["user_txn_24h"][2] == 3.0
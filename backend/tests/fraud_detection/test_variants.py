@@ -0,0 +1,134 @@
+import copy
+
+import numpy as np
+import pytest
+
+from fraud_detection.bundle_format import load_mmap_bundle, save_mmap_bundle
+from fraud_detection.compact_model import _sibling_order, export_isolation_forest
+from fraud_detection.features import build_feature_matrix
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.prediction import predict_batch
+from fraud_detection.train import save_training_bundle
+from fraud_detection.variants import (
+    best_variant,
+    build_variants,
+    depth_capped,
+    float32_thresholds,
+    node_samples,
+    sweep,
+    tree_subset,
+    variant_bundle,
+)
+
+
+def _scaled(bundle, make_transactions, n=1500, seed=8):
+    feature_state = bundle["feature_state"]
+    frame = make_transactions(n, seed=seed)
+    return feature_state["scaler"].transform(build_feature_matrix(frame, feature_state))
+
+
+############################
+# Forest Variant Tests
+############################
+
+# TC-VARIANTS-001: leaf sample counts read back match sklearn's, subsets score like sklearn
+def test_tree_subset_matches_sklearn(bundle, make_transactions):
+    forest = bundle["models"]["isolation_forest"]
+    compact = export_isolation_forest(forest)
+    X = _scaled(bundle, make_transactions)
+
+    samples = node_samples(compact)
+    for t in (0, 7, len(forest.estimators_) - 1):
+        tree = forest.estimators_[t].tree_
+        order, _ = _sibling_order(tree.children_left, tree.children_right)
+        end = compact.roots[t + 1] if t + 1 < compact.n_estimators else compact.n_nodes
+        np.testing.assert_array_equal(samples[compact.roots[t]:end], tree.n_node_samples[order])
+
+    # the same forest with its estimator lists cut down to 20
+    truncated = copy.deepcopy(forest)
+    for attr in ("estimators_", "estimators_features_", "_decision_path_lengths",
+                 "_average_path_length_per_tree"):
+        if hasattr(truncated, attr):
+            setattr(truncated, attr, list(getattr(truncated, attr))[:20])
+    subset = tree_subset(compact, 20)
+    assert subset.n_estimators == 20
+    np.testing.assert_allclose(subset.score_samples(X), truncated.score_samples(X))
+    assert tree_subset(compact, 10_000) is compact
+
+
+# TC-VARIANTS-002: depth caps and float32 thresholds shrink the forest and keep the ranking close
+def test_depth_cap_and_float32(tmp_path, bundle, make_transactions):
+    compact = export_isolation_forest(bundle["models"]["isolation_forest"])
+    X = _scaled(bundle, make_transactions)
+    full = compact.score_samples(X)
+
+    assert depth_capped(compact, compact.max_depth) is compact
+    capped = depth_capped(compact, compact.max_depth - 2)
+    assert capped.max_depth == compact.max_depth - 2
+    assert capped.n_nodes < compact.n_nodes
+    assert np.corrcoef(full, capped.score_samples(X))[0, 1] > 0.95
+
+    f32 = float32_thresholds(compact)
+    assert f32.threshold.dtype == np.float32
+    np.testing.assert_allclose(f32.score_samples(X), full, atol=1e-3)
+
+    # float32 thresholds survive the memory mapped bundle
+    feature_state, models = variant_bundle(
+        bundle["feature_state"], bundle["models"], f32,
+        {"offset": compact.offset_, "risk_thresholds": bundle["feature_state"]["risk_thresholds"]},
+    )
+    directory = save_mmap_bundle(feature_state, models, str(tmp_path / "f32"))
+    loaded = load_mmap_bundle(directory)[1]["isolation_forest"]
+    assert loaded.threshold.dtype == np.float32
+    np.testing.assert_array_equal(loaded.score_samples(X), f32.score_samples(X))
+
+
+# TC-VARIANTS-003: the sweep reports every variant, the best one is emitted as a loadable bundle
+def test_sweep_emits_best_variant(tmp_path, bundle, make_transactions):
+    compact = export_isolation_forest(bundle["models"]["isolation_forest"])
+    thresholds = bundle["feature_state"]["risk_thresholds"]
+    X = _scaled(bundle, make_transactions, n=3000)
+    labelled = (X[:50], np.array(["fraud"] * 10 + ["not_fraud"] * 40, dtype=object))
+
+    results, built = sweep(
+        compact, thresholds, X, labelled=labelled, tree_counts=(10, 25), depth_caps=(6,),
+        repeats=1, log=lambda *_: None,
+    )
+    names = {r["name"] for r in results}
+    assert names == set(build_variants(compact, tree_counts=(10, 25), depth_caps=(6,)))
+    assert {"full", "f32", "trees10", "trees25-depth6-f32"} <= names
+
+    full = next(r for r in results if r["name"] == "full")
+    assert full["spearman"] == pytest.approx(1.0)
+    assert full["tier_agreement"] == 1.0 and full["anomaly_recall"] == 1.0
+    assert full["risk_thresholds"] == thresholds
+    assert "fraud_recall_medium_or_high" in full
+
+    # recalibrated variants flag about as many rows as the full forest
+    trees10 = next(r for r in results if r["name"] == "trees10")
+    flagged = sum(trees10["tier_confusion"][t]["high"] for t in ("low", "medium", "high"))
+    assert flagged == pytest.approx(sum(full["tier_confusion"]["high"].values()), abs=5)
+
+    assert best_variant(results, min_spearman=1.01, min_recall=1.01)["name"] == "full"
+    best = best_variant(results, min_spearman=0.0, min_recall=0.0)
+    assert best["rows_per_sec"] == max(r["rows_per_sec"] for r in results)
+
+    chosen = next(r for r in results if r["name"] == "trees25")
+    path = save_training_bundle(
+        *variant_bundle(bundle["feature_state"], bundle["models"], built["trees25"], chosen),
+        {"variant": chosen}, str(tmp_path), "v1-trees25",
+    )
+    registry = ModelRegistry()
+    feature_state, models = registry.load(path)
+    assert registry.model_version == "v1-trees25"
+    assert models["isolation_forest"].n_estimators == 25
+    assert models["isolation_forest"].offset_ == pytest.approx(chosen["offset"])
+    assert feature_state["risk_thresholds"] == chosen["risk_thresholds"]
+
+    rows = make_transactions(20, seed=9).to_dict("records")
+    expected = predict_batch(rows, *variant_bundle(
+        bundle["feature_state"], bundle["models"], built["trees25"], chosen
+    ))
+    tiers = [t for _, _, t in predict_batch(rows, feature_state, models)]
+    assert tiers == [t for _, _, t in expected]
+    assert load_mmap_bundle(path)[1]["isolation_forest"].n_estimators == 25
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from fraud_detection.merchant_stats import welford_merge, welford_unmerge, welford_update
+from infrastructure.db.repos.merchant_stats_repo import SqlMerchantStatsRepo
+
+
+class _MockSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+
+
+# merchant -> (count, mean, m2) from the upsert's VALUES rows
+def _partials(stmt) -> dict:
+    params = stmt.compile(dialect=postgresql.asyncpg.dialect()).params
+    rows = {}
+    for key, value in params.items():
+        column, _, index = key.rpartition("_m")
+        if column in ("merchant_name", "count", "mean", "m2"):
+            rows.setdefault(index, {})[column] = value
+    return {
+        row["merchant_name"]: (row["count"], row["mean"], row["m2"]) for row in rows.values()
+    }
+
+
+def _fold(amounts):
+    state = (0, 0.0, 0.0)
+    for x in amounts:
+        state = welford_update(*state, x)
+    return state
+
+
+############################
+# Merchant Stats Repo Tests
+############################
+
+# TC-MERCHANT-REPO-001: each merchant's partial is welford_update over its amounts, one upsert
+@pytest.mark.anyio
+async def test_add_amounts_matches_welford_update():
+    session = _MockSession()
+    coffee = [4.5, 5.25, 3.0, 12.0, 4.75]
+    books = [30.0, 18.5]
+    pairs = [("Coffee", x) for x in coffee] + [("Books", x) for x in books]
+    pairs += [(None, 9.0), ("Coffee", None)]
+
+    await SqlMerchantStatsRepo(session).add_amounts(pairs)
+    assert len(session.statements) == 1
+    partials = _partials(session.statements[0])
+    assert partials.keys() == {"Coffee", "Books"}
+    for name, amounts in (("Coffee", coffee), ("Books", books)):
+        count, mean, m2 = partials[name]
+        expected = _fold(amounts)
+        assert count == expected[0]
+        assert mean == pytest.approx(expected[1]) and m2 == pytest.approx(expected[2])
+
+    # merging a later page's partial into the row gives the same result as one pass
+    later = [7.0, 2.5]
+    await SqlMerchantStatsRepo(session).add_amounts([("Coffee", x) for x in later])
+    merged = welford_merge(partials["Coffee"], _partials(session.statements[1])["Coffee"])
+    assert merged == pytest.approx(_fold(coffee + later))
+
+    # nothing to add, no statement
+    await SqlMerchantStatsRepo(session).add_amounts([(None, 1.0), ("", 2.0)])
+    assert len(session.statements) == 2
+
+
+# TC-MERCHANT-REPO-002: removed amounts go out as one UPDATE with each merchant's partial
+@pytest.mark.anyio
+async def test_remove_amounts_partials():
+    session = _MockSession()
+    await SqlMerchantStatsRepo(session).remove_amounts(
+        [("Coffee", 4.5), ("Books", 30.0), ("Coffee", 5.25), (None, 1.0)]
+    )
+    assert len(session.statements) == 1
+    sql = str(session.statements[0].compile(dialect=postgresql.asyncpg.dialect()))
+    assert sql.startswith("UPDATE merchant_amount_stats SET count=greatest(")
+    params = session.statements[0].compile(dialect=postgresql.asyncpg.dialect()).params
+    names, counts, means, m2s = [v for v in params.values() if isinstance(v, list)]
+    assert names == ["Books", "Coffee"] and counts == [1, 2]
+    assert (counts[1], means[1], m2s[1]) == pytest.approx(_fold([4.5, 5.25]))
+
+    # taking a page back out leaves what was there before it
+    before = _fold([3.0, 12.0, 4.75])
+    after = welford_merge(before, _fold([4.5, 5.25]))
+    assert welford_unmerge(after, (counts[1], means[1], m2s[1])) == pytest.approx(before)
+
+    await SqlMerchantStatsRepo(session).remove_amounts([(None, 1.0)])
+    assert len(session.statements) == 1
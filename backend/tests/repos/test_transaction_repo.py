@@ -0,0 +1,270 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert, Update
+
+import infrastructure.db.repos.transaction_repo as transaction_repo_mod
+from app.domain.entities import ConnectionItemEntity
+from infrastructure.db.repos.transaction_repo import SqlTransactionRepo
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+def _params(stmt) -> dict:
+    return stmt.compile(dialect=postgresql.asyncpg.dialect()).params
+
+
+# records every statement; inserted rows get ids and an UPDATE finds the pending rows
+# already written, like the transactions table within one session
+class _MockSession:
+    def __init__(self):
+        self.statements = []
+        self.ids = {}
+        self.snapshots = {}
+        # plaid id -> (merchant_name, amount) as stored, and the ones marked removed
+        self.amounts = {}
+        self.removed = set()
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        params = _params(stmt)
+        if isinstance(stmt, Insert):
+            plaid_ids = [v for k, v in params.items() if k.startswith("plaid_transaction_id")]
+            rows = []
+            for i, plaid_id in enumerate(plaid_ids):
+                new = plaid_id not in self.ids
+                self.ids.setdefault(plaid_id, len(self.ids) + 1)
+                if new:
+                    self.amounts[plaid_id] = (params[f"merchant_name_m{i}"], params[f"amount_m{i}"])
+                rows.append((plaid_id, self.ids[plaid_id], None, None, new))
+            return _Result(rows)
+        if isinstance(stmt, Update) and "removed" in params:
+            plaid_ids = next(v for v in params.values() if isinstance(v, list))
+            rows = [self.amounts[p] for p in plaid_ids if p in self.ids and p not in self.removed]
+            self.removed.update(p for p in plaid_ids if p in self.ids)
+            return _Result(rows)
+        if isinstance(stmt, Update):
+            arrays = [v for v in params.values() if isinstance(v, list)]
+            if isinstance(arrays[0][0], int):
+                # unnest arrays: transaction ids, then one per profile column
+                self.snapshots.update(
+                    {txn_id: values for txn_id, *values in zip(*arrays)}
+                )
+                return _Result([])
+            # unnest arrays: pending ids, posted ids, then PATCH_COLUMNS (name, merchant, ...)
+            pending_ids, posted_ids, _, merchants, amounts = arrays[:5]
+            rows = []
+            for pending_id, posted_id, merchant, amount in zip(
+                    pending_ids, posted_ids, merchants, amounts):
+                if pending_id in self.ids:
+                    self.ids[posted_id] = self.ids.pop(pending_id)
+                    old = self.amounts.pop(pending_id)
+                    new = self.amounts[posted_id] = (merchant or old[0], amount or old[1])
+                    rows.append((posted_id, self.ids[posted_id], None, None, *old, *new, False))
+            return _Result(rows)
+        # the account lookup
+        return _Result([("acc-1", 1)])
+
+    async def flush(self):
+        return None
+
+
+class _NoopStats:
+    def __init__(self):
+        self.added, self.removed = [], []
+
+    async def add_amounts(self, amounts):
+        self.added.extend(amounts)
+
+    async def remove_amounts(self, amounts):
+        self.removed.extend(amounts)
+
+    async def add_transactions(self, rows):
+        return {}
+
+
+@pytest.fixture
+def session():
+    return _MockSession()
+
+
+@pytest.fixture
+def repo(session):
+    repo = SqlTransactionRepo(session)
+    repo.merchant_stats = repo.user_profiles = _NoopStats()
+    return repo
+
+
+def _txn(plaid_id, pending_id=None, pending=False):
+    return {
+        "transaction_id": plaid_id, "pending_transaction_id": pending_id, "pending": pending,
+        "account_id": "acc-1", "amount": 12.5, "merchant_name": "Amazon",
+        "date": "2025-01-02", "payment_channel": "online",
+    }
+
+
+ITEM = ConnectionItemEntity(
+    id=1, user_id=7, plaid_item_id="item-1", access_token_encrypted="token",
+)
+
+
+############################
+# Plaid Upsert Tests
+############################
+
+# TC-TXN-REPO-001: pending and posted transaction in one page end up as one row
+@pytest.mark.anyio
+async def test_upsert_pending_and_posted_in_one_page(repo, session):
+    results = await repo.upsert_many_from_plaid(
+        ITEM, [_txn("posted-1", pending_id="pending-1"), _txn("pending-1", pending=True)]
+    )
+
+    kinds = [type(stmt).__name__ for stmt in session.statements[1:]]
+    # the pending row is written before the merge looks for it, nothing left to insert after
+    assert kinds == ["Insert", "Update"]
+    assert results[0] == results[1] == (1, None, None)
+    assert session.ids == {"posted-1": 1}
+
+
+# TC-TXN-REPO-002: a posted transaction without its pending row is inserted after the merge
+@pytest.mark.anyio
+async def test_upsert_posted_without_pending(repo, session):
+    results = await repo.upsert_many_from_plaid(
+        ITEM, [_txn("posted-2", pending_id="pending-2"), _txn("other-1")]
+    )
+
+    assert [type(stmt).__name__ for stmt in session.statements[1:]] == [
+        "Insert", "Update", "Insert",
+    ]
+    assert results == [(2, None, None), (1, None, None)]
+
+
+class _SnapshotProfiles(_NoopStats):
+
+    async def add_transactions(self, rows):
+        self.added.extend(rows)
+        return {txn_id: (0.5, 1.0, float(txn_id), 2.0, 3.0) for txn_id, *_ in rows}
+
+
+# TC-TXN-REPO-005: new rows get their profile snapshot written back and returned with them,
+# a row that was already stored keeps the snapshot it was first scored with
+@pytest.mark.anyio
+async def test_upsert_writes_profile_snapshots(repo, session):
+    repo.user_profiles = profiles = _SnapshotProfiles()
+    results = await repo.upsert_many_from_plaid(ITEM, [_txn("new-1"), _txn("new-2")])
+
+    assert [row[0] for row in profiles.added] == [1, 2]
+    assert profiles.added[0][1:] == (7, 12.5, "Amazon", date(2025, 1, 2))
+    assert [type(stmt).__name__ for stmt in session.statements[1:]] == ["Insert", "Update"]
+    assert session.snapshots == {1: [0.5, 1.0, 1.0, 2.0, 3.0], 2: [0.5, 1.0, 2.0, 2.0, 3.0]}
+    assert results == [(1, None, [0.5, 1.0, 1.0, 2.0, 3.0]), (2, None, [0.5, 1.0, 2.0, 2.0, 3.0])]
+
+    profiles.added.clear()
+    seen = len(session.statements)
+    await repo.upsert_many_from_plaid(ITEM, [_txn("new-1")])
+    assert profiles.added == []
+    assert [type(stmt).__name__ for stmt in session.statements[seen + 1:]] == ["Insert"]
+
+
+# TC-TXN-REPO-006: a posted amount replaces the pending one in the merchant stats
+@pytest.mark.anyio
+async def test_posted_amount_replaces_pending_in_stats(repo, session):
+    await repo.upsert_many_from_plaid(ITEM, [_txn("pending-3", pending=True)])
+    assert repo.merchant_stats.added == [("Amazon", 12.5)]
+
+    posted = {**_txn("posted-3", pending_id="pending-3"), "amount": 15.0}
+    await repo.upsert_many_from_plaid(ITEM, [posted])
+    assert repo.merchant_stats.removed == [("Amazon", 12.5)]
+    assert repo.merchant_stats.added[1:] == [("Amazon", 15.0)]
+
+    # same amount when it posts, the stats are left alone
+    await repo.upsert_many_from_plaid(ITEM, [_txn("pending-4", pending=True)])
+    await repo.upsert_many_from_plaid(ITEM, [_txn("posted-4", pending_id="pending-4")])
+    assert len(repo.merchant_stats.removed) == 1
+
+
+# TC-TXN-REPO-007: removed transactions leave the merchant stats once, unknown ids do nothing
+@pytest.mark.anyio
+async def test_mark_removed_takes_amounts_out(repo, session):
+    await repo.upsert_many_from_plaid(ITEM, [_txn("gone-1"), _txn("kept-1")])
+
+    await repo.mark_removed(["gone-1", "never-synced"])
+    await repo.mark_removed(["gone-1"])
+    assert repo.merchant_stats.removed == [("Amazon", 12.5)]
+
+
+# each UPDATE reports a row per id it got, minus the ones whose review isn't pending
+class _UpdateSession:
+    def __init__(self, reviewed=()):
+        self.statements = []
+        self.reviewed = set(reviewed)
+        self.flushes = 0
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        ids = _params(stmt)["param_1"]
+
+        class _Rowcount:
+            rowcount = len([i for i in ids if i not in self.reviewed])
+        return _Rowcount()
+
+    async def flush(self):
+        self.flushes += 1
+
+
+############################
+# Fraud Results Tests
+############################
+
+# TC-TXN-REPO-003: one UPDATE ... FROM unnest over typed arrays, only pending reviews,
+# tier kept when missing
+@pytest.mark.anyio
+async def test_set_fraud_results_statement():
+    session = _UpdateSession()
+    updated = await SqlTransactionRepo(session).set_fraud_results([
+        (1, 0.91, True, "high", 123, "v1"),
+        (2, 0.12, False, None),
+    ])
+
+    assert updated == 2 and session.flushes == 1
+    [stmt] = session.statements
+    compiled = stmt.compile(dialect=postgresql.asyncpg.dialect())
+    sql = " ".join(str(compiled).split())
+    for array_type in ("INTEGER", "FLOAT", "BOOLEAN", "VARCHAR", "BIGINT"):
+        assert f"::{array_type}[] AS {array_type}[])" in sql
+    assert sql.count("::VARCHAR[] AS VARCHAR[])") == 2
+    assert (
+        "AS scored(id, fraud_score, is_fraud_suspected, risk_level, fraud_fingerprint, "
+        "fraud_model_version)"
+    ) in sql
+    assert "risk_level=coalesce(scored.risk_level, transactions.risk_level)" in sql
+    assert "WHERE transactions.id = scored.id AND transactions.fraud_review_status = " in sql
+    params = compiled.params
+    assert params["fraud_review_status_1"] == "pending"
+    assert params["param_1"] == [1, 2]
+    assert params["param_2"] == [0.91, 0.12]
+    assert params["param_3"] == [True, False]
+    # updates without a tier, fingerprint or version bind NULL
+    assert params["param_4"] == ["high", None]
+    assert params["param_5"] == [123, None]
+    assert params["param_6"] == ["v1", None]
+
+
+# TC-TXN-REPO-004: big batches go out in chunks, the row counts add up
+@pytest.mark.anyio
+async def test_set_fraud_results_chunks(monkeypatch):
+    monkeypatch.setattr(transaction_repo_mod, "FRAUD_RESULTS_CHUNK", 2)
+    session = _UpdateSession(reviewed={4})
+    updates = [(i, 0.5, False, "low", i, "v1") for i in range(1, 6)]
+
+    assert await SqlTransactionRepo(session).set_fraud_results(updates) == 4
+    assert [_params(stmt)["param_1"] for stmt in session.statements] == [[1, 2], [3, 4], [5]]
+    assert await SqlTransactionRepo(session).set_fraud_results([]) == 0
+    assert len(session.statements) == 3
@@ -0,0 +1,193 @@
+import argparse
+import json
+from datetime import date as DateType
+
+import pytest
+
+import seed.rescore as rescore_mod
+from seed.rescore import rescore_range, split_ranges
+
+
+class _MockAsyncSession:
+    def __init__(self):
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, _exc_type, _exc, _tb):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+
+class MockTransactionRepo:
+    # ids 1..n, all pending and not removed
+    def __init__(self, n):
+        self.rows = [
+            (i, float(i), "online", False, DateType(2025, 1, 1), f"Merchant{i % 3}")
+            for i in range(1, n + 1)
+        ]
+        self.fetch_calls = []
+        self.set_results_calls = []
+
+    async def fetch_rescore_chunk(self, after_id, limit, *, max_id=None):
+        self.fetch_calls.append((after_id, limit, max_id))
+        rows = [r for r in self.rows if r[0] > after_id and (max_id is None or r[0] <= max_id)]
+        return rows[:limit]
+
+    async def set_fraud_results(self, updates):
+        self.set_results_calls.append([u[0] for u in updates])
+        return len(updates)
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = MockTransactionRepo(10)
+    monkeypatch.setattr(rescore_mod, "SqlTransactionRepo", lambda _db: repo)
+    monkeypatch.setattr(
+        rescore_mod, "predict_batch",
+        lambda batch, fs, models: [(0.1, False, "LOW") for _ in batch],
+    )
+    return repo
+
+
+############################
+# split_ranges Tests
+############################
+
+# TC-RESCORE-RANGES-001: ranges cover every id exactly once
+def test_split_ranges_cover_ids():
+    ranges = split_ranges(5, 104, 4)
+
+    assert ranges[0][0] == 4 and ranges[-1][1] == 104
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+    assert len(ranges) == 4
+
+
+# TC-RESCORE-RANGES-002: never more ranges than ids
+def test_split_ranges_small():
+    assert split_ranges(7, 8, 5) == [(6, 7), (7, 8)]
+    assert split_ranges(3, 3, 2) == [(2, 3)]
+
+
+############################
+# rescore_range Tests
+############################
+
+# TC-RESCORE-001: keyset chunks through the whole range, commit + checkpoint per chunk
+@pytest.mark.anyio
+async def test_rescore_range_base(repo, tmp_path):
+    session = _MockAsyncSession()
+    checkpoint = tmp_path / "range-0.json"
+
+    result = await rescore_range(
+        lambda: session, {}, {}, after_id=0, max_id=10, chunk_size=4,
+        checkpoint_path=str(checkpoint),
+    )
+
+    assert repo.set_results_calls == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+    assert [call[0] for call in repo.fetch_calls] == [0, 4, 8]
+    assert session.commits == 3
+    assert result["rows"] == 10 and result["updated"] == 10 and result["last_id"] == 10
+    assert json.loads(checkpoint.read_text()) == {
+        "last_id": 10, "rows": 10, "updated": 10, "skipped": 0,
+    }
+
+
+# TC-RESCORE-002: an interrupted run resumes after the checkpointed id
+@pytest.mark.anyio
+async def test_rescore_range_resume(repo, tmp_path):
+    checkpoint = tmp_path / "range-0.json"
+    checkpoint.write_text(json.dumps({"last_id": 6, "rows": 6, "updated": 5}))
+
+    result = await rescore_range(
+        lambda: _MockAsyncSession(), {}, {}, after_id=0, max_id=10, chunk_size=4,
+        checkpoint_path=str(checkpoint),
+    )
+
+    assert repo.set_results_calls == [[7, 8, 9, 10]]
+    assert result["rows"] == 10 and result["updated"] == 9 and result["scored"] == 4
+
+
+# TC-RESCORE-003: a worker only touches ids inside its own range
+@pytest.mark.anyio
+async def test_rescore_range_bounded(repo):
+    result = await rescore_range(
+        lambda: _MockAsyncSession(), {}, {}, after_id=3, max_id=7, chunk_size=100,
+    )
+
+    assert repo.set_results_calls == [[4, 5, 6, 7]]
+    assert result["last_id"] == 7
+
+
+############################
+# Plan Tests
+############################
+
+def _plan_args(checkpoint_dir, restart=False):
+    return argparse.Namespace(checkpoint_dir=str(checkpoint_dir), restart=restart, workers=2)
+
+
+# TC-RESCORE-PLAN-001: a plan resumes for the same bundle, a new bundle at the same path plans again
+def test_plan_keyed_on_bundle_version(tmp_path, monkeypatch):
+    async def _bounds():
+        return 1, 100
+
+    monkeypatch.setattr(rescore_mod, "_id_bounds", _bounds)
+    model_path = tmp_path / "fraud_model.joblib"
+    model_path.write_bytes(b"bundle one")
+    checkpoint_dir = tmp_path / "checkpoints"
+    args = _plan_args(checkpoint_dir)
+
+    plan = rescore_mod._plan(args, str(model_path))
+    assert [tuple(r) for r in plan["ranges"]] == [(0, 50), (50, 100)]
+    range_file = checkpoint_dir / "range-0.json"
+    range_file.write_text(json.dumps({"last_id": 30}))
+    # same bundle, unfinished: resumed with its range checkpoints
+    assert rescore_mod._plan(args, str(model_path))["model_version"] == plan["model_version"]
+    assert range_file.exists()
+
+    # a retrained bundle shipped to the same path gets a fresh plan
+    model_path.write_bytes(b"bundle two")
+    fresh = rescore_mod._plan(args, str(model_path))
+    assert fresh["model_version"] != plan["model_version"]
+    assert not range_file.exists()
+
+    # so does the same bundle once every range is done
+    range_file.write_text(json.dumps({"last_id": 50}))
+    rescore_mod._finish_plan(args, fresh)
+    assert json.loads((checkpoint_dir / "plan.json").read_text())["finished"] is True
+    again = rescore_mod._plan(args, str(model_path))
+    assert again.get("finished") is None and not range_file.exists()
+
+
+# TC-RESCORE-PLAN-002: without --model it rescores with the promoted version, like the app
+def test_main_defaults_to_promoted_model(tmp_path, monkeypatch):
+    fallback = str(tmp_path / "fraud_model.joblib")
+    registry_dir = tmp_path / "models"
+    (registry_dir / "v2").mkdir(parents=True)
+    (registry_dir / "v2" / "fraud_model.joblib").write_bytes(b"bundle v2")
+    settings = argparse.Namespace(
+        FRAUD_MODEL_PATH=fallback,
+        FRAUD_MODEL_REGISTRY_DIR=str(registry_dir),
+        FRAUD_COMPACT_MODEL=False,
+    )
+    planned = []
+
+    def _plan(args, model_path):
+        planned.append(model_path)
+        return None
+
+    monkeypatch.setattr(rescore_mod, "get_settings", lambda: settings)
+    monkeypatch.setattr(rescore_mod, "_plan", _plan)
+
+    # nothing promoted yet: FRAUD_MODEL_PATH
+    assert rescore_mod.main([]) == 1
+    # after a promotion: the version ACTIVE names
+    (registry_dir / "ACTIVE").write_text("v2")
+    rescore_mod.main([])
+    # an explicit --model still wins
+    rescore_mod.main(["--model", fallback])
+    assert planned == [fallback, str(registry_dir / "v2" / "fraud_model.joblib"), fallback]
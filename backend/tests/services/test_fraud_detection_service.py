@@ -1,9 +1,14 @@
 import pytest
 import asyncio
 from datetime import date as DateType
+from types import SimpleNamespace
 
-from app.services.fraud_detection_service import FraudDetectionService
+from app.services.fraud_detection_service import FraudDetectionService, FraudScoringWorkers
 import app.services.fraud_detection_service as svc_mod
+from fraud_detection import metrics
+from fraud_detection.merchant_stats import MerchantStatsCache
+from fraud_detection.model_registry import ModelRegistry
+from fraud_detection.user_profile import UserSpendProfile
 
 
 class _MockAsyncSession:
@@ -50,6 +55,39 @@ class MockTransactionRepo:
 
 
 
+class MockJobRepo:
+    claim_queue = []
+
+    def __init__(self, db):
+        self.db = db
+        self.enqueue_calls = []
+        self.claim_calls = []
+        self.done_calls = []
+        self.failed_calls = []
+        self.count_calls = 0
+
+    async def enqueue(self, ids):
+        self.enqueue_calls.append(list(ids))
+        return len(ids)
+
+    async def claim_batch(self, limit, *, lease_seconds, max_attempts):
+        self.claim_calls.append((limit, lease_seconds, max_attempts))
+        return MockJobRepo.claim_queue.pop(0) if MockJobRepo.claim_queue else []
+
+    async def mark_done(self, jobs):
+        self.done_calls.append(list(jobs))
+        return len(jobs)
+
+    async def mark_failed(self, jobs, error, *, max_attempts, retry_base_seconds):
+        self.failed_calls.append((list(jobs), error, max_attempts))
+        return len(jobs)
+
+    async def count_by_status(self):
+        self.count_calls += 1
+        return {"pending": 4, "dead": 1}
+
+
+
 
 def row(txn_id, amount, channel, pending, txn_date, merchant):
     return (txn_id, amount, channel, pending, txn_date, merchant)
@@ -69,39 +107,64 @@ def monkeypatch_sqlrepo(monkeypatch):
     )
 
 
+@pytest.fixture
+def job_repos(monkeypatch):
+    # every repo the service creates, in order
+    created = []
+    MockJobRepo.claim_queue = []
+
+    def _make(db):
+        repo = MockJobRepo(db)
+        created.append(repo)
+        return repo
+
+    monkeypatch.setattr("app.services.fraud_detection_service.SqlFraudScoringJobRepo", _make)
+    return created
+
+
 @pytest.fixture
 def mock_prediction(monkeypatch):
-    calls = {"load_count": 0, "predict_inputs": []}
+    calls = {"load_count": 0, "predict_inputs": [], "batch_sizes": []}
 
     def _mock_load_pipeline(model_path):
         calls["load_count"] += 1
         return {"feature_state": "stub_state"}, {"models": "stub_model"}
 
-    def _mock_predict_single(features, feature_state, models):
-        calls["predict_inputs"].append(dict(features))
+    def _mock_predict_batch(batch, feature_state, models):
+        calls["batch_sizes"].append(len(batch))
+        results = []
+        for features in batch:
+            calls["predict_inputs"].append(dict(features))
 
-        amount = float(features.get("amount", 0.0))
-        is_suspected = amount > 100.0
+            amount = float(features.get("amount", 0.0))
+            is_suspected = amount > 100.0
 
-        risk_tier = "HIGH" if amount > 1000 else ("MEDIUM" if amount > 100 else "LOW")
-        prediction_score = 0.9 if risk_tier == "HIGH" else (0.6 if risk_tier == "MEDIUM" else 0.1)
-        return prediction_score, is_suspected, risk_tier
+            risk_tier = "HIGH" if amount > 1000 else ("MEDIUM" if amount > 100 else "LOW")
+            prediction_score = 0.9 if risk_tier == "HIGH" else (0.6 if risk_tier == "MEDIUM" else 0.1)
+            results.append((prediction_score, is_suspected, risk_tier))
+        return results
 
 
     # need to mock the funcs in the actual service 
-    monkeypatch.setattr("app.services.fraud_detection_service.load_pipeline", _mock_load_pipeline)
-    monkeypatch.setattr("app.services.fraud_detection_service.predict_single", _mock_predict_single)
+    monkeypatch.setattr("fraud_detection.model_registry.load_pipeline", _mock_load_pipeline)
+    monkeypatch.setattr("fraud_detection.inference_executor.predict_batch", _mock_predict_batch)
     return calls
 
 
 
 
 @pytest.fixture
-def svc(session_factory, monkeypatch_sqlrepo, mock_prediction):
+def registry():
+    return ModelRegistry()
+
+
+@pytest.fixture
+def svc(session_factory, monkeypatch_sqlrepo, mock_prediction, registry):
     return FraudDetectionService(
         session_factory=session_factory,
         model_path="fraud_detection/fraud_model.joblib",
-        enabled=True
+        enabled=True,
+        registry=registry,
     )
 
 
@@ -138,6 +201,7 @@ async def test_run_prediction_base(svc, session_factory, mock_prediction):
         assert updates[1][0] == 2 and updates[1][2] is True and updates[1][3] == "MEDIUM"
 
         assert mock_session.commits == 1
+        assert mock_prediction["batch_sizes"] == [2]
 
         feats = mock_prediction["predict_inputs"]
         assert feats[0]["amount"] == 15.0 and feats[0]["merchant_name"] == "Uber"
@@ -220,63 +284,458 @@ async def test_run_prediction_no_rows(svc, session_factory, mock_prediction):
         assert repo.fetch_calls == [[999]]
         assert repo.set_results_calls == [[]]
         assert mock_session.commits == 1
+        assert mock_prediction["batch_sizes"] == []
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-PREDICT-005: ids are split into chunks of max_batch_size, one commit at the end
+@pytest.mark.anyio
+async def test_run_prediction_max_batch_size(svc, session_factory, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    svc.max_batch_size = 2
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([
+        row(1, 10.0, "online", False, DateType(2025, 1, 1), "Merchant1"),
+        row(2, 500.0, "online", False, DateType(2025, 1, 1), "Merchant2"),
+    ])
+    repo.rows_queue.append([row(3, 2000.0, "in_store", False, DateType(2025, 1, 2), "Merchant3")])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        await svc._run_prediction([1, 2, 3])
+
+        assert repo.fetch_calls == [[1, 2], [3]]
+        assert mock_prediction["batch_sizes"] == [2, 1]
+        assert [[u[0] for u in updates] for updates in repo.set_results_calls] == [[1, 2], [3]]
+        assert repo.set_results_calls[1][0][3] == "HIGH"
+        assert mock_session.commits == 1
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-PREDICT-006: new service instances reuse the model already in the registry
+@pytest.mark.anyio
+async def test_run_prediction_shared_registry(svc, session_factory, mock_prediction, registry):
+    mock_session = session_factory()
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([row(1, 10.0, "online", False, DateType(2025, 1, 1), "Merchant1")])
+    repo.rows_queue.append([row(2, 10.0, "online", False, DateType(2025, 1, 1), "Merchant2")])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        for _ in range(2):
+            request_svc = FraudDetectionService(
+                session_factory=lambda: mock_session,
+                model_path="fraud_detection/fraud_model.joblib",
+                registry=registry,
+            )
+            await request_svc._run_prediction([1])
+
+        assert mock_prediction["load_count"] == 1
+        assert registry.stats()["loaded"] is True
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+
+
+# TC-FRAUD-PREDICT-007: live merchant stats are attached to the rows sent for scoring
+@pytest.mark.anyio
+async def test_run_prediction_live_merchant_stats(svc, session_factory, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+
+    async def _loader():
+        return {"Uber": (12, 18.0, 44.0)}
+    svc.merchant_stats = MerchantStatsCache(_loader, min_count=5)
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([
+        row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber"),
+        row(2, 250.0, "in_store", True, DateType(2025, 1, 3), "Electronics"),
+    ])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        await svc._run_prediction([1, 2])
+
+        feats = mock_prediction["predict_inputs"]
+        assert feats[0]["merchant_amount_mean"] == 18.0
+        assert feats[0]["merchant_amount_std"] == pytest.approx(2.0)
+        assert "merchant_amount_mean" not in feats[1]
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-PREDICT-008: rows whose stored fingerprint matches are not scored again
+@pytest.mark.anyio
+async def test_run_prediction_skips_unchanged(svc, session_factory, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+
+    first = [
+        row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber"),
+        row(2, 250.0, "in_store", True, DateType(2025, 1, 3), "Electronics"),
+    ]
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append(first)
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        await svc._run_prediction([1, 2])
+        stored = {u[0]: u[4] for u in repo.set_results_calls[0]}
+
+        # same inputs stored with their fingerprint, then row 2 posts with a new amount
+        repo.rows_queue.append([
+            (*first[0], stored[1]),
+            row(2, 260.0, "in_store", False, DateType(2025, 1, 3), "Electronics") + (stored[2],),
+        ])
+        await svc._run_prediction([1, 2])
+
+        assert mock_prediction["batch_sizes"] == [2, 1]
+        assert [u[0] for u in repo.set_results_calls[1]] == [2]
+        assert repo.set_results_calls[1][0][4] != stored[2]
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-PREDICT-009: skip_unchanged=False scores everything and a new model version changes the fingerprint
+@pytest.mark.anyio
+async def test_run_prediction_fingerprint_version(svc, session_factory, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    svc.skip_unchanged = False
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber")])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        await svc._run_prediction([1])
+        fingerprint = repo.set_results_calls[0][0][4]
+
+        repo.rows_queue.append([row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber") + (fingerprint,)])
+        await svc._run_prediction([1])
+        assert mock_prediction["batch_sizes"] == [1, 1]
+
+        svc._model_version = "v2"
+        rows, fingerprints = svc_mod.fingerprint_rows(
+            [row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber") + (fingerprint,)], "v2",
+        )
+        assert len(rows) == 1 and fingerprints[0] != fingerprint
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+
+
+# TC-FRAUD-PREDICT-010: behavioral bundles read every user's profile in one call and score with it
+@pytest.mark.anyio
+async def test_run_prediction_user_profiles(svc, session_factory, mock_prediction, monkeypatch):
+    monkeypatch.setattr(
+        "fraud_detection.model_registry.load_pipeline",
+        lambda _path: ({"feature_version": 2}, {"models": "stub_model"}),
+    )
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+
+    profile = UserSpendProfile()
+    for amount in (10.0, 20.0, 30.0):
+        profile.add(amount, "Uber", None)
+    loads = []
+
+    async def _profiles(user_ids):
+        loads.append(set(user_ids))
+        return {5: profile}
+    svc.user_profiles = _profiles
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([
+        row(1, 20.0, "online", False, DateType(2025, 1, 2), "Uber") + (None, 5),
+        row(2, 250.0, "in_store", True, DateType(2025, 1, 3), "Target") + (None, 6),
+        row(3, 30.0, "online", False, DateType(2025, 1, 3), "Uber") + (None, 5),
+    ])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        await svc._run_prediction([1, 2, 3])
+
+        assert loads == [{5, 6}]
+        feats = mock_prediction["predict_inputs"]
+        assert feats[0]["user_merchant_share"] == 1.0
+        assert feats[0]["user_amount_z"] == pytest.approx(0.0, abs=1e-6)
+        assert "user_amount_z" not in feats[1]
     finally:
         svc_mod.SqlTransactionRepo = orig_repo
 
 
 
+# TC-FRAUD-PREDICT-011: each chunk records its stage timings and scored / skipped counts
+@pytest.mark.anyio
+async def test_run_prediction_metrics(svc, session_factory, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    repo = MockTransactionRepo(mock_session)
+
+    before = {
+        "scored": metrics.SCORED.value,
+        "skipped": metrics.SKIPPED.value,
+        "fetch": metrics.FETCH_SECONDS.count,
+        "inference": metrics.INFERENCE_SECONDS.count,
+        "write": metrics.WRITE_SECONDS.count,
+    }
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        repo.rows_queue.append([row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber")])
+        await svc._run_prediction([1])
+        fingerprint = repo.set_results_calls[0][0][4]
+        repo.rows_queue.append([
+            row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber") + (fingerprint,),
+            row(2, 40.0, "online", False, DateType(2025, 1, 2), "Uber"),
+        ])
+        await svc._run_prediction([1, 2])
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+    assert metrics.SCORED.value - before["scored"] == 2
+    assert metrics.SKIPPED.value - before["skipped"] == 1
+    assert metrics.FETCH_SECONDS.count - before["fetch"] == 2
+    assert metrics.INFERENCE_SECONDS.count - before["inference"] == 2
+    assert metrics.WRITE_SECONDS.count - before["write"] == 2
+    assert f'fraud_model_info{{version="{svc._model_version}"}} 1' in metrics.metrics.render()
+
+
+# TC-FRAUD-PREDICT-012: a failing batch counts its transactions as failed and re-raises
+@pytest.mark.anyio
+async def test_run_prediction_failure_metrics(svc, session_factory, mock_prediction, monkeypatch):
+    async def _boom(*_args):
+        raise RuntimeError("executor down")
+    monkeypatch.setattr(svc.executor, "score", _boom)
+
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber")])
+    failed = metrics.FAILED.value
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        with pytest.raises(RuntimeError):
+            await svc._run_prediction([1, 2, 3])
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+    assert metrics.FAILED.value - failed == 3
+    assert mock_session.commits == 0
+
+
+# TC-FRAUD-PREDICT-013: a row whose profile snapshot changed is scored again, and with profiles
+# on a row without a snapshot reads the live profile so it's never skipped
+def test_fingerprint_rows_profile_snapshot():
+    base = row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber")
+    snapshot = [0.5, 1.0, 2.0, 2.0, 3.0]
+    _, (fingerprint,) = svc_mod.fingerprint_rows([(*base, None, 7, snapshot)], "v1")
+
+    kept, _ = svc_mod.fingerprint_rows([(*base, fingerprint, 7, snapshot)], "v1", profiles=True)
+    assert kept == []
+    changed = [0.5, 1.0, 3.0, 3.0, 4.0]
+    kept, (refreshed,) = svc_mod.fingerprint_rows([(*base, fingerprint, 7, changed)], "v1")
+    assert len(kept) == 1 and refreshed != fingerprint
+
+    _, (legacy,) = svc_mod.fingerprint_rows([(*base, None, 7, None)], "v1")
+    assert svc_mod.fingerprint_rows([(*base, legacy, 7, None)], "v1")[0] == []
+    kept, _ = svc_mod.fingerprint_rows([(*base, legacy, 7, None)], "v1", profiles=True)
+    assert len(kept) == 1
+
 
 ############################
-# enqueue_ids Tests
+# refresh_metrics Tests
 ############################
 
-# TC-FRAUD-ENQUEUE-001: base scenario, task is scheduled
-def test_enqueue_ids_base(monkeypatch, svc):
-    scheduled = []
+# TC-FRAUD-METRICS-001: scrapes inside the interval reuse the last outbox count
+@pytest.mark.anyio
+async def test_refresh_metrics_caches_job_counts(session_factory, mock_prediction, monkeypatch):
+    monkeypatch.setattr(svc_mod, "_job_counts_at", None)
+    job_repo = MockJobRepo(None)
+    svc = FraudDetectionService(
+        session_factory=session_factory,
+        model_path="fraud_detection/fraud_model.joblib",
+        job_repo=job_repo,
+    )
+
+    await svc.refresh_metrics(job_counts_seconds=60.0)
+    await svc.refresh_metrics(job_counts_seconds=60.0)
+    assert job_repo.count_calls == 1
+    assert metrics.JOBS.labels("pending").value == 4
 
-    def _mock_create_task(id):
-        scheduled.append(id)
-        try:
-            id.close()
-        except Exception:
-            pass
+    await svc.refresh_metrics(job_counts_seconds=0.0)
+    assert job_repo.count_calls == 2
 
-        class _Response:
-            pass
-        return _Response()
 
-    monkeypatch.setattr(asyncio, "create_task", _mock_create_task)
+############################
+# enqueue_ids Tests
+############################
 
-    # should deduplicate if same ids and just create 1 task
-    svc.enqueue_ids([1, "2", 2, 1])
+# TC-FRAUD-ENQUEUE-001: base scenario, deduplicated jobs written through the request job repo
+@pytest.mark.anyio
+async def test_enqueue_ids_base(session_factory, mock_prediction):
+    job_repo = MockJobRepo(None)
+    svc = FraudDetectionService(
+        session_factory=session_factory,
+        model_path="fraud_detection/fraud_model.joblib",
+        job_repo=job_repo,
+    )
 
-    assert len(scheduled) == 1
+    # should deduplicate if same ids and only write each job once
+    assert await svc.enqueue_ids([1, "2", 2, 1]) == 2
+    assert job_repo.enqueue_calls == [[1, 2]]
 
 
 
-# TC-FRAUD-ENQUEUE-002: No tasks scheduled if disabled
-def test_enqueue_ids_disabled(monkeypatch, session_factory, mock_prediction):
+# TC-FRAUD-ENQUEUE-002: No jobs written if disabled
+@pytest.mark.anyio
+async def test_enqueue_ids_disabled(session_factory, mock_prediction):
+    job_repo = MockJobRepo(None)
     svc = FraudDetectionService(
         session_factory=session_factory,
         model_path="fraud_detection/fraud_model.joblib",
-        enabled=False
+        enabled=False,
+        job_repo=job_repo,
     )
 
-    scheduled = []
+    assert await svc.enqueue_ids([1, 2, 3]) == 0
+    assert job_repo.enqueue_calls == []
+
+
+# TC-FRAUD-ENQUEUE-003: No jobs written if empty ids list
+@pytest.mark.anyio
+async def test_enqueue_ids_empty_list(svc, job_repos):
+    assert await svc.enqueue_ids([]) == 0
+    assert await svc.enqueue_ids(None) == 0
+    assert job_repos == []
+
+
+# TC-FRAUD-ENQUEUE-004: without a request repo the jobs get their own commit and wake the workers
+@pytest.mark.anyio
+async def test_enqueue_ids_own_session(svc, session_factory, job_repos, monkeypatch):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    woken = []
+    monkeypatch.setattr(svc_mod, "get_scoring_workers", lambda: SimpleNamespace(wake=lambda: woken.append(1)))
+
+    assert await svc.enqueue_ids([3, 4]) == 2
+
+    assert job_repos[0].enqueue_calls == [[3, 4]]
+    assert mock_session.commits == 1
+    assert woken == [1]
 
-    def _mock_create_task(ids):
-        scheduled.append(ids)
 
-    monkeypatch.setattr(asyncio, "create_task", _mock_create_task)
 
-    svc.enqueue_ids([1, 2, 3])
-    assert scheduled == []
 
+############################
+# process_next_batch Tests
+############################
 
-# TC-FRAUD-ENQUEUE-003: No tasks scheduled if empty ids list
-def test_enqueue_ids_empty_list(monkeypatch, svc):
-    scheduled = []
-    monkeypatch.setattr(asyncio, "create_task", lambda c: scheduled.append(c))
-    svc.enqueue_ids([])
-    svc.enqueue_ids(None)
-    assert scheduled == []
+# TC-FRAUD-JOBS-001: claimed jobs are scored and marked done in the same commit as the results
+@pytest.mark.anyio
+async def test_process_next_batch_base(svc, session_factory, job_repos, mock_prediction):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    MockJobRepo.claim_queue.append([(100, 1, 0), (101, 2, 3)])
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([
+        row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber"),
+        row(2, 250.0, "in_store", True, DateType(2025, 1, 3), "Electronics"),
+    ])
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        assert await svc.process_next_batch() == 2
+
+        assert job_repos[0].claim_calls == [(svc.max_batch_size, svc.lease_seconds, svc.max_attempts)]
+        assert repo.fetch_calls == [[1, 2]]
+        assert [u[0] for u in repo.set_results_calls[0]] == [1, 2]
+        assert job_repos[1].done_calls == [[(100, 1, 0), (101, 2, 3)]]
+        assert job_repos[1].failed_calls == []
+        # claim commit + results commit
+        assert mock_session.commits == 2
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-JOBS-002: a scoring failure hands the batch back for retry, nothing is marked done
+@pytest.mark.anyio
+async def test_process_next_batch_failure(svc, session_factory, job_repos, monkeypatch):
+    mock_session = session_factory()
+    svc.session_factory = lambda: mock_session
+    MockJobRepo.claim_queue.append([(100, 1, 0)])
+
+    repo = MockTransactionRepo(mock_session)
+    repo.rows_queue.append([row(1, 15.0, "online", False, DateType(2025, 1, 2), "Uber")])
+
+    def _failing_predict_batch(batch, feature_state, models):
+        raise RuntimeError("model exploded")
+    monkeypatch.setattr("fraud_detection.inference_executor.predict_batch", _failing_predict_batch)
+
+    orig_repo = svc_mod.SqlTransactionRepo
+    svc_mod.SqlTransactionRepo = lambda _db: repo
+    try:
+        assert await svc.process_next_batch() == 1
+
+        done = [call for r in job_repos for call in r.done_calls]
+        failed = [call for r in job_repos for call in r.failed_calls]
+        assert done == []
+        assert failed == [([(100, 1, 0)], "RuntimeError: model exploded", svc.max_attempts)]
+        assert repo.set_results_calls == []
+    finally:
+        svc_mod.SqlTransactionRepo = orig_repo
+
+
+# TC-FRAUD-JOBS-003: nothing due, no scoring and no model load
+@pytest.mark.anyio
+async def test_process_next_batch_empty(svc, job_repos, mock_prediction):
+    assert await svc.process_next_batch() == 0
+    assert len(job_repos) == 1
+    assert mock_prediction["load_count"] == 0
+
+
+# TC-FRAUD-JOBS-004: workers drain the queue when woken and stop cleanly
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_scoring_workers_wake(svc, monkeypatch):
+    processed = []
+    pending = [2, 0]
+
+    async def _mock_process_next_batch():
+        claimed = pending.pop(0) if pending else 0
+        processed.append(claimed)
+        return claimed
+
+    monkeypatch.setattr(svc, "process_next_batch", _mock_process_next_batch)
+    workers = FraudScoringWorkers(svc, workers=1, poll_interval=60)
+
+    await workers.start()
+    await asyncio.sleep(0.01)
+    assert processed == [2, 0]
+
+    pending.append(1)
+    workers.wake()
+    await asyncio.sleep(0.01)
+    assert processed == [2, 0, 1, 0]
+
+    await workers.shutdown()
+    assert workers.running is False
@@ -1,3 +1,4 @@
+import anyio
 import pytest
 from types import SimpleNamespace
 from typing import Optional, List
@@ -11,6 +12,10 @@ from app.domain.entities import ConnectionItemEntity, AccountEntity, BudgetCateg
 class MockTransactionRepo:
     def __init__(self):
         self.upsert_calls: list[tuple[ConnectionItemEntity, dict]] = []
+        self.upsert_pages: list[int] = []
+        self.ids_by_plaid_id: dict[str, int] = {}
+        self.profiles_by_plaid_id: dict[str, list] = {}
+        self.fraud_results: list[tuple] = []
         self.removed_ids: list[str] = []
 
 
@@ -30,6 +35,23 @@ class MockTransactionRepo:
         self.upsert_calls.append((item, transaction))
         return 1
 
+    async def upsert_many_from_plaid(self, item: ConnectionItemEntity, transactions: list[dict]):
+        self.upsert_pages.append(len(transactions))
+        for transaction in transactions:
+            self.upsert_calls.append((item, transaction))
+        return [
+            (
+                self.ids_by_plaid_id.get(t["transaction_id"], 1),
+                None,
+                self.profiles_by_plaid_id.get(t["transaction_id"]),
+            )
+            for t in transactions
+        ]
+
+    async def set_fraud_results(self, updates) -> int:
+        self.fraud_results.extend(updates)
+        return len(updates)
+
     async def mark_removed(self, plaid_ids: list[str]) -> None:
         self.removed_ids.extend(plaid_ids)
 
@@ -178,9 +200,27 @@ class MockFraudDetectionService:
     def __init__(self):
         self.calls = []
         self.enabled = True
+        self.notify_calls = 0
+        self.score_inline = False
+        self.inline_timeout_seconds = 2.0
+        self.scored_rows: list[list[tuple]] = []
+        self.fail_scoring = False
+        self.scoring_delay = 0.0
     
-    def enqueue_ids(self, ids):
-        return
+    async def enqueue_ids(self, ids):
+        self.calls.append(list(ids))
+        return len(ids)
+
+    async def score_rows(self, rows):
+        self.scored_rows.append(list(rows))
+        if self.scoring_delay:
+            await anyio.sleep(self.scoring_delay)
+        if self.fail_scoring:
+            raise RuntimeError("model unavailable")
+        return [(row[0], 0.5, False, "LOW", 123) for row in rows]
+
+    def notify_workers(self):
+        self.notify_calls += 1
 
 
 @pytest.fixture
@@ -300,6 +340,128 @@ async def test_sync_connection_item_not_owned(svc):
     assert svc.connection_item_repo.update_cursor_calls == []
 
 
+# TC-TX-ITEM-005: scoring jobs are enqueued per page, workers are woken once after the cursor commit
+@pytest.mark.anyio
+async def test_sync_connection_item_enqueues_fraud_jobs(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor=None)
+
+    svc.plaid.queue = [
+        {"added": [{"transaction_id": "t1", "account_id": "p1"}], "modified": [], "removed": [], "next_cursor": "c1", "has_more": True},
+        {"added": [{"transaction_id": "t2", "account_id": "p1"}, {"transaction_id": "t3", "account_id": "p1"}],
+         "modified": [], "removed": [], "next_cursor": "c2", "has_more": False},
+    ]
+
+    await svc.sync_connection_item(99, user_id=1)
+
+    assert svc.fraud_detection_svc.calls == [[1], [1, 1]]
+    assert svc.fraud_detection_svc.notify_calls == 1
+
+
+
+# TC-TX-ITEM-006: each page is upserted in one bulk call
+@pytest.mark.anyio
+async def test_sync_connection_item_bulk_upserts_per_page(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor=None)
+
+    svc.plaid.queue = [
+        {"added": [{"transaction_id": "t1", "account_id": "p1"}, {"transaction_id": "t2", "account_id": "p1"}],
+         "modified": [{"transaction_id": "t0", "account_id": "p1"}], "removed": [], "next_cursor": "c1", "has_more": True},
+        {"added": [{"transaction_id": "t3", "account_id": "p1"}], "modified": [], "removed": [], "next_cursor": "c2", "has_more": False},
+    ]
+
+    await svc.sync_connection_item(99, user_id=1)
+
+    assert svc.transaction_repo.upsert_pages == [3, 1]
+
+
+# TC-TX-ITEM-007: inline scoring scores the Plaid payload and writes the results, no jobs
+@pytest.mark.anyio
+async def test_sync_connection_item_scores_inline(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor=None)
+    svc.fraud_detection_svc.score_inline = True
+    svc.transaction_repo.ids_by_plaid_id = {"t1": 11, "t2": 12}
+    # the profile snapshot taken at insert goes to scoring with its row
+    svc.transaction_repo.profiles_by_plaid_id = {"t1": [0.5, 1.0, 2.0, 2.0, 3.0]}
+
+    svc.plaid.queue = [
+        {"added": [{"transaction_id": "t1", "account_id": "p1", "amount": 12.5, "payment_channel": "online",
+                    "pending": False, "date": date.today(), "merchant_name": "Uber"}],
+         "modified": [], "removed": [], "next_cursor": "c1", "has_more": True},
+        {"added": [{"transaction_id": "t2", "account_id": "p1", "amount": 40.0, "merchant_name": "Target"}],
+         "modified": [], "removed": [], "next_cursor": "c2", "has_more": False},
+    ]
+
+    await svc.sync_connection_item(99, user_id=1)
+
+    assert svc.fraud_detection_svc.scored_rows == [
+        [(11, 12.5, "online", False, date.today(), "Uber", None, 1, [0.5, 1.0, 2.0, 2.0, 3.0])],
+        [(12, 40.0, None, False, None, "Target", None, 1, None)],
+    ]
+    assert svc.transaction_repo.fraud_results == [
+        (11, 0.5, False, "LOW", 123), (12, 0.5, False, "LOW", 123),
+    ]
+    assert svc.fraud_detection_svc.calls == []
+    assert svc.connection_item_repo.update_cursor_calls == [(99, "c2")]
+
+
+# TC-TX-ITEM-008: a page that fails to score falls back to scoring jobs, the sync still succeeds
+@pytest.mark.anyio
+async def test_sync_connection_item_inline_failure_enqueues(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor=None)
+    svc.fraud_detection_svc.score_inline = True
+    svc.fraud_detection_svc.fail_scoring = True
+    svc.transaction_repo.ids_by_plaid_id = {"t1": 11}
+
+    svc.plaid.queue = [
+        {"added": [{"transaction_id": "t1", "account_id": "p1"}], "modified": [], "removed": [], "next_cursor": "c1", "has_more": False},
+    ]
+
+    out = await svc.sync_connection_item(99, user_id=1)
+
+    assert out == {"ok": True, "added": 1, "modified": 0, "removed": 0}
+    assert svc.fraud_detection_svc.calls == [[11]]
+    assert svc.transaction_repo.fraud_results == []
+
+
+# TC-TX-ITEM-010: a page that takes longer than the inline timeout goes to the scoring jobs
+@pytest.mark.anyio
+async def test_sync_connection_item_inline_timeout_enqueues(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor=None)
+    svc.fraud_detection_svc.score_inline = True
+    svc.fraud_detection_svc.inline_timeout_seconds = 0.05
+    svc.fraud_detection_svc.scoring_delay = 5.0
+    svc.transaction_repo.ids_by_plaid_id = {"t1": 11}
+
+    svc.plaid.queue = [
+        {"added": [{"transaction_id": "t1", "account_id": "p1"}], "modified": [], "removed": [],
+         "next_cursor": "c1", "has_more": False},
+    ]
+
+    with anyio.fail_after(2):
+        out = await svc.sync_connection_item(99, user_id=1)
+
+    assert out == {"ok": True, "added": 1, "modified": 0, "removed": 0}
+    assert svc.fraud_detection_svc.calls == [[11]]
+    assert svc.transaction_repo.fraud_results == []
+    assert svc.connection_item_repo.update_cursor_calls == [(99, "c1")]
+
+
+# TC-TX-ITEM-009: a Plaid error stops the sync without moving the cursor
+@pytest.mark.anyio
+async def test_sync_connection_item_plaid_error(svc):
+    svc.connection_item_repo._by_id[99] = _item(item_id=99, user_id=1, cursor="c0")
+
+    async def _failing_sync(access_token, cursor):
+        raise RuntimeError("plaid down")
+
+    svc.plaid.transactions_sync = _failing_sync
+
+    with pytest.raises(RuntimeError, match="plaid down"):
+        await svc.sync_connection_item(99, user_id=1)
+
+    assert svc.connection_item_repo.update_cursor_calls == []
+    assert svc.fraud_detection_svc.notify_calls == 0
+
 
 ############################
 # sync_user Tests
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.startup import FraudScoring
+from fraud_detection.inference_executor import get_inference_executor, set_inference_executor
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _settings(model_path, mode="process", batch_max_rows=0):
+    return SimpleNamespace(
+        FRAUD_MODEL_PATH=str(model_path),
+        FRAUD_INFERENCE_MODE=mode,
+        FRAUD_INFERENCE_WORKERS=1,
+        FRAUD_INFERENCE_MAX_PENDING=4,
+        FRAUD_COMPACT_MODEL=False,
+        FRAUD_BATCH_MAX_ROWS=batch_max_rows,
+        FRAUD_BATCH_MAX_WAIT_MS=2.0,
+    )
+
+
+async def _start_executor(settings):
+    fraud_scoring = FraudScoring(settings, None)
+    fraud_scoring.model_path = settings.FRAUD_MODEL_PATH
+    await fraud_scoring._start_executor()
+    return fraud_scoring
+
+
+############################
+# Executor Startup Tests
+############################
+
+# TC-STARTUP-001: process mode without a model file falls back to a started inline executor
+@pytest.mark.anyio
+async def test_process_mode_without_model_falls_back(tmp_path):
+    fraud_scoring = await _start_executor(
+        _settings(tmp_path / "missing.joblib", batch_max_rows=100)
+    )
+    try:
+        executor = get_inference_executor()
+        assert executor is fraud_scoring.executor
+        assert executor.mode == "inline"
+        # the micro-batching dispatcher runs, callers are coalesced like with a model
+        assert executor._dispatcher is not None
+        assert await executor.score([], None, None) == []
+    finally:
+        set_inference_executor(None)
+        await fraud_scoring.executor.shutdown()
+
+
+# TC-STARTUP-002: other modes don't need the model file, they start as configured
+@pytest.mark.anyio
+async def test_thread_mode_without_model(tmp_path):
+    fraud_scoring = await _start_executor(_settings(tmp_path / "missing.joblib", mode="thread"))
+    try:
+        assert get_inference_executor() is fraud_scoring.executor
+        assert fraud_scoring.executor.mode == "thread"
+        assert fraud_scoring.executor._pool is not None
+    finally:
+        set_inference_executor(None)
+        await fraud_scoring.executor.shutdown()
@@ -0,0 +1,72 @@
+import anyio
+import pytest
+
+from app.utils.pipeline import run_pipeline
+
+
+async def _numbers(n, log=None):
+    for i in range(n):
+        if log is not None:
+            log.append(f"fetch {i}")
+        yield i
+
+
+async def _double(items):
+    async for i in items:
+        yield i * 2
+
+
+async def _collect(items):
+    return [item async for item in items]
+
+
+############################
+# run_pipeline Tests
+############################
+
+# TC-PIPE-001: items go through every stage in order
+@pytest.mark.anyio
+async def test_run_pipeline_order():
+    assert await run_pipeline(_numbers(5), _double, _double, sink=_collect) == [0, 4, 8, 12, 16]
+
+
+# TC-PIPE-002: the source keeps fetching while a later stage is busy, up to the queue bound
+@pytest.mark.anyio
+async def test_run_pipeline_overlaps_stages():
+    log = []
+    release = anyio.Event()
+
+    async def _slow(items):
+        async for i in items:
+            log.append(f"score {i}")
+            await release.wait()
+            yield i
+
+    result = []
+
+    async def _consume():
+        result.extend(await run_pipeline(_numbers(10, log), _slow, sink=_collect, maxsize=1))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_consume)
+        await anyio.wait_all_tasks_blocked()
+
+        # item 0 is being scored, the source ran ahead but stopped at the bounded stream
+        assert "score 0" in log and "fetch 1" in log
+        assert "fetch 9" not in log
+        release.set()
+
+    assert result == list(range(10))
+
+
+# TC-PIPE-003: a failing stage surfaces to the consumer
+@pytest.mark.anyio
+async def test_run_pipeline_stage_error():
+    async def _boom(items):
+        async for i in items:
+            if i == 2:
+                raise ValueError("bad page")
+            yield i
+
+    with pytest.raises(ValueError, match="bad page"):
+        await run_pipeline(_numbers(5), _boom, _double, sink=_collect)